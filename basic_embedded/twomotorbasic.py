@@ -1,8 +1,8 @@
-import RPi.GPIO as GPIO
 import time
 
-# Set GPIO mode
-GPIO.setmode(GPIO.BCM)
+# RPi.GPIO is imported by init(), so this module can be imported (and the
+# robot's software started) without touching the pins.
+GPIO = None
 
 # Define the GPIO pins for the motors
 IN1 = 17
@@ -13,20 +13,48 @@ IN3 = 23
 IN4 = 24
 ENB = 25  # PWM for motor 2
 
-# Set up the GPIO pins
-GPIO.setup(IN1, GPIO.OUT)
-GPIO.setup(IN2, GPIO.OUT)
-GPIO.setup(ENA, GPIO.OUT)  # Enable pin for motor 1
+pwmA = None
+pwmB = None
 
-GPIO.setup(IN3, GPIO.OUT)
-GPIO.setup(IN4, GPIO.OUT)
-GPIO.setup(ENB, GPIO.OUT)  # Enable pin for motor 2
-
-# Set the motor speeds (using PWM on ENA and ENB)
-pwmA = GPIO.PWM(ENA, 1000)  # 1000 Hz frequency for motor 1
-pwmB = GPIO.PWM(ENB, 1000)  # 1000 Hz frequency for motor 2
-pwmA.start(100)  # Start with 0% duty cycle (off) for motor 1
-pwmB.start(100)  # Start with 0% duty cycle (off) for motor 2
+"""
+Device lifecycle.
+"""
+def init() -> None:
+    """
+    Sets up the motor pins and starts PWM. The direction pins start low, so
+    the motors stay still until told to move, even if a previous run left
+    them driving. Calling it again does nothing.
+    """
+    global GPIO, pwmA, pwmB
+    if pwmA is not None:
+        return
+    import RPi.GPIO
+    GPIO = RPi.GPIO
+    GPIO.setmode(GPIO.BCM)
+    for pin in (IN1, IN2, IN3, IN4):
+        GPIO.setup(pin, GPIO.OUT, initial=GPIO.LOW)
+    GPIO.setup(ENA, GPIO.OUT)  # Enable pin for motor 1
+    GPIO.setup(ENB, GPIO.OUT)  # Enable pin for motor 2
+
+    # Full duty cycle; the direction pins decide whether a motor turns.
+    pwmA = GPIO.PWM(ENA, 1000)  # 1000 Hz frequency for motor 1
+    pwmB = GPIO.PWM(ENB, 1000)  # 1000 Hz frequency for motor 2
+    pwmA.start(100)
+    pwmB.start(100)
+
+def shutdown() -> None:
+    """
+    Stops both motors, stops PWM and releases the motor pins.
+    """
+    global pwmA, pwmB
+    if pwmA is None:
+        return
+    motor1_stop()
+    motor2_stop()
+    pwmA.stop()
+    pwmB.stop()
+    pwmA = pwmB = None
+    GPIO.cleanup([IN1, IN2, ENA, IN3, IN4, ENB])
 
 """
 Bare-metal motor functionality that interacts via GPIO pins.
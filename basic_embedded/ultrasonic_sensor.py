@@ -1,14 +1,12 @@
 
-import RPi.GPIO as GPIO
 import time
 import threading
 
 TRIG = 5  # GPIO 5
 ECHO = 6  # GPIO 6
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(TRIG, GPIO.OUT)
-GPIO.setup(ECHO, GPIO.IN)
+# Imported and set up by init_sensor(), so importing this module does not touch the pins.
+GPIO = None
 
 _latest_distance = None
 _lock = threading.Lock()
@@ -43,8 +41,18 @@ def _update_distance():
             _latest_distance = dist
         time.sleep(0.2)
 
+def _setup_pins():
+    global GPIO
+    if GPIO is None:
+        import RPi.GPIO
+        RPi.GPIO.setmode(RPi.GPIO.BCM)
+        RPi.GPIO.setup(TRIG, RPi.GPIO.OUT)
+        RPi.GPIO.setup(ECHO, RPi.GPIO.IN)
+        GPIO = RPi.GPIO
+
 def init_sensor():
     global _thread, _running
+    _setup_pins()
     if not _running:
         _running = True
         _thread = threading.Thread(target=_update_distance, daemon=True)
@@ -61,4 +69,7 @@ def get_distance():
         return _latest_distance
 
 def cleanup():
-    GPIO.cleanup()
+    global GPIO
+    if GPIO is not None:
+        GPIO.cleanup()
+        GPIO = None
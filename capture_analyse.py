@@ -1,7 +1,13 @@
 import sys
-import cv2
-from computer_vision_gpt_approach.computer_vision import  \
-    resize_and_encode_image, match_image_to_artwork
+import threading
+import time
+from runtime.lazy import lazy_import, preload
+from telemetry import metrics, tracing
+
+# cv2 and the vision model (OpenAI, PIL) take seconds to import on the Pi, so
+# they load on the first capture or from warm_up(), not when navigation starts.
+cv2 = lazy_import("cv2")
+computer_vision = lazy_import("computer_vision_gpt_approach.computer_vision")
 
 # Dictionary mapping long exhibit names to sets of vision tags
 ARTWORKS = {
@@ -40,34 +46,132 @@ ARTWORKS = {
     }
 }
 
-def cap_anal() -> str:
+VISION_RESULTS = metrics.counter("museum_vision_results_total",
+                                 "Camera analyses by result (match, nothing, error)", ["result"])
+
+# Camera shared across captures while the vision component is running, so a
+# verification does not pay for opening the device every time.
+_camera = None
+_camera_lock = threading.Lock()
+
+def open_camera():
+    global _camera
+    with _camera_lock:
+        if _camera is None:
+            cap = cv2.VideoCapture(0)
+            if not cap.isOpened():
+                raise RuntimeError("Cannot access webcam")
+            _camera = cap
+
+def close_camera():
+    global _camera
+    with _camera_lock:
+        if _camera is not None:
+            _camera.release()
+            _camera = None
+
+def read_frame():
+    """
+    Returns the latest camera frame, opening the camera just for this read if
+    no shared camera is open.
+    """
+    with _camera_lock:
+        if _camera is not None:
+            ret, frame = _camera.read()
+            return frame if ret else None
     cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("[ERROR] Cannot access webcam")
-        sys.exit(1)
+    try:
+        if not cap.isOpened():
+            raise RuntimeError("Cannot access webcam")
+        ret, frame = cap.read()
+        return frame if ret else None
+    finally:
+        cap.release()
 
-    ret, frame = cap.read()
-    if not ret:
-        print("[ERROR] Failed to capture frame")
-        sys.exit(1)
+def serve_camera(heartbeat=None, stopping=None, interval: float = 0.1):
+    """
+    Keeps the camera open and its buffer drained so captures get a fresh frame.
+    Runs until stopping is set; used by the runtime's vision component.
+    """
+    open_camera()
+    print("[INFO] Vision: camera open")
+    try:
+        while stopping is None or not stopping.is_set():
+            if heartbeat:
+                heartbeat()
+            with _camera_lock:
+                if not _camera.grab():
+                    raise RuntimeError("Camera stopped delivering frames")
+            time.sleep(interval)
+    finally:
+        close_camera()
 
-    filename = "frame.jpg"
-    cv2.imwrite(filename, frame)
+def warm_up() -> None:
+    """
+    Imports cv2 and the vision model ahead of the first capture.
+    """
+    preload(cv2.__name__, computer_vision.__name__, background=False)
+
+_detectors = {}
+
+def _detector(index):
+    from navigation.landmarks import LandmarkDetector
+    detector = _detectors.get(id(index))
+    if detector is None or detector.index is not index:
+        detector = _detectors[id(index)] = LandmarkDetector(index)
+    return detector
+
+def locate_landmarks(index) -> list:
+    """
+    Landmarks from the index in a fresh camera frame (see navigation/landmarks.py).
+    Raises if the camera cannot be read.
+    """
+    frame = read_frame()
+    if frame is None:
+        return []
+    return _detector(index).detect(frame)
+
+def locate_exhibit(index, name: str):
+    """
+    Where the exhibit is in a fresh camera frame, from the index's view of it
+    (see LandmarkDetector.locate_exhibit); None if it is not seen.
+    Raises if the camera cannot be read.
+    """
+    frame = read_frame()
+    if frame is None:
+        return None
+    return _detector(index).locate_exhibit(frame, name)
+
+def cap_anal() -> str:
+    with tracing.span("vision.capture"):
+        try:
+            frame = read_frame()
+        except (RuntimeError, ImportError) as e:
+            print(f"[ERROR] {e}")
+            VISION_RESULTS.labels(result="error").inc()
+            return "nothing found"
+        if frame is None:
+            print("[ERROR] Failed to capture frame")
+            VISION_RESULTS.labels(result="error").inc()
+            return "nothing found"
+
+        filename = "frame.jpg"
+        cv2.imwrite(filename, frame)
     print("[INFO] Frame captured. Analyzing...")
     
     try:
-        encoded = resize_and_encode_image(filename)
-        match = match_image_to_artwork(encoded, ARTWORKS)
+        with tracing.span("vision.match"):
+            encoded = computer_vision.resize_and_encode_image(filename)
+            match = computer_vision.match_image_to_artwork(encoded, ARTWORKS)
         print(f"[RESULT] Matched artwork: {match}")
-        cap.release()
-        cv2.destroyAllWindows()
-        
+        VISION_RESULTS.labels(result="nothing" if match == "nothing found" else "match").inc()
         return match
 
     except Exception as e:
         print(f"[ERROR] {e}")
-        sys.exit(1)
+        VISION_RESULTS.labels(result="error").inc()
+        return "nothing found"
 
 # If run directly, execute a test capture
 if __name__ == "__main__":
-    cap_anal()    
+    cap_anal()
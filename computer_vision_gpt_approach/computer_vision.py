@@ -5,11 +5,16 @@ import sys
 from dotenv import load_dotenv
 from PIL import Image
 from io import BytesIO
-import cv2
 from typing import Any
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from replay.adapters import http_client, openai_api_key
+from runtime import openai_limiter
+
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+openai.api_key = openai_api_key(os.getenv("OPENAI_API_KEY"))
+# Recorded or replayed from a cassette when CASSETTE_MODE is set.
+openai.http_client = http_client()
 
 def resize_and_encode_image(image_path: str, max_size:int =512):
     print(f"[INFO] Loading image from: {image_path}")
@@ -48,7 +53,9 @@ Artworks:
 """
 
         print("[INFO] Sending image and matching request to OpenAI...")
-        response = openai.chat.completions.create(
+        # The arrival check keeps the robot moving: it goes ahead of visitor chat.
+        result: str = openai_limiter.limiter.complete(
+            "vision.match", openai_limiter.CRITICAL, openai.chat.completions.create,
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -57,9 +64,7 @@ Artworks:
                 ]}
             ],
             max_tokens=200,
-        ) # type: ignore
-
-        result: str = response.choices[0].message.content.strip()  # type: ignore
+        )
         return result
     except Exception as e:
         print(f"[ERROR] OpenAI API failed: {e}")
@@ -102,6 +107,8 @@ if __name__ == "__main__":
         }
     }
 
+    import cv2  # only the interactive test needs the camera here
+
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
         print("[ERROR] Cannot access webcam")
@@ -0,0 +1,350 @@
+"""
+Offline content pack: everything the tour says and sees about the exhibits,
+built ahead of time into one file.
+
+The pack holds, per exhibit in the catalog (nlp_voice_bot/prompts.EXHIBITS
+with capture_analyse.ARTWORKS' vision tags):
+- the spoken summary;
+- the MP3 of every line the tour says word for word, summaries included;
+- ORB keypoints and descriptors of the exhibit's reference view, from the
+  landmark index (navigation/landmarks.py);
+- an index from tag words to exhibits, for choosing exhibits locally.
+
+At runtime the voice bot and the session manager take summaries and audio
+from the pack before calling OpenAI or gTTS. The landmark detector takes the
+reference features from it instead of decoding the reference images.
+Requests that clearly name an exhibit's tags are answered without the LLM.
+
+Layout: a fixed header, then 16-byte aligned blobs, then a JSON index of
+(offset, length) per blob. The file is mapped read-only and the index
+parsed once, so any lookup is a dictionary access and a slice of the map.
+The builder writes a new pack next to the old one and renames it into place.
+A running system picks the new pack up at the next tour (``refresh()``),
+while readers of the old mapping keep a valid view.
+
+Usage:
+    python content/pack.py build [--out content/museum.pack] [--version 2025-06]
+    python content/pack.py show [content/museum.pack]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from runtime.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+CONTENT_PACK = os.getenv("CONTENT_PACK", os.path.join(os.path.dirname(os.path.abspath(__file__)), "museum.pack"))
+MAGIC = b"MUSEPACK"
+FORMAT = 1
+HEADER = struct.Struct("<8sHHQQ")  # magic, format, reserved, index offset, index length
+ALIGN = 16
+MAX_CHOICES = 3
+MIN_TAG_HITS = 2  # single-word tags an exhibit needs before a request is taken to mean it
+
+_TAG_WORDS = re.compile(r"[^\W_]+")
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()[:20]
+
+
+def tag_words(tag: str) -> tuple[str, ...]:
+    return tuple(word.lower() for word in _TAG_WORDS.findall(tag))
+
+
+class ContentPack:
+    """
+    A built pack, memory-mapped read-only.
+
+    Parameters:
+        path: The pack file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT:
+            raise ValueError(f"{path} is not a format {FORMAT} content pack")
+        self.index = json.loads(self._map[index_offset:index_offset + index_length])
+        self.version = self.index["version"]
+        self.exhibits: dict[str, dict] = self.index["exhibits"]
+        self._audio: dict[str, list[int]] = self.index["audio"]
+        self._tags = [(tuple(words), exhibits) for words, exhibits in self.index["tags"]]
+
+    def _blob(self, span: list[int]) -> memoryview:
+        offset, length = span
+        return memoryview(self._map)[offset:offset + length]
+
+    def summary(self, location: str) -> str | None:
+        exhibit = self.exhibits.get(location)
+        if exhibit is None or "summary" not in exhibit:
+            return None
+        return bytes(self._blob(exhibit["summary"])).decode("utf-8")
+
+    def audio(self, text: str) -> memoryview | None:
+        """
+        The MP3 of a line, if the pack has it rendered.
+        """
+        span = self._audio.get(text_key(text))
+        return self._blob(span) if span else None
+
+    def reference(self, location: str):
+        """
+        (keypoint coordinates as float32 N x 2, ORB descriptors as uint8 N x 32,
+        (height, width) of the reference view) without copying, or None.
+        """
+        exhibit = self.exhibits.get(location)
+        ref = exhibit and exhibit.get("reference")
+        if not ref:
+            return None
+        count = ref["count"]
+        points = np.frombuffer(self._map, np.float32, count * 2, ref["points"][0]).reshape(count, 2)
+        descriptors = np.frombuffer(self._map, np.uint8, count * 32, ref["descriptors"][0]).reshape(count, 32)
+        return points, descriptors, tuple(ref["shape"])
+
+    def match_tags(self, text: str) -> list[str]:
+        """
+        Exhibits the request clearly asks for, best first: a tag counts when
+        all of its words appear in the text and it belongs to one exhibit
+        only. An exhibit needs a multi-word tag ("starry night") or
+        MIN_TAG_HITS single-word ones; one generic word such as "woman" or
+        "moon" is left to the LLM.
+        """
+        words = set(tag_words(text))
+        hits: dict[str, int] = {}
+        strong: set[str] = set()
+        for tag, exhibits in self._tags:
+            if len(exhibits) != 1 or not words.issuperset(tag):
+                continue
+            location = exhibits[0]
+            hits[location] = hits.get(location, 0) + 1
+            if len(tag) > 1:
+                strong.add(location)
+        chosen = [loc for loc in hits if loc in strong or hits[loc] >= MIN_TAG_HITS]
+        return sorted(chosen, key=lambda loc: -hits[loc])[:MAX_CHOICES]
+
+    def changed(self) -> bool:
+        """
+        True if the file at the pack's path has been replaced since it was opened.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True
+        return (stat.st_ino, stat.st_mtime_ns) != (self._stat.st_ino, self._stat.st_mtime_ns)
+
+
+# ----------------------------------------------------------------------
+# The pack in use
+# ----------------------------------------------------------------------
+_pack: ContentPack | None = None
+_checked = False
+_lock = threading.Lock()
+
+
+def get_pack() -> ContentPack | None:
+    """
+    The pack at CONTENT_PACK, opened on first use; None without one.
+    """
+    global _pack, _checked
+    if _checked:
+        return _pack
+    with _lock:
+        if not _checked:
+            _pack = _open(CONTENT_PACK)
+            _checked = True
+    return _pack
+
+
+def refresh() -> ContentPack | None:
+    """
+    Switches to a newly built pack if the file was replaced; call between tours.
+    """
+    global _pack, _checked
+    pack = get_pack()
+    if (pack is None and os.path.exists(CONTENT_PACK)) or (pack is not None and pack.changed()):
+        with _lock:
+            _pack = _open(CONTENT_PACK)
+            _checked = True
+    return _pack
+
+
+def _open(path: str) -> ContentPack | None:
+    if not os.path.exists(path):
+        return None
+    try:
+        pack = ContentPack(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[ERROR] Content pack {path} unusable: {e}")
+        return None
+    print(f"[INFO] Content pack {pack.version}: {len(pack.exhibits)} exhibits, "
+          f"{len(pack._audio)} rendered lines")
+    return pack
+
+
+# ----------------------------------------------------------------------
+# Building
+# ----------------------------------------------------------------------
+class PackWriter:
+    """
+    Appends aligned blobs to a file and records where they are.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        f.write(b"\0" * HEADER.size)
+
+    def add(self, data: bytes) -> list[int]:
+        padding = -self.f.tell() % ALIGN
+        self.f.write(b"\0" * padding)
+        offset = self.f.tell()
+        self.f.write(data)
+        return [offset, len(data)]
+
+    def finish(self, index: dict) -> None:
+        data = json.dumps(index, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        span = self.add(data)
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, FORMAT, 0, *span))
+
+
+def build(path: str, catalog: list[dict], summarise, synthesise=None, references=None,
+          fixed_lines=(), exhibit_lines=(), version: str | None = None) -> dict:
+    """
+    Builds a pack and renames it into place at path.
+
+    Parameters:
+        catalog: [{"location", "keyword", "tags"}] per exhibit.
+        summarise: location -> summary text.
+        synthesise: text -> MP3 bytes; None leaves the audio out.
+        references: location -> (points N x 2, descriptors N x 32, (height, width)) or None.
+        fixed_lines: Lines the tour says word for word.
+        exhibit_lines: Templates with one {} for the exhibit's name.
+        version: Names the pack; a hash of its contents by default.
+
+    Returns:
+        The pack's index.
+    """
+    tmp = f"{path}.building"
+    digest = hashlib.sha256()
+    index = {"format": FORMAT, "built": time.strftime("%Y-%m-%d %H:%M:%S"),
+             "exhibits": {}, "audio": {}, "tags": []}
+    tags: dict[tuple[str, ...], list[str]] = {}
+    lines = list(fixed_lines)
+    with open(tmp, "wb") as f:
+        writer = PackWriter(f)
+
+        def blob(data: bytes) -> list[int]:
+            digest.update(data)
+            return writer.add(data)
+
+        for item in catalog:
+            location = item["location"]
+            entry = index["exhibits"][location] = {"keyword": item.get("keyword"),
+                                                   "tags": sorted(item.get("tags", ()))}
+            print(f"[INFO] Content pack: {location}")
+            summary = summarise(location).strip()
+            entry["summary"] = blob(summary.encode("utf-8"))
+            lines += [summary] + [template.format(location) for template in exhibit_lines]
+            for tag in list(item.get("tags", ())) + [item.get("keyword") or ""]:
+                words = tag_words(tag)
+                if words and location not in tags.setdefault(words, []):
+                    tags[words].append(location)
+            reference = references(location) if references else None
+            if reference is not None:
+                points, descriptors, shape = reference
+                entry["reference"] = {
+                    "count": len(points), "shape": list(shape),
+                    "points": blob(np.ascontiguousarray(points, np.float32).tobytes()),
+                    "descriptors": blob(np.ascontiguousarray(descriptors, np.uint8).tobytes()),
+                }
+        if synthesise is not None:
+            for line in dict.fromkeys(lines):
+                index["audio"][text_key(line)] = blob(synthesise(line))
+        index["tags"] = [[list(words), exhibits] for words, exhibits in sorted(tags.items())]
+        index["version"] = version or digest.hexdigest()[:12]
+        writer.finish(index)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return index
+
+
+def _build_command(args) -> None:
+    import openai
+    import gtts
+    from capture_analyse import ARTWORKS
+    from navigation.landmarks import LandmarkDetector, LandmarkIndex, LANDMARK_INDEX
+    from nlp_voice_bot.prompts import (
+        CHAT_MODEL, EXHIBITS, LOCAL_ANSWER, local_summary, summary_messages,
+    )
+    from nlp_voice_bot.tour import FIXED_LINES, EXHIBIT_LINES
+    from replay.adapters import http_client, openai_api_key, recorded_tts
+    from runtime import openai_limiter
+
+    client = openai.OpenAI(api_key=openai_api_key(os.getenv("OPENAI_API_KEY")), http_client=http_client())
+    tts = recorded_tts(gtts.gTTS)
+
+    def summarise(location):
+        return openai_limiter.limiter.complete(
+            "pack.summary", openai_limiter.NORMAL, client.chat.completions.create,
+            model=CHAT_MODEL, messages=summary_messages(location))
+
+    def synthesise(text):
+        buffer = io.BytesIO()
+        tts(text=text, lang="en").write_to_fp(buffer)
+        return buffer.getvalue()
+
+    detector = LandmarkDetector(LandmarkIndex.load(args.landmarks or LANDMARK_INDEX))
+    catalog = [{"location": e["location"], "keyword": e["keyword"], "tags": ARTWORKS.get(e["location"], ())}
+               for e in EXHIBITS]
+    lines = FIXED_LINES + [LOCAL_ANSWER]
+    templates = EXHIBIT_LINES + [local_summary("{}")]
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    index = build(args.out, catalog, summarise, None if args.no_audio else synthesise,
+                  detector.reference, lines, templates, args.version)
+    print(f"Built content pack {index['version']} at {args.out}: {len(index['exhibits'])} exhibits, "
+          f"{len(index['audio'])} rendered lines, "
+          f"{sum('reference' in e for e in index['exhibits'].values())} reference views")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the offline content pack")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="generate summaries, audio and references into a pack")
+    build_parser.add_argument("--out", default=CONTENT_PACK)
+    build_parser.add_argument("--version", help="pack name (default: hash of its contents)")
+    build_parser.add_argument("--landmarks", help="landmark index with the exhibits' reference views")
+    build_parser.add_argument("--no-audio", action="store_true", help="leave the speech out")
+    show_parser = commands.add_parser("show", help="list what a pack holds")
+    show_parser.add_argument("path", nargs="?", default=CONTENT_PACK)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        _build_command(args)
+        return
+    pack = ContentPack(args.path)
+    print(f"Content pack {pack.version} (built {pack.index['built']}), "
+          f"{os.path.getsize(args.path) / 1024:.0f} KiB, {len(pack._audio)} rendered lines")
+    for location, entry in pack.exhibits.items():
+        reference = entry.get("reference")
+        print(f"  {location}: summary {entry['summary'][1]} B, {len(entry['tags'])} tags, "
+              f"{reference['count'] if reference else 'no'} reference features")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Throughput benchmark for the fleet dispatcher against simulated robots.
+
+Each simulated robot speaks the navigation protocol on its own
+``robots/<id>/`` topics of an in-process bus: it acknowledges requests, drives
+the same routes as navigation.py (cell by cell, with turns and the arrival
+check) and reports progress, done and retained state. Time runs faster than
+real time by ``--scale``; all reported figures are in simulated seconds.
+
+Visitor tours of one to three exhibits arrive at random (Poisson) and are
+dispatched by the time-to-serve dispatcher and, for comparison, by a
+round-robin baseline. Robots share the aisles through the reservation service
+(fleet/reservations.py) unless --no-reservations is given, in which case they
+drive through each other. With --interarrival 0 all tours are requested at
+once, which measures fleet capacity: tours per hour per robot should stay
+roughly flat as robots are added.
+
+Usage:
+    python fleet/benchmark.py [--robots 1,2,4] [--tours 20] [--interarrival 60]
+                              [--scale 0.01] [--no-reservations]
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import sys
+import os
+import threading
+import time
+from collections import deque
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fleet.dispatcher import FleetDispatcher, DEFAULT_DWELL_TIME
+from fleet.reservations import ReservationClient, ReservationService
+from navigation import protocol
+from navigation.museum_map import (
+    Location_matrix, HOME_POSITION, next_position, plan_route, heading_between,
+    turn_time, CELL_TRAVEL_TIME, VERIFY_TIME,
+)
+from runtime.channels import LocalBus
+
+EXHIBITS = [name for row in Location_matrix for name in row if name not in (0, "initial")]
+# Robots start spread out along the bottom rows, the first one at the entrance.
+START_LOCATIONS = ["initial", "Liberty Leading the People by Eugène Delacroix",
+                   "Starry Night by Vincent van Gogh", "Plushy Dog Sculpture",
+                   "Ancient Egyptian Statue"]
+
+
+class SimRobot:
+    """
+    A robot that drives in simulated time.
+
+    Parameters:
+        bus: The LocalBus shared with the dispatcher.
+        robot_id: Namespaces this robot's topics.
+        scale: Real seconds per simulated second.
+        jitter: Relative random variation of every drive and turn.
+        rng: Random source, for reproducible runs.
+        reserve: Reserve routes and steps like navigation.follow_reserved_route.
+        start: Named location the robot starts at.
+    """
+
+    def __init__(self, bus: LocalBus, robot_id: str, scale: float,
+                 jitter: float = 0.15, rng: random.Random | None = None, reserve: bool = True,
+                 start: str = "initial"):
+        self.robot_id = robot_id
+        self.scale = scale
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+        self.position = next_position(start) or list(HOME_POSITION)
+        self.facing = "UP"
+        self.current = None
+        self.goal = None
+        self.steps = 0
+        self.jobs = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self.client = bus.client(robot_id)
+        self.topic_movement = protocol.robot_topic(protocol.TOPIC_MOVEMENT, robot_id)
+        self.topic_status = protocol.robot_topic(protocol.TOPIC_NAV_STATUS, robot_id)
+        self.topic_state = protocol.robot_topic(protocol.TOPIC_ROBOT_STATE, robot_id)
+        self.gate = ReservationClient(self.client, robot_id) if reserve else None
+
+    def start(self) -> None:
+        self.client.subscribe(self.topic_movement, qos=protocol.QOS)
+        self.client.message_callback_add(self.topic_movement, self._on_movement)
+        if self.gate:
+            self.gate.subscribe()
+        self.client.connect()
+        self.client.loop_start()
+        if self.gate:
+            self.gate.release(self.position, self.facing)
+        self.publish_state()
+        self._thread = threading.Thread(target=self._drive_loop, daemon=True,
+                                        name=f"sim-{self.robot_id}")
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.client.publish(self.topic_state, b"", qos=protocol.QOS, retain=True)
+        self.client.disconnect()
+
+    def publish_state(self) -> None:
+        with self._cond:
+            queued = list(self.jobs)
+            current = self.current
+        payload = protocol.encode("state", robot_id=self.robot_id, busy=current is not None,
+                                  request_id=current[0] if current else None,
+                                  target=current[1] if current else None,
+                                  queue=[target for _, target in queued],
+                                  queue_ids=[job_id for job_id, _ in queued],
+                                  position=list(self.position), facing=self.facing)
+        self.client.publish(self.topic_state, payload, qos=protocol.QOS, retain=True)
+
+    def _status(self, msg_type: str, request_id: str, **fields) -> None:
+        self.client.publish(self.topic_status, protocol.encode(msg_type, request_id, **fields),
+                            qos=protocol.QOS)
+
+    def _on_movement(self, client, userdata, msg) -> None:
+        request = protocol.decode(msg.payload)
+        if request["type"] != "request":
+            return
+        with self._cond:
+            self.jobs.append((request["id"], request["target"]))
+            self._cond.notify_all()
+        self._status("ack", request["id"], status="accepted")
+        self.publish_state()
+
+    def _sleep(self, seconds: float) -> None:
+        seconds *= 1.0 + self.rng.uniform(-self.jitter, self.jitter)
+        time.sleep(seconds * self.scale)
+
+    def _move(self, cell, request_id: str) -> None:
+        heading = heading_between(self.position, cell)
+        self._sleep(turn_time(self.facing, heading) + CELL_TRAVEL_TIME)
+        self.position, self.facing = list(cell), heading
+        self.steps += 1
+        remaining = len(plan_route(self.position, self.goal))
+        self._status("progress", request_id, cell=list(cell), step=self.steps,
+                     total_steps=self.steps + remaining, eta=remaining * CELL_TRAVEL_TIME)
+        self.publish_state()
+
+    def _follow_reserved_route(self, goal, request_id: str) -> None:
+        # Mirrors navigation.follow_reserved_route in simulated time.
+        route = []
+        while self.position != goal and not self._stopping:
+            if not route:
+                route = self.gate.plan(self.position, goal, self.facing) or []
+                if not route:
+                    time.sleep(self.gate.slot_time * 2 * self.scale)
+                continue
+            cell = route[0]
+            if cell == self.position:
+                route.pop(0)
+                time.sleep(self.gate.slot_time * self.scale)
+                continue
+            granted, new_route = self.gate.request_step(self.position, cell, self.facing)
+            if new_route is not None:
+                route = new_route
+                continue
+            if not granted:
+                time.sleep(self.gate.slot_time * self.scale)
+                continue
+            route.pop(0)
+            self._move(cell, request_id)
+
+    def _drive_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self.jobs and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                self.current = self.jobs.popleft()
+            self.publish_state()
+            request_id, target = self.current
+
+            self.goal = goal = next_position(target)
+            if self.gate is None:
+                for cell in plan_route(self.position, goal):
+                    self._move(cell, request_id)
+            else:
+                self._follow_reserved_route(goal, request_id)
+                self.gate.release(self.position, self.facing)
+            if self.steps:
+                self._sleep(VERIFY_TIME)
+            self.steps = 0
+
+            self._status("done", request_id, target=target, verified=True)
+            with self._cond:
+                self.current = None
+            self.publish_state()
+
+
+class RoundRobinDispatcher(FleetDispatcher):
+    """
+    Baseline: hands tours to robots in turn, ignoring where they are.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._turn = 0
+
+    def choose_robot(self, targets):
+        if not self.robots:
+            return None, float("inf")
+        robot = self.robots[sorted(self.robots)[self._turn % len(self.robots)]]
+        self._turn += 1
+        return robot, robot.time_to_serve(targets[0], self.dwell_time)
+
+
+class TourLog:
+    """
+    Records when each tour was requested, first reached and finished.
+    """
+
+    def __init__(self, bus: LocalBus):
+        self.requested: dict[str, float] = {}
+        self.stops: dict[str, int] = {}
+        self.first_arrival: dict[str, float] = {}
+        self.finished: dict[str, float] = {}
+        self.all_done = threading.Event()
+        self._lock = threading.Lock()
+        self.client = bus.client("observer")
+        status_topic = f"{protocol.FLEET_PREFIX}/+/{protocol.TOPIC_NAV_STATUS}"
+        self.client.subscribe(status_topic, qos=protocol.QOS)
+        self.client.message_callback_add(status_topic, self._on_status)
+        self.client.connect()
+        self.client.loop_start()
+        self.expected = 0
+
+    def request(self, tour_id: str, stops: int) -> None:
+        with self._lock:
+            self.requested[tour_id] = time.monotonic()
+            self.stops[tour_id] = stops
+
+    def _on_status(self, client, userdata, msg) -> None:
+        message = protocol.decode(msg.payload)
+        if message["type"] not in protocol.FINAL_TYPES:
+            return
+        tour_id, _, stop = message["id"].rpartition(".")
+        now = time.monotonic()
+        with self._lock:
+            if tour_id not in self.requested:
+                return
+            if stop == "0":
+                self.first_arrival[tour_id] = now
+            if int(stop) == self.stops[tour_id] - 1:
+                self.finished[tour_id] = now
+                if len(self.finished) >= self.expected:
+                    self.all_done.set()
+
+
+def run_benchmark(robots: int, tours: int, dispatcher_cls=FleetDispatcher,
+                  interarrival: float = 60.0, dwell: float = DEFAULT_DWELL_TIME,
+                  scale: float = 0.01, seed: int = 1, reserve: bool = True) -> dict:
+    """
+    Runs one dispatching scenario.
+
+    Returns:
+        Simulated-time results: mean and p90 wait until a visitor's robot
+        arrives, makespan and tours per hour. "stalled" is True if the tours
+        did not all finish within the time limit; the other figures then
+        cover only part of the run and mean nothing.
+    """
+    rng = random.Random(seed)
+    bus = LocalBus()
+    service = ReservationService(bus.client("reservations"), time_scale=scale)
+    service.mqtt_client.on_connect = lambda client, userdata, flags, rc: service.subscribe()
+    service.mqtt_client.connect()
+    service.mqtt_client.loop_start()
+    sims = [SimRobot(bus, f"r{i + 1}", scale, rng=random.Random(seed * 100 + i), reserve=reserve,
+                     start=START_LOCATIONS[i % len(START_LOCATIONS)])
+            for i in range(robots)]
+    log = TourLog(bus)
+    log.expected = tours
+
+    dispatcher = dispatcher_cls(bus.client("dispatcher"), dwell_time=dwell, time_scale=scale,
+                                reservations=service)
+    dispatcher.mqtt_client.on_connect = lambda client, userdata, flags, rc: dispatcher.subscribe()
+    dispatcher.mqtt_client.connect()
+    dispatcher.mqtt_client.loop_start()
+    for sim in sims:
+        sim.start()
+    while len(dispatcher.status()) < robots:
+        time.sleep(0.01)
+
+    requester = bus.client("kiosk")
+    start = time.monotonic()
+    for n in range(tours):
+        tour_id = f"t{n}"
+        targets = rng.sample(EXHIBITS, rng.randint(1, 3))
+        log.request(tour_id, len(targets))
+        requester.publish(protocol.TOPIC_FLEET_REQUESTS,
+                          protocol.encode("request", tour_id, targets=targets), qos=protocol.QOS)
+        if interarrival > 0:
+            time.sleep(rng.expovariate(1.0 / interarrival) * scale)
+
+    finished = log.all_done.wait(timeout=tours * 3600 * scale)
+    end = time.monotonic()
+    for sim in sims:
+        sim.stop()
+    dispatcher.mqtt_client.disconnect()
+    service.mqtt_client.disconnect()
+    log.client.disconnect()
+
+    waits = sorted((log.first_arrival[t] - log.requested[t]) / scale for t in log.first_arrival)
+    makespan = (end - start) / scale
+    return {
+        "robots": robots,
+        "dispatcher": "time-to-serve" if dispatcher_cls is FleetDispatcher else "round-robin",
+        "completed": len(log.finished),
+        "stalled": not finished,
+        "mean_wait": sum(waits) / len(waits) if waits else 0.0,
+        "p90_wait": waits[int(0.9 * (len(waits) - 1))] if waits else 0.0,
+        "makespan": makespan,
+        "tours_per_hour": len(log.finished) / makespan * 3600 if makespan else 0.0,
+        "deadlocks": service.deadlocks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fleet dispatching with simulated robots")
+    parser.add_argument("--robots", default="1,2,4", help="comma-separated fleet sizes")
+    parser.add_argument("--tours", type=int, default=20)
+    parser.add_argument("--interarrival", type=float, default=60.0,
+                        help="mean simulated seconds between tour requests")
+    parser.add_argument("--dwell", type=float, default=DEFAULT_DWELL_TIME)
+    parser.add_argument("--scale", type=float, default=0.01,
+                        help="real seconds per simulated second")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-reservations", action="store_true",
+                        help="let simulated robots drive through each other")
+    args = parser.parse_args()
+
+    print(f"{'robots':>6}  {'dispatcher':<14}{'done':>5}  {'mean wait':>9}  "
+          f"{'p90 wait':>8}  {'makespan':>8}  {'tours/h':>7}  {'per robot':>9}  {'deadlocks':>9}")
+    stalled = 0
+    for robots in (int(n) for n in args.robots.split(",")):
+        for dispatcher_cls in (FleetDispatcher, RoundRobinDispatcher):
+            # Keep the per-trip logging of the dispatcher out of the table.
+            with contextlib.redirect_stdout(io.StringIO()):
+                r = run_benchmark(robots, args.tours, dispatcher_cls, args.interarrival,
+                                  args.dwell, args.scale, args.seed, not args.no_reservations)
+            if r["stalled"]:
+                stalled += 1
+                print(f"{r['robots']:>6}  {r['dispatcher']:<14}{r['completed']:>5}  "
+                      f"stalled: stopped after {r['makespan']:.0f}s, "
+                      f"{r['deadlocks']} deadlocks")
+                continue
+            print(f"{r['robots']:>6}  {r['dispatcher']:<14}{r['completed']:>5}  "
+                  f"{r['mean_wait']:>8.0f}s  {r['p90_wait']:>7.0f}s  "
+                  f"{r['makespan']:>7.0f}s  {r['tours_per_hour']:>7.1f}  "
+                  f"{r['tours_per_hour'] / r['robots']:>9.1f}  {r['deadlocks']:>9}")
+    if stalled:
+        print(f"{stalled} run(s) stalled before all tours finished")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
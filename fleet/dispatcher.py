@@ -0,0 +1,352 @@
+"""
+Fleet dispatcher for several robots sharing one MQTT broker.
+
+Each robot runs main.py with its own ``ROBOT_ID``, so its movement, status and
+retained state topics live under ``robots/<robot_id>/``. The dispatcher
+follows every robot's retained state (pose, running trip, queue) and trip
+progress, and assigns each visitor tour request from ``fleet/requests`` to the
+robot with the lowest estimated time-to-serve: the time to finish what it is
+already doing and has been planned to do, plus the drive to the tour's first
+stop.
+
+The whole tour goes to one robot (the visitor follows it). The dispatcher keeps
+each robot's plan and releases one stop at a time as an ordinary navigation
+request with id ``<tour id>.<n>``: the next stop goes out once the previous one
+is done and the visitor's dwell time at the exhibit has passed, so tours
+assigned to the same robot never interleave.
+
+Usage:
+    python fleet/dispatcher.py [--broker HOST] [--port PORT] [--dwell SECONDS]
+"""
+
+import argparse
+import sys
+import os
+import threading
+import time
+from collections import deque
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from navigation import protocol
+from navigation.museum_map import next_position, estimate_travel_time, HOME_POSITION
+from fleet.reservations import ReservationService
+
+MQTT_BROKER = "localhost"
+MQTT_PORT = 1883
+
+# Seconds a visitor spends at an exhibit (summary plus questions) before the
+# robot drives on.
+DEFAULT_DWELL_TIME = 90.0
+
+TOPIC_ALL_STATES = f"{protocol.FLEET_PREFIX}/+/{protocol.TOPIC_ROBOT_STATE}"
+TOPIC_ALL_STATUS = f"{protocol.FLEET_PREFIX}/+/{protocol.TOPIC_NAV_STATUS}"
+MAX_REMEMBERED_TOURS = 256
+
+
+class RobotView:
+    """
+    The dispatcher's picture of one robot.
+    """
+
+    def __init__(self, robot_id: str):
+        self.robot_id = robot_id
+        self.position = list(HOME_POSITION)
+        self.facing = "UP"
+        self.busy = False
+        self.current: tuple[str, str] | None = None    # (request id, target) being driven
+        self.eta: float | None = None                   # seconds left on the current trip
+        self.queued: list[tuple[str, str]] = []         # as last reported by the robot
+        self.in_flight: tuple[str, str] | None = None   # stop released by the dispatcher
+        self.plan: deque[tuple[str, str]] = deque()     # stops not released yet
+        self.dwell_until = 0.0                          # monotonic end of the current dwell
+
+    def backlog(self) -> list[tuple[str, str]]:
+        """
+        Trips the robot still has to make, in order: the current one, its
+        queue, the released stop if it has not reported it yet, then the plan.
+        """
+        trips = ([self.current] if self.current else []) + list(self.queued)
+        seen = {request_id for request_id, _ in trips}
+        if self.in_flight and self.in_flight[0] not in seen:
+            trips.append(self.in_flight)
+        return trips + list(self.plan)
+
+    def time_to_serve(self, target: str, dwell_time: float, dwell_left: float = 0.0) -> float:
+        """
+        Estimated seconds until this robot could arrive at target.
+
+        Parameters:
+            target: The exhibit (or "initial") to reach.
+            dwell_time: Seconds spent at each exhibit stop before driving on.
+            dwell_left: Seconds left of a dwell already under way.
+        """
+        seconds = dwell_left
+        position, facing = self.position, self.facing
+        for i, (_, stop) in enumerate(self.backlog()):
+            cell = next_position(stop)
+            if cell is None:
+                continue
+            if i == 0 and self.current and self.eta is not None:
+                drive = self.eta
+                _, facing = estimate_travel_time(position, cell, facing)
+            else:
+                drive, facing = estimate_travel_time(position, cell, facing)
+            seconds += drive + (dwell_time if stop != "initial" else 0.0)
+            position = cell
+        drive, _ = estimate_travel_time(position, next_position(target), facing)
+        return seconds + drive
+
+    def to_dict(self) -> dict:
+        return {"robot_id": self.robot_id, "position": self.position, "facing": self.facing,
+                "busy": self.busy, "eta": self.eta,
+                "backlog": [target for _, target in self.backlog()]}
+
+
+class FleetDispatcher:
+    """
+    Parameters:
+        mqtt_client: A paho client, or a runtime LocalClient.
+        dwell_time: Seconds a visitor spends at each exhibit.
+        time_scale: Real seconds per estimated second; below 1 only when
+            dispatching simulated robots that run faster than real time.
+        reservations: Optional ReservationService in the same process, told
+            when a robot has finished its tours so it can be moved out of the way.
+    """
+
+    def __init__(self, mqtt_client, dwell_time: float = DEFAULT_DWELL_TIME,
+                 time_scale: float = 1.0, reservations: ReservationService | None = None):
+        self.mqtt_client = mqtt_client
+        self.dwell_time = dwell_time
+        self.time_scale = time_scale
+        self.reservations = reservations
+        self.robots: dict[str, RobotView] = {}
+        self.tours: dict[str, str] = {}  # tour id -> assignment message
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> None:
+        """
+        Subscribes to robot state, trip status and tour requests. Call from on_connect.
+        """
+        for topic, callback in ((TOPIC_ALL_STATES, self.on_state_message),
+                                (TOPIC_ALL_STATUS, self.on_status_message),
+                                (protocol.TOPIC_FLEET_REQUESTS, self.on_request_message)):
+            self.mqtt_client.subscribe(topic, qos=protocol.QOS)
+            self.mqtt_client.message_callback_add(topic, callback)
+
+    # Robot tracking ------------------------------------------------------
+    def on_state_message(self, client, userdata, msg) -> None:
+        robot_id = protocol.robot_id_from_topic(msg.topic)
+        if robot_id is None:
+            return
+        if not msg.payload:
+            # Retained state cleared: the robot has left the fleet.
+            with self._lock:
+                if self.robots.pop(robot_id, None):
+                    print(f"Fleet: robot {robot_id} left")
+            return
+        try:
+            state = protocol.decode(msg.payload)
+        except ValueError as e:
+            print(f"Fleet: ignoring malformed state from {robot_id}: {e}")
+            return
+
+        with self._lock:
+            robot = self.robots.get(robot_id)
+            joined = robot is None
+            if joined:
+                robot = self.robots[robot_id] = RobotView(robot_id)
+                print(f"Fleet: robot {robot_id} joined at {state.get('position')}")
+            robot.position = list(state.get("position") or robot.position)
+            robot.facing = state.get("facing") or robot.facing
+            robot.busy = bool(state.get("busy"))
+            current_id = state.get("request_id")
+            if not robot.busy or current_id is None:
+                robot.current, robot.eta = None, None
+            elif robot.current is None or robot.current[0] != current_id:
+                robot.current, robot.eta = (current_id, state.get("target")), None
+            robot.queued = list(zip(state.get("queue_ids") or [], state.get("queue") or []))
+            release = self._release_due(robot)
+        self._send(robot_id, release)
+        if joined and not robot.busy and release is None:
+            self._report_idle(robot_id)
+
+    def on_status_message(self, client, userdata, msg) -> None:
+        robot_id = protocol.robot_id_from_topic(msg.topic)
+        try:
+            message = protocol.decode(msg.payload)
+        except ValueError:
+            return
+        with self._lock:
+            robot = self.robots.get(robot_id)
+            if robot is None:
+                return
+            if message["type"] == "progress":
+                if robot.current and robot.current[0] == message.get("id"):
+                    robot.eta = message.get("eta")
+                return
+            if message["type"] not in protocol.FINAL_TYPES:
+                return
+            if not robot.in_flight or robot.in_flight[0] != message.get("id"):
+                return
+            target = robot.in_flight[1]
+            robot.in_flight = None
+            dwell = self.dwell_time if message["type"] == "done" and target != "initial" else 0.0
+            robot.dwell_until = time.monotonic() + dwell * self.time_scale
+            release = self._release_due(robot)
+            idle = release is None and not dwell and not robot.plan
+        if release is None and dwell:
+            timer = threading.Timer(dwell * self.time_scale, self._release_later, (robot_id,))
+            timer.daemon = True
+            timer.start()
+        self._send(robot_id, release)
+        if idle:
+            self._report_idle(robot_id)
+
+    def _release_due(self, robot: RobotView) -> tuple[str, str] | None:
+        """
+        Hands the robot its next planned stop once it is free. Called with the lock held.
+        """
+        if robot.in_flight or not robot.plan or time.monotonic() < robot.dwell_until:
+            return None
+        robot.in_flight = robot.plan.popleft()
+        return robot.in_flight
+
+    def _release_later(self, robot_id: str) -> None:
+        with self._lock:
+            robot = self.robots.get(robot_id)
+            release = self._release_due(robot) if robot else None
+            idle = robot is not None and release is None and not robot.in_flight and not robot.plan
+        self._send(robot_id, release)
+        if idle:
+            self._report_idle(robot_id)
+
+    def _report_idle(self, robot_id: str) -> None:
+        if self.reservations is not None:
+            self.reservations.mark_idle(robot_id)
+
+    def _send(self, robot_id: str, trip: tuple[str, str] | None) -> None:
+        if trip is None:
+            return
+        trip_id, target = trip
+        self.mqtt_client.publish(protocol.robot_topic(protocol.TOPIC_MOVEMENT, robot_id),
+                                 protocol.encode("request", trip_id, target=target),
+                                 qos=protocol.QOS)
+
+    # Assignment ----------------------------------------------------------
+    def choose_robot(self, targets: list[str]) -> tuple[RobotView | None, float]:
+        """
+        The robot with the lowest time-to-serve for the tour's first stop.
+        Called with the lock held.
+        """
+        best, best_time = None, float("inf")
+        now = time.monotonic()
+        for robot in self.robots.values():
+            dwell_left = max(0.0, robot.dwell_until - now) / self.time_scale
+            seconds = robot.time_to_serve(targets[0], self.dwell_time, dwell_left)
+            if seconds < best_time:
+                best, best_time = robot, seconds
+        return best, best_time
+
+    def on_request_message(self, client, userdata, msg) -> None:
+        try:
+            request = protocol.decode(msg.payload)
+        except ValueError as e:
+            print(f"Fleet: ignoring malformed tour request: {e}")
+            return
+        if request["type"] != "request":
+            return
+
+        tour_id = request["id"]
+        targets = request.get("targets") or [request["target"]]
+        unknown = [t for t in targets if next_position(t) is None]
+        if unknown:
+            self._publish_assignment(protocol.encode("failed", tour_id, targets=targets,
+                                                     reason=f"unknown exhibits: {unknown}",
+                                                     retryable=False))
+            return
+
+        robot, release = None, None
+        with self._lock:
+            assignment = self.tours.get(tour_id)
+            if assignment is None:
+                robot, estimate = self.choose_robot(targets)
+                if robot is not None:
+                    robot.plan.extend((f"{tour_id}.{n}", target) for n, target in enumerate(targets))
+                    release = self._release_due(robot)
+                    assignment = protocol.encode("assigned", tour_id, robot_id=robot.robot_id,
+                                                 targets=targets, estimate=round(estimate, 1))
+                    self.tours[tour_id] = assignment
+                    while len(self.tours) > MAX_REMEMBERED_TOURS:
+                        self.tours.pop(next(iter(self.tours)))
+
+        if assignment is None:
+            print(f"Fleet: no robot available for tour {tour_id}")
+            self._publish_assignment(protocol.encode("failed", tour_id, targets=targets,
+                                                     reason="no robots available", retryable=True))
+            return
+        if robot is not None:
+            print(f"Fleet: tour {tour_id} {targets} -> robot {robot.robot_id} "
+                  f"(serves in ~{estimate:.0f}s)")
+            self._send(robot.robot_id, release)
+        # A resent tour request gets the original assignment again.
+        self._publish_assignment(assignment)
+
+    def _publish_assignment(self, payload: str) -> None:
+        self.mqtt_client.publish(protocol.TOPIC_FLEET_ASSIGNMENTS, payload, qos=protocol.QOS)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {robot_id: robot.to_dict() for robot_id, robot in self.robots.items()}
+
+
+def serve(client, heartbeat=None, stopping=None, dwell_time: float = DEFAULT_DWELL_TIME):
+    """
+    Runs the dispatcher, and the reservation service robots plan their
+    routes with, on an MQTT (or in-process bus) client.
+
+    Parameters:
+        client: A paho client, or a runtime LocalClient.
+        heartbeat: Optional callable invoked about once a second.
+        stopping: Optional threading.Event that ends the loop once set.
+        dwell_time: Seconds a visitor spends at each exhibit.
+    """
+    reservations = ReservationService(client)
+    dispatcher = FleetDispatcher(client, dwell_time, reservations=reservations)
+
+    def on_connect(client, userdata, flags, rc):
+        print(f"Fleet dispatcher connected with result code {rc}")
+        dispatcher.subscribe()
+        reservations.subscribe()
+
+    client.on_connect = on_connect
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_start()
+    stopping = stopping or threading.Event()
+    try:
+        while not stopping.wait(1.0):
+            if heartbeat:
+                heartbeat()
+    finally:
+        client.loop_stop()
+
+
+def main():
+    import paho.mqtt.client as mqtt
+
+    global MQTT_BROKER, MQTT_PORT
+    parser = argparse.ArgumentParser(description="Assign visitor tours to museum robots")
+    parser.add_argument("--broker", default=MQTT_BROKER)
+    parser.add_argument("--port", type=int, default=MQTT_PORT)
+    parser.add_argument("--dwell", type=float, default=DEFAULT_DWELL_TIME,
+                        help="seconds a visitor spends at each exhibit")
+    args = parser.parse_args()
+    MQTT_BROKER, MQTT_PORT = args.broker, args.port
+    try:
+        serve(mqtt.Client(client_id="museum-dispatcher", protocol=mqtt.MQTTv311),
+              dwell_time=args.dwell)
+    except KeyboardInterrupt:
+        print("Fleet dispatcher stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,607 @@
+"""
+Space-time reservations for robots sharing the museum floor.
+
+The aisles are one cell wide, so two robots driving the greedy route towards
+each other meet head-on and both wait in the obstacle loop forever. Instead,
+each robot asks the reservation service for a route before a trip and for
+permission before every step:
+
+- ``plan``: the service runs a space-time A* over (cell, time slot) that avoids
+  every cell other robots have reserved for the same slots, adding wait actions
+  or detours where needed, reserves the result and parks the robot at its goal.
+- ``step``: granted when the next cell is physically free and still reserved
+  for (or free to) the asking robot. A robot running late is replanned instead.
+- ``release``: the trip ended or was cancelled; the robot stays parked where it is.
+
+Robots that are refused a step, or find no route because other robots stand in
+the way, wait for a cell another robot stands on or has parked its goal on.
+The service follows these wait-for edges; a cycle is a deadlock (for example
+two robots each parked on the other's next exhibit). If a robot in the cycle
+is only blocking with a goal it has not reached yet, it gives that goal up and
+plans again; otherwise one robot in the cycle (the one that has stepped aside
+least often, then the highest id) is sent to a free neighbouring cell off the
+others' goals so they can pass, after which it replans. A robot that
+has stood released on someone's goal for longer than IDLE_GRACE, or that the
+dispatcher reports idle, is sent to the nearest free named location.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import defaultdict
+
+from navigation import protocol
+from navigation.museum_map import (
+    Location_matrix, DIRECTION_VECTORS, plan_route, turn_time,
+    CELL_TRAVEL_TIME,
+)
+
+SLOT_TIME = 1.0          # seconds per reservation slot
+PLANNING_HORIZON = 240   # slots a route may span, including waits
+RETRY_AFTER = 2.0        # seconds before asking again when the goal is taken
+IDLE_GRACE = 180.0       # seconds a released robot may stay on another's goal
+
+ROWS = len(Location_matrix)
+COLS = len(Location_matrix[0])
+
+
+def slots_for(seconds: float) -> int:
+    return max(1, math.ceil(seconds / SLOT_TIME))
+
+
+def step_slots(facing: str, heading: str) -> int:
+    return slots_for(turn_time(facing, heading) + CELL_TRAVEL_TIME)
+
+
+def neighbours(cell: tuple[int, int]):
+    for heading, (dr, dc) in DIRECTION_VECTORS.items():
+        row, col = cell[0] + dr, cell[1] + dc
+        if 0 <= row < ROWS and 0 <= col < COLS:
+            yield heading, (row, col)
+
+
+class ReservationTable:
+    """
+    Which robot holds which cell in which time slot.
+
+    A moving robot holds both the cell it leaves and the cell it enters for the
+    whole move, so two robots can never swap cells head-on. A robot that has
+    arrived is parked: it holds its cell from then on until it plans again.
+    """
+
+    def __init__(self):
+        self._slots: dict[tuple, dict[int, str]] = defaultdict(dict)
+        self._parked: dict[tuple, tuple[str, int]] = {}  # cell -> (robot, from slot)
+
+    def is_free(self, cell, first: int, last: int, robot: str, parked: bool = True) -> bool:
+        """
+        True if no other robot holds cell in any slot from first to last.
+        With parked=False, a cell another robot has parked its goal on counts
+        as free: the robot standing there may always leave it.
+        """
+        cell = tuple(cell)
+        held = self._slots.get(cell, {})
+        for slot in range(first, last + 1):
+            owner = held.get(slot)
+            if owner is not None and owner != robot:
+                return False
+        if not parked:
+            return True
+        parked = self._parked.get(cell)
+        return parked is None or parked[0] == robot or parked[1] > last
+
+    def free_from(self, cell, slot: int, robot: str) -> bool:
+        """
+        True if no other robot holds cell at or after slot, so robot can park there.
+        """
+        cell = tuple(cell)
+        if any(s >= slot and owner != robot for s, owner in self._slots.get(cell, {}).items()):
+            return False
+        parked = self._parked.get(cell)
+        return parked is None or parked[0] == robot
+
+    def reserve(self, robot: str, cell, first: int, last: int) -> None:
+        held = self._slots[tuple(cell)]
+        for slot in range(first, last + 1):
+            held[slot] = robot
+
+    def park(self, robot: str, cell, from_slot: int) -> None:
+        for parked_cell, (owner, _) in list(self._parked.items()):
+            if owner == robot:
+                del self._parked[parked_cell]
+        self._parked[tuple(cell)] = (robot, from_slot)
+
+    def unpark(self, robot: str) -> None:
+        for cell, (owner, _) in list(self._parked.items()):
+            if owner == robot:
+                del self._parked[cell]
+
+    def parked_by(self, cell) -> str | None:
+        parked = self._parked.get(tuple(cell))
+        return parked[0] if parked else None
+
+    def parked_cell(self, robot: str) -> tuple | None:
+        for cell, (owner, _) in self._parked.items():
+            if owner == robot:
+                return cell
+        return None
+
+    def release(self, robot: str) -> None:
+        for held in self._slots.values():
+            for slot in [s for s, owner in held.items() if owner == robot]:
+                del held[slot]
+        self.unpark(robot)
+
+    def prune(self, before: int) -> None:
+        for held in self._slots.values():
+            for slot in [s for s in held if s < before]:
+                del held[slot]
+
+    def plan(self, robot: str, start, goal, facing: str, now: int) -> list[list[int]] | None:
+        """
+        Finds and reserves a conflict-free route with a space-time A*.
+
+        Parameters:
+            robot: The robot asking; its own reservations never block it.
+            start: [row, col] it stands on now.
+            goal: [row, col] to reach and park on.
+            facing: Its heading, since turns lengthen a step.
+            now: The current slot.
+
+        Returns:
+            The cells to drive through after start, where a repeated cell means
+            waiting one slot, or None if the goal cannot be reached and held
+            within PLANNING_HORIZON (for example another robot is parked on it).
+        """
+        start, goal = tuple(start), tuple(goal)
+        cell_slots = slots_for(CELL_TRAVEL_TIME)
+
+        def estimate(cell):
+            return (abs(cell[0] - goal[0]) + abs(cell[1] - goal[1])) * cell_slots
+
+        counter = itertools.count()
+        frontier = [(now + estimate(start), next(counter), start, facing, now)]
+        came_from = {(start, facing, now): None}
+        while frontier:
+            _, _, cell, heading_now, slot = heapq.heappop(frontier)
+            key = (cell, heading_now, slot)
+            if cell == goal and self.free_from(goal, slot, robot):
+                path = []
+                while key is not None:
+                    path.append(key)
+                    key = came_from[key]
+                path.reverse()
+                self._commit(robot, path)
+                return self._to_route(path)
+            if slot - now >= PLANNING_HORIZON:
+                continue
+
+            moves = [(cell, heading_now, slot + 1)]  # wait one slot
+            for heading, neighbour in neighbours(cell):
+                moves.append((neighbour, heading, slot + step_slots(heading_now, heading)))
+            for next_cell, next_heading, next_slot in moves:
+                next_key = (next_cell, next_heading, next_slot)
+                if next_key in came_from:
+                    continue
+                if not (self.is_free(cell, slot, next_slot, robot, parked=cell != start)
+                        and self.is_free(next_cell, slot, next_slot, robot,
+                                         parked=next_cell != start)):
+                    continue
+                came_from[next_key] = key
+                heapq.heappush(frontier, (next_slot + estimate(next_cell), next(counter),
+                                          next_cell, next_heading, next_slot))
+        return None
+
+    def _commit(self, robot: str, path) -> None:
+        for (cell, _, slot), (next_cell, _, next_slot) in zip(path, path[1:]):
+            self.reserve(robot, cell, slot, next_slot)
+            self.reserve(robot, next_cell, slot, next_slot)
+        goal, _, arrival = path[-1]
+        self.park(robot, goal, arrival)
+
+    @staticmethod
+    def _to_route(path) -> list[list[int]]:
+        return [list(cell) for cell, _, _ in path[1:]]
+
+
+class ReservationService:
+    """
+    Serves plan, step and release messages from every robot in the fleet.
+
+    Parameters:
+        mqtt_client: A paho client, or a runtime LocalClient.
+        time_scale: Real seconds per simulated second; below 1 only when
+            serving simulated robots.
+    """
+
+    def __init__(self, mqtt_client, time_scale: float = 1.0):
+        self.mqtt_client = mqtt_client
+        self.time_scale = time_scale
+        self.table = ReservationTable()
+        self.positions: dict[str, tuple] = {}
+        self.facing: dict[str, str] = {}
+        self.moving: dict[str, tuple] = {}    # robot -> cell it was granted and is entering
+        self.waiting: dict[str, tuple] = {}   # robot -> cell it was refused
+        self.goals: dict[str, tuple] = {}     # robot -> goal of its current trip
+        self.active: set[str] = set()         # robots between plan and release
+        self.detours: dict[str, list] = {}    # deadlock victims' sidesteps, sent on their next step
+        self.clearing: set[str] = set()       # idle robots asked to make way
+        self.released_at: dict[str, int] = {}  # slot each idle robot was released
+        self.deadlocks = 0
+        self.sidesteps: dict[str, int] = defaultdict(int)
+        self._stuck: set[str] | None = None
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> None:
+        """
+        Subscribes to reservation requests. Call from on_connect.
+        """
+        self.mqtt_client.subscribe(protocol.TOPIC_RESERVATIONS, qos=protocol.QOS)
+        self.mqtt_client.message_callback_add(protocol.TOPIC_RESERVATIONS, self.on_message)
+
+    def now(self) -> int:
+        return int(time.monotonic() / (SLOT_TIME * self.time_scale))
+
+    def on_message(self, client, userdata, msg) -> None:
+        try:
+            message = protocol.decode(msg.payload)
+        except ValueError as e:
+            print(f"Reservations: ignoring malformed message: {e}")
+            return
+        robot = message.get("robot_id")
+        if not robot or message.get("position") is None:
+            return
+
+        with self._lock:
+            self._observe(robot, message)
+            if message["type"] == "plan":
+                reply = self._plan(robot, message)
+            elif message["type"] == "step":
+                reply = self._step(robot, message)
+            elif message["type"] == "release":
+                self._release(robot)
+                return
+            else:
+                return
+        msg_type, fields = reply
+        self.mqtt_client.publish(
+            protocol.robot_topic(protocol.TOPIC_RESERVATION_REPLIES, robot),
+            protocol.encode(msg_type, message.get("id"), **fields), qos=protocol.QOS)
+
+    def _observe(self, robot: str, message: dict) -> None:
+        position = tuple(message["position"])
+        self.positions[robot] = position
+        self.facing[robot] = message.get("facing") or self.facing.get(robot, "UP")
+        if self.moving.get(robot) == position:
+            del self.moving[robot]
+
+    def _plan(self, robot: str, message: dict) -> tuple[str, dict]:
+        if robot in self.detours:
+            return "route", {"route": self.detours.pop(robot)}
+        now = self.now()
+        self.table.prune(now)
+        self.table.release(robot)
+        self.active.add(robot)
+        self.clearing.discard(robot)
+        self.waiting.pop(robot, None)
+        self.detours.pop(robot, None)
+        position = self.positions[robot]
+
+        goal = tuple(message["goal"])
+        self.goals[robot] = goal
+        route = self.table.plan(robot, position, goal, self.facing[robot], now)
+        if route is None:
+            self._hold(robot, position, now)
+            blocked_at = self._first_blocker(robot, position, goal)
+            self.waiting[robot] = blocked_at
+            cycle = self._find_cycle(robot)
+            if cycle:
+                self._resolve(cycle, now)
+                if robot in self.detours:
+                    return "route", {"route": self.detours.pop(robot)}
+                # Another robot may have given up the goal; take it before it
+                # plans again and parks there once more.
+                route = self.table.plan(robot, position, goal, self.facing[robot], now)
+            if route is None:
+                self._ask_to_clear(robot, blocked_at, now)
+                return "route", {"route": None, "retry_after": RETRY_AFTER}
+            self.waiting.pop(robot, None)
+        self.released_at.pop(robot, None)
+        return "route", {"route": route}
+
+    def _step(self, robot: str, message: dict) -> tuple[str, dict]:
+        if robot in self.detours:
+            return "grant", {"granted": False, "route": self.detours.pop(robot)}
+
+        now = self.now()
+        position, cell = self.positions[robot], tuple(message["cell"])
+        if self._occupant(cell, robot):
+            self.waiting[robot] = cell
+            cycle = self._find_cycle(robot)
+            if cycle:
+                self._resolve(cycle, now)
+                if robot in self.detours:
+                    return "grant", {"granted": False, "route": self.detours.pop(robot)}
+            return "grant", {"granted": False}
+
+        heading = next((h for h, n in neighbours(position) if n == cell), None)
+        if heading is None:
+            return "grant", {"granted": False, "route": []}  # not adjacent: plan again
+        last = now + step_slots(self.facing[robot], heading)
+        if not (self.table.is_free(cell, now, last, robot)
+                and self.table.is_free(position, now, last, robot, parked=False)):
+            # Running late (or early): the slots went to someone else, so replan
+            # towards its goal. An empty route makes it ask again.
+            self.waiting.pop(robot, None)
+            goal = self.goals.get(robot) or self.table.parked_cell(robot) or cell
+            _, fields = self._plan(robot, {"goal": goal})
+            return "grant", {"granted": False, "route": fields["route"] or []}
+
+        self.table.reserve(robot, position, now, last)
+        self.table.reserve(robot, cell, now, last)
+        self.waiting.pop(robot, None)
+        self.moving[robot] = cell
+        return "grant", {"granted": True}
+
+    def _release(self, robot: str) -> None:
+        self.table.release(robot)
+        now = self.now()
+        self._hold(robot, self.positions[robot], now)
+        self.released_at.setdefault(robot, now)
+        self.active.discard(robot)
+        self.waiting.pop(robot, None)
+        self.goals.pop(robot, None)
+        self.moving.pop(robot, None)
+        self.detours.pop(robot, None)
+
+    def _hold(self, robot: str, cell: tuple, now: int) -> None:
+        """
+        Parks a robot where it stands, unless another robot has already parked
+        its goal there: that goal must not be lost, and the robot standing on
+        it is still seen by _occupant.
+        """
+        if self.table.parked_by(cell) in (None, robot):
+            self.table.park(robot, cell, now)
+        else:
+            self.table.unpark(robot)
+
+    # Deadlocks -------------------------------------------------------------
+    def _occupant(self, cell: tuple, exclude: str) -> str | None:
+        for robot, position in self.positions.items():
+            if robot != exclude and (position == cell or self.moving.get(robot) == cell):
+                return robot
+        return None
+
+    def _blocker(self, cell: tuple, exclude: str) -> str | None:
+        """
+        The robot standing on, entering or parked on cell, other than exclude.
+        """
+        occupant = self._occupant(cell, exclude)
+        if occupant is not None:
+            return occupant
+        owner = self.table.parked_by(cell)
+        return owner if owner != exclude else None
+
+    def _first_blocker(self, robot: str, start: tuple, goal: tuple) -> tuple:
+        """
+        The first cell held by another robot on the path past the fewest
+        robots, i.e. the robot this one is really waiting for.
+        """
+        costs = {start: 0}
+        came_from = {start: None}
+        frontier = [(0, start)]
+        while frontier:
+            cost, cell = heapq.heappop(frontier)
+            if cell == goal:
+                break
+            if cost > costs[cell]:
+                continue
+            for _, neighbour in neighbours(cell):
+                step_cost = 1 + (ROWS * COLS if self._blocker(neighbour, robot) else 0)
+                if cost + step_cost < costs.get(neighbour, float("inf")):
+                    costs[neighbour] = cost + step_cost
+                    came_from[neighbour] = cell
+                    heapq.heappush(frontier, (cost + step_cost, neighbour))
+        path = []
+        cell = goal
+        while cell is not None and cell in came_from:
+            path.append(cell)
+            cell = came_from[cell]
+        for cell in reversed(path[:-1]):
+            if self._blocker(cell, robot):
+                return cell
+        return goal
+
+    def _find_cycle(self, robot: str) -> list[str] | None:
+        chain = [robot]
+        current = robot
+        while current in self.waiting:
+            blocker = self._blocker(self.waiting[current], current)
+            if blocker is None:
+                return None
+            if blocker in chain:
+                return chain[chain.index(blocker):]
+            chain.append(blocker)
+            current = blocker
+        return None
+
+    def _resolve(self, cycle: list[str], now: int) -> None:
+        wanted = {self.waiting[r] for r in cycle if r in self.waiting}
+        for victim in sorted(cycle, reverse=True):
+            goal = self.table.parked_cell(victim)
+            if (goal in wanted and victim in self.active and goal != self.positions[victim]
+                    and self.moving.get(victim) != goal):
+                # Blocking only with a goal it has not reached: give it up and
+                # plan again on the next step, behind the robot waiting for it.
+                print(f"Reservations: deadlock between {', '.join(cycle)}; "
+                      f"{victim} gives up its goal {list(goal)}")
+                self.deadlocks += 1
+                self._stuck = None
+                self.table.unpark(victim)
+                self.waiting.pop(victim, None)
+                self.detours[victim] = []
+                return
+        goals = wanted | {self.goals[r] for r in cycle if r in self.goals}
+        # Take turns, or the same robot keeps stepping back into the others' way.
+        victims = sorted(cycle, key=lambda r: (-self.sidesteps[r], r), reverse=True)
+        for avoid, victim in itertools.product((goals, wanted), victims):
+            position = self.positions[victim]
+            for heading, cell in neighbours(position):
+                last = now + step_slots(self.facing[victim], heading)
+                if (cell in avoid or self._occupant(cell, victim)
+                        or self.table.parked_by(cell) not in (None, victim)
+                        or not self.table.is_free(cell, now, last, victim)):
+                    continue
+                print(f"Reservations: deadlock between {', '.join(cycle)}; "
+                      f"{victim} steps aside to {list(cell)}")
+                self.deadlocks += 1
+                self.sidesteps[victim] += 1
+                self._stuck = None
+                self.table.release(victim)
+                self.table.reserve(victim, position, now, last)
+                self.table.reserve(victim, cell, now, last)
+                self.table.park(victim, cell, last)
+                self.waiting.pop(victim, None)
+                self.detours[victim] = [list(cell)]
+                return
+        if self._stuck != set(cycle):
+            # Retried on every plan and step; report it once until it clears.
+            print(f"Reservations: deadlock between {', '.join(cycle)} with no free cell to step aside")
+            self._stuck = set(cycle)
+
+    def mark_idle(self, robot: str) -> None:
+        """
+        Tells the service that a released robot has nothing left to do (its
+        visitor has moved on), so it may be asked to clear a goal at once.
+        """
+        with self._lock:
+            if robot not in self.active:
+                self.released_at[robot] = self.now() - slots_for(IDLE_GRACE)
+
+    def _ask_to_clear(self, robot: str, goal: tuple, now: int) -> None:
+        """
+        Moves a robot that has been idle on another robot's goal for longer
+        than IDLE_GRACE to the nearest free named location.
+        """
+        owner = self.table.parked_by(goal)
+        if owner is None or owner == robot or owner in self.active or owner in self.clearing:
+            return
+        if now - self.released_at.get(owner, now) < slots_for(IDLE_GRACE):
+            return
+        target = self._clear_target(owner)
+        if target is None:
+            return
+        print(f"Reservations: asking idle {owner} to clear {list(goal)} for {robot}, "
+              f"moving to {target}")
+        self.clearing.add(owner)
+        self.mqtt_client.publish(
+            protocol.robot_topic(protocol.TOPIC_MOVEMENT, owner),
+            protocol.encode("request", f"clear-{protocol.new_request_id()}", target=target),
+            qos=protocol.QOS)
+
+    def _clear_target(self, robot: str) -> str | None:
+        position = self.positions[robot]
+        wanted = set(self.waiting.values()) | set(self.goals.values())
+        free = []
+        for row, names in enumerate(Location_matrix):
+            for col, name in enumerate(names):
+                cell = (row, col)
+                if (name == 0 or cell in wanted or self.table.parked_by(cell)
+                        or self._occupant(cell, robot)):
+                    continue
+                free.append((abs(row - position[0]) + abs(col - position[1]), name))
+        return min(free)[1] if free else None
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"positions": {r: list(p) for r, p in self.positions.items()},
+                    "waiting": {r: list(c) for r, c in self.waiting.items()},
+                    "active": sorted(self.active), "deadlocks": self.deadlocks}
+
+
+class ReservationClient:
+    """
+    Robot side: asks the reservation service for routes and steps.
+
+    If the service does not answer, the robot falls back to the greedy route
+    and unreserved steps, as it drove before there was a fleet.
+
+    Parameters:
+        mqtt_client: A connected paho client, or a runtime LocalClient.
+        robot_id: This robot's id.
+        timeout: Seconds to wait for a reply.
+    """
+
+    slot_time = SLOT_TIME
+
+    def __init__(self, mqtt_client, robot_id: str, timeout: float = 2.0):
+        self.mqtt_client = mqtt_client
+        self.robot_id = robot_id
+        self.timeout = timeout
+        self.topic_replies = protocol.robot_topic(protocol.TOPIC_RESERVATION_REPLIES, robot_id)
+        self.available = True
+        self._replies: dict[str, dict] = {}
+        self._cond = threading.Condition()
+
+    def subscribe(self) -> None:
+        """
+        Subscribes to replies. Call from on_connect so it survives reconnects.
+        """
+        self.mqtt_client.subscribe(self.topic_replies, qos=protocol.QOS)
+        self.mqtt_client.message_callback_add(self.topic_replies, self.on_reply)
+
+    def on_reply(self, client, userdata, msg) -> None:
+        try:
+            message = protocol.decode(msg.payload)
+        except ValueError:
+            return
+        with self._cond:
+            self._replies[message.get("id")] = message
+            self._cond.notify_all()
+
+    def _ask(self, msg_type: str, **fields) -> dict | None:
+        request_id = protocol.new_request_id()
+        self.mqtt_client.publish(
+            protocol.TOPIC_RESERVATIONS,
+            protocol.encode(msg_type, request_id, robot_id=self.robot_id, **fields),
+            qos=protocol.QOS)
+        with self._cond:
+            self._cond.wait_for(lambda: request_id in self._replies, self.timeout)
+            reply = self._replies.pop(request_id, None)
+        if reply is None and self.available:
+            print("Reservations: no reply from the reservation service, driving unreserved")
+        self.available = reply is not None
+        return reply
+
+    def plan(self, position, goal, facing: str) -> list[list[int]] | None:
+        """
+        Returns the route to drive (a repeated cell means wait one slot), or
+        None if the goal is taken for now and the robot should ask again.
+        """
+        reply = self._ask("plan", position=list(position), goal=list(goal), facing=facing)
+        if reply is None:
+            return plan_route(position, goal)
+        return reply.get("route")
+
+    def request_step(self, position, cell, facing: str) -> tuple[bool, list[list[int]] | None]:
+        """
+        Asks to enter the neighbouring cell now.
+
+        Returns:
+            (granted, route): a route replaces the rest of the current one.
+        """
+        if not self.available:
+            return True, None
+        reply = self._ask("step", position=list(position), cell=list(cell), facing=facing)
+        if reply is None:
+            return True, None
+        return bool(reply.get("granted")), reply.get("route")
+
+    def release(self, position, facing: str = "UP") -> None:
+        self.mqtt_client.publish(
+            protocol.TOPIC_RESERVATIONS,
+            protocol.encode("release", robot_id=self.robot_id, position=list(position),
+                            facing=facing),
+            qos=protocol.QOS)
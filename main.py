@@ -1,62 +1,197 @@
+import threading
 import time
+from collections import OrderedDict
 import paho.mqtt.client as mqtt
-from navigation.navigation import travel
+from navigation.navigation import (
+    travel, robot_state, arrival_verified, trip_failure, init_hardware, shutdown_hardware,
+    TRAVEL_OK, TRAVEL_CANCELLED, FAILED_UNKNOWN_TARGET, FAILED_NOT_VERIFIED,
+)
+from navigation import protocol
+from navigation.job_queue import NavigationJobQueue, PRIORITIES, PRIORITY_NORMAL
+from fleet.reservations import ReservationClient
+from telemetry import metrics, tracing
 
 
 # MQTT configuration
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
-TOPIC_MOVEMENT = "movement"
-TOPIC_ARRIVED = "arrived"
+# Namespaced under robots/<ROBOT_ID>/ when several robots share the broker.
+TOPIC_MOVEMENT = protocol.robot_topic(protocol.TOPIC_MOVEMENT)
+TOPIC_NAV_STATUS = protocol.robot_topic(protocol.TOPIC_NAV_STATUS)
+TOPIC_ROBOT_STATE = protocol.robot_topic(protocol.TOPIC_ROBOT_STATE)
+MAX_REMEMBERED_REQUESTS = 256
 
-mqtt_client = mqtt.Client(protocol=mqtt.MQTTv311)
-goal = None
-navigation_active = False
+TRIP_SECONDS = metrics.histogram("museum_nav_trip_seconds", "Duration of each trip attempt",
+                                 ["target", "result"])
+QUEUE_DEPTH = metrics.gauge("museum_nav_queue_depth", "Trips waiting behind the current one")
+ROBOT_BUSY = metrics.gauge("museum_nav_busy", "1 while a trip is running")
+TRIP_RESULTS = {TRAVEL_OK: "done", TRAVEL_CANCELLED: "cancelled"}
+
+mqtt_client = None
+# In a fleet (ROBOT_ID set) every route and step is reserved with the dispatcher.
+reservations = None
+
+# Trips are handed from the MQTT thread to the navigation loop through a
+# priority queue; a replacing or higher-priority request preempts the running
+# trip between grid cells.
+jobs = NavigationJobQueue(max_attempts=3, backoff=1.0)
+
+# Request id -> final status message (None while queued or travelling), so a
+# resent request is acknowledged again instead of starting a second trip.
+request_ledger = OrderedDict()
+ledger_lock = threading.Lock()
+
+def publish_status(msg_type, request_id, **fields):
+    payload = protocol.encode(msg_type, request_id, **fields)
+    mqtt_client.publish(TOPIC_NAV_STATUS, payload, qos=protocol.QOS)
+    return payload
+
+def publish_final(msg_type, request_id, **fields):
+    final = publish_status(msg_type, request_id, **fields)
+    with ledger_lock:
+        request_ledger[request_id] = final
+
+def publish_state():
+    status = jobs.status()
+    current = status["current"]
+    QUEUE_DEPTH.set(len(status["queued"]))
+    ROBOT_BUSY.set(int(current is not None))
+    payload = protocol.encode("state", robot_id=protocol.ROBOT_ID, busy=current is not None,
+                              request_id=current["id"] if current else None,
+                              target=current["target"] if current else None,
+                              queue=[job["target"] for job in status["queued"]],
+                              queue_ids=[job["id"] for job in status["queued"]],
+                              **robot_state())
+    mqtt_client.publish(TOPIC_ROBOT_STATE, payload, qos=protocol.QOS, retain=True)
 
 def on_movement_message(client, userdata, msg):
-    global goal, navigation_active
-    goal = msg.payload.decode()
-    navigation_active = True
-    print(f"Movement request received: {goal}")
+    try:
+        request = protocol.decode(msg.payload)
+    except ValueError as e:
+        print(f"Ignoring malformed movement request: {e}")
+        return
+
+    if request["type"] == "cancel":
+        job = jobs.cancel(request.get("id"))
+        if job is not None:
+            print(f"Cancelled trip to {job.target} ({job.id})")
+            if not job.cancelled_while_running:
+                publish_final("failed", job.id, target=job.target, reason="cancelled", retryable=False)
+        return
+    if request["type"] != "request":
+        return
+
+    request_id = request["id"]
+    trace = tracing.extract(request)
+    if trace is not None and isinstance(request.get("ts"), (int, float)):
+        tracing.record("mqtt.request", request["ts"], parent=trace)
+    with ledger_lock:
+        known = request_id in request_ledger
+        final = request_ledger.get(request_id)
+        if not known:
+            request_ledger[request_id] = None
+            while len(request_ledger) > MAX_REMEMBERED_REQUESTS:
+                request_ledger.popitem(last=False)
+
+    if known:
+        print(f"Duplicate movement request {request_id}, not travelling again")
+        publish_status("ack", request_id, status="duplicate")
+        if final is not None:
+            mqtt_client.publish(TOPIC_NAV_STATUS, final, qos=protocol.QOS)
+        return
+
+    priority = PRIORITIES.get(request.get("priority"), PRIORITY_NORMAL)
+    print(f"Movement request received: {request['target']} ({request_id})")
+    job, replaced = jobs.submit(request_id, request["target"], priority,
+                                replace=bool(request.get("replace")), trace=trace)
+    publish_status("ack", request_id, status="accepted")
+    for old in replaced:
+        if not old.cancelled_while_running:
+            publish_final("failed", old.id, target=old.target, reason="replaced", retryable=False)
+    publish_state()
 
 def on_connect(client, userdata, flags, rc):
     print(f"Connected to MQTT broker with result code {rc}")
-    mqtt_client.subscribe(TOPIC_MOVEMENT)
+    mqtt_client.subscribe(TOPIC_MOVEMENT, qos=protocol.QOS)
     mqtt_client.message_callback_add(TOPIC_MOVEMENT, on_movement_message)
+    if reservations is not None:
+        reservations.subscribe()
+        state = robot_state()
+        reservations.release(state["position"], state["facing"])
+    publish_state()
+
+def run_job(job, heartbeat=None):
+    def on_progress(cell, step, total_steps, eta):
+        if heartbeat:
+            heartbeat()
+        publish_status("progress", job.id, cell=cell, step=step,
+                       total_steps=total_steps, eta=eta)
+        publish_state()
+
+    print(f"Starting navigation to: {job.target} (attempt {job.attempts})")
+    started = time.monotonic()
+    with tracing.span("nav.trip", parent=job.trace, target=job.target, attempt=job.attempts) as trip:
+        result = travel(job.target, on_progress, should_stop=job.cancelled.is_set, gate=reservations)
+        if trip is not None:
+            trip.set(result=result)
+    TRIP_SECONDS.labels(target=job.target, result=TRIP_RESULTS.get(result, "failed")).observe(
+        time.monotonic() - started)
+    print(f"Navigation completed with result: {result}")
+
+    error = None if result == TRAVEL_OK else trip_failure()
+    if jobs.finish(job, ok=result == TRAVEL_OK, error=error, retry=error != FAILED_UNKNOWN_TARGET):
+        print(f"Trip to {job.target} requeued ({job.status})")
+    elif job.status == "done":
+        publish_final("done", job.id, target=job.target, verified=arrival_verified())
+    elif job.status == "cancelled" or result == TRAVEL_CANCELLED:
+        publish_final("failed", job.id, target=job.target, reason="cancelled", retryable=False)
+    else:
+        # A fresh request may still succeed once an unverified arrival is
+        # checked again (e.g. a visitor stood in the camera's way); an
+        # unknown target never will.
+        publish_final("failed", job.id, target=job.target,
+                      reason=f"{job.error} after {job.attempts} attempts",
+                      retryable=job.error == FAILED_NOT_VERIFIED)
+    publish_state()
+
+def serve(client, heartbeat=None, stopping=None):
+    """
+    Runs the navigation loop on an MQTT (or in-process bus) client.
+
+    Parameters:
+        client: A paho client, or a runtime LocalClient.
+        heartbeat: Optional callable invoked while idle and after every cell.
+        stopping: Optional threading.Event that ends the loop once set.
+    """
+    global mqtt_client, reservations
+    init_hardware()
+    mqtt_client = client
+    if protocol.ROBOT_ID:
+        reservations = ReservationClient(mqtt_client, protocol.ROBOT_ID)
 
-def main():
-    global goal, navigation_active
-    
     # Connect to MQTT broker
     mqtt_client.on_connect = on_connect
     mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
     mqtt_client.loop_start()
-    
+
     print("Main system initialized. Waiting for navigation commands...")
 
-    while True:
-        if not navigation_active:
-            time.sleep(0.5)
-            continue
-        
-        print(f"Starting navigation to: {goal}")
-        result = travel(goal)
-        
-
-        # Send arrival notification
-        print(f"Navigation completed with result: {'SUCCESS' if result == 0 else 'FAILURE'}")
-        if result ==0:
-            # More verbose arrival publishing
-            arrival_message = f"arrived at {goal}"
-            print(f"Publishing to {TOPIC_ARRIVED}: '{arrival_message}'")
-            publish_result = mqtt_client.publish(TOPIC_ARRIVED, arrival_message)
-            print(f"Publish result: {publish_result.rc} (0 means success)")
-        else:
-            result = travel(goal) 
-        
-        # Reset navigation state
-        navigation_active = False
-        goal = None
+    try:
+        while stopping is None or not stopping.is_set():
+            if heartbeat:
+                heartbeat()
+            job = jobs.next_job(timeout=1.0)
+            if job is None:
+                continue
+            publish_state()
+            run_job(job, heartbeat)
+    finally:
+        mqtt_client.loop_stop()
+        shutdown_hardware()
+
+def main():
+    metrics.start_server()
+    serve(mqtt.Client(protocol=mqtt.MQTTv311))
 
 if __name__ == "__main__":
     main()
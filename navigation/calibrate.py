@@ -0,0 +1,192 @@
+"""
+Calibrates the motion engine for one robot.
+
+Stand the robot 1.5 to 4 m from a flat wall, facing it, with half a metre
+free on every side. The straight run drives towards the wall at cruise speed
+and fits the speed to the ultrasonic readings, which gives the time per cell.
+The spin then turns on the spot at cruise speed and times two returns of the
+wall's echo, one full revolution apart, which gives the turn times. The
+result is written to calibration/<ROBOT_ID>.json, which navigation loads
+when it starts.
+
+With --simulated the same routine runs against the simulator's base on the
+virtual clock (--true-cell-time and --true-turn-time set how that base really
+moves), and the result is only printed unless --output is given.
+
+Usage (from the repository root; as a script, navigation/ would shadow the package):
+    python -m navigation.calibrate [--robot-id ID] [--output FILE] [--cells 1.5]
+    python -m navigation.calibrate --simulated [--true-cell-time 3.8] [--true-turn-time 1.3]
+"""
+
+import argparse
+import sys
+import time
+
+from navigation import motion
+from navigation.motion import Calibration, MotionEngine, calibration_path, load_calibration, save_calibration
+
+SAMPLE_INTERVAL = 0.02
+STOP_DISTANCE = 40.0  # cm; the straight run ends at least this far from the wall
+ECHO_MARGIN = 30.0    # cm; a reading this close to the starting one is the wall
+
+
+def measure_cell_time(engine: MotionEngine, get_distance, cells: float = 1.5) -> float:
+    """
+    Drives towards the wall at cruise speed and fits a line to the readings.
+
+    Parameters:
+        engine: The engine to drive with; its calibration supplies the ramps and cell size.
+        get_distance: Ultrasonic reading in cm (or None).
+        cells: How far to cruise while sampling.
+
+    Returns:
+        Cruise seconds per cell.
+    """
+    c = engine.calibration
+    start = get_distance()
+    # Cruise, plus both ramps at up to twice the expected speed, must fit before the wall.
+    room = cells * c.cell_size_cm + 2 * c.ramp_time / c.cell_time * c.cell_size_cm
+    if start is None or start - STOP_DISTANCE < room:
+        raise RuntimeError(f"Need {room + STOP_DISTANCE:.0f} cm to the wall, have "
+                           f"{'no reading' if start is None else f'{start:.0f} cm'}")
+    samples = []
+    engine.motors.move_forward()
+    try:
+        engine.run_profile(engine.ramp(c.ramp_time, up=True))
+        engine.set_duty(c.cruise_duty)
+        deadline = time.monotonic() + 3 * cells * c.cell_time
+        while time.monotonic() < deadline:
+            distance = get_distance()
+            if distance is not None:
+                samples.append((time.monotonic(), distance))
+                if start - distance >= cells * c.cell_size_cm:
+                    break
+            time.sleep(SAMPLE_INTERVAL)
+        engine.run_profile(engine.ramp(c.ramp_time, up=False))
+    finally:
+        engine.stop()
+
+    if len(samples) < 5:
+        raise RuntimeError("Too few ultrasonic readings during the straight run")
+    n = len(samples)
+    mean_t = sum(t for t, _ in samples) / n
+    mean_d = sum(d for _, d in samples) / n
+    slope = (sum((t - mean_t) * (d - mean_d) for t, d in samples)
+             / sum((t - mean_t) ** 2 for t, _ in samples))
+    if slope >= 0:
+        raise RuntimeError("The wall did not get closer; is the robot facing it?")
+    return c.cell_size_cm / -slope
+
+
+def measure_turn_time(engine: MotionEngine, get_distance) -> float:
+    """
+    Spins right at cruise speed and times one revolution between two returns
+    of the wall's echo.
+
+    Returns:
+        Cruise seconds per quarter turn.
+    """
+    c = engine.calibration
+    wall = get_distance()
+    if wall is None:
+        raise RuntimeError("No ultrasonic reading to spin against")
+    returns = []
+    facing = True
+    engine.motors.motor1_forward()
+    engine.motors.motor2_backward()
+    try:
+        engine.run_profile(engine.ramp(c.turn_ramp_time, up=True))
+        engine.set_duty(c.cruise_duty)
+        deadline = time.monotonic() + 3 * 4 * c.turn_90_time * 2
+        while len(returns) < 2 and time.monotonic() < deadline:
+            distance = get_distance()
+            on_wall = distance is not None and abs(distance - wall) < ECHO_MARGIN
+            if on_wall and not facing:
+                returns.append(time.monotonic())
+            facing = on_wall
+            time.sleep(SAMPLE_INTERVAL)
+        engine.run_profile(engine.ramp(c.turn_ramp_time, up=False))
+    finally:
+        engine.stop()
+
+    if len(returns) < 2:
+        raise RuntimeError("The wall's echo did not come back twice while spinning")
+    return (returns[1] - returns[0]) / 4
+
+
+def calibrate(engine: MotionEngine, get_distance, cells: float = 1.5, turns: bool = True,
+              source: str = "sensor") -> Calibration:
+    """
+    Runs the straight run and (optionally) the spin.
+
+    Returns:
+        The engine's calibration with the measured times.
+    """
+    values = engine.calibration.to_dict()
+    values["cell_time"] = round(measure_cell_time(engine, get_distance, cells), 3)
+    print(f"Calibrate: {values['cell_time']:.2f} s per cell at cruise")
+    if turns:
+        quarter = measure_turn_time(engine, get_distance)
+        values["turn_90_time"] = round(quarter, 3)
+        values["turn_180_time"] = round(2 * quarter, 3)
+        print(f"Calibrate: {quarter:.2f} s per quarter turn at cruise")
+    values["source"] = source
+    return Calibration.from_dict(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the robot's cell and turn times")
+    parser.add_argument("--robot-id", help="robot whose calibration file to write (default ROBOT_ID)")
+    parser.add_argument("--output", help="calibration file (default calibration/<robot id>.json)")
+    parser.add_argument("--cells", type=float, default=1.5, help="cells to cruise while measuring")
+    parser.add_argument("--no-turns", action="store_true", help="only measure the cell time")
+    parser.add_argument("--simulated", action="store_true",
+                        help="calibrate the simulator's base instead of the robot")
+    parser.add_argument("--true-cell-time", type=float, default=Calibration().cell_time,
+                        help="simulated base: real cruise seconds per cell")
+    parser.add_argument("--true-turn-time", type=float, default=Calibration().turn_90_time,
+                        help="simulated base: real cruise seconds per quarter turn")
+    parser.add_argument("--wall-cm", type=float, default=300.0, help="simulated base: distance to the wall")
+    args = parser.parse_args()
+
+    path = args.output or calibration_path(args.robot_id)
+    engine = MotionEngine(None, load_calibration(path))
+    clock = None
+    if args.simulated:
+        from simulation.clock import VirtualClock
+        from simulation import hardware
+        clock = VirtualClock()
+        physics = Calibration(cell_time=args.true_cell_time, turn_90_time=args.true_turn_time,
+                              turn_180_time=2 * args.true_turn_time, source="simulator")
+        engine.motors = hardware.SimMotors(clock, physics=physics)
+        sensor = hardware.SimRangefinder(engine.motors, args.wall_cm)
+        clock.install(sys.modules[__name__], motion)
+        clock.start()
+    else:
+        import basic_embedded.twomotorbasic as motors
+        import basic_embedded.ultrasonic_sensor as sensor
+        motors.init()
+        engine.motors = motors
+
+    sensor.init_sensor()
+    try:
+        result = calibrate(engine, sensor.get_distance, args.cells, not args.no_turns,
+                           "simulator" if args.simulated else "sensor")
+    except RuntimeError as e:
+        print(f"[ERROR] Calibration failed: {e}")
+        sys.exit(1)
+    finally:
+        sensor.stop_sensor()
+        if clock is not None:
+            clock.stop()
+        else:
+            engine.motors.shutdown()
+
+    if args.simulated and not args.output:
+        print("Simulated calibration:", result.to_dict())
+        return
+    print("Calibrate: wrote", save_calibration(result, path))
+
+
+if __name__ == "__main__":
+    main()
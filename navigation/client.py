@@ -0,0 +1,199 @@
+"""
+Requester side of the navigation protocol.
+
+Sends a trip request, resends it (same id) if no acknowledgement arrives, and
+retries a failed trip with a fresh request after a short backoff, so a lost
+message or a failed verification never leaves the caller waiting forever.
+
+Requested inside a trace, the trip is a "nav.request" span whose context rides
+along in every request, so navigation's spans join the requester's trace.
+"""
+
+import threading
+import time
+from typing import Callable
+
+from navigation import protocol
+from telemetry import metrics, tracing
+
+MQTT_ROUND_TRIP = metrics.histogram("museum_mqtt_round_trip_seconds",
+                                    "From publishing a trip request to its acknowledgement",
+                                    buckets=metrics.FAST_BUCKETS)
+
+
+class NavigationClient:
+    """
+    Tracks the one trip currently requested over MQTT.
+
+    Parameters:
+        mqtt_client: A connected paho client.
+        on_done: Called with the target once the trip completes.
+        on_failed: Called with (target, reason) once retries are exhausted.
+        on_progress: Called with the decoded progress message.
+        ack_timeout: Seconds to wait for an acknowledgement before resending.
+        max_attempts: Trip attempts (fresh requests) before giving up.
+        retry_backoff: Seconds before retrying a failed trip, doubled each time.
+        robot_id: Robot whose namespaced topics to use; defaults to protocol.ROBOT_ID.
+    """
+
+    def __init__(self, mqtt_client, on_done: Callable[[str], None],
+                 on_failed: Callable[[str, str], None] | None = None,
+                 on_progress: Callable[[dict], None] | None = None,
+                 ack_timeout: float = 2.0, max_attempts: int = 3, retry_backoff: float = 0.5,
+                 robot_id: str | None = None):
+        self.mqtt_client = mqtt_client
+        self.topic_movement = protocol.robot_topic(protocol.TOPIC_MOVEMENT, robot_id)
+        self.topic_status = protocol.robot_topic(protocol.TOPIC_NAV_STATUS, robot_id)
+        self.on_done = on_done
+        self.on_failed = on_failed
+        self.on_progress = on_progress
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+        self.request_id: str | None = None
+        self.target: str | None = None
+        self.options: dict = {}
+        self.attempt = 0
+        self.trace: tracing.Span | None = None
+        self._acked = False
+        self._resends = 0
+        self._sent_at = 0.0
+        self._timer: threading.Timer | None = None
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> None:
+        """
+        Subscribes to trip status. Call from on_connect so it survives reconnects.
+        """
+        self.mqtt_client.subscribe(self.topic_status, qos=protocol.QOS)
+        self.mqtt_client.message_callback_add(self.topic_status, self.on_status_message)
+
+    def request(self, target: str, priority: str = "normal", replace: bool = False) -> str:
+        """
+        Requests a trip, superseding any trip this client is still waiting on.
+
+        Parameters:
+            priority: "normal" or "high"; high preempts a running normal trip.
+            replace: Ask navigation to cancel everything queued or running first.
+        """
+        with self._lock:
+            if self.trace is not None:
+                self.trace.end(outcome="superseded")
+            self.target = target
+            self.options = {"priority": priority, "replace": replace}
+            self.attempt = 1
+            self.trace = tracing.start_span("nav.request", target=target)
+            return self._send_new()
+
+    def _send_new(self) -> str:
+        self.request_id = protocol.new_request_id()
+        self._acked = False
+        self._resends = 0
+        self._publish()
+        return self.request_id
+
+    def _publish(self) -> None:
+        fields = dict(self.options)
+        if self.trace is not None:
+            fields["trace"] = tracing.inject(self.trace)
+        payload = protocol.encode("request", self.request_id, target=self.target, **fields)
+        print(f"Navigation: requesting {self.target} ({self.request_id}, attempt {self.attempt})")
+        self._sent_at = time.monotonic()
+        self.mqtt_client.publish(self.topic_movement, payload, qos=protocol.QOS)
+        self._arm_timer(self.ack_timeout, self._on_ack_timeout, self.request_id)
+
+    def _arm_timer(self, delay: float, fn, *args) -> None:
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, fn, args)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_ack_timeout(self, request_id: str) -> None:
+        with self._lock:
+            if request_id != self.request_id or self._acked:
+                return
+            if self._resends < 2:
+                # Same id: navigation ignores it if the first copy did arrive.
+                self._resends += 1
+                print(f"Navigation: no ack for {request_id}, resending")
+                self._publish()
+                return
+            target = self._finish("unacknowledged")
+        self._fail(target, "navigation did not acknowledge the request")
+
+    def _retry(self, request_id: str) -> None:
+        with self._lock:
+            if request_id != self.request_id:
+                return
+            self.attempt += 1
+            self._send_new()
+
+    def _finish(self, outcome: str) -> str | None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self.trace is not None:
+            self.trace.end(outcome=outcome, attempts=self.attempt)
+            self.trace = None
+        target, self.request_id, self.target = self.target, None, None
+        return target
+
+    def _trace_hop(self, message: dict) -> None:
+        # The final status's trip over the broker, from navigation's send time.
+        if self.trace is not None and isinstance(message.get("ts"), (int, float)):
+            tracing.record("mqtt.status", message["ts"], parent=self.trace)
+
+    def _fail(self, target: str | None, reason: str) -> None:
+        print(f"Navigation: trip to {target} failed: {reason}")
+        if self.on_failed:
+            self.on_failed(target, reason)
+
+    def cancel(self) -> None:
+        with self._lock:
+            request_id = self.request_id
+            self._finish("cancelled")
+        if request_id:
+            self.mqtt_client.publish(self.topic_movement,
+                                     protocol.encode("cancel", request_id), qos=protocol.QOS)
+
+    def on_status_message(self, client, userdata, msg) -> None:
+        try:
+            message = protocol.decode(msg.payload)
+        except ValueError as e:
+            print(f"Navigation: ignoring malformed status: {e}")
+            return
+
+        with self._lock:
+            if message.get("id") != self.request_id:
+                return  # stale or duplicate status for an earlier trip
+            kind = message["type"]
+            if kind == "ack":
+                if not self._acked:
+                    MQTT_ROUND_TRIP.observe(time.monotonic() - self._sent_at)
+                self._acked = True
+                if self._timer:
+                    self._timer.cancel()
+                return
+            if kind == "progress":
+                self._acked = True
+            elif kind == "done":
+                self._trace_hop(message)
+                target = self._finish("done")
+            elif kind == "failed":
+                if message.get("retryable") and self.attempt < self.max_attempts:
+                    delay = self.retry_backoff * 2 ** (self.attempt - 1)
+                    print(f"Navigation: trip failed ({message.get('reason')}), retrying in {delay:.1f}s")
+                    self._arm_timer(delay, self._retry, self.request_id)
+                    return
+                self._trace_hop(message)
+                target = self._finish("failed")
+
+        if kind == "progress":
+            if self.on_progress:
+                self.on_progress(message)
+        elif kind == "done":
+            self.on_done(target)
+        elif kind == "failed":
+            self._fail(target, message.get("reason", "unknown"))
@@ -0,0 +1,204 @@
+"""
+Travel costs for the edges of the museum grid, learned from the robot's trips.
+
+Every cell the robot drives records how long the move took, and how long it
+waited for the way to clear first, under its edge (the cell it left and its
+heading) and the time-of-day bucket of the trip. Each estimate is a running
+mean over the first 1/ALPHA samples and exponentially weighted after that, so
+it follows crowds that come and go over the season without being reset by a
+single quiet trip.
+
+The estimates are kept in a small fixed-layout binary file (EDGE_COST_FILE,
+about 4 KB for the current floor) that is rewritten after each trip.
+``cost()`` gives the planner its edge weights (see museum_map.fastest_route).
+An edge that has never been driven in a bucket falls back to its other
+buckets, then to the uniform CELL_TRAVEL_TIME.
+
+Usage:
+    python -m navigation.edge_costs [FILE] [--top 20]    # slowest learned edges
+"""
+
+import argparse
+import os
+import struct
+import threading
+import time
+from array import array
+
+from navigation.museum_map import (
+    Location_matrix, directions, heading_between, DIRECTION_VECTORS, CELL_TRAVEL_TIME,
+)
+
+EDGE_COST_FILE = os.getenv("EDGE_COST_FILE", "edge_costs.bin")
+ALPHA = 0.2          # weight of a new sample once an edge has 1/ALPHA of them
+BUCKET_HOURS = 2     # width of a time-of-day bucket
+BUCKETS = 24 // BUCKET_HOURS
+
+ROWS = len(Location_matrix)
+COLS = len(Location_matrix[0])
+SIZE = ROWS * COLS * len(directions) * BUCKETS
+
+MAGIC = b"EDGC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHH")  # magic, version, rows, cols, buckets
+
+
+def bucket_of(when: float | None = None) -> int:
+    """
+    Time-of-day bucket of a wall-clock time (default now).
+    """
+    return time.localtime(time.time() if when is None else when).tm_hour // BUCKET_HOURS
+
+
+class EdgeCostModel:
+    """
+    Learned drive and wait seconds per (cell, heading, time-of-day bucket).
+
+    Parameters:
+        path: Store file; None keeps the model in memory only.
+        prior: Seconds assumed for an edge that has never been driven.
+    """
+
+    def __init__(self, path: str | None = EDGE_COST_FILE, prior: float = CELL_TRAVEL_TIME):
+        self.path = path
+        self.prior = prior
+        self.drive = array("f", [0.0]) * SIZE
+        self.wait = array("f", [0.0]) * SIZE
+        self.count = array("H", [0]) * SIZE
+        self.samples = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    @staticmethod
+    def _index(cell, heading: str, bucket: int) -> int:
+        return ((cell[0] * COLS + cell[1]) * len(directions) + directions.index(heading)) * BUCKETS + bucket
+
+    def observe(self, start, end, drive_seconds: float, wait_seconds: float = 0.0,
+                when: float | None = None) -> None:
+        """
+        Records one traversal of the edge from start to the adjacent cell end.
+        """
+        i = self._index(start, heading_between(start, end), bucket_of(when))
+        with self._lock:
+            n = self.count[i]
+            alpha = max(ALPHA, 1.0 / (n + 1))
+            self.drive[i] += alpha * (drive_seconds - self.drive[i])
+            self.wait[i] += alpha * (wait_seconds - self.wait[i])
+            self.count[i] = min(n + 1, 0xFFFF)
+            self.samples += 1
+            self._dirty = True
+
+    def estimate(self, start, end, when: float | None = None) -> tuple[float, float, int]:
+        """
+        (drive seconds, wait seconds, samples) expected for an edge at a time
+        of day; the edge's other buckets, weighted by samples, stand in for an
+        empty one, and the prior for an edge never driven.
+        """
+        first = self._index(start, heading_between(start, end), 0)
+        bucket = bucket_of(when)
+        with self._lock:
+            n = self.count[first + bucket]
+            if n:
+                return self.drive[first + bucket], self.wait[first + bucket], n
+            total = drive = wait = 0
+            for i in range(first, first + BUCKETS):
+                total += self.count[i]
+                drive += self.count[i] * self.drive[i]
+                wait += self.count[i] * self.wait[i]
+        if total:
+            return drive / total, wait / total, 0
+        return self.prior, 0.0, 0
+
+    def cost(self, start, end, when: float | None = None) -> float:
+        """
+        Expected seconds to get from start to the adjacent cell end.
+        """
+        drive, wait, _ = self.estimate(start, end, when)
+        return drive + wait
+
+    def learned(self) -> list[tuple[list[int], str, int, float, float, int]]:
+        """
+        (cell, heading, bucket, drive, wait, samples) for every edge and bucket with samples.
+        """
+        rows = []
+        with self._lock:
+            for row in range(ROWS):
+                for col in range(COLS):
+                    for heading in directions:
+                        for bucket in range(BUCKETS):
+                            i = self._index((row, col), heading, bucket)
+                            if self.count[i]:
+                                rows.append(([row, col], heading, bucket,
+                                             self.drive[i], self.wait[i], self.count[i]))
+        return rows
+
+    # ------------------------------------------------------------------
+    # Store
+    # ------------------------------------------------------------------
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                magic, version, rows, cols, buckets = HEADER.unpack(f.read(HEADER.size))
+                if (magic, version, rows, cols, buckets) != (MAGIC, VERSION, ROWS, COLS, BUCKETS):
+                    print(f"[INFO] Navigation: {self.path} is for another floor layout; starting afresh")
+                    return
+                drive, wait, count = array("f"), array("f"), array("H")
+                drive.fromfile(f, SIZE)
+                wait.fromfile(f, SIZE)
+                count.fromfile(f, SIZE)
+        except (OSError, EOFError, struct.error) as e:
+            print(f"[ERROR] Navigation: could not read edge costs from {self.path}: {e}")
+            return
+        with self._lock:
+            self.drive, self.wait, self.count = drive, wait, count
+            self.samples = sum(count)
+        print(f"[INFO] Navigation: loaded {self.samples} edge samples from {self.path}")
+
+    def save(self) -> None:
+        """
+        Writes the model if it changed, replacing the file atomically.
+        """
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            data = (HEADER.pack(MAGIC, VERSION, ROWS, COLS, BUCKETS) + self.drive.tobytes()
+                    + self.wait.tobytes() + self.count.tobytes())
+            self._dirty = False
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[ERROR] Navigation: could not save edge costs to {self.path}: {e}")
+            self._dirty = True
+
+
+def report(model: EdgeCostModel, top: int = 20) -> str:
+    rows = model.learned()
+    if not rows:
+        return "No edges learned yet."
+    lines = [f"{model.samples} samples; slowest edges:",
+             f"{'edge':<20}{'hours':>8}{'drive s':>9}{'wait s':>8}{'n':>6}"]
+    for cell, heading, bucket, drive, wait, n in sorted(rows, key=lambda r: -(r[3] + r[4]))[:top]:
+        dr, dc = DIRECTION_VECTORS[heading]
+        edge = f"{cell} -> {[cell[0] + dr, cell[1] + dc]}"
+        hours = f"{bucket * BUCKET_HOURS:02d}-{(bucket + 1) * BUCKET_HOURS:02d}"
+        lines.append(f"{edge:<20}{hours:>8}{drive:>9.2f}{wait:>8.2f}{n:>6}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Travel times the robot has learned per grid edge")
+    parser.add_argument("path", nargs="?", default=EDGE_COST_FILE)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    print(report(EdgeCostModel(args.path), args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Thread-safe, preemptible queue of navigation jobs.
+
+MQTT callbacks submit and cancel jobs from the network thread while the
+navigation loop blocks in ``next_job()``. Higher-priority jobs run first, a job
+submitted with ``replace=True`` cancels everything queued or running, and a
+failed job is retried a bounded number of times with exponential backoff.
+Running jobs are cancelled cooperatively: the trip checks ``job.cancelled``
+between grid cells.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+PRIORITIES = {"normal": PRIORITY_NORMAL, "high": PRIORITY_HIGH}
+
+MAX_HISTORY = 256
+
+
+class NavJob:
+    def __init__(self, job_id: str, target: str, priority: int = PRIORITY_NORMAL, trace=None):
+        self.id = job_id
+        self.target = target
+        self.priority = priority
+        self.status = "queued"  # queued | running | retrying | done | failed | cancelled
+        self.attempts = 0
+        self.error: str | None = None
+        self.created = time.monotonic()
+        self.not_before = 0.0
+        self.cancelled = threading.Event()
+        self.cancelled_while_running = False
+        self.trace = trace  # the requester's span context, see telemetry/tracing.py
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "target": self.target, "priority": self.priority,
+                "status": self.status, "attempts": self.attempts, "error": self.error}
+
+
+class NavigationJobQueue:
+    """
+    Parameters:
+        max_attempts: Trip attempts per job before it is reported as failed.
+        backoff: Delay before the first retry, doubled on each further retry.
+    """
+
+    def __init__(self, max_attempts: int = 3, backoff: float = 1.0):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._jobs: OrderedDict[str, NavJob] = OrderedDict()
+        self._current: NavJob | None = None
+        self._cond = threading.Condition()
+
+    def submit(self, job_id: str, target: str, priority: int = PRIORITY_NORMAL,
+               replace: bool = False, trace=None) -> tuple[NavJob, list[NavJob]]:
+        """
+        Queues a trip.
+
+        Parameters:
+            replace: Cancel every queued job and the running trip first.
+            trace: The requester's span context, parent of the trip's spans.
+
+        Returns:
+            The new job and the jobs it cancelled.
+        """
+        with self._cond:
+            cancelled = self._cancel_all() if replace else []
+            if not replace and self._current and priority > self._current.priority:
+                # Preempt the running trip; it is requeued and resumes afterwards.
+                print(f"Job queue: {target} preempts {self._current.target}")
+                self._current.cancelled.set()
+            job = NavJob(job_id, target, priority, trace)
+            self._remember(job)
+            self._push(job)
+            self._cond.notify_all()
+        return job, cancelled
+
+    def cancel(self, job_id: str) -> NavJob | None:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in ("done", "failed", "cancelled"):
+                return None
+            self._mark_cancelled(job)
+            self._cond.notify_all()
+            return job
+
+    def next_job(self, timeout: float | None = None) -> NavJob | None:
+        """
+        Blocks until a job is ready to run and marks it running.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._heap = [e for e in self._heap if e[2].status != "cancelled"]
+                heapq.heapify(self._heap)
+                ready = [entry for entry in self._heap if entry[2].not_before <= now]
+                if ready:
+                    entry = min(ready)
+                    self._heap.remove(entry)
+                    heapq.heapify(self._heap)
+                    job = entry[2]
+                    job.status = "running"
+                    job.attempts += 1
+                    job.cancelled.clear()
+                    self._current = job
+                    return job
+
+                waits = [entry[2].not_before - now for entry in self._heap]
+                if deadline is not None:
+                    waits.append(deadline - now)
+                    if deadline <= now:
+                        return None
+                self._cond.wait(min(waits) if waits else None)
+
+    def finish(self, job: NavJob, ok: bool, error: str | None = None, retry: bool = True) -> bool:
+        """
+        Records the outcome of a trip.
+
+        Parameters:
+            retry: False if trying again cannot help, e.g. for an unknown target.
+
+        Returns:
+            True if the job was put back in the queue (retry or preemption),
+            False once its outcome is final.
+        """
+        with self._cond:
+            if self._current is job:
+                self._current = None
+            if job.status == "cancelled":
+                return False
+            if job.cancelled.is_set():
+                # Preempted by a higher-priority job: run again later, not a failed attempt.
+                job.attempts -= 1
+                job.status = "queued"
+                self._push(job)
+                self._cond.notify_all()
+                return True
+            if ok:
+                job.status = "done"
+                return False
+            job.error = error
+            if not retry or job.attempts >= self.max_attempts:
+                job.status = "failed"
+                return False
+            job.status = "retrying"
+            job.not_before = time.monotonic() + self.backoff * 2 ** (job.attempts - 1)
+            self._push(job)
+            self._cond.notify_all()
+            return True
+
+    def status(self, job_id: str | None = None) -> dict:
+        """
+        A snapshot of one job, or of the running job and the queue.
+        """
+        with self._cond:
+            if job_id is not None:
+                job = self._jobs.get(job_id)
+                return job.to_dict() if job else {"id": job_id, "status": "unknown"}
+            queued = sorted(e for e in self._heap if e[2].status != "cancelled")
+            return {
+                "current": self._current.to_dict() if self._current else None,
+                "queued": [e[2].to_dict() for e in queued],
+            }
+
+    # ------------------------------------------------------------------
+    def _push(self, job: NavJob) -> None:
+        heapq.heappush(self._heap, (-job.priority, next(self._seq), job))
+
+    def _remember(self, job: NavJob) -> None:
+        self._jobs[job.id] = job
+        while len(self._jobs) > MAX_HISTORY:
+            self._jobs.popitem(last=False)
+
+    def _mark_cancelled(self, job: NavJob) -> None:
+        # A running trip reports its own cancellation once the robot stops.
+        job.cancelled_while_running = job is self._current
+        job.status = "cancelled"
+        job.cancelled.set()
+
+    def _cancel_all(self) -> list[NavJob]:
+        cancelled = [e[2] for e in self._heap if e[2].status != "cancelled"]
+        if self._current and self._current.status == "running":
+            cancelled.append(self._current)
+        for job in cancelled:
+            self._mark_cancelled(job)
+        self._heap = []
+        return cancelled
@@ -0,0 +1,370 @@
+"""
+Landmarks the robot can recognise on the local CPU while it drives.
+
+The index (LANDMARK_INDEX, landmarks/index.json) lists two kinds:
+
+- ArUco markers (4x4 dictionary) fixed to the walls: ``"marker:<id>"`` with
+  the marker centre's ``position`` in grid units (cell centres are integers,
+  so a wall above row 0 is at row -0.5), the direction it ``faces`` and its
+  printed ``size_cm``. A marker gives the distance to the wall and the
+  sideways offset, i.e. a precise fix.
+- Keyframes: ``"keyframe:<name>"`` with a stored camera ``image`` taken from
+  the centre of ``cell`` facing ``heading``, matched with ORB features. A
+  keyframe only says "the robot is at about this cell".
+
+``LandmarkDetector.detect(frame)`` returns what it found in one frame; the
+localiser (navigation/localisation.py) turns that into a pose. cv2 and numpy
+load on the first detection.
+
+The index also holds the view of each exhibit for the final alignment on
+arrival: ``"exhibit:<exhibit name>"`` with an ``image`` taken where the robot
+should stop, ``distance_cm`` from the exhibit. ``LandmarkDetector.locate_exhibit``
+matches it with ORB features and a homography. An entry with ``width_cm``
+falls back to the largest four-sided contour in the frame (the picture frame).
+The reference view's features come from the content pack (content/pack.py)
+when it has them, so the images need not be decoded and analysed on the robot.
+
+Usage:
+    python -m navigation.landmarks list
+    python -m navigation.landmarks add-marker 7 -0.5 1 DOWN --size 15
+    python -m navigation.landmarks add-keyframe mona_lisa 0 1 UP    # captures the current frame
+    python -m navigation.landmarks add-exhibit "Mona Lisa by Leonardo da Vinci" --distance 50 --width 53
+"""
+
+import argparse
+import json
+import os
+
+from content import pack as content_pack
+from runtime.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+LANDMARK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "landmarks")
+LANDMARK_INDEX = os.getenv("LANDMARK_INDEX", os.path.join(LANDMARK_DIR, "index.json"))
+
+DEFAULT_FOCAL_PX = 600.0     # camera focal length in pixels at the processed width
+PROCESS_WIDTH = 640          # frames are scaled down to this width before detection
+ORB_FEATURES = 500
+MIN_KEYFRAME_MATCHES = 25
+MIN_EXHIBIT_MATCHES = 15
+MIN_CONTOUR_AREA = 0.02      # of the frame, for the picture-frame fallback
+RATIO_TEST = 0.75
+
+
+class LandmarkIndex:
+    """
+    The landmarks of the floor, by id.
+
+    Parameters:
+        landmarks: Landmark entries as described in the module docstring.
+        focal_px: Camera focal length in pixels at PROCESS_WIDTH.
+        root: Directory keyframe images are relative to.
+    """
+
+    def __init__(self, landmarks: list[dict] | None = None, focal_px: float = DEFAULT_FOCAL_PX,
+                 root: str = LANDMARK_DIR):
+        self.focal_px = focal_px
+        self.root = root
+        self.landmarks = {lm["id"]: lm for lm in landmarks or []}
+
+    def __len__(self) -> int:
+        return len(self.landmarks)
+
+    def get(self, landmark_id: str) -> dict | None:
+        return self.landmarks.get(landmark_id)
+
+    def markers(self) -> list[dict]:
+        return [lm for lm in self.landmarks.values() if lm["id"].startswith("marker:")]
+
+    def keyframes(self) -> list[dict]:
+        return [lm for lm in self.landmarks.values() if lm["id"].startswith("keyframe:")]
+
+    def exhibit(self, name: str) -> dict | None:
+        return self.landmarks.get(f"exhibit:{name}")
+
+    def add(self, landmark: dict) -> None:
+        self.landmarks[landmark["id"]] = landmark
+
+    @classmethod
+    def load(cls, path: str = LANDMARK_INDEX) -> "LandmarkIndex":
+        """
+        The index at path, or an empty one (no localisation) if there is none.
+        """
+        if not os.path.exists(path):
+            return cls(root=os.path.dirname(path))
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Navigation: ignoring landmark index {path}: {e}")
+            return cls(root=os.path.dirname(path))
+        return cls(data.get("landmarks", []), data.get("focal_px", DEFAULT_FOCAL_PX),
+                   os.path.dirname(path))
+
+    def save(self, path: str = LANDMARK_INDEX) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"focal_px": self.focal_px, "landmarks": list(self.landmarks.values())},
+                      f, indent=2)
+            f.write("\n")
+
+
+class LandmarkDetector:
+    """
+    Finds the index's markers and keyframes in camera frames.
+    """
+
+    def __init__(self, index: LandmarkIndex):
+        self.index = index
+        self._aruco = None
+        self._orb = None
+        self._matcher = None
+        self._keyframes = None  # [(landmark, descriptors)]
+        self._exhibits = {}     # exhibit id -> (keypoint coordinates, descriptors, image size) or None
+        self._pack = None       # content pack the cached references came from
+
+    def _prepare(self) -> None:
+        if self._orb is not None:
+            return
+        self._orb = cv2.ORB_create(ORB_FEATURES)
+        self._matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+        if self.index.markers():
+            dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
+            self._aruco = cv2.aruco.ArucoDetector(dictionary, cv2.aruco.DetectorParameters())
+        self._keyframes = []
+        for landmark in self.index.keyframes():
+            image = cv2.imread(os.path.join(self.index.root, landmark["image"]), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                print(f"[ERROR] Navigation: keyframe image {landmark['image']} not found")
+                continue
+            _, descriptors = self._orb.detectAndCompute(self._scaled(image), None)
+            if descriptors is not None:
+                self._keyframes.append((landmark, descriptors))
+
+    @staticmethod
+    def _scaled(image):
+        height, width = image.shape[:2]
+        if width <= PROCESS_WIDTH:
+            return image
+        return cv2.resize(image, (PROCESS_WIDTH, round(height * PROCESS_WIDTH / width)),
+                          interpolation=cv2.INTER_AREA)
+
+    def detect(self, frame) -> list[dict]:
+        """
+        Landmarks in one BGR frame.
+
+        Returns:
+            [{"landmark": id, "distance_cm", "offset_cm"}] for markers (offset
+            positive to the right of the image centre) and at most one
+            [{"landmark": id, "score"}] for the best matching keyframe.
+        """
+        self._prepare()
+        gray = self._scaled(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        return self._markers(gray) + self._keyframe(gray)
+
+    def _markers(self, gray) -> list[dict]:
+        if self._aruco is None:
+            return []
+        corners, ids, _ = self._aruco.detectMarkers(gray)
+        if ids is None:
+            return []
+        found = []
+        centre_x = gray.shape[1] / 2
+        for quad, marker_id in zip(corners, ids.flatten()):
+            landmark = self.index.get(f"marker:{int(marker_id)}")
+            if landmark is None:
+                continue
+            points = quad.reshape(4, 2)
+            side_px = float(np.mean(np.linalg.norm(points - np.roll(points, 1, axis=0), axis=1)))
+            if side_px <= 0:
+                continue
+            distance_cm = self.index.focal_px * landmark["size_cm"] / side_px
+            offset_cm = (float(points[:, 0].mean()) - centre_x) * distance_cm / self.index.focal_px
+            found.append({"landmark": landmark["id"], "distance_cm": distance_cm,
+                          "offset_cm": offset_cm})
+        return found
+
+    def _keyframe(self, gray) -> list[dict]:
+        if not self._keyframes:
+            return []
+        _, descriptors = self._orb.detectAndCompute(gray, None)
+        if descriptors is None:
+            return []
+        best, best_good = None, 0
+        for landmark, reference in self._keyframes:
+            good = 0
+            for pair in self._matcher.knnMatch(descriptors, reference, k=2):
+                if len(pair) == 2 and pair[0].distance < RATIO_TEST * pair[1].distance:
+                    good += 1
+            if good > best_good:
+                best, best_good = landmark, good
+        if best is None or best_good < MIN_KEYFRAME_MATCHES:
+            return []
+        return [{"landmark": best["id"], "score": best_good / ORB_FEATURES}]
+
+    def locate_exhibit(self, frame, name: str) -> dict | None:
+        """
+        Where an exhibit is relative to the spot its reference view was taken from.
+
+        Returns:
+            {"offset_cm", "range_error_cm", "by"}: how far the exhibit lies
+            right of the camera axis, how much further away it is than it
+            should be (negative: too close), and whether it was found by
+            "features" (which also identifies the exhibit) or by its "outline";
+            None if it is not in the frame or the index has no view of it.
+        """
+        exhibit = self.index.exhibit(name)
+        if exhibit is None:
+            return None
+        self._prepare()
+        gray = self._scaled(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        found, by = self._match_exhibit(gray, exhibit), "features"
+        if found is None and "width_cm" in exhibit:
+            found, by = self._frame_contour(gray, exhibit), "outline"
+        if found is None:
+            return None
+        centre_x, distance_cm = found
+        return {"offset_cm": (centre_x - gray.shape[1] / 2) * distance_cm / self.index.focal_px,
+                "range_error_cm": distance_cm - exhibit["distance_cm"], "by": by}
+
+    def reference(self, name: str):
+        """
+        ORB features of the exhibit's reference view, computed from its image.
+
+        Returns:
+            (keypoint coordinates as float32 N x 2, descriptors as uint8 N x 32,
+            (height, width) of the scaled view); None without a usable image.
+        """
+        exhibit = self.index.exhibit(name)
+        if exhibit is None or "image" not in exhibit:
+            return None
+        self._prepare()
+        image = cv2.imread(os.path.join(self.index.root, exhibit["image"]), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            print(f"[ERROR] Navigation: exhibit image {exhibit['image']} not found")
+            return None
+        image = self._scaled(image)
+        keypoints, descriptors = self._orb.detectAndCompute(image, None)
+        if descriptors is None:
+            return None
+        return np.float32([kp.pt for kp in keypoints]), descriptors, image.shape[:2]
+
+    def _reference(self, exhibit: dict):
+        pack = content_pack.get_pack()
+        if pack is not self._pack:
+            self._exhibits.clear()
+            self._pack = pack
+        if exhibit["id"] not in self._exhibits:
+            name = exhibit["id"].split(":", 1)[1]
+            reference = pack.reference(name) if pack is not None else None
+            if reference is None:
+                reference = self.reference(name)
+            self._exhibits[exhibit["id"]] = reference
+        return self._exhibits[exhibit["id"]]
+
+    def _match_exhibit(self, gray, exhibit: dict) -> tuple[float, float] | None:
+        """
+        (x of the reference view's centre in this frame, distance in cm) by homography.
+        """
+        reference = self._reference(exhibit)
+        if reference is None:
+            return None
+        ref_points, ref_descriptors, (height, width) = reference
+        points, descriptors = self._orb.detectAndCompute(gray, None)
+        if descriptors is None:
+            return None
+        good = [pair[0] for pair in self._matcher.knnMatch(ref_descriptors, descriptors, k=2)
+                if len(pair) == 2 and pair[0].distance < RATIO_TEST * pair[1].distance]
+        if len(good) < MIN_EXHIBIT_MATCHES:
+            return None
+        source = ref_points[[m.queryIdx for m in good]].reshape(-1, 1, 2)
+        target = np.float32([points[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+        homography, inliers = cv2.findHomography(source, target, cv2.RANSAC, 5.0)
+        if homography is None or int(inliers.sum()) < MIN_EXHIBIT_MATCHES:
+            return None
+        centre = cv2.perspectiveTransform(np.float32([[[width / 2, height / 2]]]), homography)[0][0]
+        scale = abs(np.linalg.det(homography[:2, :2])) ** 0.5
+        if scale <= 0:
+            return None
+        return float(centre[0]), exhibit["distance_cm"] / scale
+
+    def _frame_contour(self, gray, exhibit: dict) -> tuple[float, float] | None:
+        """
+        (x of the largest four-sided contour's centre, distance in cm from its width).
+        """
+        edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        best, best_area = None, MIN_CONTOUR_AREA * gray.shape[0] * gray.shape[1]
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area < best_area:
+                continue
+            quad = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(quad) == 4:
+                best, best_area = quad, area
+        if best is None:
+            return None
+        x, _, width_px, _ = cv2.boundingRect(best)
+        return x + width_px / 2, self.index.focal_px * exhibit["width_cm"] / width_px
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Edit the landmark index used for localisation")
+    parser.add_argument("--index", default=LANDMARK_INDEX)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    marker = commands.add_parser("add-marker", help="a marker fixed to a wall")
+    marker.add_argument("marker_id", type=int)
+    marker.add_argument("row", type=float)
+    marker.add_argument("col", type=float)
+    marker.add_argument("faces", choices=["UP", "RIGHT", "DOWN", "LEFT"])
+    marker.add_argument("--size", type=float, default=15.0, help="printed side length in cm")
+    keyframe = commands.add_parser("add-keyframe", help="the current camera view from a cell centre")
+    keyframe.add_argument("name")
+    keyframe.add_argument("row", type=int)
+    keyframe.add_argument("col", type=int)
+    keyframe.add_argument("heading", choices=["UP", "RIGHT", "DOWN", "LEFT"])
+    exhibit = commands.add_parser("add-exhibit",
+                                  help="the current camera view of an exhibit, from where the robot should stop")
+    exhibit.add_argument("name", help="exhibit name as the vision model reports it")
+    exhibit.add_argument("--distance", type=float, required=True, help="cm from the camera to the exhibit")
+    exhibit.add_argument("--width", type=float, help="cm; enables the picture-frame fallback")
+    args = parser.parse_args()
+
+    index = LandmarkIndex.load(args.index)
+    if args.command == "list":
+        for landmark in index.landmarks.values():
+            print(json.dumps(landmark))
+        print(f"{len(index)} landmarks")
+        return
+    if args.command == "add-marker":
+        index.add({"id": f"marker:{args.marker_id}", "position": [args.row, args.col],
+                   "faces": args.faces, "size_cm": args.size})
+        index.save(args.index)
+        print(f"Saved {len(index)} landmarks to {args.index}")
+        return
+
+    from capture_analyse import read_frame
+    frame = read_frame()
+    if frame is None:
+        raise SystemExit("[ERROR] Failed to capture frame")
+    folder = "keyframes" if args.command == "add-keyframe" else "exhibits"
+    image = os.path.join(folder, "".join(ch if ch.isalnum() else "_" for ch in args.name) + ".png")
+    os.makedirs(os.path.join(index.root, folder), exist_ok=True)
+    cv2.imwrite(os.path.join(index.root, image), frame)
+    if args.command == "add-keyframe":
+        index.add({"id": f"keyframe:{args.name}", "image": image,
+                   "cell": [args.row, args.col], "heading": args.heading})
+    else:
+        entry = {"id": f"exhibit:{args.name}", "image": image, "distance_cm": args.distance}
+        if args.width:
+            entry["width_cm"] = args.width
+        index.add(entry)
+    index.save(args.index)
+    print(f"Saved {len(index)} landmarks to {args.index}")
+
+
+if __name__ == "__main__":
+    main()
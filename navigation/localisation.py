@@ -0,0 +1,288 @@
+"""
+Pose estimate from the robot's commanded motion and landmarks seen by the camera.
+
+Between camera fixes the position is dead reckoned from the motion engine's
+odometer, and its uncertainty grows with every cell driven, because the wheels
+slip. While the robot travels, a background thread looks for landmarks from the
+index (navigation/landmarks.py) LOCALISE_HZ times a second. Each fix is fused
+in with a Kalman update per grid axis, weighted by its precision. A marker is
+good to a few centimetres; a keyframe only to about a quarter of a cell. A fix
+more than GATE_SIGMAS away from the estimate is dropped, unless LOST_AFTER of
+them in a row agree with each other. That means the estimate was wrong, and
+it is reset to them.
+
+Navigation uses the estimate in three ways:
+- to end a straight run where the landmarks say the cell is, not where the timing says;
+- to correct ``currentPosition`` when the robot ended up in another cell;
+- to nudge onto the cell centre before the camera check at an exhibit.
+
+With no markers or keyframes in the index no thread runs and navigation
+behaves exactly as before.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Callable
+
+from navigation.museum_map import DIRECTION_VECTORS
+from navigation.landmarks import LandmarkIndex
+from telemetry import metrics
+
+LOCALISE_HZ = float(os.getenv("LOCALISE_HZ", "4"))
+SLIP_SIGMA = 0.08         # cells of drift per cell driven (1 sigma)
+START_SIGMA = 0.05        # cells, when the pose is set by hand or after a stop
+MARKER_SIGMA = 0.03       # cells, plus MARKER_RANGE_SIGMA per cell of range
+MARKER_RANGE_SIGMA = 0.03
+KEYFRAME_SIGMA = 0.25
+GATE_SIGMAS = 3.0
+LOST_AFTER = 4
+STALE_AFTER_CELLS = 2.0   # driven since the last fix before the estimate is dead reckoning again
+
+FIXES = metrics.counter("museum_nav_landmark_fixes_total",
+                        "Landmark sightings by how the pose filter used them", ["result"])
+FIX_ACCEPTED = FIXES.labels(result="accepted")
+FIX_REJECTED = FIXES.labels(result="rejected")
+FIX_RESET = FIXES.labels(result="reset")
+POSE_SIGMA = metrics.gauge("museum_nav_pose_sigma_cells", "Uncertainty of the position estimate")
+
+
+class PoseFilter:
+    """
+    Position on the grid (row and column as floats; cell centres are whole
+    numbers) with an independent variance per axis.
+    """
+
+    def __init__(self, position, sigma: float = START_SIGMA):
+        self.reset(position, sigma)
+
+    def reset(self, position, sigma: float = START_SIGMA) -> None:
+        self.row, self.col = float(position[0]), float(position[1])
+        self.var_row = self.var_col = sigma ** 2
+
+    def predict(self, d_row: float, d_col: float) -> None:
+        """
+        Moves the estimate by the commanded motion; slip adds uncertainty along it.
+        """
+        self.row += d_row
+        self.col += d_col
+        self.var_row += SLIP_SIGMA ** 2 * abs(d_row)
+        self.var_col += SLIP_SIGMA ** 2 * abs(d_col)
+
+    def distance(self, row: float, col: float, variance: float) -> float:
+        """
+        How many standard deviations a fix lies from the estimate.
+        """
+        return math.sqrt((row - self.row) ** 2 / (self.var_row + variance)
+                         + (col - self.col) ** 2 / (self.var_col + variance))
+
+    def correct(self, row: float, col: float, variance: float) -> None:
+        gain = self.var_row / (self.var_row + variance)
+        self.row += gain * (row - self.row)
+        self.var_row *= 1 - gain
+        gain = self.var_col / (self.var_col + variance)
+        self.col += gain * (col - self.col)
+        self.var_col *= 1 - gain
+
+    def sigma(self) -> float:
+        return math.sqrt(max(self.var_row, self.var_col))
+
+    def cell(self) -> list[int]:
+        return [round(self.row), round(self.col)]
+
+
+class Localiser:
+    """
+    Keeps a PoseFilter up to date from the engine's odometer and landmark fixes.
+
+    Parameters:
+        engine: The MotionEngine driving the robot (for its odometer).
+        index: The landmarks to look for.
+        locate: Returns the landmarks in a fresh camera frame, locate(index).
+        heading: Returns the robot's heading ("UP", ...).
+        position: The starting cell.
+        cell_size_cm: Converts marker distances to cells.
+    """
+
+    def __init__(self, engine, index: LandmarkIndex, locate: Callable, heading: Callable[[], str],
+                 position, cell_size_cm: float = 100.0):
+        self.engine = engine
+        self.index = index
+        self.locate = locate
+        self.heading = heading
+        self.cell_size_cm = cell_size_cm
+        self.pose = PoseFilter(position)
+        self.fixes = 0
+        self._odometer = engine.odometer()
+        self._fix_odometer = None     # odometer at the last accepted fix
+        self._rejected: list[tuple[float, float]] = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.index.markers() or self.index.keyframes())
+
+    def _predict(self) -> None:
+        odometer = self.engine.odometer()
+        delta, self._odometer = odometer - self._odometer, odometer
+        if delta:
+            dr, dc = DIRECTION_VECTORS[self.heading()]
+            self.pose.predict(dr * delta, dc * delta)
+
+    def update(self) -> None:
+        """
+        Applies the motion since the last update; call before the heading changes.
+        """
+        with self._lock:
+            self._predict()
+
+    def sync(self, position) -> None:
+        """
+        Resets the estimate to position unless it already puts the robot in that cell.
+        """
+        with self._lock:
+            self._predict()
+            if self.pose.cell() != list(position):
+                self.pose.reset(position)
+                self._fix_odometer = None
+
+    def anchored(self) -> bool:
+        """
+        Whether a landmark was seen within the last STALE_AFTER_CELLS of driving.
+        """
+        return (self._fix_odometer is not None
+                and abs(self.engine.odometer() - self._fix_odometer) <= STALE_AFTER_CELLS)
+
+    def estimate(self) -> tuple[float, float, float] | None:
+        """
+        (row, col, sigma) if the estimate is anchored by a recent fix, else None.
+        """
+        with self._lock:
+            if not self.anchored():
+                return None
+            self._predict()
+            return self.pose.row, self.pose.col, self.pose.sigma()
+
+    def along_track(self, start, vector) -> float | None:
+        """
+        Cells driven from start in direction vector, by the anchored estimate.
+        """
+        estimate = self.estimate()
+        if estimate is None:
+            return None
+        row, col, _ = estimate
+        return (row - start[0]) * vector[0] + (col - start[1]) * vector[1]
+
+    def measurement(self, detection: dict, heading: str) -> tuple[float, float, float] | None:
+        """
+        (row, col, variance) of the robot implied by one detection, or None if
+        the landmark is unknown or seen from an angle the index does not cover.
+        """
+        landmark = self.index.get(detection["landmark"])
+        if landmark is None:
+            return None
+        dr, dc = DIRECTION_VECTORS[heading]
+        if "position" in landmark:
+            fr, fc = DIRECTION_VECTORS[landmark["faces"]]
+            if (fr + dr, fc + dc) != (0, 0):
+                return None  # only markers the robot is driving towards
+            distance = detection["distance_cm"] / self.cell_size_cm
+            offset = detection.get("offset_cm", 0.0) / self.cell_size_cm
+            right_r, right_c = dc, -dr
+            row = landmark["position"][0] - dr * distance - right_r * offset
+            col = landmark["position"][1] - dc * distance - right_c * offset
+            return row, col, (MARKER_SIGMA + MARKER_RANGE_SIGMA * distance) ** 2
+        if landmark.get("heading") != heading:
+            return None
+        return float(landmark["cell"][0]), float(landmark["cell"][1]), KEYFRAME_SIGMA ** 2
+
+    def fix(self, detections: list[dict], odometer_at_capture: float | None = None) -> int:
+        """
+        Fuses the landmarks seen in one frame into the estimate.
+
+        Parameters:
+            detections: As returned by LandmarkDetector.detect.
+            odometer_at_capture: Odometer when the frame was taken; the robot has
+                moved on since by the difference.
+
+        Returns:
+            The number of fixes accepted.
+        """
+        heading = self.heading()
+        accepted = 0
+        with self._lock:
+            self._predict()
+            moved = 0.0 if odometer_at_capture is None else self._odometer - odometer_at_capture
+            dr, dc = DIRECTION_VECTORS[heading]
+            for detection in detections:
+                measured = self.measurement(detection, heading)
+                if measured is None:
+                    continue
+                row, col, variance = measured
+                row, col = row + dr * moved, col + dc * moved
+                if self.pose.distance(row, col, variance) > GATE_SIGMAS:
+                    FIX_REJECTED.inc()
+                    self._rejected.append((row, col))
+                    if len(self._rejected) >= LOST_AFTER and self._agree(self._rejected[-LOST_AFTER:]):
+                        recent = self._rejected[-LOST_AFTER:]
+                        self.pose.reset((sum(r for r, _ in recent) / len(recent),
+                                         sum(c for _, c in recent) / len(recent)), math.sqrt(variance))
+                        self._rejected.clear()
+                        self._fix_odometer = self._odometer
+                        FIX_RESET.inc()
+                        print("Navigation: lost track, landmarks reset the pose to",
+                              [round(self.pose.row, 2), round(self.pose.col, 2)])
+                    continue
+                self.pose.correct(row, col, variance)
+                self._rejected.clear()
+                self._fix_odometer = self._odometer
+                self.fixes += 1
+                accepted += 1
+                FIX_ACCEPTED.inc()
+            POSE_SIGMA.set(self.pose.sigma())
+        return accepted
+
+    @staticmethod
+    def _agree(fixes: list[tuple[float, float]]) -> bool:
+        rows = [r for r, _ in fixes]
+        cols = [c for _, c in fixes]
+        return max(rows) - min(rows) < 0.5 and max(cols) - min(cols) < 0.5
+
+    # ------------------------------------------------------------------
+    # Background thread
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """
+        Starts looking for landmarks (a no-op with an empty index).
+        """
+        if not self.enabled or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="localiser")
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join()
+
+    def _run(self) -> None:
+        failing = False
+        while not self._stopping.is_set():
+            if not self.engine.turning:
+                odometer = self.engine.odometer()
+                try:
+                    detections = self.locate(self.index)
+                    failing = False
+                except Exception as e:
+                    if not failing:
+                        print(f"[ERROR] Navigation: landmark detection failed: {e}")
+                    failing = True
+                    detections = []
+                if detections and not self.engine.turning:
+                    self.fix(detections, odometer)
+            time.sleep(1.0 / LOCALISE_HZ)
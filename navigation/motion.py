@@ -0,0 +1,337 @@
+"""
+Velocity-profiled motion for the two-motor base.
+
+Instead of switching the motors fully on for a fixed time per cell, the
+engine ramps the PWM duty cycle up (``set_speed``), cruises and ramps it down
+again, and drives a straight run of several cells as one continuous move.
+Ramping keeps the wheels from slipping, so the robot stops where it was told
+to and the camera check on arrival needs fewer correction nudges.
+
+Speed is taken as proportional to the duty cycle above the duty at which the
+wheels start to turn. A linear ramp then covers half the distance the same
+time at cruise would, which the profiles account for, so a segment of n cells
+covers n cells. Times below are "cruise seconds": the time a distance or
+angle takes at full cruise speed.
+
+Each robot's timings come from a calibration file written by
+``python -m navigation.calibrate`` (``calibration/<ROBOT_ID>.json``, or the path in
+MOTION_CALIBRATION). Without one, the defaults reproduce the original fixed
+timings for a single cell or quarter turn (a half turn spins for twice as
+long as a quarter turn); longer straight runs are faster because the robot
+no longer stops at every cell.
+"""
+
+import json
+import math
+import os
+import time
+from typing import Callable
+
+from navigation import protocol
+from navigation.museum_map import CELL_TRAVEL_TIME, TURN_90_TIME
+
+CALIBRATION_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "calibration")
+
+DEFAULT_RAMP_TIME = 0.6       # standstill to cruise when driving
+DEFAULT_TURN_RAMP_TIME = 0.3  # standstill to cruise when turning on the spot
+
+
+class Calibration:
+    """
+    Motion constants of one robot.
+
+    Parameters:
+        cell_time: Cruise seconds per grid cell.
+        turn_90_time: Cruise seconds per quarter turn.
+        turn_180_time: Cruise seconds per half turn.
+        ramp_time: Seconds from standstill to cruise speed (and back) when driving.
+        turn_ramp_time: The same when turning on the spot.
+        min_duty: Duty cycle (%) below which the wheels do not turn.
+        cruise_duty: Duty cycle (%) at cruise speed.
+        nudge_duty: Duty cycle (%) of the short correction moves at an exhibit.
+        ramp_steps: Duty changes per ramp.
+        cell_size_cm: Size of a grid cell, used to calibrate with the ultrasonic sensor.
+        source: How the values were obtained (defaults, sensor, simulator).
+    """
+
+    FIELDS = ("cell_time", "turn_90_time", "turn_180_time", "ramp_time", "turn_ramp_time",
+              "min_duty", "cruise_duty", "nudge_duty", "ramp_steps", "cell_size_cm", "source")
+
+    def __init__(self, cell_time: float = CELL_TRAVEL_TIME - DEFAULT_RAMP_TIME,
+                 turn_90_time: float = TURN_90_TIME - DEFAULT_TURN_RAMP_TIME,
+                 turn_180_time: float = 2 * (TURN_90_TIME - DEFAULT_TURN_RAMP_TIME),
+                 ramp_time: float = DEFAULT_RAMP_TIME,
+                 turn_ramp_time: float = DEFAULT_TURN_RAMP_TIME,
+                 min_duty: float = 30.0, cruise_duty: float = 100.0, nudge_duty: float = 60.0,
+                 ramp_steps: int = 5, cell_size_cm: float = 100.0, source: str = "defaults"):
+        if not 0 <= min_duty < cruise_duty <= 100:
+            raise ValueError("Duty cycles must satisfy 0 <= min_duty < cruise_duty <= 100")
+        if ramp_time / 2 >= cell_time:
+            raise ValueError("A drive ramp must cover less than one cell")
+        self.cell_time = cell_time
+        self.turn_90_time = turn_90_time
+        self.turn_180_time = turn_180_time
+        self.ramp_time = ramp_time
+        self.turn_ramp_time = turn_ramp_time
+        self.min_duty = min_duty
+        self.cruise_duty = cruise_duty
+        self.nudge_duty = nudge_duty
+        self.ramp_steps = max(1, int(ramp_steps))
+        self.cell_size_cm = cell_size_cm
+        self.source = source
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Calibration":
+        return cls(**{k: v for k, v in data.items() if k in cls.FIELDS})
+
+
+def calibration_path(robot_id: str | None = None) -> str:
+    if os.getenv("MOTION_CALIBRATION"):
+        return os.getenv("MOTION_CALIBRATION")
+    return os.path.join(CALIBRATION_DIR, f"{robot_id or protocol.ROBOT_ID or 'default'}.json")
+
+def load_calibration(path: str | None = None) -> Calibration:
+    """
+    The robot's calibration, or the defaults if it has not been calibrated.
+    """
+    path = path or calibration_path()
+    if not os.path.exists(path):
+        return Calibration()
+    try:
+        with open(path) as f:
+            calibration = Calibration.from_dict(json.load(f))
+    except (OSError, ValueError, TypeError) as e:
+        print(f"[ERROR] Motion: ignoring calibration {path}: {e}")
+        return Calibration()
+    print(f"[INFO] Motion: calibration from {path} ({calibration.source})")
+    return calibration
+
+def save_calibration(calibration: Calibration, path: str | None = None) -> str:
+    path = path or calibration_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(calibration.to_dict(), f, indent=2)
+        f.write("\n")
+    return path
+
+
+class MotionEngine:
+    """
+    Drives the base with ramped duty-cycle profiles.
+
+    Parameters:
+        motors: The twomotorbasic module (or anything with its functions).
+        calibration: The robot's motion constants.
+    """
+
+    def __init__(self, motors, calibration: Calibration | None = None):
+        self.motors = motors
+        self.calibration = calibration or Calibration()
+        self.turning = False
+        self._duty = self.calibration.cruise_duty
+        self._direction = 0  # +1 driving forward, -1 backward, 0 stopped or turning
+        # (cells at the last speed change, when it was, cells per second since)
+        self._odometer = (0.0, time.monotonic(), 0.0)
+
+    # ------------------------------------------------------------------
+    # Profiles
+    # ------------------------------------------------------------------
+    def duty(self, fraction: float) -> float:
+        """
+        Duty cycle for a fraction (0..1) of cruise speed.
+        """
+        c = self.calibration
+        return c.min_duty + max(0.0, min(1.0, fraction)) * (c.cruise_duty - c.min_duty)
+
+    def ramp(self, ramp_time: float, up: bool = True, peak: float = 1.0) -> list[tuple[float, float]]:
+        """
+        (duty, seconds) steps accelerating to (or decelerating from) a fraction
+        of cruise speed. Each step holds the speed at its midpoint, so the ramp
+        covers ramp_time * peak**2 / 2 cruise seconds.
+        """
+        n = self.calibration.ramp_steps
+        seconds = ramp_time * peak / n
+        steps = [(self.duty(peak * (i + 0.5) / n), seconds) for i in range(n)]
+        return steps if up else steps[::-1]
+
+    def profile(self, cruise_seconds: float, ramp_time: float) -> list[tuple[float, float]]:
+        """
+        (duty, seconds) steps covering a distance of cruise_seconds: ramp up,
+        cruise, ramp down, or a shorter peak when there is no room to cruise.
+        """
+        if cruise_seconds <= 0:
+            return []
+        if cruise_seconds < ramp_time:
+            peak = math.sqrt(cruise_seconds / ramp_time)
+            return self.ramp(ramp_time, True, peak) + self.ramp(ramp_time, False, peak)
+        cruise = [(self.duty(1.0), cruise_seconds - ramp_time)] if cruise_seconds > ramp_time else []
+        return self.ramp(ramp_time, True) + cruise + self.ramp(ramp_time, False)
+
+    def segment_time(self, cells: int) -> float:
+        """
+        Seconds a straight run of cells takes from standstill to standstill.
+        """
+        return sum(s for _, s in self.profile(cells * self.calibration.cell_time,
+                                              self.calibration.ramp_time))
+
+    def turn_time(self, quarters: int) -> float:
+        """
+        Seconds a turn on the spot takes; quarters is 1 or 3 (90 degrees) or 2.
+        """
+        c = self.calibration
+        quarters %= 4
+        if quarters == 0:
+            return 0.0
+        cruise = c.turn_180_time if quarters == 2 else c.turn_90_time
+        return sum(s for _, s in self.profile(cruise, c.turn_ramp_time))
+
+    # ------------------------------------------------------------------
+    # Moves
+    # ------------------------------------------------------------------
+    def odometer(self) -> float:
+        """
+        Cells driven so far (backwards counts negative) as commanded: what the
+        robot covered if its wheels did not slip.
+        """
+        base, since, rate = self._odometer
+        return base + rate * (time.monotonic() - since)
+
+    def _update_odometer(self) -> None:
+        c = self.calibration
+        speed = max(0.0, min(1.0, (self._duty - c.min_duty) / (c.cruise_duty - c.min_duty)))
+        now = time.monotonic()
+        base, since, rate = self._odometer
+        self._odometer = (base + rate * (now - since), now, self._direction * speed / c.cell_time)
+
+    def _moving(self, direction: int) -> None:
+        self._direction = direction
+        self._update_odometer()
+
+    def set_duty(self, duty: float) -> None:
+        self.motors.set_speed(1, duty)
+        self.motors.set_speed(2, duty)
+        self._duty = duty
+        self._update_odometer()
+
+    def run_profile(self, steps: list[tuple[float, float]]) -> None:
+        for duty, seconds in steps:
+            self.set_duty(duty)
+            time.sleep(seconds)
+
+    def stop(self) -> None:
+        self.motors.motor1_stop()
+        self.motors.motor2_stop()
+        self._direction = 0
+        self.set_duty(self.calibration.cruise_duty)
+
+    def _cruise(self, covered: float, until: float) -> float:
+        if until > covered:
+            self.run_profile([(self.duty(1.0), until - covered)])
+            return until
+        return covered
+
+    def _locate(self, covered: float, position: Callable[[], float | None] | None) -> float:
+        estimate = position() if position else None
+        return covered if estimate is None else estimate * self.calibration.cell_time
+
+    def drive(self, cells: int, clear: Callable[[], bool] | None = None,
+              should_stop: Callable[[], bool] | None = None,
+              on_cell: Callable[[int], None] | None = None,
+              position: Callable[[], float | None] | None = None) -> int:
+        """
+        Drives forward through a straight run of cells without stopping between them.
+
+        Half a ramp before each cell boundary the run checks clear() and
+        should_stop(); if either says to stop, it ramps down and stops exactly
+        on that boundary. With position, the run also asks there (and before
+        the final ramp down) how far it has really come, and cruises on until
+        the landmarks agree instead of trusting the timing alone.
+
+        Parameters:
+            cells: Cells to drive.
+            clear: Optional check that the way ahead is free.
+            should_stop: Optional cancellation check.
+            on_cell: Called with the number of cells done as each boundary is crossed.
+            position: Optional estimate of the cells driven since the start of
+                the run, or None when there is none.
+
+        Returns:
+            The cells driven (fewer than asked if the run stopped early).
+        """
+        if cells <= 0:
+            return 0
+        c = self.calibration
+        half = c.ramp_time / 2  # cruise seconds covered by one ramp
+        self.motors.move_forward()
+        self._moving(1)
+        try:
+            self.run_profile(self.ramp(c.ramp_time, up=True))
+            covered = half
+            for boundary in range(1, cells):
+                decide_at = boundary * c.cell_time - half
+                covered = self._cruise(covered, decide_at)
+                covered = self._cruise(self._locate(covered, position), decide_at)
+                if (should_stop and should_stop()) or (clear and not clear()):
+                    self.run_profile(self.ramp(c.ramp_time, up=False))
+                    if on_cell:
+                        on_cell(boundary)
+                    return boundary
+                covered = self._cruise(covered, boundary * c.cell_time)
+                if on_cell:
+                    on_cell(boundary)
+            brake_at = cells * c.cell_time - half
+            covered = self._cruise(covered, brake_at)
+            self._cruise(self._locate(covered, position), brake_at)
+            self.run_profile(self.ramp(c.ramp_time, up=False))
+        finally:
+            self.stop()
+        if on_cell:
+            on_cell(cells)
+        return cells
+
+    def turn(self, quarters: int) -> None:
+        """
+        Turns on the spot: 1 is a quarter turn right, 3 (or -1) a quarter turn
+        left and 2 a half turn (to the left, like turn_behind_left).
+        """
+        c = self.calibration
+        quarters %= 4
+        if quarters == 0:
+            return
+        self.turning = True
+        if quarters == 1:
+            self.motors.motor1_forward()
+            self.motors.motor2_backward()
+        else:
+            self.motors.motor1_backward()
+            self.motors.motor2_forward()
+        cruise = c.turn_180_time if quarters == 2 else c.turn_90_time
+        try:
+            self.run_profile(self.profile(cruise, c.turn_ramp_time))
+        finally:
+            self.stop()
+            self.turning = False
+
+    def nudge(self, cruise_seconds: float, forward: bool = True) -> None:
+        """
+        A short, slow correction move, e.g. to line the camera up with an
+        exhibit, covering the distance of cruise_seconds at cruise speed.
+        """
+        c = self.calibration
+        fraction = (c.nudge_duty - c.min_duty) / (c.cruise_duty - c.min_duty)
+        if fraction <= 0:
+            return
+        self.set_duty(c.nudge_duty)
+        if forward:
+            self.motors.move_forward()
+        else:
+            self.motors.move_backward()
+        self._moving(1 if forward else -1)
+        try:
+            time.sleep(cruise_seconds / fraction)
+        finally:
+            self.stop()
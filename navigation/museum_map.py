@@ -0,0 +1,147 @@
+"""
+The museum floor grid and travel-time estimates.
+
+Kept free of hardware imports so planners and dispatchers can reason about
+routes on machines without GPIO, a camera or motors. ``plan_route`` is the
+default route (rows first, then columns); ``fastest_route`` weighs every edge,
+e.g. with the travel times navigation has learned (navigation/edge_costs.py).
+"""
+
+import heapq
+import itertools
+import math
+
+# Updated Location_matrix (using long exhibit names) for compatibility with voicebot (which now sends the long exhibit name) and capture_analyse (which uses the long exhibit name for image verification)
+Location_matrix = [
+    ["The Scream by Edvard Munch", "Mona Lisa by Leonardo da Vinci", "Sunflowers by Vincent van Gogh"],
+    ["Plushy Dog Sculpture", 0, "Ancient Egyptian Statue"],
+    ["Liberty Leading the People by Eugène Delacroix", "initial", "Starry Night by Vincent van Gogh"]
+]
+
+directions = ["UP", "RIGHT", "DOWN", "LEFT"]
+DIRECTION_VECTORS = {"UP": (-1, 0), "RIGHT": (0, 1), "DOWN": (1, 0), "LEFT": (0, -1)}
+
+HOME_POSITION = [2, 1]  # "initial"
+
+# Timings used for estimates; they mirror the drive code in navigation.py and
+# basic_embedded/twomotorbasic.py.
+CELL_TRAVEL_TIME = 4.75  # seconds of forward drive per grid cell
+TURN_90_TIME = 1.45
+TURN_180_TIME = 2.9
+VERIFY_TIME = 3.0        # one image capture and comparison on arrival
+
+
+def next_position(name):
+    for i, row in enumerate(Location_matrix):
+        for j, val in enumerate(row):
+            if val == name:
+                return [i, j]
+    return None
+
+
+def plan_route(start, target) -> list[list[int]]:
+    """
+    The cells navigation.get_to_location passes through, excluding start.
+    """
+    route = []
+    position = list(start)
+    while position != list(target):
+        if position[0] != target[0]:
+            position = [position[0] + (1 if target[0] > position[0] else -1), position[1]]
+        else:
+            position = [position[0], position[1] + (1 if target[1] > position[1] else -1)]
+        route.append(position)
+    return route
+
+
+def fastest_route(start, target, facing, edge_cost, turn_cost=None) -> tuple[list[list[int]], float]:
+    """
+    The quickest route by Dijkstra over (cell, heading).
+
+    Parameters:
+        start: [row, col] the robot starts from.
+        target: [row, col] of the destination.
+        facing: The robot's heading at the start.
+        edge_cost: Seconds to move from a cell to an adjacent one, edge_cost(cell, next_cell).
+        turn_cost: Seconds to turn, turn_cost(facing, heading); defaults to turn_time.
+
+    Returns:
+        (cells excluding start, seconds).
+    """
+    turn_cost = turn_cost or turn_time
+    start, target = tuple(start), tuple(target)
+    rows, cols = len(Location_matrix), len(Location_matrix[0])
+    tie = itertools.count()
+    frontier = [(0.0, next(tie), start, facing)]
+    best = {(start, facing): 0.0}
+    came_from = {}
+    while frontier:
+        seconds, _, cell, heading = heapq.heappop(frontier)
+        if cell == target:
+            route, state = [], (cell, heading)
+            while state[0] != start:
+                route.append(list(state[0]))
+                state = came_from[state]
+            return route[::-1], seconds
+        if seconds > best.get((cell, heading), math.inf):
+            continue
+        for new_heading, (dr, dc) in DIRECTION_VECTORS.items():
+            nxt = (cell[0] + dr, cell[1] + dc)
+            if not (0 <= nxt[0] < rows and 0 <= nxt[1] < cols):
+                continue
+            cost = seconds + turn_cost(heading, new_heading) + edge_cost(list(cell), list(nxt))
+            if cost < best.get((nxt, new_heading), math.inf):
+                best[(nxt, new_heading)] = cost
+                came_from[(nxt, new_heading)] = (cell, heading)
+                heapq.heappush(frontier, (cost, next(tie), nxt, new_heading))
+    return [], math.inf
+
+
+def route_seconds(start, route, facing, edge_cost, turn_cost=None) -> float:
+    """
+    Seconds a given route takes under the same costs as fastest_route.
+    """
+    turn_cost = turn_cost or turn_time
+    seconds = 0.0
+    position = list(start)
+    for cell in route:
+        heading = heading_between(position, cell)
+        seconds += turn_cost(facing, heading) + edge_cost(position, list(cell))
+        facing, position = heading, list(cell)
+    return seconds
+
+
+def turn_time(facing: str, heading: str) -> float:
+    delta = (directions.index(heading) - directions.index(facing)) % 4
+    return {0: 0.0, 1: TURN_90_TIME, 2: TURN_180_TIME, 3: TURN_90_TIME}[delta]
+
+
+def heading_between(a, b) -> str:
+    vector = (b[0] - a[0], b[1] - a[1])
+    for name, v in DIRECTION_VECTORS.items():
+        if v == vector:
+            return name
+    raise ValueError(f"Cells {a} and {b} are not adjacent")
+
+
+def estimate_travel_time(start, target, facing: str = "UP") -> tuple[float, str]:
+    """
+    Estimates a trip's duration from its route, turns and arrival check.
+
+    Parameters:
+        start: [row, col] the robot starts from.
+        target: [row, col] of the destination.
+        facing: The robot's heading at the start.
+
+    Returns:
+        (seconds, heading on arrival).
+    """
+    seconds = 0.0
+    position = list(start)
+    for cell in plan_route(start, target):
+        heading = heading_between(position, cell)
+        seconds += turn_time(facing, heading) + CELL_TRAVEL_TIME
+        facing, position = heading, cell
+    if position != list(start):
+        seconds += VERIFY_TIME
+    return seconds, facing
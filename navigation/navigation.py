@@ -9,29 +9,63 @@ import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from basic_embedded.twomotorbasic import (
-    move_forward, move_backward,
-    turn_90_left, turn_90_right,
-    turn_behind_left, turn_behind_right,
-    motor1_stop, motor2_stop
-)
+import basic_embedded.twomotorbasic as motors
+from basic_embedded.twomotorbasic import init as init_motors, shutdown as shutdown_motors
 from basic_embedded.ultrasonic_sensor import init_sensor, stop_sensor, get_distance
-from capture_analyse import cap_anal
+# Cheap to import: the camera, cv2 and the vision model load on the first check.
+from capture_analyse import ARTWORKS, cap_anal, locate_landmarks, locate_exhibit
+from navigation.protocol import decode, robot_topic, TOPIC_MOVEMENT
+from navigation.museum_map import (
+    Location_matrix, directions, next_position, HOME_POSITION,
+    DIRECTION_VECTORS, plan_route, fastest_route, route_seconds,
+)
+from navigation.motion import MotionEngine, load_calibration
+from navigation.edge_costs import EdgeCostModel
+from navigation.landmarks import LandmarkIndex
+from navigation.localisation import Localiser
+from telemetry import events, metrics, tracing
 
 # Constants
 PIVOT_DISTANCE = 30.0
 OBSTACLE_THRESHOLD = 30.0
+LEARNED_ROUTE_MARGIN = 2.0  # seconds a learned route must save over the default one
+RELOCALISE_SIGMA = 0.3      # cells; how sure landmarks must be to move currentPosition
+CENTRE_TOLERANCE = 0.15     # cells off the cell centre before a correcting nudge
+ALIGN_STEPS = 5             # local corrections before the camera check on arrival
+ALIGN_TOLERANCE_CM = 8.0    # how far off the exhibit's reference view still counts as centred
+ARRIVAL_CHECK_TIME = 6.0    # seconds assumed for facing the wall, aligning and the camera check
+ARRIVAL_ALPHA = 0.2         # weight of the latest arrival check in the learned time
 
-# Updated Location_matrix (using long exhibit names) for compatibility with voicebot (which now sends the long exhibit name) and capture_analyse (which uses the long exhibit name for image verification)
-Location_matrix = [
-    ["The Scream by Edvard Munch", "Mona Lisa by Leonardo da Vinci", "Sunflowers by Vincent van Gogh"],
-    ["Plushy Dog Sculpture", 0, "Ancient Egyptian Statue"],
-    ["Liberty Leading the People by Eugène Delacroix", "initial", "Starry Night by Vincent van Gogh"]
-]
+# Updated once per cell or check, never inside the motion sleeps.
+CELLS = metrics.counter("museum_nav_cells_total", "Grid cells driven")
+OBSTACLE_WAIT = metrics.histogram("museum_nav_obstacle_wait_seconds",
+                                  "Time spent waiting for an obstacle to clear")
+VERIFY_ATTEMPTS = metrics.counter("museum_vision_verify_attempts_total",
+                                  "Camera checks on arrival, by outcome", ["outcome"])
+VERIFY_MATCHED = VERIFY_ATTEMPTS.labels(outcome="matched")
+VERIFY_MISMATCHED = VERIFY_ATTEMPTS.labels(outcome="mismatch")
+ARRIVALS = metrics.counter("museum_nav_arrivals_total",
+                           "Arrivals at an exhibit, by whether the camera confirmed it",
+                           ["verified"])
+RELOCALISED = metrics.counter("museum_nav_relocalised_total",
+                              "Runs after which landmarks put the robot in another cell")
+ALIGNMENTS = metrics.counter("museum_vision_alignments_total",
+                             "Local alignments on an exhibit before the camera check, by result",
+                             ["result"])
 
-directions = ["UP", "RIGHT", "DOWN", "LEFT"]
 currently_facing = "UP"
-currentPosition = [2, 1]  # Start at "Initial"
+currentPosition = list(HOME_POSITION)  # Start at "Initial"
+arrival_check_time = ARRIVAL_CHECK_TIME  # learned from every arrival
+last_verified = None  # result of the trip's arrival check, None until one has run
+last_failure = None  # why the last trip failed, None if it has not
+
+# Ramped, calibrated moves; see navigation/motion.py and navigation/calibrate.py.
+engine = MotionEngine(motors, load_calibration())
+# Drive and obstacle-wait times per grid edge, learned from every trip.
+edge_model = EdgeCostModel()
+# Camera landmarks fused with the odometer; idle without a landmark index.
+localiser = Localiser(engine, LandmarkIndex.load(), locate_landmarks, lambda: currently_facing,
+                      HOME_POSITION, engine.calibration.cell_size_cm)
 
 def wall_detection() -> bool:
     current = get_distance()
@@ -63,114 +97,508 @@ def rotate_to_direction(direction_vector):
 
     if delta == 0:
         return
-    elif delta == 1:
-        turn_90_right()
-        update_orientation("RIGHT")
-    elif delta == 2:
-        turn_behind_left()
-        update_orientation("RIGHT")
-        update_orientation("RIGHT")
-    elif delta == 3:
-        turn_90_left()
-        update_orientation("LEFT")
-
-def calculate_movement(next_loc, direction_vector, location):
+    localiser.update()  # account for the last run under the old heading
+    with tracing.span("nav.turn", facing=desired):
+        engine.turn(delta)
+        if delta == 1:
+            update_orientation("RIGHT")
+        elif delta == 2:
+            update_orientation("RIGHT")
+            update_orientation("RIGHT")
+        elif delta == 3:
+            update_orientation("LEFT")
+
+def wait_for_clear(next_loc, should_stop=None) -> bool:
+    """
+    Waits until nothing stands in front of the robot.
+
+    Returns:
+        False if should_stop cancelled the trip while waiting.
+    """
+    if not wall_detection():
+        return True
+    print("Obstacle detected. Waiting...")
+    waiting_since = time.monotonic()
+    try:
+        with tracing.span("nav.obstacle", cell=next_loc):
+            while wall_detection():
+                if should_stop and should_stop():
+                    print("Trip cancelled while waiting for obstacle")
+                    return False
+                time.sleep(1)
+    finally:
+        OBSTACLE_WAIT.observe(time.monotonic() - waiting_since)
+    return True
+
+def drive_segment(direction_vector, cells, should_stop=None, on_cell=None) -> int:
+    """
+    Turns towards direction_vector and drives a straight run of cells as one
+    continuous move. The run stops early, on a cell boundary, if something
+    steps in front of the robot or the trip is cancelled.
+
+    Parameters:
+        direction_vector: Unit step, e.g. [1, 0] for DOWN.
+        cells: Cells to drive.
+        should_stop: Optional cancellation check.
+        on_cell: Optional callback after each cell, once the pose is updated.
+
+    Returns:
+        The cells driven; 0 if the trip was cancelled before moving.
+    """
+    global currentPosition
+    start = list(currentPosition)
+    end = [start[0] + direction_vector[0] * cells, start[1] + direction_vector[1] * cells]
+    localiser.sync(start)
     rotate_to_direction(direction_vector)
-    if wall_detection():
-        print("Obstacle detected. Waiting...")
-        while wall_detection():
-            time.sleep(1)
-
-    print("Moving forward to:", next_loc)
-    move_forward()
-    time.sleep(4.75)
-    motor1_stop()
-    motor2_stop()
+    waiting_since = time.monotonic()
+    if not wait_for_clear([start[0] + direction_vector[0], start[1] + direction_vector[1]],
+                          should_stop):
+        return 0
+    waited = time.monotonic() - waiting_since
+    last = time.monotonic()
+
+    def crossed(done):
+        global currentPosition
+        nonlocal last, waited
+        previous = currentPosition
+        currentPosition = [start[0] + direction_vector[0] * done,
+                           start[1] + direction_vector[1] * done]
+        now = time.monotonic()
+        edge_model.observe(previous, currentPosition, now - last, waited)
+        last, waited = now, 0.0
+        CELLS.inc()
+        if on_cell:
+            on_cell()
+
+    position = None
+    if localiser.enabled:
+        position = lambda: localiser.along_track(start, direction_vector)
+    print("Moving forward to:", end)
+    with tracing.span("nav.drive", cell=end, cells=cells) as drive:
+        driven = engine.drive(cells, clear=lambda: not wall_detection(),
+                              should_stop=should_stop, on_cell=crossed, position=position)
+        if drive is not None and driven < cells:
+            drive.set(cell=list(currentPosition), stopped_early=True)
+    settle_on_estimate(direction_vector)
+    return driven
+
+def settle_on_estimate(direction_vector) -> None:
+    """
+    After a run: moves currentPosition to the cell the landmarks put the
+    robot in, and nudges onto the cell centre along the direction of travel.
+    """
     global currentPosition
-    currentPosition = next_loc
-
-    # Arrival logic
-    if currentPosition == next_position(location):
-        wall_direction = None
-        if currentPosition == [3, 1] or currentPosition == [0, 1]:
-            wall_direction = "UP"
-        elif currentPosition[1] == 0:
-            wall_direction = "LEFT"
-        elif currentPosition[1] == 2:
-            wall_direction = "RIGHT"
-
-        if wall_direction:
-            print("Adjusting to face wall:", wall_direction)
-            target_vector = {
-                "UP": (-1, 0), "RIGHT": (0, 1),
-                "DOWN": (1, 0), "LEFT": (0, -1)
-            }[wall_direction]
-            rotate_to_direction(target_vector)
-
-        # Verification with retries
-        print("Running image verification...")
-        for attempt in range(3):
-            detected = cap_anal()
-            if detected == location:
-                print("Image verification successful.")
+    estimate = localiser.estimate()
+    if estimate is None:
+        return
+    row, col, sigma = estimate
+    cell = [round(row), round(col)]
+    on_floor = 0 <= cell[0] < len(Location_matrix) and 0 <= cell[1] < len(Location_matrix[0])
+    if cell != currentPosition and on_floor and sigma < RELOCALISE_SIGMA:
+        print("Navigation: landmarks put the robot at", cell, "not", currentPosition)
+        RELOCALISED.inc()
+        currentPosition = cell
+    error = (row - currentPosition[0]) * direction_vector[0] + (col - currentPosition[1]) * direction_vector[1]
+    if abs(error) > CENTRE_TOLERANCE and sigma < abs(error) / 2:
+        engine.nudge(abs(error) * engine.calibration.cell_time, forward=error < 0)
+
+def arrive(location) -> bool:
+    """
+    Faces the exhibit's wall and checks with the camera that the robot is
+    at location, nudging back and forth between attempts.
+
+    Returns:
+        True if the camera confirmed the exhibit.
+    """
+    global last_verified, last_failure
+    last_verified = False
+    wall_direction = None
+    if currentPosition == [3, 1] or currentPosition == [0, 1]:
+        wall_direction = "UP"
+    elif currentPosition[1] == 0:
+        wall_direction = "LEFT"
+    elif currentPosition[1] == 2:
+        wall_direction = "RIGHT"
+
+    if wall_direction:
+        print("Adjusting to face wall:", wall_direction)
+        target_vector = {
+            "UP": (-1, 0), "RIGHT": (0, 1),
+            "DOWN": (1, 0), "LEFT": (0, -1)
+        }[wall_direction]
+        rotate_to_direction(target_vector)
+
+    # Verification with retries; each is lined up locally first if the index has
+    # a view of the exhibit, otherwise the robot nudges back and forth blind.
+    # Centring on the reference view's features already identifies the
+    # exhibit, so the vision model is only asked otherwise.
+    print("Running image verification...")
+    for attempt in range(3):
+        aligned = align_on_exhibit(location)
+        if aligned is None and attempt == 1:
+            engine.nudge(0.3, forward=False)
+        elif aligned is None and attempt == 2:
+            engine.nudge(0.6, forward=True)
+        if aligned == "identified":
+            detected = location
+        else:
+            with tracing.span("vision.verify", attempt=attempt + 1) as check:
+                detected = cap_anal()
+                if check is not None:
+                    check.set(matched=detected == location)
+        if detected == location:
+            VERIFY_MATCHED.inc()
+            ARRIVALS.labels(verified="yes").inc()
+            events.record("vision.check", exhibit=location, ok=True, attempts=attempt + 1)
+            print("Image verification successful.")
+            last_verified = True
+            return True
+        VERIFY_MISMATCHED.inc()
+        print(f"Attempt {attempt + 1}: Image not matched. Adjusting position.")
+
+    last_failure = FAILED_NOT_VERIFIED
+    ARRIVALS.labels(verified="no").inc()
+    events.record("vision.check", exhibit=location, ok=False, attempts=3, seen=detected)
+    print(f"WARNING: Expected '{location}' but image not confirmed after retries.")
+    return False
+
+def has_arrival_check(location) -> bool:
+    """
+    True if the camera can confirm location, i.e. it is an exhibit; there is
+    nothing to check at "initial".
+    """
+    return location in ARTWORKS
+
+def align_on_exhibit(location) -> str | None:
+    """
+    Lines the robot up with the exhibit's reference view using the local
+    camera: drives towards or away from it, and sidesteps along the wall,
+    until it is within ALIGN_TOLERANCE_CM.
+
+    Returns:
+        "identified" once centred on a match of the view's features,
+        "centred" once centred on the picture frame's outline, "lost" or
+        "gave_up" otherwise; None if the index has no view of the exhibit
+        or it is not in the frame.
+    """
+    if localiser.index.exhibit(location) is None:
+        return None
+    cm_time = engine.calibration.cell_time / engine.calibration.cell_size_cm
+    with tracing.span("vision.align") as span:
+        for step in range(ALIGN_STEPS):
+            try:
+                seen = locate_exhibit(localiser.index, location)
+            except (RuntimeError, ImportError) as e:
+                print(f"[ERROR] Navigation: exhibit alignment failed: {e}")
+                seen = None
+            if seen is None:
+                result = "unseen" if step == 0 else "lost"
                 break
-            print(f"Attempt {attempt + 1}: Image not matched. Adjusting position.")
+            offset, range_error = seen["offset_cm"], seen["range_error_cm"]
+            if abs(offset) <= ALIGN_TOLERANCE_CM and abs(range_error) <= ALIGN_TOLERANCE_CM:
+                result = "identified" if seen.get("by") == "features" else "centred"
+                break
+            print(f"Navigation: exhibit {offset:+.0f} cm to the side, {range_error:+.0f} cm too far")
+            if abs(range_error) > ALIGN_TOLERANCE_CM:
+                engine.nudge(abs(range_error) * cm_time, forward=range_error > 0)
+            if abs(offset) > ALIGN_TOLERANCE_CM:
+                sidestep(offset * cm_time)
+        else:
+            result = "gave_up"
+        if span is not None:
+            span.set(result=result, steps=step)
+    ALIGNMENTS.labels(result=result).inc()
+    if result == "unseen":
+        return None
+    return result
 
-            if attempt == 0:
-                move_backward()
-                time.sleep(0.3)
-            elif attempt == 1:
-                move_forward()
-                time.sleep(0.6)
+def sidestep(cruise_seconds: float) -> None:
+    """
+    Moves sideways (right if positive) and turns back to the original heading.
+    """
+    facing = currently_facing
+    side = directions[(directions.index(facing) + (1 if cruise_seconds > 0 else -1)) % 4]
+    rotate_to_direction(DIRECTION_VECTORS[side])
+    engine.nudge(abs(cruise_seconds), forward=True)
+    rotate_to_direction(DIRECTION_VECTORS[facing])
 
-            motor1_stop()
-            motor2_stop()
+def calculate_movement(next_loc, direction_vector, location, should_stop=None):
+    """
+    Drives a single cell, running the arrival check if it is the location's cell.
+    """
+    if drive_segment(direction_vector, 1, should_stop) == 0:
+        return False
+    if currentPosition == next_position(location) and has_arrival_check(location):
+        return arrive(location)
+    return True
 
+def segments(position, route) -> list[tuple[list[int], int]]:
+    """
+    A route split into straight runs: (unit direction vector, cells) each.
+    """
+    runs = []
+    for cell in route:
+        step = [cell[0] - position[0], cell[1] - position[1]]
+        if runs and runs[-1][0] == step:
+            runs[-1] = (step, runs[-1][1] + 1)
         else:
-            print(f"WARNING: Expected '{location}' but image not confirmed after retries.")
+            runs.append((step, 1))
+        position = cell
+    return runs
 
-def next_position(name):
-    for i, row in enumerate(Location_matrix):
-        for j, val in enumerate(row):
-            if val == name:
-                return [i, j]
-    return None
+def route_time(position, route) -> float:
+    """
+    Seconds of driving and turning left along a route.
+    """
+    seconds, previous = 0.0, None
+    for step, cells in segments(position, route):
+        seconds += engine.segment_time(cells)
+        if previous is not None:
+            seconds += engine.turn_time(directions.index(direction_of(step))
+                                        - directions.index(direction_of(previous)))
+        previous = step
+    return seconds
 
-def get_to_location(location):
-    global currentPosition
+def trip_eta(position, route) -> float:
+    """
+    Seconds until the robot stands verified at the end of a route: the first
+    turn, driving and turning by the motion timing, the obstacle waits learned
+    for these edges at this time of day, and the arrival check.
+    """
+    seconds = route_time(position, route) + arrival_check_time
+    if route:
+        first = [route[0][0] - position[0], route[0][1] - position[1]]
+        seconds += engine.turn_time(directions.index(direction_of(first)) - directions.index(currently_facing))
+    if edge_model.samples:
+        when = time.time()
+        for a, b in zip([position] + route, route):
+            seconds += edge_model.estimate(a, b, when)[1]
+    return seconds
+
+def direction_of(step) -> str:
+    return next(name for name, vector in DIRECTION_VECTORS.items() if list(vector) == list(step))
+
+def planned_route(start, target) -> list[list[int]]:
+    """
+    The route to drive: the default rows-then-columns route, unless the
+    learned edge costs say another is faster by LEARNED_ROUTE_MARGIN.
+    """
+    default = plan_route(start, target)
+    if not edge_model.samples:
+        return default
+    when = time.time()
+    cost = lambda a, b: edge_model.cost(a, b, when)
+    turn = lambda facing, heading: engine.turn_time(directions.index(heading)
+                                                    - directions.index(facing))
+    route, seconds = fastest_route(start, target, currently_facing, cost, turn)
+    default_seconds = route_seconds(start, default, currently_facing, cost, turn)
+    if route and seconds + LEARNED_ROUTE_MARGIN < default_seconds:
+        print(f"Navigation: learned route {route} ({seconds:.0f} s) instead of "
+              f"{default} ({default_seconds:.0f} s)")
+        return route
+    return default
+
+def get_to_location(location, on_progress=None, should_stop=None, gate=None) -> bool:
+    """
+    Drives to a named location along the planned route, each straight run of
+    cells as one continuous move.
+
+    Parameters:
+        location: The exhibit (or "initial") to drive to.
+        on_progress: Optional callback(cell, step, total_steps, eta) once the
+            route is planned (step 0) and after each cell; eta is trip_eta.
+        should_stop: Optional callable checked between cells; True abandons the trip.
+        gate: Optional fleet.reservations.ReservationClient. With it the route
+            comes from the reservation service and every step is granted first.
+
+    Returns:
+        True if the location was reached and, for an exhibit, verified.
+    """
+    global arrival_check_time, last_failure
     target = next_position(location)
     if not target:
         print("Target location not found:", location)
-        return
+        last_failure = FAILED_UNKNOWN_TARGET
+        return False
+    if gate is not None:
+        return follow_reserved_route(location, target, gate, on_progress, should_stop)
+
+    route = planned_route(currentPosition, target)  # cells still to drive
+    step_count = 0
 
+    def progressed():
+        nonlocal step_count, route
+        step_count += 1
+        if route and route[0] == currentPosition:
+            route = route[1:]
+        if on_progress:
+            on_progress(list(currentPosition), step_count, step_count + len(route),
+                        trip_eta(currentPosition, route))
+
+    if on_progress and route:
+        on_progress(list(currentPosition), 0, len(route), trip_eta(currentPosition, route))
+    while currentPosition != target:
+        if should_stop and should_stop():
+            print("Trip to", location, "cancelled at", currentPosition)
+            return False
+        if currentPosition in route:
+            route = route[route.index(currentPosition) + 1:]
+        elif not route or abs(route[0][0] - currentPosition[0]) + abs(route[0][1] - currentPosition[1]) != 1:
+            route = planned_route(currentPosition, target)  # landmarks moved the robot off the route
+        step, cells = segments(currentPosition, route)[0]
+        drive_segment(step, cells, should_stop, progressed)
+    if not has_arrival_check(location):
+        return True
+    # Also when no step was needed, e.g. retrying after a failed camera check.
+    started = time.monotonic()
+    reached = arrive(location)
+    arrival_check_time += ARRIVAL_ALPHA * (time.monotonic() - started - arrival_check_time)
+    return reached
+
+def follow_reserved_route(location, target, gate, on_progress=None, should_stop=None) -> bool:
+    """
+    Drives a route reserved with the fleet's reservation service, waiting
+    where the route says to and asking before every step, so robots sharing
+    an aisle take turns instead of meeting head-on.
+    """
+    route = []
+    step_count = 0
+    reached = False
     while currentPosition != target:
-        direction_vector = [target[0] - currentPosition[0], target[1] - currentPosition[1]]
-        step = [0, 0]
-        if direction_vector[0] != 0:
-            step[0] = int(direction_vector[0] / abs(direction_vector[0]))
-        elif direction_vector[1] != 0:
-            step[1] = int(direction_vector[1] / abs(direction_vector[1]))
-        next_step = [currentPosition[0] + step[0], currentPosition[1] + step[1]]
-        calculate_movement(next_step, step, location)
+        if should_stop and should_stop():
+            print("Trip to", location, "cancelled at", currentPosition)
+            return False
+        if not route:
+            route = gate.plan(currentPosition, target, currently_facing)
+            if not route:
+                print("No free route to", location, "yet, waiting")
+                route = []
+                time.sleep(gate.slot_time * 2)
+                continue
+        cell = route[0]
+        if cell == currentPosition:
+            route.pop(0)
+            time.sleep(gate.slot_time)  # planned wait for another robot to pass
+            continue
+        granted, new_route = gate.request_step(currentPosition, cell, currently_facing)
+        if new_route is not None:
+            route = new_route
+            continue
+        if not granted:
+            time.sleep(gate.slot_time)
+            continue
+        route.pop(0)
+        step = [cell[0] - currentPosition[0], cell[1] - currentPosition[1]]
+        reached = calculate_movement(cell, step, location, should_stop)
+        step_count += 1
+        if on_progress:
+            remaining = sum(1 for a, b in zip([currentPosition] + route, route) if a != b)
+            on_progress(list(currentPosition), step_count, step_count + remaining,
+                        remaining * engine.segment_time(1) + arrival_check_time)
+    if not step_count and has_arrival_check(location):
+        # Already there, e.g. retrying after a failed camera check: check again.
+        return arrive(location)
+    return reached
+
+def init_hardware() -> None:
+    """
+    Prepares the motors (pins low, PWM running). Call once before the first trip.
+    """
+    init_motors()
+
+def shutdown_hardware() -> None:
+    """
+    Stops the motors and releases their pins, e.g. before a restart.
+    """
+    stop_sensor()
+    shutdown_motors()
+
+def robot_state() -> dict:
+    return {"position": list(currentPosition), "facing": currently_facing}
+
+def arrival_verified() -> bool:
+    """
+    True if the camera confirmed the exhibit at the end of the last trip.
+    """
+    return last_verified is True
+
+def trip_failure() -> str:
+    """
+    Why the last trip failed, e.g. FAILED_UNKNOWN_TARGET or FAILED_NOT_VERIFIED.
+    """
+    return last_failure or "trip failed"
+
+TRAVEL_OK = 0
+TRAVEL_FAILED = 1
+TRAVEL_CANCELLED = 2
+# Reasons a trip failed (trip_failure); only an unverified arrival may go better on a retry.
+FAILED_UNKNOWN_TARGET = "unknown target"
+FAILED_NOT_VERIFIED = "arrival not verified"
+
+def travel(location, on_progress=None, should_stop=None, gate=None) -> int:
+    """
+    Drives to a named location with the ultrasonic sensor running.
+
+    Parameters:
+        location: The exhibit (or "initial") to drive to.
+        on_progress: Optional per-cell progress callback, see get_to_location.
+        should_stop: Optional cancellation check, see get_to_location.
+        gate: Optional reservation client, see get_to_location. The robot is
+            released (parked where it stopped) once the trip ends.
+
+    Returns:
+        TRAVEL_OK (0) when the location was reached and, for an exhibit,
+        verified, TRAVEL_CANCELLED if should_stop ended the trip, TRAVEL_FAILED
+        otherwise (see trip_failure).
+    """
+    global last_verified, last_failure
+    last_verified = None
+    last_failure = None
+    init_sensor()
+    localiser.start()
+    try:
+        reached = get_to_location(location, on_progress, should_stop, gate)
+    finally:
+        localiser.stop()
+        stop_sensor()
+        edge_model.save()
+        if gate is not None:
+            gate.release(currentPosition, currently_facing)
+    if reached and last_verified is not False:
+        return TRAVEL_OK
+    if should_stop and should_stop():
+        return TRAVEL_CANCELLED
+    return TRAVEL_FAILED
 
 # MQTT Setup
 def on_connect(client, userdata, flags, rc):
     print("Connected with result code", rc)
-    client.subscribe("movement")
+    client.subscribe(robot_topic(TOPIC_MOVEMENT), qos=1)
 
 def on_message(client, userdata, msg):
-    global currentPosition, currently_facing
-    location = msg.payload.decode()
-    print("Received target location:", location)
-    currentPosition = [3, 1]
-    currently_facing = "UP"
+    # The pose carries over between trips: the robot is wherever the last
+    # trip left it, not back at the entrance.
+    try:
+        request = decode(msg.payload)
+    except ValueError as e:
+        print("Ignoring malformed movement message:", e)
+        return
+    if request["type"] != "request":
+        return
+    location = request["target"]
+    print("Received target location:", location, "from", currentPosition, "facing", currently_facing)
     init_sensor()
+    localiser.start()
     try:
-        get_to_location(location)
+        with tracing.use(tracing.extract(request)), tracing.span("nav.trip", target=location):
+            get_to_location(location)
     finally:
+        localiser.stop()
         stop_sensor()
+        edge_model.save()
 
 def start_navigation():
+    init_hardware()
     client = mqtt.Client()
     client.on_connect = on_connect
     client.on_message = on_message
@@ -0,0 +1,138 @@
+"""
+Versioned JSON message schema for navigation over MQTT.
+
+Every message is a JSON object with a protocol version ``v``, a ``type`` and,
+for anything about a trip, the request ``id`` chosen by the requester. The id
+makes handling idempotent: a resent request with a known id is acknowledged
+again but never starts a second trip.
+
+Message types:
+    request   requester -> navigation   {"target", optional "priority": "normal" | "high",
+                                         optional "replace": bool}
+    cancel    requester -> navigation   {}
+    ack       navigation -> requester   {"status": "accepted" | "duplicate"}
+    progress  navigation -> requester   {"cell", "step", "total_steps", "eta"} (step 0 on departure;
+                                         eta: seconds until the arrival check is done)
+    done      navigation -> requester   {"target", "verified"}
+    failed    navigation -> requester   {"target", "reason", "retryable"} (retryable: a fresh
+                                         request may succeed, e.g. after an unverified arrival)
+    state     navigation -> anyone      {"robot_id", "position", "facing", "busy", "request_id",
+                                         "target", "queue", "queue_ids"} (retained)
+    assigned  dispatcher -> requester   {"robot_id", "targets", "estimate"}
+    plan      robot -> reservations     {"robot_id", "position", "facing", "goal"}
+    route     reservations -> robot     {"route": [[row, col], ...] or null, "retry_after"}
+    step      robot -> reservations     {"robot_id", "position", "cell"}
+    grant     reservations -> robot     {"granted", optional "route"}
+    release   robot -> reservations     {"robot_id", "position"}
+
+Several robots can share one broker. Each robot's navigation, status and state
+topics are then namespaced under ``robots/<robot_id>/`` (``ROBOT_ID`` from the
+environment), and tour requests go to the fleet dispatcher on
+``fleet/requests`` as a request with ``"targets"`` instead of ``"target"``.
+Robots sharing the floor reserve their routes on ``fleet/reservations`` and get
+replies on ``robots/<robot_id>/reservations``.
+Without a robot id the original global topics are used.
+
+Requests may carry ``"trace": {"trace_id", "span_id"}``, the
+span the sender was working in (telemetry/tracing.py), so a trip's spans join
+the trace of the tour leg that asked for it.
+"""
+
+import json
+import os
+import time
+import uuid
+
+PROTOCOL_VERSION = 1
+
+TOPIC_MOVEMENT = "movement"            # requests
+TOPIC_NAV_STATUS = "navigation/status"  # ack, progress, done, failed
+TOPIC_ROBOT_STATE = "robot/state"       # retained snapshot of the robot
+
+ROBOT_ID = os.getenv("ROBOT_ID") or None
+FLEET_PREFIX = "robots"
+TOPIC_FLEET_REQUESTS = "fleet/requests"        # tour requests for the dispatcher
+TOPIC_FLEET_ASSIGNMENTS = "fleet/assignments"  # which robot serves which request
+TOPIC_RESERVATIONS = "fleet/reservations"      # route and step reservations
+TOPIC_RESERVATION_REPLIES = "reservations"     # per robot, under robots/<id>/
+
+# At-least-once delivery; duplicates are absorbed by the request id.
+QOS = 1
+
+MESSAGE_TYPES = {"request", "cancel", "ack", "progress", "done", "failed", "state", "assigned",
+                 "plan", "route", "step", "grant", "release"}
+FINAL_TYPES = {"done", "failed"}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def robot_topic(base: str, robot_id: str | None = None) -> str:
+    """
+    The topic for one robot, e.g. ``robots/r2/movement``.
+
+    Parameters:
+        base: One of the per-robot topics (TOPIC_MOVEMENT, TOPIC_NAV_STATUS, TOPIC_ROBOT_STATE).
+        robot_id: Defaults to ROBOT_ID; with neither, the global topic is returned.
+    """
+    robot_id = robot_id or ROBOT_ID
+    return f"{FLEET_PREFIX}/{robot_id}/{base}" if robot_id else base
+
+
+def robot_id_from_topic(topic: str) -> str | None:
+    parts = topic.split("/")
+    if len(parts) > 2 and parts[0] == FLEET_PREFIX:
+        return parts[1]
+    return None
+
+
+def encode(msg_type: str, request_id: str | None = None, **fields) -> str:
+    """
+    Builds a protocol message.
+
+    Parameters:
+        msg_type: One of MESSAGE_TYPES.
+        request_id: The trip this message is about, if any.
+        fields: The type-specific payload fields.
+    """
+    if msg_type not in MESSAGE_TYPES:
+        raise ValueError(f"Unknown message type: {msg_type}")
+    message = {"v": PROTOCOL_VERSION, "type": msg_type, "ts": time.time()}
+    if request_id is not None:
+        message["id"] = request_id
+    message.update(fields)
+    return json.dumps(message)
+
+
+def decode(payload: bytes | str) -> dict:
+    """
+    Parses a protocol message.
+
+    A bare, non-JSON string (the original format) is treated as a request for
+    that target with a fresh id, so older senders keep working.
+
+    Raises:
+        ValueError: If the message is malformed or from an unsupported version.
+    """
+    text = payload.decode() if isinstance(payload, bytes) else payload
+    text = text.strip()
+    if not text.startswith("{"):
+        if not text:
+            raise ValueError("Empty message")
+        return {"v": PROTOCOL_VERSION, "type": "request", "id": new_request_id(),
+                "target": text, "ts": time.time()}
+
+    try:
+        message = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Malformed message: {e}") from e
+    if not isinstance(message, dict):
+        raise ValueError("Message must be a JSON object")
+    if message.get("v") != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported protocol version: {message.get('v')}")
+    if message.get("type") not in MESSAGE_TYPES:
+        raise ValueError(f"Unknown message type: {message.get('type')}")
+    if message["type"] == "request" and not (message.get("target") or message.get("targets")):
+        raise ValueError("Request without target")
+    return message
@@ -0,0 +1,283 @@
+"""
+Long-lived microphone capture with frame-level voice-activity detection.
+
+A single background thread keeps the microphone open for the whole session and
+classifies each 30 ms frame as speech or silence against a continuously updated
+noise floor. A ring buffer of recent frames is kept so the start of an utterance
+(the pre-roll) is never clipped, and utterances are endpointed as soon as the
+visitor has been quiet for a short hangover period.
+
+While the bot is talking the stream keeps listening behind an echo gate: the
+speech threshold is raised well above the bot's own playback level, a longer
+onset is required, and the noise floor is frozen so the loudspeaker does not
+inflate it.
+"""
+
+import math
+import queue
+import threading
+from array import array
+from collections import deque
+
+from runtime.lazy import lazy_import
+
+# Imported when the microphone is first opened, not with the voice bot.
+pyaudio = lazy_import("pyaudio")
+sr = lazy_import("speech_recognition")
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit mono
+FRAME_MS = 30
+MAX_UTTERANCE_SECONDS = 60.0  # longest listen() waits for an utterance to end without a phrase limit
+ENDPOINT_SLACK_SECONDS = 2.0  # on top of the phrase limit and trailing silence, for a busy capture thread
+
+
+def frame_energy(frame: bytes) -> float:
+    """
+    Root-mean-square energy of a frame of signed 16-bit samples.
+    """
+    samples = array("h", frame)
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class MicrophoneStream:
+    """
+    Keeps the microphone open and hands out endpointed utterances.
+
+    Parameters:
+        preroll_ms: Audio kept from before speech onset.
+        start_ms: Consecutive voiced audio needed to declare speech onset.
+        end_silence_ms: Trailing silence that ends an utterance.
+        threshold_ratio: How far above the noise floor a frame must be to count as speech.
+        min_energy: Absolute energy floor below which a frame is always silence.
+        noise_alpha: Smoothing factor for the running noise-floor estimate.
+        echo_ratio: Extra threshold multiplier while the echo gate is active.
+        barge_in_ms: Consecutive voiced audio needed to declare speech over playback.
+        device_index: PyAudio input device, or None for the default.
+    """
+
+    def __init__(self, preroll_ms: int = 300, start_ms: int = 90, end_silence_ms: int = 500,
+                 threshold_ratio: float = 3.0, min_energy: float = 150.0,
+                 noise_alpha: float = 0.05, echo_ratio: float = 4.0, barge_in_ms: int = 150,
+                 device_index: int | None = None):
+        self.frame_bytes = SAMPLE_RATE * FRAME_MS // 1000 * SAMPLE_WIDTH
+        self.start_frames = max(1, start_ms // FRAME_MS)
+        self.end_frames = max(1, end_silence_ms // FRAME_MS)
+        self.threshold_ratio = threshold_ratio
+        self.min_energy = min_energy
+        self.noise_alpha = noise_alpha
+        self.echo_ratio = echo_ratio
+        self.barge_in_frames = max(1, barge_in_ms // FRAME_MS)
+        self.device_index = device_index
+
+        self._preroll = deque(maxlen=max(1, preroll_ms // FRAME_MS))
+        self._noise_floor: float | None = None
+        self._voiced = 0
+        self._silent = 0
+        self._frames: list[bytes] = []
+        self._in_speech = False
+
+        self._lock = threading.Lock()
+        self._armed = False
+        self._keep_pending = False
+        self._echo_gate = False
+        self._limit_frames: int | None = None
+        self._speech_started = threading.Event()
+        self._utterances = queue.Queue()
+        self._listeners = []
+
+        self._audio = None
+        self._stream = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def noise_floor(self) -> float:
+        return self._noise_floor or 0.0
+
+    def set_echo_gate(self, active: bool) -> None:
+        """
+        Raises the speech threshold while the bot's own audio is playing.
+        """
+        with self._lock:
+            self._echo_gate = active
+
+    def capture_barge_in(self) -> None:
+        """
+        Keeps the utterance currently being spoken for the next listen() call,
+        even though nobody was listening when it started.
+        """
+        with self._lock:
+            self._armed = True
+            self._keep_pending = True
+
+    def end_utterance(self) -> None:
+        """
+        Endpoints the utterance being spoken now instead of waiting for the
+        trailing silence, e.g. once a partial result has said enough.
+        """
+        with self._lock:
+            ended = self._in_speech
+            if ended:
+                self._finish_utterance()
+        if ended and self._listeners:
+            self._notify([("end", None)])
+
+    def add_listener(self, callback) -> None:
+        """
+        Registers a callback for live speech, called from the capture thread as
+        callback(kind, data) with kind "start" (data is the pre-roll audio),
+        "frame" (one voiced or trailing frame) or "end" (data is None).
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, events: list) -> None:
+        for kind, data in events:
+            for callback in self._listeners:
+                try:
+                    callback(kind, data)
+                except Exception as e:
+                    print(f"Microphone: listener failed: {e}")
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, input=True,
+            frames_per_buffer=self.frame_bytes // SAMPLE_WIDTH,
+            input_device_index=self.device_index,
+        )
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        print("Microphone: capture thread started")
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._stream:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._audio:
+            self._audio.terminate()
+            self._audio = None
+
+    def listen(self, timeout: float | None = None,
+               phrase_time_limit: float | None = None) -> "sr.AudioData | None":
+        """
+        Waits for the next utterance.
+
+        Parameters:
+            timeout: Seconds to wait for speech to start, or None to wait forever.
+            phrase_time_limit: Longest utterance in seconds before it is cut off.
+
+        Returns:
+            The endpointed utterance, or None if nobody started speaking in
+            time or the utterance never ended (e.g. the capture thread stalled).
+        """
+        with self._lock:
+            if not self._keep_pending:
+                while not self._utterances.empty():
+                    self._utterances.get_nowait()
+            self._keep_pending = False
+            self._limit_frames = (int(phrase_time_limit * 1000) // FRAME_MS
+                                  if phrase_time_limit else None)
+            self._speech_started.clear()
+            if self._in_speech or not self._utterances.empty():
+                # The visitor started talking before we were asked to listen.
+                self._speech_started.set()
+            self._armed = True
+
+        try:
+            if not self._speech_started.wait(timeout):
+                return None
+            longest = (phrase_time_limit or MAX_UTTERANCE_SECONDS) + self.end_frames * FRAME_MS / 1000
+            try:
+                data = self._utterances.get(timeout=longest + ENDPOINT_SLACK_SECONDS)
+            except queue.Empty:
+                print("Microphone: utterance did not end in time, treating it as no speech")
+                return None
+        finally:
+            with self._lock:
+                self._armed = False
+        return sr.AudioData(data, SAMPLE_RATE, SAMPLE_WIDTH)
+
+    # ------------------------------------------------------------------
+    # Capture thread
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        while self._running:
+            try:
+                frame = self._stream.read(self.frame_bytes // SAMPLE_WIDTH,
+                                          exception_on_overflow=False)
+            except OSError as e:
+                print(f"Microphone: read failed: {e}")
+                continue
+            self.process_frame(frame)
+
+    def _update_noise_floor(self, energy: float) -> None:
+        if self._noise_floor is None:
+            self._noise_floor = energy
+        else:
+            self._noise_floor += self.noise_alpha * (energy - self._noise_floor)
+
+    def is_speech(self, energy: float) -> bool:
+        ratio = self.threshold_ratio * (self.echo_ratio if self._echo_gate else 1.0)
+        return energy > max(self.min_energy, self.noise_floor * ratio)
+
+    def process_frame(self, frame: bytes) -> None:
+        """
+        Runs one frame through the VAD. Called from the capture thread.
+        """
+        energy = frame_energy(frame)
+        voiced = self.is_speech(energy)
+        events = []
+        with self._lock:
+            self._advance(frame, energy, voiced, events)
+        if events and self._listeners:
+            self._notify(events)
+
+    def _advance(self, frame: bytes, energy: float, voiced: bool, events: list) -> None:
+        if not self._in_speech:
+            self._preroll.append(frame)
+            if voiced:
+                self._voiced += 1
+            else:
+                self._voiced = 0
+                if not self._echo_gate:
+                    self._update_noise_floor(energy)
+            onset = self.barge_in_frames if self._echo_gate else self.start_frames
+            if self._voiced >= onset:
+                self._in_speech = True
+                self._silent = 0
+                self._frames = list(self._preroll)
+                self._preroll.clear()
+                events.append(("start", b"".join(self._frames)))
+                if self._armed:
+                    self._speech_started.set()
+            return
+
+        self._frames.append(frame)
+        events.append(("frame", frame))
+        self._silent = 0 if voiced else self._silent + 1
+        too_long = self._limit_frames is not None and len(self._frames) >= self._limit_frames
+        if self._silent >= self.end_frames or too_long:
+            self._finish_utterance()
+            events.append(("end", None))
+
+    def _finish_utterance(self) -> None:
+        # Trim most of the trailing silence, keeping a short tail for the recogniser.
+        keep = len(self._frames) - max(0, self._silent - 3)
+        data = b"".join(self._frames[:keep])
+        self._frames = []
+        self._in_speech = False
+        self._voiced = 0
+        self._silent = 0
+        if self._armed:
+            self._utterances.put(data)
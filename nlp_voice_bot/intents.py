@@ -0,0 +1,43 @@
+"""
+Keyword-based intent helpers shared by the voice bot and the tour state machine.
+
+Keywords match whole words or phrases, so "end" is not found in "recommend"
+nor "no" in "know".
+"""
+
+import re
+
+YES_WORDS  = {"yes", "sure", "okay", "sounds good", "yep", "yeah", "alright", "why not"}
+NO_WORDS   = {"no", "nope", "another", "different", "change", "don't"}
+MOVE_WORDS = {
+    "move on", "next", "continue", "let's go", "go on",
+    "no questions", "no question"
+}
+END_WORDS  = {"done", "stop", "that's all", "end", "quit", "exit"}
+UNSURE_WORDS = {"don't know", "not sure", "idk"}
+
+def _contains(text: str, word_set: set[str]) -> bool:
+    t = text.lower()
+    return any(re.search(rf"\b{re.escape(w)}\b", t) for w in word_set)
+
+def wants_yes(text: str | None) -> bool:
+    return bool(text) and _contains(text, YES_WORDS)
+
+def wants_no(text: str | None) -> bool:
+    return bool(text) and _contains(text, NO_WORDS)
+
+def wants_move_on(text: str | None) -> bool:
+    return bool(text) and (_contains(text, MOVE_WORDS) or wants_yes(text))
+
+def wants_to_end(text: str | None) -> bool:
+    return bool(text) and _contains(text, END_WORDS)
+
+def is_unsure(text: str | None) -> bool:
+    return not text or _contains(text, UNSURE_WORDS)
+
+def ends_turn_early(text: str | None) -> bool:
+    """
+    True if a partial utterance already asks to move on or to end the tour.
+    A yes alone does not count: a question often follows it.
+    """
+    return bool(text) and (_contains(text, MOVE_WORDS) or _contains(text, END_WORDS))
@@ -0,0 +1,175 @@
+"""
+Bounded conversation memory for a visitor's questions.
+
+Follow-up questions ("what about his other paintings?") need the earlier
+turns, but sending the whole tour's history would make every answer slower
+and dearer as the tour goes on. A ConversationMemory keeps the last
+VERBATIM_TURNS question/answer pairs word for word. Older pairs are folded
+into a rolling summary by a background LLM call, so answering never waits
+for it. The context sent with a question (summary plus recent turns) is held
+under MEMORY_TOKENS, counted with a local tokenizer estimate.
+"""
+
+import asyncio
+import math
+import os
+import re
+import threading
+from typing import Callable
+
+from nlp_voice_bot.prompts import memory_messages
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+VERBATIM_TURNS = int(os.getenv("MEMORY_TURNS", "3"))
+MEMORY_TOKENS = int(os.getenv("MEMORY_TOKENS", "500"))  # summary plus recent turns
+SUMMARY_TOKENS = 150  # longest rolling summary kept
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Tokens in text: exact with tiktoken when it is installed, otherwise about
+    one per four letters of each word and one per punctuation mark.
+    """
+    global _encoding
+    if tiktoken is not None:
+        try:
+            if _encoding is None:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            return len(_encoding.encode(text))
+        except Exception:
+            pass  # the encoding could not be loaded; estimate instead
+    return sum(math.ceil(len(piece) / 4) for piece in _WORDS.findall(text))
+
+
+def clip_tokens(text: str, limit: int) -> str:
+    """
+    text cut at a word boundary to about limit tokens.
+    """
+    if count_tokens(text) <= limit:
+        return text
+    words = text.split()
+    while len(words) > 1 and count_tokens(" ".join(words)) > limit:
+        words = words[:len(words) * 9 // 10]
+    return " ".join(words) + " ..."
+
+
+class Turn:
+    def __init__(self, exhibit: str, question: str, answer: str):
+        self.exhibit = exhibit
+        self.question = question
+        self.answer = answer
+        self.tokens = count_tokens(question) + count_tokens(answer)
+
+
+class ConversationMemory:
+    """
+    One visitor's questions and answers, summary first.
+
+    Parameters:
+        summarise: Sends chat messages and returns the reply. It may be a
+            blocking callable, run on a thread, or a coroutine function, run
+            on the caller's event loop.
+        turns: Question/answer pairs kept word for word.
+        budget: Tokens of context sent with each question.
+    """
+
+    def __init__(self, summarise: Callable[[list[dict]], str], turns: int = VERBATIM_TURNS,
+                 budget: int = MEMORY_TOKENS):
+        self._summarise = summarise
+        self.max_turns = turns
+        self.budget = budget
+        self.summary = ""
+        self.recent: list[Turn] = []
+        self._folding: list[Turn] = []  # older turns waiting to join the summary
+        self._busy = False
+        self._task: asyncio.Future | None = None
+        self._lock = threading.Lock()
+
+    def context(self) -> tuple[str, list[tuple[str, str, str]]]:
+        """
+        The summary and the newest (exhibit, question, answer) turns that fit
+        in the budget with it, for prompts.answer_messages. Turns still being
+        folded into the summary are included while they fit.
+        """
+        with self._lock:
+            summary = self.summary
+            turns = self._folding + self.recent
+        spent = count_tokens(summary)
+        kept = []
+        for turn in reversed(turns):
+            if spent + turn.tokens > self.budget:
+                break
+            kept.append((turn.exhibit, turn.question, turn.answer))
+            spent += turn.tokens
+        return summary, kept[::-1]
+
+    def add(self, exhibit: str, question: str, answer: str) -> None:
+        """
+        Remembers a turn, and starts folding older ones into the summary.
+        """
+        with self._lock:
+            self.recent.append(Turn(exhibit, question, answer))
+            while len(self.recent) > self.max_turns or (
+                    len(self.recent) > 1 and sum(t.tokens for t in self.recent) > self.budget):
+                self._folding.append(self.recent.pop(0))
+            start = self._folding and not self._busy
+            if start:
+                self._busy = True
+        if start:
+            self._start_fold()
+
+    def _start_fold(self) -> None:
+        if asyncio.iscoroutinefunction(self._summarise):
+            self._task = asyncio.ensure_future(self._fold_async())
+        else:
+            threading.Thread(target=self._fold, name="memory-fold", daemon=True).start()
+
+    def _batch(self) -> tuple[list[Turn], list[dict]]:
+        with self._lock:
+            batch = list(self._folding)
+            return batch, memory_messages(self.summary, [(t.exhibit, t.question, t.answer) for t in batch])
+
+    def _fold(self) -> None:
+        while True:
+            batch, messages = self._batch()
+            try:
+                summary = self._summarise(messages)
+            except Exception as e:
+                print(f"Memory: summarising failed, keeping the turns brief instead: {e}")
+                summary = None
+            if not self._folded(batch, summary):
+                return
+
+    async def _fold_async(self) -> None:
+        while True:
+            batch, messages = self._batch()
+            try:
+                summary = await self._summarise(messages)
+            except Exception as e:
+                print(f"Memory: summarising failed, keeping the turns brief instead: {e}")
+                summary = None
+            if not self._folded(batch, summary):
+                return
+
+    def _folded(self, batch: list[Turn], summary: str | None) -> bool:
+        """
+        Replaces the summary. Without one, the folded turns' questions are
+        kept instead.
+
+        Returns:
+            True if more turns arrived to fold meanwhile.
+        """
+        if summary is None:
+            summary = " ".join([self.summary] + [f"The visitor asked: {t.question}" for t in batch])
+        with self._lock:
+            self.summary = clip_tokens(summary.strip(), SUMMARY_TOKENS)
+            del self._folding[:len(batch)]
+            self._busy = bool(self._folding)
+            return self._busy
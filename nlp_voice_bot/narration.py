@@ -0,0 +1,130 @@
+"""
+What the bot says while the robot drives, timed by the trip's estimated arrival.
+
+Navigation reports an ETA when it sets off and after every cell (the
+``progress`` messages; see navigation.trip_eta). An ArrivalEstimate keeps
+the latest one and counts it down between messages. A SpeechTimer learns how
+long the bot takes to say a line, from every line it has said.
+
+With both, the tour (tour.py) plans the trip's speech. Short transit lines
+fill the time until the exhibit summary has to start. The summary then starts
+so that it ends NARRATION_MARGIN seconds before the robot has arrived. Every
+line is fixed text, so the content pack (content/pack.py) renders it ahead
+of time.
+"""
+
+import re
+import threading
+import time
+
+SPEECH_SECONDS_PER_WORD = 0.3  # gTTS at ffplay's 1.3x tempo, synthesis included
+SPEECH_ALPHA = 0.1             # weight of the latest line in the learned rate
+MIN_TIMED_SECONDS = 1.0        # shorter lines were skipped or text only and teach nothing
+NARRATION_MARGIN = 1.5         # seconds the summary should end before the arrival
+NARRATION_GAP = 1.0            # seconds a transit line leaves spare, so it cannot make the summary late
+
+# Said in this order, each at most once per tour, while there is time to spare.
+TRANSIT_NARRATION = [
+    "While we walk, have a look at the other works we pass along the way.",
+    "I find my way around using markers on the walls, so I always know where we are.",
+    "If anything catches your eye on the way, just ask me about it when we get there.",
+    "The museum holds paintings and sculptures from several centuries, so there is plenty to see.",
+    "Photos are welcome, but please keep the flash off near the paintings.",
+    "Thanks for your patience, we're making good progress.",
+]
+
+_WORDS = re.compile(r"\S+")
+
+
+class SpeechTimer:
+    """
+    Seconds the bot takes to say a line, learned from the lines it has said.
+    Shared by every tour in the process.
+    """
+
+    def __init__(self, seconds_per_word: float = SPEECH_SECONDS_PER_WORD):
+        self.seconds_per_word = seconds_per_word
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def duration(self, text: str) -> float:
+        return len(_WORDS.findall(text)) * self.seconds_per_word
+
+    def observe(self, text: str, seconds: float) -> None:
+        """
+        Learns from one line that was said to the end.
+        """
+        words = len(_WORDS.findall(text))
+        if not words or seconds < MIN_TIMED_SECONDS:
+            return
+        with self._lock:
+            alpha = max(SPEECH_ALPHA, 1.0 / (self.lines + 1))
+            self.seconds_per_word += alpha * (seconds / words - self.seconds_per_word)
+            self.lines += 1
+
+
+class ArrivalEstimate:
+    """
+    The latest ETA from navigation's progress messages, counted down between them.
+    """
+
+    def __init__(self):
+        self._latest: tuple[float, float] | None = None  # (eta, when received)
+        self.first: float | None = None  # the estimate on departure
+        self._first_at = 0.0
+
+    def update(self, message: dict) -> None:
+        eta = message.get("eta")
+        if not isinstance(eta, (int, float)):
+            return
+        self._latest = (float(eta), time.monotonic())
+        if self.first is None:
+            self.first, self._first_at = self._latest
+
+    def remaining(self) -> float | None:
+        """
+        Seconds until arrival; None before navigation has sent an estimate.
+        """
+        latest = self._latest
+        if latest is None:
+            return None
+        eta, received = latest
+        return max(0.0, eta - (time.monotonic() - received))
+
+    def late(self) -> float | None:
+        """
+        Seconds the trip has taken beyond the estimate on departure (negative:
+        sooner); call on arrival.
+        """
+        if self.first is None:
+            return None
+        return time.monotonic() - self._first_at - self.first
+
+
+def next_line(remaining: float, summary: str | None, timer: SpeechTimer,
+              said: set[str]) -> tuple[str | None, float]:
+    """
+    What to say next on the way, with remaining seconds to the arrival.
+
+    Parameters:
+        summary: The exhibit summary, or None while it is being prepared.
+        said: Transit lines already said on this tour.
+
+    Returns:
+        (text, 0) to say text now, the summary once it is due, or
+        (None, seconds) to stay quiet for that long and then plan again
+        (seconds is 0 when nothing can be said until the summary is ready).
+    """
+    slack = remaining - NARRATION_MARGIN
+    if summary is not None:
+        slack -= timer.duration(summary)
+        if slack <= 0:
+            return summary, 0.0
+    for line in TRANSIT_NARRATION:
+        if line not in said and timer.duration(line) + NARRATION_GAP <= slack:
+            return line, 0.0
+    return None, max(slack, 0.0)
+
+
+# Process-wide timer used by the tours.
+speech_timer = SpeechTimer()
@@ -0,0 +1,69 @@
+"""
+Cancellable audio playback for the voice bot.
+"""
+
+import subprocess
+import threading
+
+FFPLAY_ARGS = ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet"]
+
+
+class SpeechPlayer:
+    """
+    Plays audio files through ffplay in a way another thread can interrupt.
+    """
+
+    def __init__(self):
+        self._process: subprocess.Popen | None = None
+        self._interrupted = False
+        self._lock = threading.Lock()
+
+    def play(self, path: str, filters: str | None = None) -> bool:
+        """
+        Plays a file to completion unless stop() is called first.
+
+        Parameters:
+            path: The audio file to play.
+            filters: Optional ffplay audio filter graph, e.g. "atempo=1.3".
+
+        Returns:
+            True if playback finished, False if it was interrupted.
+        """
+        cmd = list(FFPLAY_ARGS)
+        if filters:
+            cmd += ["-af", filters]
+        cmd.append(path)
+
+        with self._lock:
+            self._interrupted = False
+            self._process = subprocess.Popen(cmd)
+            process = self._process
+        try:
+            returncode = process.wait()
+        finally:
+            with self._lock:
+                self._process = None
+
+        if self._interrupted:
+            return False
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+        return True
+
+    def is_playing(self) -> bool:
+        with self._lock:
+            return self._process is not None and self._process.poll() is None
+
+    def stop(self) -> bool:
+        """
+        Interrupts the current playback.
+
+        Returns:
+            True if something was playing and has been stopped.
+        """
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                return False
+            self._interrupted = True
+            self._process.terminate()
+        return True
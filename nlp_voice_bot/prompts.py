@@ -0,0 +1,83 @@
+"""
+The exhibits and the chat prompts the voice bot sends about them, shared by
+the single-visitor bot (voicebot.py) and the session manager (sessions.py).
+"""
+
+CHAT_MODEL = "gpt-3.5-turbo"
+SUMMARY_TTL = 24 * 3600.0  # seconds an exhibit summary is reused
+PREFETCH_SUMMARIES = 2     # most popular exhibits whose summaries are prepared before they are asked for
+
+EXHIBITS = [
+    {"keyword": "scream",       "location": "The Scream by Edvard Munch"},
+    {"keyword": "starry night", "location": "Starry Night by Vincent van Gogh"},
+    {"keyword": "sunflower",    "location": "Sunflowers by Vincent van Gogh"},
+    {"keyword": "liberty",      "location": "Liberty Leading the People by Eugène Delacroix"},
+    {"keyword": "mona lisa",    "location": "Mona Lisa by Leonardo da Vinci"},
+    {"keyword": "egyptian",     "location": "Ancient Egyptian Statue"},
+    {"keyword": "plushy dog",   "location": "Plushy Dog Sculpture"},
+]
+
+# Utility: map keyword to full location if keyword provided
+def to_location(name: str) -> str:
+    return next((e["location"] for e in EXHIBITS if e["keyword"] == name.lower()), name)
+
+def summary_messages(name: str) -> list[dict]:
+    long_name = to_location(name)
+    return [{"role": "system",
+             "content": f"You are a museum guide. Provide a warm, engaging 2-3 sentence summary about the exhibit '{long_name}'."}]
+
+def answer_messages(exhibit: str, question: str, summary: str = "", turns=()) -> list[dict]:
+    """
+    The question, after the conversation so far: a summary of the older
+    part and (exhibit, question, answer) turns word for word (memory.py).
+    """
+    long_exhibit = to_location(exhibit)
+    system = f"You are a museum guide at '{long_exhibit}'. Answer visitor questions clearly but concisely."
+    if summary:
+        system += f" Earlier in the tour: {summary}"
+    messages = [{"role": "system", "content": system}]
+    for turn_exhibit, turn_question, answer in turns:
+        if turn_exhibit != exhibit:
+            turn_question = f"(At the {to_location(turn_exhibit)}) {turn_question}"
+        messages.append({"role": "user", "content": turn_question})
+        messages.append({"role": "assistant", "content": answer})
+    messages.append({"role": "user", "content": question})
+    return messages
+
+def memory_messages(summary: str, turns) -> list[dict]:
+    """Folds (exhibit, question, answer) turns into the rolling summary"""
+    transcript = "\n".join(f"At the {to_location(exhibit)}, the visitor asked: {question}\nGuide: {answer}"
+                           for exhibit, question, answer in turns)
+    return [
+        {"role": "system",
+         "content": "Condense this museum tour conversation into at most three sentences. Keep the exhibits, "
+                    "artists, names and facts a follow-up question might refer to."},
+        {"role": "user", "content": f"Summary so far: {summary or 'none'}\n\n{transcript}"}
+    ]
+
+def choose_messages(text: str) -> list[dict]:
+    exhibit_list = ", ".join(f"{e['keyword']} ({e['location']})" for e in EXHIBITS)
+    return [
+        {"role": "system",
+         "content": f"Choose up to 3 exhibit LOCATIONS matching the user's interest from: {exhibit_list}. Return a comma-separated list or 'none'."},
+        {"role": "user", "content": text}
+    ]
+
+# Said instead when the daily OpenAI budget is spent (runtime/openai_limiter.py).
+def local_summary(name: str) -> str:
+    return f"Here we are at the {to_location(name)}."
+
+LOCAL_ANSWER = ("I'm afraid I can't look that up right now, "
+                "but the label next to the exhibit has more about it.")
+
+def keyword_choice(text: str) -> list[str]:
+    """Exhibits named in the request, without asking the LLM"""
+    lower_text = text.lower()
+    return [e["location"] for e in EXHIBITS if e["keyword"] in lower_text][:3]
+
+def parse_choice(reply: str) -> list[str]:
+    if reply.lower() == "none":
+        return []
+    raw = [loc.strip() for loc in reply.split(",")]
+    # Convert any keywords to locations
+    return [to_location(x) for x in raw]
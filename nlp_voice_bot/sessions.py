@@ -0,0 +1,491 @@
+"""
+Many visitors' tours at once, served from one host.
+
+Each kiosk or robot conversation is a TourSession: the usual tour state
+machine (tour.py) whose speech, listening and LLM calls are coroutines on one
+shared asyncio loop, so an idle session holds no thread and only a few
+kilobytes. Sessions share three services:
+
+- the LLMGateway runs every chat completion on a bounded pool and hands free
+  slots out round robin across sessions, so one talkative visitor cannot
+  starve the others;
+- the TTSCache renders each distinct line once (prompts and exhibit summaries
+  repeat across visitors) and keeps the audio in a size-bounded LRU;
+- the ExhibitKnowledge generates each exhibit's summary once and reuses it for
+  every session until it expires, and answers questions and exhibit choices
+  through the gateway.
+
+The single-visitor bot (voicebot.py) runs its tour on the same three
+services, so both share one implementation of the summary cache, answers
+with memory, exhibit choice and speech rendering.
+
+Summaries, audio and exhibit tags come from the offline content pack
+(content/pack.py) first when one is built.
+
+A session talks to its visitor through a channel: any object with
+``async play(text, audio) -> bool`` (False if the visitor talked over it;
+audio is None when synthesis failed) and ``async listen() -> str | None``.
+Trips go through ``attach_robot`` (one robot per session, over the navigation
+protocol) or any send_movement callable whose caller reports back with
+``session.tour.notify_arrived`` / ``notify_failed``. A session keeps only the
+last SESSION_TRANSCRIPT lines of its conversation.
+
+To see how many sessions one box sustains:
+    python simulation/session_load.py --sessions 10,50,100,200
+"""
+
+import asyncio
+import collections
+import functools
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from navigation.client import NavigationClient
+from nlp_voice_bot.prompts import (
+    CHAT_MODEL, EXHIBITS, LOCAL_ANSWER, PREFETCH_SUMMARIES, SUMMARY_TTL, to_location,
+    local_summary, summary_messages, answer_messages, choose_messages, keyword_choice,
+    parse_choice,
+)
+from nlp_voice_bot.memory import ConversationMemory
+from nlp_voice_bot.tour import TourStateMachine
+from runtime import openai_limiter
+from runtime.openai_limiter import NORMAL, CHAT
+from telemetry import events, latency, metrics
+from content import pack as content_pack
+
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "64"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "8"))
+TTS_CACHE_BYTES = int(os.getenv("TTS_CACHE_MB", "64")) * 1024 * 1024
+SESSION_TRANSCRIPT = 40    # lines of conversation kept per session
+
+SESSIONS_ACTIVE = metrics.gauge("museum_sessions_active", "Tour sessions running")
+SESSIONS_WAITING = metrics.gauge("museum_sessions_waiting", "Tour sessions waiting for a free place")
+LLM_QUEUE_SECONDS = metrics.histogram("museum_llm_queue_seconds",
+                                      "Wait for a free LLM gateway slot",
+                                      buckets=metrics.FAST_BUCKETS)
+TTS_LOOKUPS = metrics.counter("museum_tts_cache_total",
+                              "Speech lines by whether the TTS cache had them", ["result"])
+TTS_HIT = TTS_LOOKUPS.labels(result="hit")
+TTS_SHARED = TTS_LOOKUPS.labels(result="shared")  # joined a render already in flight
+TTS_MISS = TTS_LOOKUPS.labels(result="miss")
+TTS_PACKED = TTS_LOOKUPS.labels(result="pack")  # pre-rendered in the content pack
+
+
+class FairSlots:
+    """
+    At most ``limit`` concurrent holders. Waiters are served round robin by
+    key (one per session in turn), and in order within a key.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.busy = 0
+        self._waiting: collections.OrderedDict[str, collections.deque] = collections.OrderedDict()
+
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    async def acquire(self, key: str) -> None:
+        if self.busy < self.limit and not self._waiting:
+            self.busy += 1
+            return
+        granted = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(key, collections.deque()).append(granted)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                self.release()  # handed a slot just as the waiter was cancelled
+            raise
+
+    def release(self) -> None:
+        """
+        Passes the slot to the next key in turn, or frees it.
+        """
+        while self._waiting:
+            key, queue = next(iter(self._waiting.items()))
+            granted = queue.popleft()
+            if queue:
+                self._waiting.move_to_end(key)
+            else:
+                del self._waiting[key]
+            if not granted.done():  # skip waiters that were cancelled
+                granted.set_result(None)
+                return
+        self.busy -= 1
+
+
+class LLMGateway:
+    """
+    Chat completions for every session, at most ``concurrency`` in flight.
+    Each call also goes through the OpenAI rate limiter and budget shared
+    with the camera check (runtime/openai_limiter.py).
+
+    Parameters:
+        client: Returns the OpenAI (or compatible) client, e.g. voicebot.get_client.
+        concurrency: Calls in flight at once; the rest queue fairly by session.
+        limiter: The rate limiter; openai_limiter.limiter by default.
+    """
+
+    def __init__(self, client: Callable[[], object], concurrency: int = LLM_CONCURRENCY,
+                 model: str = CHAT_MODEL, limiter: openai_limiter.OpenAILimiter | None = None):
+        self.client = client
+        self.model = model
+        self.limiter = limiter
+        self.slots = FairSlots(concurrency)
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix="llm")
+
+    async def complete(self, session_id: str, messages: list[dict], stage: str = "llm",
+                       priority: int = NORMAL, fallback: Callable[[], str] | None = None) -> str:
+        """
+        The model's reply to messages, timed as a latency stage. The stage is
+        also the caller the limiter books the usage to.
+        """
+        queued = time.perf_counter()
+        await self.slots.acquire(session_id)
+        try:
+            LLM_QUEUE_SECONDS.observe(time.perf_counter() - queued)
+            with latency.span(stage):
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._executor, functools.partial(self._create, messages, stage, priority, fallback))
+        finally:
+            self.slots.release()
+
+    def _create(self, messages: list[dict], caller: str, priority: int,
+                fallback: Callable[[], str] | None) -> str:
+        limiter = self.limiter or openai_limiter.limiter
+        return limiter.complete(caller, priority, self.client().chat.completions.create,
+                                fallback=fallback, model=self.model, messages=messages)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class TTSCache:
+    """
+    MP3 audio per line of text, rendered once and shared by every session.
+    Concurrent requests for the same line wait for one render.
+
+    Parameters:
+        tts: Returns a gTTS-compatible class, e.g. voicebot.get_tts.
+        max_bytes: Audio kept; the least recently spoken lines go first.
+    """
+
+    def __init__(self, tts: Callable[[], type], max_bytes: int = TTS_CACHE_BYTES,
+                 concurrency: int = TTS_CONCURRENCY, lang: str = "en"):
+        self.tts = tts
+        self.max_bytes = max_bytes
+        self.lang = lang
+        self.bytes = 0
+        self._audio: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        self._rendering: dict[str, asyncio.Future] = {}
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix="tts")
+
+    def __len__(self) -> int:
+        return len(self._audio)
+
+    async def render(self, text: str) -> bytes:
+        pack = content_pack.get_pack()
+        packed = pack.audio(text) if pack is not None else None
+        if packed is not None:
+            TTS_PACKED.inc()
+            return bytes(packed)
+        audio = self._audio.get(text)
+        if audio is not None:
+            self._audio.move_to_end(text)
+            TTS_HIT.inc()
+            return audio
+        task = self._rendering.get(text)
+        if task is None:
+            TTS_MISS.inc()
+            task = self._rendering[text] = asyncio.ensure_future(self._render(text))
+        else:
+            TTS_SHARED.inc()
+        # One visitor walking away must not cancel the render for the others.
+        return await asyncio.shield(task)
+
+    async def _render(self, text: str) -> bytes:
+        try:
+            with latency.span("tts"):
+                audio = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._synthesise, text)
+        finally:
+            del self._rendering[text]
+        self._store(text, audio)
+        return audio
+
+    def _synthesise(self, text: str) -> bytes:
+        buffer = io.BytesIO()
+        self.tts()(text=text, lang=self.lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+    def _store(self, text: str, audio: bytes) -> None:
+        if len(audio) > self.max_bytes:
+            return
+        self._audio[text] = audio
+        self.bytes += len(audio)
+        while self.bytes > self.max_bytes:
+            _, dropped = self._audio.popitem(last=False)
+            self.bytes -= len(dropped)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class ExhibitKnowledge:
+    """
+    What the guide knows and says about the exhibits, over the gateway.
+    Summaries are generated once and shared by every session for ``ttl``
+    seconds; a fallback summary is not kept, so the next visitor tries again.
+    """
+
+    def __init__(self, gateway: LLMGateway, ttl: float = SUMMARY_TTL):
+        self.gateway = gateway
+        self.ttl = ttl
+        self._summaries: dict[str, tuple[float, str]] = {}
+        self._pending: dict[str, asyncio.Future] = {}
+
+    async def summary(self, location: str, session_id: str = "knowledge") -> str:
+        location = to_location(location)
+        pack = content_pack.get_pack()
+        text = pack.summary(location) if pack is not None else None
+        if text:
+            return text
+        cached = self._summaries.get(location)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        task = self._pending.get(location)
+        if task is None:
+            task = self._pending[location] = asyncio.ensure_future(self._generate(location, session_id))
+        return await asyncio.shield(task)
+
+    async def prefetch(self, locations: list[str] | None = None) -> None:
+        """
+        Prepares summaries ahead of the first visitor asking for them; the
+        PREFETCH_SUMMARIES most popular exhibits by default.
+        """
+        if locations is None:
+            locations = list(events.popularity())[:PREFETCH_SUMMARIES]
+        for location in locations:
+            try:
+                await self.summary(location)
+            except Exception as e:
+                print(f"Sessions: could not prefetch the summary of {location}: {e}")
+
+    async def _generate(self, location: str, session_id: str) -> str:
+        fallback = local_summary(location)
+        try:
+            text = await self.gateway.complete(session_id, summary_messages(location), "llm.summary",
+                                               fallback=lambda: fallback)
+        finally:
+            del self._pending[location]
+        if text != fallback:
+            self._summaries[location] = (time.monotonic(), text)
+        return text
+
+    def memory(self, session_id: str) -> ConversationMemory:
+        """
+        A new visitor's conversation memory, summarised through the gateway.
+        """
+        async def summarise(messages: list[dict]) -> str:
+            return await self.gateway.complete(session_id, messages, "llm.memory", CHAT)
+
+        return ConversationMemory(summarise)
+
+    async def answer(self, exhibit: str, question: str, memory: ConversationMemory,
+                     session_id: str) -> str:
+        """
+        The answer to a visitor's question, after the conversation in memory,
+        which then keeps it.
+        """
+        summary, turns = memory.context()
+        answer = await self.gateway.complete(session_id, answer_messages(exhibit, question, summary, turns),
+                                             "llm.answer", CHAT, lambda: LOCAL_ANSWER)
+        if answer != LOCAL_ANSWER:
+            memory.add(exhibit, question, answer)
+        return answer
+
+    async def choose(self, text: str, session_id: str) -> list[str]:
+        """
+        The exhibits a visitor asked for: by keyword, then by the content
+        pack's tags, then by asking the model.
+        """
+        matches = keyword_choice(text)
+        if matches:
+            return matches
+        pack = content_pack.get_pack()
+        matches = pack.match_tags(text) if pack is not None else []
+        if matches:
+            return matches
+        return parse_choice(await self.gateway.complete(session_id, choose_messages(text), "llm.choose",
+                                                        fallback=lambda: "none"))
+
+
+class TourSession:
+    """
+    One visitor's tour on the shared loop.
+
+    Parameters:
+        session_id: Unique per session; the gateway's fairness key.
+        channel: The visitor's audio or text link (see the module docstring).
+        send_movement: Asks navigation to drive to a location; see attach_robot.
+    """
+
+    def __init__(self, session_id: str, channel, gateway: LLMGateway, tts: TTSCache,
+                 knowledge: ExhibitKnowledge, send_movement: Callable[[str], None] | None = None,
+                 exhibits: list[str] | None = None):
+        self.id = session_id
+        self.channel = channel
+        self.gateway = gateway
+        self.tts = tts
+        self.knowledge = knowledge
+        self.transcript: collections.deque[tuple[str, str]] = collections.deque(maxlen=SESSION_TRANSCRIPT)
+        self.memory = knowledge.memory(session_id)
+        self.navigation: NavigationClient | None = None
+        self.task: asyncio.Future | None = None
+        self._move = send_movement
+        self._heard_at: float | None = None
+        self.tour = TourStateMachine(
+            speak=self.speak,
+            listen=self.listen,
+            summarise=self.summarise,
+            answer=self.answer,
+            choose=self.choose,
+            send_movement=self.send_movement,
+            exhibits=exhibits or [e["location"] for e in EXHIBITS],
+            popularity=events.popularity,
+            tour_id=session_id,
+        )
+
+    def attach_robot(self, mqtt_client, robot_id: str | None = None) -> NavigationClient:
+        """
+        Sends this session's trips to a robot over the navigation protocol.
+        The caller connects mqtt_client and calls subscribe() once connected.
+        """
+        self.navigation = NavigationClient(
+            mqtt_client,
+            on_done=lambda target: self.tour.notify_arrived(target),
+            on_failed=lambda target, reason: self.tour.notify_failed(reason),
+            on_progress=self.tour.notify_progress,
+            robot_id=robot_id,
+        )
+        return self.navigation
+
+    def send_movement(self, location: str) -> None:
+        if self.navigation is not None:
+            if location == "initial":
+                self.navigation.request(location, priority="high", replace=True)
+            else:
+                self.navigation.request(location)
+        elif self._move is not None:
+            self._move(location)
+        else:
+            print(f"Session {self.id}: no robot for the trip to {location}")
+            self.tour.notify_arrived("no robot")
+
+    async def speak(self, text: str) -> bool:
+        self.transcript.append(("bot", text))
+        try:
+            audio = await self.tts.render(text)
+        except Exception as e:
+            print(f"Session {self.id}: audio error (continuing with text only): {e}")
+            audio = None
+        if self._heard_at is not None:
+            latency.record("turn.response", time.perf_counter() - self._heard_at)
+            self._heard_at = None
+        return await self.channel.play(text, audio)
+
+    async def listen(self) -> str | None:
+        text = await self.channel.listen()
+        self._heard_at = time.perf_counter()
+        if text:
+            self.transcript.append(("visitor", text))
+        return text
+
+    async def summarise(self, location: str) -> str:
+        return await self.knowledge.summary(location, self.id)
+
+    async def answer(self, exhibit: str, question: str) -> str:
+        return await self.knowledge.answer(exhibit, question, self.memory, self.id)
+
+    async def choose(self, text: str) -> list[str]:
+        return await self.knowledge.choose(text, self.id)
+
+
+class SessionManager:
+    """
+    Runs tour sessions concurrently on the running asyncio loop, at most
+    ``max_sessions`` at a time (later ones wait for a place).
+
+    Parameters:
+        gateway: Shared LLM gateway.
+        tts: Shared speech cache.
+        knowledge: Shared exhibit summaries; one over the gateway if omitted.
+    """
+
+    def __init__(self, gateway: LLMGateway, tts: TTSCache, knowledge: ExhibitKnowledge | None = None,
+                 max_sessions: int = MAX_SESSIONS):
+        self.gateway = gateway
+        self.tts = tts
+        self.knowledge = knowledge or ExhibitKnowledge(gateway)
+        self.max_sessions = max_sessions
+        self.sessions: dict[str, TourSession] = {}
+        self.finished = 0
+        self._places = asyncio.Semaphore(max_sessions)
+        self._prefetch: asyncio.Future | None = None
+
+    def open(self, session_id: str, channel, send_movement: Callable[[str], None] | None = None,
+             exhibits: list[str] | None = None) -> TourSession:
+        """
+        Creates a session and starts its tour; await ``session.task`` for the end.
+        """
+        if session_id in self.sessions:
+            raise ValueError(f"Session {session_id} is already open")
+        content_pack.refresh()
+        if self._prefetch is None:
+            self._prefetch = asyncio.ensure_future(self.knowledge.prefetch())
+        session = TourSession(session_id, channel, self.gateway, self.tts, self.knowledge,
+                              send_movement, exhibits)
+        self.sessions[session_id] = session
+        session.task = asyncio.ensure_future(self._run(session))
+        return session
+
+    async def _run(self, session: TourSession) -> None:
+        try:
+            SESSIONS_WAITING.inc()
+            try:
+                await self._places.acquire()
+            finally:
+                SESSIONS_WAITING.dec()
+            SESSIONS_ACTIVE.inc()
+            try:
+                await session.tour.run()
+            except Exception as e:
+                print(f"Session {session.id}: tour failed: {e}")
+            finally:
+                SESSIONS_ACTIVE.dec()
+                self._places.release()
+        finally:
+            del self.sessions[session.id]
+            self.finished += 1
+
+    def get(self, session_id: str) -> TourSession | None:
+        return self.sessions.get(session_id)
+
+    def active(self) -> int:
+        return len(self.sessions)
+
+    async def close(self) -> None:
+        """
+        Cancels the tours still running and stops the shared services.
+        """
+        tasks = [s.task for s in self.sessions.values() if s.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.gateway.close()
+        self.tts.close()
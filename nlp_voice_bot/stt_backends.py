@@ -0,0 +1,285 @@
+"""
+Pluggable speech-to-text backends.
+
+Backends are tried in a configurable order (``STT_BACKENDS``, e.g.
+``"vosk,google"``) and a backend that errors hands the utterance on to the next
+one. The Google Web Speech API needs the network; the Vosk backend runs locally
+on the CPU and decodes while the visitor is still talking, emitting partial
+results to any registered ``on_partial`` callbacks.
+"""
+
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable
+
+from runtime.lazy import lazy_import
+from telemetry import latency as latency_metrics
+from replay.cassette import recorded
+
+sr = lazy_import("speech_recognition")
+
+try:
+    import vosk
+except ImportError:
+    vosk = None
+
+DEFAULT_BACKENDS = "google"
+
+
+class BackendStats:
+    """
+    Running latency and outcome counts for a single backend.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.calls += 1
+        self.last_latency = latency
+        self.total_latency += latency
+        if not ok:
+            self.failures += 1
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.calls if self.calls else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.name}: {self.calls} calls, {self.failures} failed, "
+                f"mean {self.mean_latency * 1000:.0f} ms, last {self.last_latency * 1000:.0f} ms")
+
+
+class STTBackend:
+    """
+    Base class for speech-to-text backends.
+
+    Streaming backends override the ``*_stream`` hooks; they are fed live audio
+    by ``SpeechToText.attach`` and can answer ``transcribe`` from what they have
+    already decoded.
+    """
+
+    name = "base"
+    streaming = False
+
+    def transcribe(self, audio: "sr.AudioData") -> str | None:
+        """
+        Returns the recognised text, or None if the audio held no words.
+        Raises on backend errors so the next backend can be tried.
+        """
+        raise NotImplementedError
+
+    def expect_stream(self) -> None:
+        """
+        Called on the capture thread the moment speech starts, before any decoding.
+        """
+        pass
+
+    def start_stream(self, preroll: bytes) -> None:
+        pass
+
+    def feed_stream(self, frame: bytes) -> str | None:
+        """
+        Decodes one frame and returns the current partial result, if it changed.
+        """
+        return None
+
+    def finish_stream(self) -> None:
+        pass
+
+
+class GoogleSTT(STTBackend):
+    """
+    The Google Web Speech API via speech_recognition (one network round trip).
+    """
+
+    name = "google"
+
+    def __init__(self, recognizer: "sr.Recognizer | None" = None):
+        self.recognizer = recognizer  # created on the first utterance
+
+    def transcribe(self, audio: "sr.AudioData") -> str | None:
+        raw = audio.get_raw_data()
+        request = {"audio": hashlib.sha256(raw).hexdigest(),
+                   "rate": audio.sample_rate, "width": audio.sample_width}
+        # Replaying other audio than was recorded falls back to recorded order.
+        return recorded("google-stt", request, lambda: self._recognize(audio),
+                        loose={"rate": audio.sample_rate})
+
+    def _recognize(self, audio: "sr.AudioData") -> str | None:
+        if self.recognizer is None:
+            self.recognizer = sr.Recognizer()
+        try:
+            return self.recognizer.recognize_google(audio)
+        except sr.UnknownValueError:
+            return None
+
+
+class VoskSTT(STTBackend):
+    """
+    Offline CPU-only recogniser using a Vosk/Kaldi model (``VOSK_MODEL_PATH``).
+
+    While attached to the microphone it decodes each frame as it arrives, so the
+    final text is ready almost as soon as the utterance is endpointed.
+    """
+
+    name = "vosk"
+    streaming = True
+
+    def __init__(self, model_path: str | None = None, sample_rate: int = 16000):
+        if vosk is None:
+            raise RuntimeError("vosk is not installed (pip install vosk)")
+        model_path = model_path or os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-en-us")
+        if not os.path.isdir(model_path):
+            raise RuntimeError(f"Vosk model not found: {model_path}")
+        vosk.SetLogLevel(-1)
+        self.model = vosk.Model(model_path)
+        self.sample_rate = sample_rate
+        self._stream = None
+        self._last_partial = ""
+        self._final: str | None = None
+        self._done = threading.Event()
+        self._done.set()
+
+    def _new_recognizer(self):
+        return vosk.KaldiRecognizer(self.model, self.sample_rate)
+
+    def expect_stream(self) -> None:
+        self._done.clear()
+        self._final = None
+
+    def start_stream(self, preroll: bytes) -> None:
+        self._last_partial = ""
+        self._stream = self._new_recognizer()
+        self._stream.AcceptWaveform(preroll)
+
+    def feed_stream(self, frame: bytes) -> str | None:
+        if self._stream is None:
+            return None
+        self._stream.AcceptWaveform(frame)
+        partial = json.loads(self._stream.PartialResult()).get("partial", "")
+        if partial and partial != self._last_partial:
+            self._last_partial = partial
+            return partial
+        return None
+
+    def finish_stream(self) -> None:
+        if self._stream is not None:
+            self._final = json.loads(self._stream.FinalResult()).get("text", "")
+            self._stream = None
+        self._done.set()
+
+    def transcribe(self, audio: "sr.AudioData") -> str | None:
+        # Prefer the result decoded live; give the worker a moment to flush it.
+        if self._done.wait(timeout=1.0) and self._final is not None:
+            text, self._final = self._final, None
+            return text or None
+
+        recognizer = self._new_recognizer()
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2))
+        return json.loads(recognizer.FinalResult()).get("text", "") or None
+
+
+BACKENDS = {
+    "google": GoogleSTT,
+    "vosk": VoskSTT,
+}
+
+
+class SpeechToText:
+    """
+    Runs utterances through backends in fallback order and reports latencies.
+
+    Parameters:
+        order: Comma-separated backend names, defaulting to ``STT_BACKENDS``.
+    """
+
+    def __init__(self, order: str | None = None):
+        order = order or os.getenv("STT_BACKENDS", DEFAULT_BACKENDS)
+        self.backends: list[STTBackend] = []
+        for name in (n.strip().lower() for n in order.split(",") if n.strip()):
+            factory = BACKENDS.get(name)
+            if factory is None:
+                print(f"STT: unknown backend '{name}', skipping")
+                continue
+            try:
+                self.backends.append(factory())
+            except Exception as e:
+                print(f"STT: backend '{name}' unavailable: {e}")
+        if not self.backends:
+            print("STT: no configured backend available, using google")
+            self.backends.append(GoogleSTT())
+        print(f"STT: backend order {[b.name for b in self.backends]}")
+
+        self.stats = {b.name: BackendStats(b.name) for b in self.backends}
+        self.on_partial: list[Callable[[str], None]] = []
+        self._frames = queue.Queue()
+        self._worker = None
+
+    def attach(self, microphone) -> None:
+        """
+        Feeds live speech from a MicrophoneStream to the streaming backends.
+        Decoding runs on its own thread so the capture thread never stalls.
+        """
+        if not any(b.streaming for b in self.backends):
+            return
+        microphone.add_listener(self._on_speech)
+        self._worker = threading.Thread(target=self._stream_worker, daemon=True)
+        self._worker.start()
+
+    def _on_speech(self, kind: str, data: bytes | None) -> None:
+        if kind == "start":
+            for backend in self.backends:
+                backend.expect_stream()
+        self._frames.put((kind, data))
+
+    def _stream_worker(self) -> None:
+        streaming = [b for b in self.backends if b.streaming]
+        while True:
+            kind, data = self._frames.get()
+            for backend in streaming:
+                try:
+                    if kind == "start":
+                        backend.start_stream(data)
+                    elif kind == "frame":
+                        partial = backend.feed_stream(data)
+                        if partial:
+                            self._emit_partial(partial)
+                    elif kind == "end":
+                        backend.finish_stream()
+                except Exception as e:
+                    print(f"STT: {backend.name} streaming failed: {e}")
+
+    def _emit_partial(self, text: str) -> None:
+        for callback in self.on_partial:
+            try:
+                callback(text)
+            except Exception as e:
+                print(f"STT: partial callback failed: {e}")
+
+    def transcribe(self, audio: "sr.AudioData") -> str | None:
+        for backend in self.backends:
+            start = time.monotonic()
+            try:
+                text = backend.transcribe(audio)
+            except Exception as e:
+                self.stats[backend.name].record(time.monotonic() - start, ok=False)
+                print(f"STT: {backend.name} failed ({e}), trying next backend")
+                continue
+            latency = time.monotonic() - start
+            self.stats[backend.name].record(latency, ok=True)
+            latency_metrics.record(f"stt.{backend.name}", latency)
+            print(f"STT: {backend.name} took {latency * 1000:.0f} ms")
+            return text
+        return None
+
+    def report(self) -> str:
+        return "\n".join(str(s) for s in self.stats.values())
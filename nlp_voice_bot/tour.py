@@ -0,0 +1,569 @@
+"""
+Event-driven tour state machine for the voice bot.
+
+The tour moves through explicit states (greet -> select -> travel -> present ->
+Q&A -> next) on an asyncio loop. Blocking work (speech playback, listening, LLM
+calls) runs in worker threads and reports back by posting events, and MQTT
+callbacks post arrival events from the network thread, so no state ever polls.
+Callables that are coroutine functions are awaited on the loop instead, which
+lets many tours share one loop (sessions.py).
+
+With a streaming recogniser, partial results reach the tour while the visitor
+is still talking. In Q&A, one that already asks to move on or to end the tour
+ends the utterance there (early intent), instead of waiting for the trailing
+silence and the rest of the sentence. Elsewhere the visitor is often naming
+exhibits ("let's go see the Mona Lisa"), so the whole utterance is heard.
+
+On the way to an exhibit the bot fills the trip with transit lines and starts
+the exhibit summary so that it ends as the robot arrives, timed by
+navigation's ETA (narration.py).
+
+Each trip is traced as a "tour.leg" (telemetry/tracing.py) from the visitor's
+request until the robot has arrived and the exhibit summary is under way.
+Choices, trips and the time spent at each exhibit go to the tour event log
+(telemetry/events.py).
+"""
+
+import asyncio
+import random
+import time
+from enum import Enum
+from typing import Any, Callable
+
+from nlp_voice_bot.intents import (
+    wants_yes, wants_no, wants_move_on, wants_to_end, is_unsure, ends_turn_early
+)
+from nlp_voice_bot import narration
+from telemetry import events, latency, metrics, tracing
+
+WELCOME_LINE = "Hi! Welcome to the museum. What kind of exhibits are you interested in seeing today?"
+TRANSIT_LINE = "Off we go, follow me!"
+QA_PROMPT = "Do you have any questions about this exhibit, or would you like to move on?"
+ANOTHER_PROMPT = "Would you like to visit another exhibit?"
+FAREWELL_LINE = "Thanks for visiting! I hope you enjoy the rest of your day at the museum."
+SUGGEST_AGAIN_LINE = "No problem, let me suggest another option."
+NOT_HEARD_LINE = "I didn't catch that, so let's move on."
+PROPOSE_LINE = "How about we head to the {}? How does that sound?"
+UNREACHABLE_LINE = "Sorry, I couldn't get to the {}. Let's try something else."
+# Every line the tour says word for word, for pre-rendering (content/pack.py).
+FIXED_LINES = [WELCOME_LINE, TRANSIT_LINE, QA_PROMPT, ANOTHER_PROMPT, FAREWELL_LINE,
+               SUGGEST_AGAIN_LINE, NOT_HEARD_LINE] + narration.TRANSIT_NARRATION
+EXHIBIT_LINES = [PROPOSE_LINE, UNREACHABLE_LINE]
+
+LEG_SECONDS = metrics.histogram(
+    "museum_tour_leg_seconds", "From the visitor's request to arriving with the exhibit summary under way",
+    ["status"])
+TOURS = metrics.counter("museum_tours_total", "Tours finished")
+ETA_ERROR = metrics.histogram("museum_eta_error_seconds",
+                              "Actual trip time minus navigation's estimate on departure",
+                              buckets=(-30, -10, -5, -2, 0, 2, 5, 10, 30, 60))
+EARLY_INTENTS = metrics.counter("museum_early_intents_total",
+                                "Utterances ended early because a partial result already said enough")
+SUMMARY_LATE = metrics.histogram("museum_summary_after_arrival_seconds",
+                                 "Exhibit summary started on the way still to say once the robot has arrived",
+                                 buckets=(0, 1, 2, 5, 10, 20))
+
+
+class TourState(Enum):
+    GREET = "greet"
+    SELECT = "select"
+    TRAVEL = "travel"
+    PRESENT = "present"
+    QA = "qa"
+    NEXT = "next"
+    END = "end"
+
+
+class EventType(Enum):
+    ARRIVED = "arrived"   # navigation finished (MQTT thread)
+    NAV_FAILED = "nav_failed"  # navigation gave up, payload is the reason
+    HEARD = "heard"       # speech-to-text finished, payload is the text or None
+    HEARING = "hearing"   # partial speech-to-text result (STT thread), payload is the text so far
+    SPOKEN = "spoken"     # playback ended, payload is False if the visitor barged in
+    PROGRESS = "progress"  # navigation sent a new ETA (MQTT thread)
+
+
+class TourEvent:
+    def __init__(self, kind: EventType, payload: Any = None):
+        self.kind = kind
+        self.payload = payload
+
+    def __repr__(self) -> str:
+        return f"TourEvent({self.kind.value}, {self.payload!r})"
+
+
+class TourStateMachine:
+    """
+    One visitor's tour, driven by events rather than polling.
+
+    Every callable except send_movement may also be a coroutine function.
+
+    Parameters:
+        speak: Blocking text-to-speech callable, returning False if interrupted.
+        listen: Blocking speech-to-text callable returning text or None.
+        summarise: Returns a spoken summary for an exhibit location.
+        answer: Answers a visitor question about an exhibit location.
+        choose: Maps a visitor request to a list of exhibit locations.
+        send_movement: Asks navigation to drive to a location.
+        exhibits: Every exhibit location that can be visited.
+        heartbeat: Optional callable invoked every second while the event loop is responsive.
+        popularity: Optional callable returning how often each exhibit was
+            chosen; suggestions then favour popular exhibits.
+        tour_id: Identifies the tour in the event log; a new id by default.
+        end_utterance: Optional callable that endpoints the utterance being
+            heard now; with it, a partial result (notify_partial) asking to
+            move on or end the tour cuts listening short in Q&A.
+    """
+
+    def __init__(self, speak: Callable[[str], bool], listen: Callable[[], str | None],
+                 summarise: Callable[[str], str], answer: Callable[[str, str], str],
+                 choose: Callable[[str], list[str]], send_movement: Callable[[str], None],
+                 exhibits: list[str], heartbeat: Callable[[], None] | None = None,
+                 popularity: Callable[[], dict[str, int]] | None = None, tour_id: str | None = None,
+                 end_utterance: Callable[[], None] | None = None):
+        self._speak = speak
+        self._listen = listen
+        self._summarise = summarise
+        self._answer = answer
+        self._choose = choose
+        self._send_movement = send_movement
+        self.exhibits = list(exhibits)
+        self._heartbeat = heartbeat
+        self._popularity = popularity
+        self._end_utterance = end_utterance
+        self.id = tour_id or tracing.new_id()
+
+        self.state = TourState.GREET
+        self.current_location: str | None = None
+        self.upcoming: list[str] = []
+        self.visited: set[str] = set()
+        self.request: str | None = None
+        self.guided = False
+        self.barged_in = False
+        self.progress: dict | None = None  # latest navigation progress message
+        self.eta = narration.ArrivalEstimate()  # of the trip in progress
+        self.narrated: set[str] = set()  # transit lines said on this tour
+        self._told = False  # the current exhibit's summary was said on the way
+        self._told_until = 0.0  # monotonic time the summary is expected to end
+        self.leg: tracing.Span | None = None  # trace of the trip in progress
+        self._leg_token = None
+        self._heard_at: float | None = None  # wall clock of the last utterance heard
+        self._hearing = False  # listening for the visitor, so partial results matter
+        self._started_at = time.time()
+        self._arrived_at: float | None = None  # wall clock of arriving at the current exhibit
+        self._questions = 0  # asked at the current exhibit
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._events: asyncio.Queue | None = None
+        self._pending: list[TourEvent] = []
+        self._tasks: set[asyncio.Future] = set()
+        self._summary: asyncio.Future | None = None
+
+    # ------------------------------------------------------------------
+    # Event plumbing
+    # ------------------------------------------------------------------
+    def post(self, kind: EventType, payload: Any = None) -> None:
+        """
+        Queues an event for the tour. Safe to call from any thread.
+        """
+        event = TourEvent(kind, payload)
+        if self._loop is None:
+            self._pending.append(event)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._events.put_nowait, event)
+        except RuntimeError:
+            # The tour has already finished and its loop is closed.
+            print(f"Tour: dropping {event} after tour end")
+
+    def notify_arrived(self, message: str = "") -> None:
+        self.post(EventType.ARRIVED, message)
+
+    def notify_failed(self, reason: str) -> None:
+        self.post(EventType.NAV_FAILED, reason)
+
+    def notify_progress(self, message: dict) -> None:
+        # Only the latest update matters; the event just wakes the narration.
+        self.progress = message
+        self.eta.update(message)
+        if self.state is TourState.TRAVEL:
+            self.post(EventType.PROGRESS)
+
+    def notify_partial(self, text: str) -> None:
+        # Dropped unless the tour is listening, so they never pile up in _pending.
+        if self._hearing:
+            self.post(EventType.HEARING, text)
+
+    async def wait_for(self, kind: EventType) -> Any:
+        """
+        Waits for the next event of a kind, keeping any others for later states.
+        """
+        return (await self.wait_for_any(kind)).payload
+
+    async def wait_for_any(self, *kinds: EventType) -> TourEvent:
+        for i, event in enumerate(self._pending):
+            if event.kind in kinds:
+                return self._pending.pop(i)
+        while True:
+            event = await self._events.get()
+            if event.kind in kinds:
+                return event
+            self._pending.append(event)
+
+    def _discard(self, kind: EventType) -> None:
+        self._pending = [e for e in self._pending if e.kind is not kind]
+
+    def _spawn(self, kind: EventType, fn: Callable, *args) -> None:
+        """
+        Runs a blocking callable in a worker thread and posts its result as an event.
+        """
+        async def runner():
+            try:
+                result = await self._call(fn, *args)
+            except Exception as e:
+                print(f"Tour: {kind.value} worker failed: {e}")
+                result = None
+            self._events.put_nowait(TourEvent(kind, result))
+
+        task = asyncio.ensure_future(runner())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _call(fn: Callable, *args) -> Any:
+        """
+        Awaits a coroutine function on the loop; runs anything else in a worker thread.
+        """
+        if asyncio.iscoroutinefunction(fn):
+            return await fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    def start_speaking(self, text: str) -> None:
+        self._spawn(EventType.SPOKEN, self._timed_speak, text)
+
+    async def _timed_speak(self, text: str) -> Any:
+        started = time.monotonic()
+        finished = await self._call(self._speak, text)
+        if finished is not False:
+            narration.speech_timer.observe(text, time.monotonic() - started)
+        return finished
+
+    async def say(self, text: str) -> bool:
+        """
+        Speaks and waits for playback to end.
+
+        Once the visitor has talked over the bot, further prompts are skipped
+        until their utterance has been heard.
+
+        Returns:
+            False if the speech was interrupted or skipped.
+        """
+        if self.barged_in:
+            print(f"Tour: skipping prompt after barge-in: {text}")
+            return False
+        self.start_speaking(text)
+        if await self.wait_for(EventType.SPOKEN) is False:
+            self.barged_in = True
+            return False
+        return True
+
+    async def hear(self, early_intent: bool = False) -> str | None:
+        """
+        Listens for the visitor's next utterance.
+
+        Parameters:
+            early_intent: End the utterance as soon as a partial result asks
+                to move on or to end the tour (only where that is all the
+                reply can mean, i.e. in Q&A).
+        """
+        self._spawn(EventType.HEARD, self._listen)
+        self._hearing = early_intent and self._end_utterance is not None
+        early = None
+        try:
+            while True:
+                event = await self.wait_for_any(EventType.HEARD, EventType.HEARING)
+                if event.kind is EventType.HEARD:
+                    break
+                if early is None and ends_turn_early(event.payload):
+                    print(f"Tour: early intent in '{event.payload}', ending the utterance")
+                    early = event.payload
+                    EARLY_INTENTS.inc()
+                    self._end_utterance()
+        finally:
+            self._hearing = False
+            self._discard(EventType.HEARING)
+        # The cut-off utterance is still transcribed; the partial is the fallback.
+        text = event.payload or early
+        self._heard_at = time.time()
+        self.barged_in = False
+        return text
+
+    def _begin_leg(self, start: float | None = None) -> None:
+        """
+        Starts tracing a leg, unless one is already open. Work started from
+        the tour until it ends (LLM calls, the navigation request) joins it.
+        """
+        if self.leg is None:
+            self.leg = tracing.start_trace("tour.leg", start=start)
+            self._leg_token = tracing.activate(self.leg)
+
+    def _end_leg(self, **attrs) -> None:
+        if self.leg is not None:
+            tracing.deactivate(self._leg_token)
+            self.leg.end(**attrs)
+            LEG_SECONDS.labels(status=attrs.get("status", "")).observe(self.leg.end_time - self.leg.start)
+            self.leg = None
+
+    def _unvisited(self) -> list[str]:
+        return [loc for loc in self.exhibits if loc not in self.visited]
+
+    def _suggest(self, candidates: list[str]) -> str:
+        """
+        A random candidate, weighted towards the ones other visitors chose most.
+        """
+        counts = {}
+        if self._popularity is not None:
+            try:
+                counts = self._popularity()
+            except Exception as e:
+                print(f"Tour: popularity unavailable: {e}")
+        return random.choices(candidates, [1 + counts.get(loc, 0) for loc in candidates])[0]
+
+    def _chosen(self, locations: list[str], how: str) -> None:
+        for location in locations:
+            events.record("exhibit.chosen", tour=self.id, exhibit=location, how=how)
+
+    def _leave_exhibit(self) -> None:
+        if self._arrived_at is not None:
+            events.record("exhibit.dwell", tour=self.id, exhibit=self.current_location,
+                          duration=time.time() - self._arrived_at, questions=self._questions)
+            self._arrived_at = None
+
+    # ------------------------------------------------------------------
+    # States
+    # ------------------------------------------------------------------
+    async def _pulse(self) -> None:
+        while True:
+            self._heartbeat()
+            await asyncio.sleep(1.0)
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._events = asyncio.Queue()
+        self._started_at = time.time()
+        events.record("tour.start", tour=self.id)
+        pulse = asyncio.ensure_future(self._pulse()) if self._heartbeat else None
+        handlers = {
+            TourState.GREET: self._greet,
+            TourState.SELECT: self._select,
+            TourState.TRAVEL: self._travel,
+            TourState.PRESENT: self._present,
+            TourState.QA: self._qa,
+            TourState.NEXT: self._next,
+        }
+        while self.state is not TourState.END:
+            print(f"Tour: state -> {self.state.value}")
+            state, started = self.state, time.perf_counter()
+            self.state = await handlers[state]()
+            latency.record(f"state.{state.value}", time.perf_counter() - started)
+        await self._end()
+        if pulse:
+            pulse.cancel()
+
+    async def _greet(self) -> TourState:
+        await self.say(WELCOME_LINE)
+        self.request = await self.hear()
+        self.guided = is_unsure(self.request)
+        return TourState.SELECT
+
+    async def _propose(self, unvisited: list[str]) -> str | None:
+        while unvisited:
+            choice = self._suggest(unvisited)
+            await self.say(PROPOSE_LINE.format(choice))
+            reply = await self.hear()
+
+            if wants_to_end(reply):
+                return None
+            if wants_yes(reply):
+                return choice
+            unvisited.remove(choice)
+            if unvisited:
+                await self.say(SUGGEST_AGAIN_LINE)
+        return None
+
+    async def _select(self) -> TourState:
+        if self.upcoming:
+            self.current_location = self.upcoming.pop(0)
+            self._begin_leg()
+            self.leg.set(target=self.current_location)
+            return TourState.TRAVEL
+
+        unvisited = self._unvisited()
+        if not unvisited:
+            return TourState.END
+
+        if self.guided or is_unsure(self.request):
+            pick = await self._propose(unvisited)
+            if pick is None:
+                return TourState.END
+            self._begin_leg(self._heard_at)
+            self._chosen([pick], "suggested")
+            self.upcoming.append(pick)
+        else:
+            # The leg starts with the request, so choosing the exhibit is part of it.
+            self._begin_leg(self._heard_at)
+            chosen = await self._call(self._choose, self.request)
+            candidates = [loc for loc in chosen if loc not in self.visited]
+            self._chosen(candidates, "asked")
+            self.upcoming.extend(candidates or [self._suggest(unvisited)])
+        return TourState.SELECT
+
+    async def _travel(self) -> TourState:
+        location = self.current_location
+        self.visited.add(location)
+        self._discard(EventType.ARRIVED)
+        self._discard(EventType.NAV_FAILED)
+        self._discard(EventType.PROGRESS)
+        self.progress = None
+        self.eta = narration.ArrivalEstimate()
+        self._told = False
+
+        # Overlap the summary request and the transit speech with the trip.
+        departed = time.time()
+        self._summary = asyncio.ensure_future(self._call(self._summarise, location))
+        self._send_movement(location)
+        self.start_speaking(TRANSIT_LINE)
+
+        outcome = await self._narrate()
+        self._discard(EventType.PROGRESS)
+        if outcome.kind is EventType.NAV_FAILED:
+            print(f"Navigation: Could not reach {location}: {outcome.payload}")
+            self._summary.cancel()
+            events.record("trip.failed", tour=self.id, exhibit=location,
+                          duration=time.time() - departed, reason=str(outcome.payload))
+            self._end_leg(status="failed", reason=outcome.payload)
+            await self.say(UNREACHABLE_LINE.format(location))
+            return TourState.NEXT
+        print(f"Navigation: Arrived at {location}")
+        self._arrived_at = time.time()
+        self._questions = 0
+        events.record("trip.arrived", tour=self.id, exhibit=location, duration=self._arrived_at - departed,
+                      eta=self.eta.first, narrated=self._told)
+        return TourState.PRESENT
+
+    async def _narrate(self) -> TourEvent:
+        """
+        Speaks while the robot drives: the transit line already started, then
+        transit lines while there is time, then the exhibit summary, timed to
+        end just before the arrival. Without an ETA the bot waits quietly.
+
+        Returns:
+            The ARRIVED or NAV_FAILED event, once nothing is being said.
+        """
+        outcome = None
+        speaking = True
+        while True:
+            if speaking:
+                event = await self.wait_for_any(EventType.SPOKEN, EventType.ARRIVED, EventType.NAV_FAILED)
+                if event.kind is not EventType.SPOKEN:
+                    outcome = event
+                    self._arrival_timing(outcome, still_speaking=True)
+                    continue
+                speaking = False
+                if event.payload is False:
+                    self.barged_in = True
+            if outcome is not None:
+                return outcome
+            if self._told or self.barged_in:
+                outcome = await self.wait_for_any(EventType.ARRIVED, EventType.NAV_FAILED)
+                self._arrival_timing(outcome, still_speaking=False)
+                return outcome
+
+            summary = None
+            if self._summary.done() and not self._summary.cancelled() and self._summary.exception() is None:
+                summary = self._summary.result()
+            remaining = self.eta.remaining()
+            text, delay = (None, 0.0) if remaining is None else \
+                narration.next_line(remaining, summary, narration.speech_timer, self.narrated)
+            if text is not None:
+                if text == summary:
+                    self._told = True
+                    self._told_until = time.monotonic() + narration.speech_timer.duration(text)
+                    print(f"Tour: summary ({narration.speech_timer.duration(text):.0f}s) "
+                          f"starts {remaining:.0f}s before the arrival")
+                else:
+                    self.narrated.add(text)
+                self.start_speaking(text)
+                speaking = True
+                continue
+            # Quiet until the next line is due, a new ETA, the summary or the trip's end.
+            waiter = asyncio.ensure_future(
+                self.wait_for_any(EventType.PROGRESS, EventType.ARRIVED, EventType.NAV_FAILED))
+            watched = {waiter} if self._summary.done() else {waiter, self._summary}
+            await asyncio.wait(watched, timeout=delay or None, return_when=asyncio.FIRST_COMPLETED)
+            if not waiter.done():
+                waiter.cancel()
+                continue
+            if waiter.result().kind is not EventType.PROGRESS:
+                self._arrival_timing(waiter.result(), still_speaking=False)
+                return waiter.result()
+
+    def _arrival_timing(self, outcome: TourEvent, still_speaking: bool) -> None:
+        if outcome.kind is not EventType.ARRIVED:
+            return
+        late = self.eta.late()
+        if late is not None:
+            ETA_ERROR.observe(late)
+        if self._told:
+            SUMMARY_LATE.observe(max(0.0, self._told_until - time.monotonic()) if still_speaking else 0.0)
+
+    async def _present(self) -> TourState:
+        if self._told:
+            self._end_leg(status="arrived")
+            return TourState.QA
+        try:
+            summary = await self._summary
+        except Exception as e:
+            print(f"Tour: summary failed: {e}")
+            summary = f"Here we are at the {self.current_location}."
+        self._end_leg(status="arrived")
+        await self.say(summary)
+        return TourState.QA
+
+    async def _qa(self) -> TourState:
+        await self.say(QA_PROMPT)
+        reply = await self.hear(early_intent=True)
+
+        if wants_to_end(reply):
+            self._leave_exhibit()
+            return TourState.END
+        if wants_move_on(reply):
+            self._leave_exhibit()
+            return TourState.NEXT
+        if not reply:
+            await self.say(NOT_HEARD_LINE)
+            self._leave_exhibit()
+            return TourState.NEXT
+        self._questions += 1
+        await self.say(await self._call(self._answer, self.current_location, reply))
+        return TourState.QA
+
+    async def _next(self) -> TourState:
+        if self.upcoming or self.guided:
+            return TourState.SELECT
+
+        await self.say(ANOTHER_PROMPT)
+        reply = await self.hear()
+        if wants_to_end(reply) or wants_no(reply):
+            return TourState.END
+        self.request = reply
+        return TourState.SELECT
+
+    async def _end(self) -> None:
+        self._end_leg(status="abandoned")
+        self._leave_exhibit()
+        events.record("tour.end", tour=self.id, duration=time.time() - self._started_at,
+                      visited=len(self.visited))
+        TOURS.inc()
+        await self.say(FAREWELL_LINE)
+        self._send_movement("initial")
@@ -1,16 +1,63 @@
 import paho.mqtt.client as mqtt
-import speech_recognition as sr
 import os
 import time
-import random
-import subprocess
-from gtts import gTTS
-from openai import OpenAI
 from dotenv import load_dotenv
 import threading
+import asyncio
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from nlp_voice_bot.tour import TourStateMachine
+from nlp_voice_bot.prompts import EXHIBITS, to_location
+from nlp_voice_bot.sessions import LLMGateway, TTSCache, ExhibitKnowledge
+from navigation import protocol
+from navigation.client import NavigationClient
+from nlp_voice_bot.audio_capture import MicrophoneStream
+from nlp_voice_bot.stt_backends import SpeechToText
+from nlp_voice_bot.playback import SpeechPlayer
+from telemetry import events, latency
+from content import pack as content_pack
+from replay.adapters import http_client, openai_api_key, recorded_tts
+from runtime.lazy import lazy_import, preload
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# openai and gtts take seconds to import on the Pi: they load, and the client
+# is built, on first use or from warm_up() once the tour is already waiting.
+openai = lazy_import("openai")
+gtts = lazy_import("gtts")
+client = None
+gTTS = None
+_services_lock = threading.Lock()
+
+def get_client():
+    """The OpenAI client, created on first use"""
+    global client
+    with _services_lock:
+        if client is None:
+            # With CASSETTE_MODE=record/replay, OpenAI calls go through the cassette.
+            client = openai.OpenAI(api_key=openai_api_key(os.getenv("OPENAI_API_KEY")),
+                                   http_client=http_client())
+        return client
+
+def get_tts():
+    """The gTTS class (cassette-recorded when enabled), imported on first use"""
+    global gTTS
+    with _services_lock:
+        if gTTS is None:
+            gTTS = recorded_tts(gtts.gTTS)
+        return gTTS
+
+# The session manager's services (sessions.py); this bot's tour is one session on them.
+SESSION_ID = "voicebot"
+gateway = LLMGateway(get_client)
+speech = TTSCache(get_tts)
+knowledge = ExhibitKnowledge(gateway)
+
+def warm_up():
+    """Loads the OpenAI client, gTTS and the audio stack ahead of the first tour"""
+    get_client()
+    get_tts()
+    preload("pyaudio", "speech_recognition", background=False)
 
 print("==========================================")
 print("Voice Bot Starting...")
@@ -19,75 +66,122 @@ print("==========================================")
 # Configure MQTT connection
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
-TOPIC_MOVEMENT = "movement"
-TOPIC_ARRIVED = "arrived"
+TOPIC_MOVEMENT = protocol.robot_topic(protocol.TOPIC_MOVEMENT)
+TOPIC_NAV_STATUS = protocol.robot_topic(protocol.TOPIC_NAV_STATUS)
 
 # Global state
 mqtt_connected = False
 mqtt_client = None
-current_location = None
-upcoming_locations = []
-waiting_for_arrival = False
-
-EXHIBITS = [
-    {"keyword": "scream",       "location": "The Scream by Edvard Munch"},
-    {"keyword": "starry night", "location": "Starry Night by Vincent van Gogh"},
-    {"keyword": "sunflower",    "location": "Sunflowers by Vincent van Gogh"},
-    {"keyword": "liberty",      "location": "Liberty Leading the People by Eugène Delacroix"},
-    {"keyword": "mona lisa",    "location": "Mona Lisa by Leonardo da Vinci"},
-    {"keyword": "egyptian",     "location": "Ancient Egyptian Statue"},
-    {"keyword": "plushy dog",   "location": "Plushy Dog Sculpture"},
-]
-
-def speak(text):
+nav_client = None
+mqtt_ready = threading.Event()
+active_tour = None
+memory = None  # the current visitor's questions and answers
+
+player = SpeechPlayer()
+speech_to_text = SpeechToText()
+microphone = None
+last_heard_at = None  # when the visitor's last utterance was recognised
+visitor_spoke = threading.Event()  # speech onset, so the next tour has someone to talk to
+
+async def speak(text) -> bool:
+    """Speaks text aloud; returns False if the visitor talked over it"""
+    global last_heard_at
     print("Bot:", text)
     try:
-        tts = gTTS(text=text, lang='en')
-        tts.save("output.mp3")
-        subprocess.run([
-            "ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet",
-            "-af", "atempo=1.3", "output.mp3"
-        ], check=True)
+        audio = await speech.render(text)
+        with open("output.mp3", "wb") as f:
+            f.write(audio)
+        if last_heard_at is not None:
+            # Visitor stopped talking -> bot starts answering
+            latency.record("turn.response", time.perf_counter() - last_heard_at)
+            last_heard_at = None
+        return await asyncio.to_thread(play, "output.mp3")
     except Exception as e:
         print(f"Audio error (continuing with text only): {e}")
+        return True
+
+def play(path: str) -> bool:
+    """Plays a rendered line with the microphone's echo gate closed"""
+    if microphone is not None:
+        microphone.set_echo_gate(True)
+    try:
+        with latency.span("playback"):
+            return player.play(path, filters="atempo=1.3")
+    finally:
+        if microphone is not None:
+            microphone.set_echo_gate(False)
+
+def on_visitor_speech(kind, data):
+    """Barge-in: stop talking as soon as the visitor starts"""
+    if kind == "start":
+        visitor_spoke.set()
+    if kind == "start" and player.is_playing():
+        print("Barge-in: visitor started talking, stopping playback")
+        microphone.capture_barge_in()
+        player.stop()
+
+def on_partial_result(text):
+    """Streaming STT: the tour looks for an early intent in what it has heard so far"""
+    if active_tour is not None:
+        active_tour.notify_partial(text)
+
+speech_to_text.on_partial.append(on_partial_result)
+
+def end_utterance():
+    """Endpoints the visitor's utterance now, once the tour has heard enough"""
+    if microphone is not None:
+        microphone.end_utterance()
+
+def get_microphone() -> MicrophoneStream:
+    """Starts the shared microphone stream on first use"""
+    global microphone
+    if microphone is None:
+        microphone = MicrophoneStream()
+        microphone.add_listener(on_visitor_speech)
+        speech_to_text.attach(microphone)
+        microphone.start()
+    return microphone
+
+def wait_for_visitor(heartbeat=None, stopping=None) -> bool:
+    """
+    Blocks until someone speaks near the robot, so an empty room does not get
+    tour after tour. Without a microphone there is nothing to wait for.
+
+    Returns:
+        False if stopping was set first.
+    """
+    try:
+        get_microphone()
+    except Exception as e:
+        print(f"Microphone unavailable, not waiting for a visitor: {e}")
+        return True
+    visitor_spoke.clear()
+    print("Waiting for a visitor to speak...")
+    while not visitor_spoke.wait(1.0):
+        if heartbeat:
+            heartbeat()
+        if stopping is not None and stopping.is_set():
+            return False
+    return True
 
 def listen_to_user():
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        recognizer.adjust_for_ambient_noise(source, duration=0.4)
-        print("Listening ...")
-        try:
-            audio = recognizer.listen(source, timeout=6, phrase_time_limit=20)
-            text = recognizer.recognize_google(audio)
-            print("You said:", text)
-            return text
-        except Exception as e:
-            print("Error:", e)
+    global last_heard_at
+    print("Listening ...")
+    try:
+        with latency.span("listen"):
+            audio = get_microphone().listen(timeout=6, phrase_time_limit=20)
+        if audio is None:
+            print("Error: listening timed out waiting for phrase to start")
             return None
-
-YES_WORDS  = {"yes", "sure", "okay", "sounds good", "yep", "yeah", "alright", "why not"}
-NO_WORDS   = {"no", "nope", "another", "different", "change", "don't"}
-MOVE_WORDS = {
-    "move on", "next", "continue", "let's go", "go on",
-    "no questions", "no question"     
-}
-END_WORDS  = {"done", "stop", "that's all", "end", "quit", "exit"}  
-
-def _contains(text: str, word_set: set[str]) -> bool:
-    t = text.lower()
-    return any(w in t for w in word_set)
-
-def wants_yes(text: str | None) -> bool:
-    return bool(text) and _contains(text, YES_WORDS)
-
-def wants_no(text: str | None) -> bool:
-    return bool(text) and _contains(text, NO_WORDS)
-
-def wants_move_on(text: str | None) -> bool:
-    return bool(text) and (_contains(text, MOVE_WORDS) or wants_yes(text))
-
-def wants_to_end(text: str | None) -> bool:
-    return bool(text) and _contains(text, END_WORDS)
+        heard_at = time.perf_counter()
+        with latency.span("stt"):
+            text = speech_to_text.transcribe(audio)
+        last_heard_at = heard_at
+        print("You said:", text)
+        return text
+    except Exception as e:
+        print("Error:", e)
+        return None
 
 # MQTT callback handlers
 def on_connect(client, userdata, flags, rc):
@@ -95,28 +189,31 @@ def on_connect(client, userdata, flags, rc):
     print(f"MQTT: Connected with result code {rc}")
     if rc == 0:
         mqtt_connected = True
-        # Make sure we're subscribed to the arrived topic
-        result = client.subscribe(TOPIC_ARRIVED)
-        print(f"MQTT: Subscribed to {TOPIC_ARRIVED}, result: {result}")
-        
-        # Add a specific message callback for the arrived topic
-        client.message_callback_add(TOPIC_ARRIVED, on_arrived_message)
-        print("MQTT: Added specific callback for arrival messages")
+        mqtt_ready.set()
+        # Trip acknowledgements, progress and results all arrive on the status topic
+        nav_client.subscribe()
+        print(f"MQTT: Subscribed to {TOPIC_NAV_STATUS}")
     else:
         print(f"MQTT: Failed to connect, result code: {rc}")
 
-def on_arrived_message(client, userdata, msg):
-    """Specific callback for arrival messages"""
-    global waiting_for_arrival
-    try:
-        print(f"MQTT: ARRIVAL MESSAGE RECEIVED!")
-        message_content = msg.payload.decode() if msg.payload else ""
-        print(f"MQTT: Arrival message: '{message_content}'")
-        print(f"MQTT: Current location is: {current_location}")
-        waiting_for_arrival = False
-    except Exception as e:
-        print(f"MQTT: Error in arrival callback: {e}")
-        waiting_for_arrival = False
+def notify_arrival(message: str = "") -> None:
+    """Hands an arrival over to the running tour, from any thread"""
+    if active_tour is not None:
+        active_tour.notify_arrived(message)
+
+def on_trip_done(target):
+    print(f"MQTT: Arrived at {target}")
+    notify_arrival(target)
+
+def on_trip_failed(target, reason):
+    if active_tour is not None:
+        active_tour.notify_failed(reason)
+
+def on_trip_progress(message):
+    print(f"MQTT: Progress {message.get('step')}/{message.get('total_steps')}, "
+          f"ETA {message.get('eta', 0):.1f}s")
+    if active_tour is not None:
+        active_tour.notify_progress(message)
 
 def on_message(client, userdata, msg):
     """General message handler for any other topics"""
@@ -124,28 +221,26 @@ def on_message(client, userdata, msg):
     try:
         message_content = msg.payload.decode() if msg.payload else ""
         print(f"MQTT: Message content: '{message_content}'")
-        
-        # As a fallback, also check for arrival messages here
-        if msg.topic == TOPIC_ARRIVED:
-            print(f"MQTT: Arrival detected in general handler!")
-            waiting_for_arrival = False
     except Exception as e:
         print(f"MQTT: Error in general message handler: {e}")
 
 def simulate_arrival():
     """Simulate arrival after a delay (used if MQTT fails)"""
-    global waiting_for_arrival
     time.sleep(5)  # Simulate travel time
     print("SIMULATED: Navigation completed")
-    waiting_for_arrival = False
+    notify_arrival("simulated")
 
-def setup_mqtt():
-    """Set up MQTT with error handling"""
-    global mqtt_client, mqtt_connected
+def setup_mqtt(client=None):
+    """Set up MQTT with error handling, on a given client or a new paho one"""
+    global mqtt_client, mqtt_connected, nav_client
     
+    mqtt_connected = False
+    mqtt_ready.clear()
     try:
         print("MQTT: Setting up client...")
-        mqtt_client = mqtt.Client(protocol=mqtt.MQTTv311)
+        mqtt_client = client or mqtt.Client(protocol=mqtt.MQTTv311)
+        nav_client = NavigationClient(mqtt_client, on_done=on_trip_done,
+                                      on_failed=on_trip_failed, on_progress=on_trip_progress)
         mqtt_client.on_connect = on_connect
         mqtt_client.on_message = on_message
         
@@ -154,25 +249,22 @@ def setup_mqtt():
         mqtt_client.loop_start()
         
         # Wait briefly to see if connection succeeds
-        time.sleep(1)
+        mqtt_ready.wait(timeout=1)
         return mqtt_connected
     except Exception as e:
         print(f"MQTT: Setup failed with error: {e}")
         return False
 
-# Utility: map keyword to full location if keyword provided
-def to_location(name: str) -> str:
-    return next((e["location"] for e in EXHIBITS if e["keyword"] == name.lower()), name)
-
 def send_movement_command(location: str) -> None:
-    global waiting_for_arrival, mqtt_client, mqtt_connected
     full_location = to_location(location)
     print(f"Navigation: Requesting movement to '{full_location}'")
-    waiting_for_arrival = True
     if mqtt_connected and mqtt_client:
         try:
-            print(f"MQTT: Publishing to {TOPIC_MOVEMENT}: {full_location}")
-            mqtt_client.publish(TOPIC_MOVEMENT, full_location)
+            if full_location == "initial":
+                # The tour is over: drop any trip still queued and head home first.
+                nav_client.request(full_location, priority="high", replace=True)
+            else:
+                nav_client.request(full_location)
             print("MQTT: Message sent, waiting for arrival...")
         except Exception as e:
             print(f"MQTT: Publish failed: {e}")
@@ -182,166 +274,81 @@ def send_movement_command(location: str) -> None:
         print("Navigation: MQTT not connected, using simulation")
         threading.Thread(target=simulate_arrival).start()
 
-def wait_for_arrival():
-    global waiting_for_arrival
-    
-    print("Navigation: Waiting for arrival...")
-    speak("We're on our way to the exhibit. Please wait while we navigate there.")
-    
-    # Print initial waiting status
-    print(f"Navigation: waiting_for_arrival state: {waiting_for_arrival}")
-    
-    # Wait indefinitely for arrival notification
-    while waiting_for_arrival:
-        time.sleep(0.5)
-    
-    print(f"Navigation: Arrived at {current_location}")
-
-def exhibit_summary(name: str) -> str:
-    long_name = to_location(name)
-    return client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "system",
-                   "content": f"You are a museum guide. Provide a warm, engaging 2-3 sentence summary about the exhibit '{long_name}'."}]
-    ).choices[0].message.content.strip()
-
-def answer_question(exhibit: str, question: str) -> str:
-    long_exhibit = to_location(exhibit)
-    return client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": f"You are a museum guide at '{long_exhibit}'. Answer visitor questions clearly but concisely."},
-            {"role": "user", "content": question}
-        ]
-    ).choices[0].message.content.strip()
-
-def choose_locs(text: str) -> list[str]:
-    # First try simple keyword matching for robustness
-    lower_text = text.lower()
-    matches = [e["location"] for e in EXHIBITS if e["keyword"] in lower_text]
-    if matches:
-        return matches[:3]
-
-    # Fallback to LLM-based selection
-    exhibit_list = ", ".join(f"{e['keyword']} ({e['location']})" for e in EXHIBITS)
-    reply = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system",
-             "content": f"Choose up to 3 exhibit LOCATIONS matching the user's interest from: {exhibit_list}. Return a comma-separated list or 'none'."},
-            {"role": "user", "content": text}
-        ]
-    ).choices[0].message.content.strip()
-    if reply.lower() == "none":
-        return []
-    raw = [loc.strip() for loc in reply.split(",")]
-    # Convert any keywords to locations
-    return [to_location(x) for x in raw]
-
-def propose_exhibit(unvisited: list[str]) -> str | None:
-    if not unvisited:
-        return None
-    while unvisited:
-        choice = random.choice(unvisited)
-        speak(f"How about we head to the {choice}? How does that sound?")
-        reply = listen_to_user()
+async def exhibit_summary(name: str) -> str:
+    """The exhibit's summary: from the content pack, else generated and shared for SUMMARY_TTL seconds"""
+    return await knowledge.summary(name, SESSION_ID)
 
-        if wants_to_end(reply):
-            return None
-        if wants_yes(reply):
-            return choice
-        unvisited.remove(choice)
-        if unvisited:
-            speak("No problem, let me suggest another option.")
-    return None
-
-def end_tour() -> None:
-    speak("Thanks for visiting! I hope you enjoy the rest of your day at the museum.")
-    send_movement_command("initial")
-    if mqtt_connected and mqtt_client:
-        mqtt_client.disconnect()
-    raise SystemExit
+async def answer_question(exhibit: str, question: str) -> str:
+    return await knowledge.answer(exhibit, question, memory, SESSION_ID)
+
+async def choose_locs(text: str) -> list[str]:
+    return await knowledge.choose(text, SESSION_ID)
+
+async def run_tour() -> None:
+    """Runs the tour, preparing the most popular exhibits' summaries while the visitor is greeted"""
+    prefetch = asyncio.ensure_future(knowledge.prefetch())
+    try:
+        await active_tour.run()
+    finally:
+        prefetch.cancel()
 
 # MAIN PROGRAM STARTS HERE
-def main():
-    global current_location, mqtt_connected
-    
+def main(client=None, heartbeat=None):
+    """
+    Runs one visitor's tour.
+
+    Parameters:
+        client: Optional MQTT (or in-process bus) client; a paho client is created if omitted.
+        heartbeat: Optional callable the tour invokes while its event loop is responsive.
+    """
+    global active_tour, mqtt_connected, memory
+
     # Try to set up MQTT, but continue even if it fails
-    mqtt_connected = setup_mqtt()
+    mqtt_connected = setup_mqtt(client)
     print(f"MQTT connected: {mqtt_connected}")
-    
-    # Start interaction
-    visited = set()
-    speak("Hi! Welcome to the museum. What kind of exhibits are you interested in seeing today?")
-    first = listen_to_user()
-
-    if not first or _contains(first, {"don't know", "not sure", "idk"}):
-        while True:
-            unvisited = [e["location"] for e in EXHIBITS if e["location"] not in visited]
-            target = propose_exhibit(unvisited)
-            if target is None:
-                end_tour()
-
-            current_location = target
-            visited.add(current_location)
-            send_movement_command(current_location)
-            wait_for_arrival()
-            speak(exhibit_summary(current_location))
-
-            while True:
-                speak("Do you have any questions about this exhibit, or would you like to move on?")
-                resp = listen_to_user()
-
-                if wants_to_end(resp):
-                    end_tour()
-                if wants_move_on(resp):
-                    break
-                if not resp:
-                    speak("I didn't catch that, so let's move on.")
-                    break
-                speak(answer_question(current_location, resp))
-    else:
-        upcoming = choose_locs(first)
-        if not upcoming:
-            upcoming = [random.choice([e["location"] for e in EXHIBITS])]
-
-        while True:
-            current_location = upcoming.pop(0)
-            visited.add(current_location)
-            send_movement_command(current_location)
-            wait_for_arrival()
-            speak(exhibit_summary(current_location))
-
-            while True:
-                speak("Do you have any questions about this exhibit, or would you like to move on?")
-                r = listen_to_user()
-
-                if wants_to_end(r):
-                    end_tour()
-                if wants_move_on(r):
-                    break
-                if not r:
-                    speak("I didn't catch that, so let's move on.")
-                    break
-                speak(answer_question(current_location, r))
-
-            if not upcoming:
-                speak("Would you like to visit another exhibit?")
-                nxt = listen_to_user()
-
-                if wants_to_end(nxt) or wants_no(nxt):  
-                    end_tour()
-
-                if not nxt or _contains(nxt, {"don't know", "not sure", "idk"}):
-                    pick = propose_exhibit([e["location"] for e in EXHIBITS if e["location"] not in visited])
-                    if pick is None:
-                        end_tour()
-                    upcoming.append(pick)
-                else:
-                    cand = [loc for loc in choose_locs(nxt) if loc not in visited]
-                    upcoming.extend(cand or [random.choice([e["location"] for e in EXHIBITS if e["location"] not in visited])])
+
+    # Open the microphone up front so the visitor can talk over the greeting
+    try:
+        get_microphone()
+    except Exception as e:
+        print(f"Microphone unavailable: {e}")
+
+    content_pack.refresh()
+    memory = knowledge.memory(SESSION_ID)
+    active_tour = TourStateMachine(
+        speak=speak,
+        listen=listen_to_user,
+        summarise=exhibit_summary,
+        answer=answer_question,
+        choose=choose_locs,
+        send_movement=send_movement_command,
+        exhibits=[e["location"] for e in EXHIBITS],
+        heartbeat=heartbeat,
+        popularity=events.popularity,
+        end_utterance=end_utterance,
+    )
+    latency.recorder.begin_tour()
+    try:
+        asyncio.run(run_tour())
+    finally:
+        latency.recorder.end_tour(visited=sorted(active_tour.visited))
+        active_tour = None
+        memory = None
+        print("STT latency:\n" + speech_to_text.report())
+        if mqtt_connected and mqtt_client:
+            mqtt_client.disconnect()
+
+def shutdown_audio():
+    """Closes the shared microphone stream; it otherwise stays open between tours"""
+    global microphone
+    if microphone is not None:
+        microphone.stop()
+        microphone = None
 
 # Start the main program
 if __name__ == "__main__":
     print("Starting voice bot system...")
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        shutdown_audio()
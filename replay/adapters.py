@@ -0,0 +1,129 @@
+"""
+Hooks that route the project's external calls through the cassette.
+
+OpenAI (chat and vision) is recorded at the HTTP transport: ``http_client()``
+returns an httpx client for ``OpenAI(http_client=...)`` / ``openai.http_client``
+whose transport records or replays every request. gTTS and speech_recognition
+bring their own HTTP stacks without a transport hook, so they are recorded at
+their client call instead: ``recorded_tts(gTTS)`` wraps the synthesiser and
+stt_backends.GoogleSTT goes through ``cassette.recorded``.
+
+With CASSETTE_MODE unset every hook is a no-op and the libraries behave as usual.
+"""
+
+import copy
+import hashlib
+import io
+import json
+
+from replay.cassette import get_cassette, MODE_REPLAY
+
+# Mirrors the OpenAI SDK's default: vision calls can take far longer than httpx's 5 s.
+OPENAI_TIMEOUT = 600.0
+OPENAI_CONNECT_TIMEOUT = 5.0
+REPLAY_API_KEY = "cassette-replay"
+
+
+def _loose_body(body):
+    """
+    The request with the user's turn blanked out (the visitor's words, or the
+    camera frame of a vision call), for matching when the exact request was
+    never recorded.
+    """
+    loose = copy.deepcopy(body)
+    for message in loose.get("messages", []):
+        if message.get("role") == "user":
+            message["content"] = "<user>"
+    return loose
+
+
+def _make_transport():
+    import httpx
+
+    class CassetteTransport(httpx.BaseTransport):
+        """
+        httpx transport that records or replays requests through the cassette.
+        """
+
+        def __init__(self, service: str = "openai", inner: httpx.BaseTransport | None = None):
+            self.service = service
+            self.inner = inner or httpx.HTTPTransport()
+
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            raw = request.read()
+            try:
+                body = json.loads(raw) if raw else None
+            except ValueError:
+                body = {"sha256": hashlib.sha256(raw).hexdigest()}
+            described = {"method": request.method, "path": request.url.path, "body": body}
+            loose = None
+            if isinstance(body, dict) and "messages" in body:
+                loose = dict(described, body=_loose_body(body))
+
+            def live():
+                response = self.inner.handle_request(request)
+                try:
+                    content = response.read()
+                finally:
+                    response.close()
+                return {
+                    "status": response.status_code,
+                    "content_type": response.headers.get("content-type", "application/json"),
+                    "body": content.decode("utf-8", errors="replace"),
+                }
+
+            recorded = get_cassette().call(self.service, described, live, loose)
+            return httpx.Response(recorded["status"],
+                                  headers={"content-type": recorded["content_type"]},
+                                  content=recorded["body"].encode("utf-8"), request=request)
+
+        def close(self) -> None:
+            self.inner.close()
+
+    return CassetteTransport
+
+
+def http_client(service: str = "openai"):
+    """
+    An httpx client recording/replaying through the cassette, or None when
+    cassettes are off (the SDK then uses its own client).
+    """
+    if not get_cassette().active:
+        return None
+    import httpx
+    transport = _make_transport()(service)
+    return httpx.Client(transport=transport,
+                        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT))
+
+
+def openai_api_key(key: str | None) -> str | None:
+    """
+    The configured key, or a placeholder when replaying offline without one.
+    """
+    if not key and get_cassette().mode == MODE_REPLAY:
+        return REPLAY_API_KEY
+    return key
+
+
+def recorded_tts(tts_class):
+    """
+    Wraps a gTTS-compatible class so synthesis goes through the cassette.
+    Returns the class unchanged when cassettes are off.
+    """
+    if not get_cassette().active:
+        return tts_class
+
+    class RecordedTTS(tts_class):
+        def write_to_fp(self, fp) -> None:
+            request = {"text": self.text, "lang": self.lang,
+                       "slow": getattr(self, "slow", False), "tld": getattr(self, "tld", None)}
+
+            def live() -> bytes:
+                buffer = io.BytesIO()
+                tts_class.write_to_fp(self, buffer)
+                return buffer.getvalue()
+
+            fp.write(get_cassette().call("gtts", request, live))
+
+    RecordedTTS.__name__ = tts_class.__name__
+    return RecordedTTS
@@ -0,0 +1,299 @@
+"""
+Record/replay store for calls to external services (OpenAI, gTTS, Google STT).
+
+In ``record`` mode every call goes to the live service and its request,
+response and latency are appended to a cassette file. In ``replay`` mode the
+same calls are answered from the cassette without touching the network, so
+tours, benchmarks and tests run offline and reproducibly.
+
+A call is matched on the exact request first. Requests that carry data which
+rarely repeats (a camera frame, the visitor's words or recorded voice) also
+have a "loose" key without that data; an unmatched exact request gets the
+loose key's recorded responses in recorded order, so an answer about the Mona
+Lisa is replayed for any question about the Mona Lisa.
+
+Replayed calls can return at once (``none``), after the latency recorded with
+the response (``recorded``), or after a latency drawn from a log-normal fitted
+to everything recorded for that service (``synthetic``), optionally scaled.
+
+Configuration (environment):
+    CASSETTE_MODE     off (default), record or replay
+    CASSETTE_PATH     cassette file, default cassettes/museum.cassette
+    CASSETTE_LATENCY  none, recorded (default) or synthetic
+    CASSETTE_LATENCY_SCALE  multiplier on replayed latencies, default 1.0
+
+The file is gzip-compressed JSON lines, one gzip member per appended record,
+so a crash loses at most the call in progress. Identical requests are stored
+once; re-recording one only appends its new latency.
+
+Usage:
+    python replay/cassette.py [PATH]    # summarise a cassette
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from telemetry import metrics
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+LATENCY_NONE = "none"
+LATENCY_RECORDED = "recorded"
+LATENCY_SYNTHETIC = "synthetic"
+
+DEFAULT_PATH = os.path.join("cassettes", "museum.cassette")
+
+CACHE_LOOKUPS = metrics.counter("museum_cache_lookups_total",
+                                "Cache lookups by cache and result (hit, loose, miss)",
+                                ["cache", "result"])
+
+
+class CassetteMiss(LookupError):
+    """
+    Raised in replay mode for a call the cassette holds no response for.
+    """
+
+
+def request_key(service: str, request: Any) -> str:
+    canonical = json.dumps([service, request], sort_keys=True, separators=(",", ":"),
+                           ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+def encode_value(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    return value
+
+
+def decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and set(value) == {"__bytes__"}:
+        return base64.b64decode(value["__bytes__"])
+    return value
+
+
+class Entry:
+    def __init__(self, service: str, loose: str | None, response: Any):
+        self.service = service
+        self.loose = loose
+        self.response = response
+        self.latencies: list[float] = []
+        self.replays = 0
+
+
+class Cassette:
+    """
+    One cassette file and the calls recorded in it.
+
+    Parameters:
+        path: The cassette file (created on the first recording).
+        mode: MODE_OFF, MODE_RECORD or MODE_REPLAY.
+        latency: How replayed calls are delayed: LATENCY_NONE, _RECORDED or _SYNTHETIC.
+        scale: Multiplier on replayed latencies.
+        sleep: Used to delay replayed calls (a simulator can pass its virtual clock).
+        rng: Random source for synthetic latencies.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, mode: str = MODE_OFF,
+                 latency: str = LATENCY_RECORDED, scale: float = 1.0,
+                 sleep: Callable[[float], None] = time.sleep, rng: random.Random | None = None):
+        if mode not in (MODE_OFF, MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if latency not in (LATENCY_NONE, LATENCY_RECORDED, LATENCY_SYNTHETIC):
+            raise ValueError(f"Unknown cassette latency: {latency}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.scale = scale
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.entries: dict[str, Entry] = {}
+        self._loose: dict[tuple[str, str], list[str]] = {}
+        self._cursors: dict[tuple[str, str], int] = {}
+        self.hits = 0
+        self.loose_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if mode != MODE_OFF and os.path.exists(path):
+            self.load()
+
+    @property
+    def active(self) -> bool:
+        return self.mode != MODE_OFF
+
+    # ------------------------------------------------------------------
+    # File format
+    # ------------------------------------------------------------------
+    def load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._apply(json.loads(line))
+        print(f"Cassette: loaded {len(self.entries)} recorded calls from {self.path}")
+
+    def _apply(self, record: dict) -> Entry:
+        key = record["key"]
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = Entry(record["service"], record.get("loose"),
+                                              record["response"])
+            if entry.loose:
+                self._loose.setdefault((entry.service, entry.loose), []).append(key)
+        elif "response" in record:
+            entry.response = record["response"]
+        entry.latencies.append(record["latency"])
+        return entry
+
+    def _append(self, record: dict) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+    def call(self, service: str, request: Any, live: Callable[[], Any],
+             loose: Any = None) -> Any:
+        """
+        Performs one external call through the cassette.
+
+        Parameters:
+            service: Names the service, e.g. "openai", "gtts" or "google-stt".
+            request: JSON-serialisable description of everything the response depends on.
+            live: Makes the real call and returns its (JSON-serialisable or bytes) response.
+            loose: Optional request description without single-use data, for fallback matching.
+
+        Returns:
+            The live or recorded response.
+        """
+        if self.mode == MODE_OFF:
+            return live()
+        key = request_key(service, request)
+        loose_key = request_key(service, loose) if loose is not None else None
+        if self.mode == MODE_REPLAY:
+            return self._replay(service, key, loose_key)
+
+        started = time.perf_counter()
+        response = live()
+        elapsed = time.perf_counter() - started
+        record = {"key": key, "service": service, "latency": round(elapsed, 4)}
+        with self._lock:
+            known = self.entries.get(key)
+            if known is None or known.response != encode_value(response):
+                record["response"] = encode_value(response)
+                if loose_key:
+                    record["loose"] = loose_key
+            self._apply(record)
+            self._append(record)
+        return response
+
+    def _replay(self, service: str, key: str, loose_key: str | None) -> Any:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                CACHE_LOOKUPS.labels(cache="cassette", result="hit").inc()
+            elif loose_key is not None and (service, loose_key) in self._loose:
+                keys = self._loose[(service, loose_key)]
+                cursor = self._cursors.get((service, loose_key), 0)
+                self._cursors[(service, loose_key)] = cursor + 1
+                entry = self.entries[keys[cursor % len(keys)]]
+                self.loose_hits += 1
+                CACHE_LOOKUPS.labels(cache="cassette", result="loose").inc()
+            else:
+                self.misses += 1
+                CACHE_LOOKUPS.labels(cache="cassette", result="miss").inc()
+                raise CassetteMiss(f"No recorded {service} response for request {key}")
+            delay = self._delay(entry)
+            entry.replays += 1
+            response = entry.response
+        if delay > 0:
+            self.sleep(delay)
+        return decode_value(response)
+
+    def _delay(self, entry: Entry) -> float:
+        if self.latency == LATENCY_NONE or not entry.latencies:
+            return 0.0
+        if self.latency == LATENCY_RECORDED:
+            return entry.latencies[entry.replays % len(entry.latencies)] * self.scale
+        median, sigma = self.latency_model(entry.service)
+        return self.rng.lognormvariate(0.0, sigma) * median * self.scale
+
+    def latency_model(self, service: str) -> tuple[float, float]:
+        """
+        Median and log-normal spread of everything recorded for a service.
+        """
+        logs = [math.log(max(latency, 1e-4)) for entry in self.entries.values()
+                if entry.service == service for latency in entry.latencies]
+        if not logs:
+            return 0.0, 0.0
+        mean = sum(logs) / len(logs)
+        sigma = math.sqrt(sum((x - mean) ** 2 for x in logs) / len(logs))
+        return math.exp(mean), sigma
+
+    def summary(self) -> str:
+        services = sorted({entry.service for entry in self.entries.values()})
+        lines = [f"{'service':<14}{'requests':>9}{'calls':>7}{'median ms':>11}{'spread':>8}"]
+        for service in services:
+            entries = [e for e in self.entries.values() if e.service == service]
+            median, sigma = self.latency_model(service)
+            lines.append(f"{service:<14}{len(entries):>9}{sum(len(e.latencies) for e in entries):>7}"
+                         f"{median * 1000:>11.0f}{sigma:>8.2f}")
+        if self.hits or self.loose_hits or self.misses:
+            lines.append(f"replayed: {self.hits} exact, {self.loose_hits} loose, {self.misses} missing")
+        return "\n".join(lines)
+
+
+_cassette: Cassette | None = None
+_cassette_lock = threading.Lock()
+
+def get_cassette() -> Cassette:
+    """
+    The process-wide cassette configured from the environment.
+    """
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(
+                path=os.getenv("CASSETTE_PATH", DEFAULT_PATH),
+                mode=os.getenv("CASSETTE_MODE", MODE_OFF).lower(),
+                latency=os.getenv("CASSETTE_LATENCY", LATENCY_RECORDED).lower(),
+                scale=float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0")),
+            )
+            if _cassette.active:
+                print(f"Cassette: {_cassette.mode} mode on {_cassette.path}")
+        return _cassette
+
+def set_cassette(cassette: Cassette) -> None:
+    """
+    Replaces the process-wide cassette (e.g. one driven by a simulator clock).
+    """
+    global _cassette
+    with _cassette_lock:
+        _cassette = cassette
+
+def recorded(service: str, request: Any, live: Callable[[], Any], loose: Any = None) -> Any:
+    return get_cassette().call(service, request, live, loose)
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("CASSETTE_PATH", DEFAULT_PATH)
+    cassette = Cassette(path, mode=MODE_REPLAY)
+    print(cassette.summary())
+
+
+if __name__ == "__main__":
+    main()
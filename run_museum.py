@@ -0,0 +1,171 @@
+"""
+Single-process museum runtime.
+
+Hosts navigation, vision and the voice bot as supervised components of one
+process, so heavy modules (OpenAI, cv2, GPIO) are imported once and exactly one
+navigation loop handles movement requests. Components talk over an in-process
+bus by default; pass --broker to use a real MQTT broker instead (for example to
+watch traffic with mosquitto_sub or to run components on separate machines).
+
+With several robots on one broker, give each robot an id (its topics are then
+namespaced under robots/<id>/) and run the fleet dispatcher once, on any host:
+
+    python run_museum.py --broker HOST --robot-id r1
+    python run_museum.py --broker HOST --components dispatcher
+
+Heavy libraries (OpenAI, gTTS, cv2) are imported on a background thread once
+the components are running, so the robot takes requests sooner after a start
+or restart; ``python runtime/import_profile.py`` shows where import time goes.
+
+Operational metrics of all components are served on
+http://127.0.0.1:9108/metrics (--metrics-port, 0 to disable).
+
+Usage:
+    python run_museum.py [--broker HOST] [--port PORT] [--robot-id ID]
+                         [--components navigation,vision,voice,dispatcher]
+                         [--metrics-port PORT]
+"""
+
+import argparse
+import json
+import os
+import threading
+
+import paho.mqtt.client as mqtt
+
+from runtime.channels import LocalBus
+from runtime.supervisor import Supervisor, Component, RESTART_ALWAYS, RESTART_ON_FAILURE
+from telemetry import metrics
+
+TOPIC_HEALTH = "runtime/health"
+DEFAULT_COMPONENTS = ("navigation", "vision", "voice")
+ALL_COMPONENTS = DEFAULT_COMPONENTS + ("dispatcher",)
+
+
+def build_supervisor(components, make_client, health_client) -> Supervisor:
+    def on_health(name, status):
+        health_client.publish(f"{TOPIC_HEALTH}/{name}", json.dumps(status), qos=1, retain=True)
+
+    supervisor = Supervisor(on_health=on_health)
+
+    if "navigation" in components:
+        import main as navigation_main
+        supervisor.add(Component(
+            "navigation",
+            lambda ctx: navigation_main.serve(make_client("navigation"), ctx.heartbeat, ctx.stopping),
+            restart=RESTART_ON_FAILURE, heartbeat_timeout=30.0,
+        ))
+
+    if "vision" in components:
+        import capture_analyse
+        supervisor.add(Component(
+            "vision",
+            lambda ctx: capture_analyse.serve_camera(ctx.heartbeat, ctx.stopping),
+            restart=RESTART_ON_FAILURE, heartbeat_timeout=5.0,
+        ))
+
+    if "voice" in components:
+        from nlp_voice_bot import voicebot
+
+        def run_tour(ctx):
+            # Each run is one visitor's tour, started once someone speaks, so
+            # the bot does not greet and drive around an empty room.
+            if voicebot.wait_for_visitor(ctx.heartbeat, ctx.stopping):
+                voicebot.main(make_client("voice"), ctx.heartbeat)
+
+        supervisor.add(Component("voice", run_tour, restart=RESTART_ALWAYS, heartbeat_timeout=10.0))
+
+    if "dispatcher" in components:
+        from fleet import dispatcher
+        supervisor.add(Component(
+            "dispatcher",
+            lambda ctx: dispatcher.serve(make_client("dispatcher"), ctx.heartbeat, ctx.stopping),
+            restart=RESTART_ON_FAILURE, heartbeat_timeout=10.0,
+        ))
+
+    return supervisor
+
+
+def warm_up(components) -> threading.Thread:
+    """
+    Loads the libraries the components defer (see runtime/lazy.py) on a
+    background thread, ahead of the first tour.
+    """
+    steps = []
+    if "voice" in components:
+        from nlp_voice_bot import voicebot
+        steps.append(voicebot.warm_up)
+    if components & {"navigation", "vision"}:
+        import capture_analyse
+        steps.append(capture_analyse.warm_up)
+
+    def run():
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                print(f"[ERROR] Warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, daemon=True, name="warm-up")
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the museum robot in one supervised process")
+    parser.add_argument("--broker", help="MQTT broker host (default: in-process bus)")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--robot-id", help="namespace this robot's topics for a multi-robot fleet")
+    parser.add_argument("--components", default=",".join(DEFAULT_COMPONENTS),
+                        help="comma-separated subset of: " + ", ".join(ALL_COMPONENTS))
+    parser.add_argument("--metrics-port", type=int, default=metrics.METRICS_PORT,
+                        help="local port for the metrics scrape endpoint (0: off)")
+    args = parser.parse_args()
+    components = {c.strip() for c in args.components.split(",") if c.strip()}
+    if args.robot_id:
+        # Read by navigation.protocol when the components are imported below.
+        os.environ["ROBOT_ID"] = args.robot_id
+
+    bus = None if args.broker else LocalBus()
+
+    def make_client(name):
+        # Components connect their own client, so they keep their on_connect handling.
+        if bus is not None:
+            return bus.client(name)
+        return mqtt.Client(client_id=f"museum-{name}", protocol=mqtt.MQTTv311)
+
+    health_client = make_client("runtime")
+    health_client.connect(args.broker or "localhost", args.port, 60)
+    health_client.loop_start()
+
+    if args.broker:
+        if "navigation" in components:
+            import main as navigation_main
+            navigation_main.MQTT_BROKER, navigation_main.MQTT_PORT = args.broker, args.port
+        if "voice" in components:
+            from nlp_voice_bot import voicebot
+            voicebot.MQTT_BROKER, voicebot.MQTT_PORT = args.broker, args.port
+        if "dispatcher" in components:
+            from fleet import dispatcher
+            dispatcher.MQTT_BROKER, dispatcher.MQTT_PORT = args.broker, args.port
+
+    if args.metrics_port:
+        metrics.start_server(args.metrics_port)
+    supervisor = build_supervisor(components, make_client, health_client)
+    print(f"[SUPERVISOR] Running {', '.join(sorted(components))} "
+          f"over {'MQTT at ' + args.broker if args.broker else 'the in-process bus'}")
+    supervisor.start()
+    warm_up(components)
+    try:
+        supervisor.run_forever()
+    except KeyboardInterrupt:
+        print("[SUPERVISOR] Shutting down...")
+    finally:
+        supervisor.stop()
+        if "voice" in components:
+            from nlp_voice_bot import voicebot
+            voicebot.shutdown_audio()
+
+
+if __name__ == "__main__":
+    main()
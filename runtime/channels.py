@@ -0,0 +1,203 @@
+"""
+In-process publish/subscribe bus with a paho-compatible client.
+
+Components hosted in the same runtime talk through a ``LocalBus`` instead of a
+Mosquitto broker. ``LocalClient`` implements the subset of
+``paho.mqtt.client.Client`` this project uses (connect, loop_start/forever,
+subscribe, message_callback_add, publish with retain), so main.py and the voice
+bot run unchanged on either transport. Each client delivers messages on its
+own dispatcher thread, matching paho's network-thread callback semantics.
+"""
+
+import queue
+import threading
+from typing import Callable
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """
+    MQTT topic filter matching with ``+`` and ``#`` wildcards.
+    """
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[i]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class LocalMessage:
+    def __init__(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+
+class PublishResult:
+    def __init__(self, rc: int = 0, mid: int = 0):
+        self.rc = rc
+        self.mid = mid
+
+    def wait_for_publish(self, timeout: float | None = None) -> None:
+        pass
+
+    def is_published(self) -> bool:
+        return True
+
+
+class LocalBus:
+    """
+    The broker stand-in: routes every publish to the matching subscribers and
+    keeps the last retained message per topic.
+    """
+
+    def __init__(self):
+        self._clients: list["LocalClient"] = []
+        self._retained: dict[str, LocalMessage] = {}
+        self._lock = threading.Lock()
+        self._mid = 0
+
+    def client(self, name: str = "") -> "LocalClient":
+        client = LocalClient(self, name)
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def _detach(self, client: "LocalClient") -> None:
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def publish(self, topic: str, payload, qos: int = 0, retain: bool = False) -> PublishResult:
+        if isinstance(payload, str):
+            payload = payload.encode()
+        elif payload is None:
+            payload = b""
+        message = LocalMessage(topic, payload, qos, retain)
+        with self._lock:
+            self._mid += 1
+            if retain:
+                if payload:
+                    self._retained[topic] = message
+                else:
+                    self._retained.pop(topic, None)
+            clients = list(self._clients)
+            mid = self._mid
+        for client in clients:
+            if client.is_subscribed(topic):
+                client._enqueue(LocalMessage(topic, payload, qos, False))
+        return PublishResult(0, mid)
+
+    def retained(self, topic_filter: str) -> list[LocalMessage]:
+        with self._lock:
+            return [m for t, m in self._retained.items() if topic_matches(topic_filter, t)]
+
+    def pending(self) -> int:
+        """
+        Messages published but not yet handed to a client's callbacks.
+        """
+        with self._lock:
+            clients = list(self._clients)
+        return sum(client._inbox.qsize() for client in clients)
+
+
+class LocalClient:
+    """
+    Drop-in for the parts of paho's Client used by main.py and the voice bot.
+    """
+
+    def __init__(self, bus: LocalBus, name: str = ""):
+        self.bus = bus
+        self.name = name
+        self.on_connect = None
+        self.on_message = None
+        self._filters: set[str] = set()
+        self._callbacks: list[tuple[str, Callable]] = []
+        self._inbox = queue.Queue()
+        self._thread = None
+        self._connected = False
+        self._lock = threading.Lock()
+
+    # Connection lifecycle -------------------------------------------------
+    def connect(self, host: str | None = None, port: int | None = None, keepalive: int = 60) -> int:
+        self._connected = True
+        self._inbox.put(("connect", None))
+        return 0
+
+    def loop_start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.loop_forever, daemon=True,
+                                            name=f"bus-{self.name}")
+            self._thread.start()
+
+    def loop_forever(self) -> None:
+        while True:
+            kind, message = self._inbox.get()
+            if kind == "stop":
+                return
+            try:
+                if kind == "connect":
+                    if self.on_connect:
+                        self.on_connect(self, None, {}, 0)
+                else:
+                    self._dispatch(message)
+            except Exception as e:
+                print(f"[ERROR] Bus client {self.name}: callback failed: {e}")
+
+    def loop_stop(self) -> None:
+        if self._thread is not None:
+            self._inbox.put(("stop", None))
+            if threading.current_thread() is not self._thread:
+                self._thread.join()
+            self._thread = None
+
+    def disconnect(self) -> int:
+        self._connected = False
+        self.bus._detach(self)
+        self.loop_stop()
+        return 0
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    # Pub/sub ----------------------------------------------------------------
+    def subscribe(self, topic: str, qos: int = 0):
+        with self._lock:
+            self._filters.add(topic)
+        for message in self.bus.retained(topic):
+            self._enqueue(LocalMessage(message.topic, message.payload, message.qos, True))
+        return (0, 0)
+
+    def unsubscribe(self, topic: str):
+        with self._lock:
+            self._filters.discard(topic)
+        return (0, 0)
+
+    def message_callback_add(self, topic_filter: str, callback) -> None:
+        with self._lock:
+            self._callbacks = [(f, cb) for f, cb in self._callbacks if f != topic_filter]
+            self._callbacks.append((topic_filter, callback))
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False) -> PublishResult:
+        return self.bus.publish(topic, payload, qos, retain)
+
+    def is_subscribed(self, topic: str) -> bool:
+        with self._lock:
+            return any(topic_matches(f, topic) for f in self._filters)
+
+    def _enqueue(self, message: LocalMessage) -> None:
+        self._inbox.put(("message", message))
+
+    def _dispatch(self, message: LocalMessage) -> None:
+        with self._lock:
+            callbacks = [cb for f, cb in self._callbacks if topic_matches(f, message.topic)]
+        if callbacks:
+            for callback in callbacks:
+                callback(self, None, message)
+        elif self.on_message:
+            self.on_message(self, None, message)
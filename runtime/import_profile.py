@@ -0,0 +1,84 @@
+"""
+Import-time profile of the robot's entry points.
+
+Imports each module in a fresh interpreter with ``-X importtime`` and reports
+the wall time of the import and the slowest modules it pulled in (by their
+own time and including what they imported), so a slow start after boot or a
+supervisor restart can be traced to the library responsible.
+
+Usage:
+    python runtime/import_profile.py [MODULE ...] [--top 15]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_MODULES = ("main", "nlp_voice_bot.voicebot", "capture_analyse", "run_museum")
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """
+    (module, self µs, cumulative µs) for every line of ``-X importtime`` output.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def profile(module: str) -> dict:
+    """
+    Imports one module in a fresh interpreter.
+
+    Returns:
+        wall seconds, the parsed rows, and the error if the import failed.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")])))
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    rows = parse_importtime(result.stderr)
+    error = None
+    if result.returncode != 0:
+        lines = [l for l in result.stderr.splitlines() if not l.startswith("import time:")]
+        error = lines[-1] if lines else f"exit code {result.returncode}"
+    return {"module": module, "wall": wall, "rows": rows, "error": error}
+
+
+def report(result: dict, top: int) -> str:
+    rows = result["rows"]
+    total = next((cum for name, _, cum in reversed(rows) if name == result["module"]), None)
+    lines = [f"{result['module']}: {result['wall'] * 1000:.0f} ms wall"
+             + (f", {total / 1000:.0f} ms importing" if total is not None else "")
+             + f", {len(rows)} modules"]
+    if result["error"]:
+        lines.append(f"  import failed: {result['error']}")
+    lines.append(f"  {'self ms':>8}{'cum ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[1])[:top]:
+        lines.append(f"  {self_us / 1000:>8.1f}{cumulative_us / 1000:>9.1f}  {name}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Where the robot's startup import time goes")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES))
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list per import")
+    args = parser.parse_args()
+    for module in args.modules:
+        print(report(profile(module), args.top))
+        print()
+
+
+if __name__ == "__main__":
+    main()
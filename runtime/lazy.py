@@ -0,0 +1,100 @@
+"""
+Deferred imports for heavy modules.
+
+``lazy_import("cv2")`` returns a stand-in module that imports the real one on
+first attribute access, so importing the navigation or voice code no longer
+pays for cv2, OpenAI or PIL up front (seconds on the Pi) and works on a
+machine without them until they are actually used. ``preload()`` imports a
+set of lazy modules on a background thread once the runtime is up, so the
+first tour does not pay for them either.
+
+How long each deferred import took is kept in ``load_times`` and recorded as
+the ``import.<module>`` latency stage.
+"""
+
+import importlib
+import sys
+import threading
+import time
+import types
+
+load_times: dict[str, float] = {}
+_lazy: dict[str, "LazyModule"] = {}
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """
+    Placeholder for a module that is imported on first use.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+        self.__dict__["_load_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_module"]
+        if module is not None:
+            return module
+        with self.__dict__["_load_lock"]:
+            module = self.__dict__["_module"]
+            if module is None:
+                already = self.__name__ in sys.modules
+                started = time.perf_counter()
+                module = importlib.import_module(self.__name__)
+                if not already:
+                    _record(self.__name__, time.perf_counter() - started)
+                self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def _record(name: str, seconds: float) -> None:
+    load_times[name] = seconds
+    print(f"[INFO] Loaded {name} in {seconds * 1000:.0f} ms")
+    from telemetry import latency
+    latency.record(f"import.{name}", seconds)
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    A module that is imported the first time one of its attributes is used.
+    """
+    with _lock:
+        module = _lazy.get(name)
+        if module is None:
+            module = _lazy[name] = LazyModule(name)
+        return module
+
+
+def preload(*names: str, background: bool = True) -> threading.Thread | None:
+    """
+    Imports lazy modules ahead of first use, by default on a daemon thread.
+    A module that fails to import is reported and left for its first use to raise.
+
+    Parameters:
+        names: Modules to load; defaults to every module declared with lazy_import.
+    """
+    def run():
+        for name in names or list(_lazy):
+            try:
+                lazy_import(name)._load()
+            except Exception as e:
+                print(f"[ERROR] Preloading {name} failed: {e}")
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, daemon=True, name="preload")
+    thread.start()
+    return thread
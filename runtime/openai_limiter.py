@@ -0,0 +1,400 @@
+"""
+One rate limiter and daily budget for every OpenAI call made with the
+project's API key.
+
+The camera check on arrival (``vision.match``) and the voice bot's chat
+(``llm.summary``, ``llm.choose``, ``llm.answer``) share the key's per-minute
+request and token limits. Each call goes through ``limiter.complete`` with its
+caller and a priority:
+
+- CRITICAL calls keep the robot moving and may use the whole bucket;
+- NORMAL calls (summaries, choosing exhibits) leave RESERVE[NORMAL] of it;
+- CHAT calls (visitor questions) leave RESERVE[CHAT] of it.
+
+A burst of questions therefore queues behind the reserve instead of
+rate-limiting the next camera check. Waiters are served highest priority
+first, in arrival order within a priority. A 429 from the API empties the
+buckets so every caller backs off together.
+
+Identical requests already in flight are sent once, and every caller gets
+the reply. When the daily token or dollar budget is spent, calls below
+CRITICAL are answered from earlier identical replies or from the caller's
+local fallback. Without either, BudgetExceeded is raised. Camera checks are
+still made.
+
+Usage per caller (calls, tokens, dollars, coalesced and degraded calls) is
+kept for the day in OPENAI_USAGE_FILE and exported as ``museum_openai_*``
+metrics. To see today's:
+    python runtime/openai_limiter.py [openai_usage.json]
+"""
+
+import collections
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from telemetry import metrics
+
+CRITICAL, NORMAL, CHAT = 0, 1, 2
+PRIORITY_NAMES = {CRITICAL: "critical", NORMAL: "normal", CHAT: "chat"}
+# Share of each bucket a priority must leave for the ones above it.
+RESERVE = {CRITICAL: 0.0, NORMAL: 0.1, CHAT: 0.3}
+
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))        # requests per minute, 0 for no limit
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "200000"))     # tokens per minute, 0 for no limit
+DAILY_TOKENS = int(os.getenv("OPENAI_DAILY_TOKENS", "0"))    # 0 for no limit
+DAILY_USD = float(os.getenv("OPENAI_DAILY_USD", "0"))        # 0 for no limit
+USAGE_FILE = os.getenv("OPENAI_USAGE_FILE", "openai_usage.json")
+
+# US dollars per million (prompt, completion) tokens. Unknown models are
+# charged at the dearest price.
+PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o": (2.50, 10.00),
+}
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 255          # one 512 px tile at high detail
+DEFAULT_COMPLETION_TOKENS = 200
+CACHE_ENTRIES = 256         # replies kept for answering over budget
+MAX_WAIT_STEP = 1.0         # seconds between bucket checks while queued
+
+CALLS = metrics.counter("museum_openai_calls_total",
+                        "OpenAI calls by caller and how they were answered", ["caller", "result"])
+TOKENS = metrics.counter("museum_openai_tokens_total", "OpenAI tokens used", ["caller"])
+COST = metrics.counter("museum_openai_cost_dollars_total", "Estimated OpenAI spend", ["caller"])
+WAIT_SECONDS = metrics.histogram("museum_openai_wait_seconds",
+                                 "Wait for rate limit headroom", ["priority"])
+BUDGET_USED = metrics.gauge("museum_openai_budget_used_ratio",
+                            "Share of the daily token or dollar budget spent")
+
+
+class BudgetExceeded(RuntimeError):
+    """
+    The daily budget is spent and the call has no cached or local answer.
+    """
+
+
+class TokenBucket:
+    """
+    ``per_minute`` units refilled continuously, holding at most a minute's worth.
+    A limit of 0 never runs dry.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + max(0.0, now - self._updated) * self.rate)
+        self._updated = now
+
+    def shortfall(self, amount: float, reserve: float) -> float:
+        """
+        Seconds until amount can be taken while leaving reserve (a share of
+        the capacity) in the bucket; 0 if it can be taken now.
+        """
+        if not self.capacity:
+            return 0.0
+        needed = min(amount, self.capacity) + reserve * self.capacity
+        return max(0.0, (needed - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        # A reply longer than estimated leaves the bucket in debt.
+        if self.capacity:
+            self.level -= amount
+
+
+def estimate_tokens(request: dict) -> tuple[int, int]:
+    """
+    Rough (prompt, completion) token counts for a chat request.
+    """
+    chars, images = 0, 0
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            for part in content or []:
+                if part.get("type") == "image_url":
+                    images += 1
+                else:
+                    chars += len(part.get("text", ""))
+    prompt = chars // CHARS_PER_TOKEN + 4 * len(request.get("messages", [])) + images * IMAGE_TOKENS
+    return prompt, request.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+
+
+def price(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    per_prompt, per_completion = next(
+        (p for name, p in sorted(PRICES.items(), key=lambda item: -len(item[0]))
+         if model.startswith(name)),
+        max(PRICES.values()))
+    return (prompt_tokens * per_prompt + completion_tokens * per_completion) / 1e6
+
+
+def _request_key(request: dict) -> str:
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class OpenAILimiter:
+    """
+    Admits OpenAI calls by priority within the key's rate limits and the
+    daily budget. Safe to use from any thread.
+
+    Parameters:
+        rpm: Requests per minute (0 for no limit).
+        tpm: Tokens per minute (0 for no limit).
+        daily_tokens: Tokens per day before non-critical calls degrade (0 for no limit).
+        daily_usd: Dollars per day before non-critical calls degrade (0 for no limit).
+        path: File keeping today's usage across restarts (None keeps it in memory).
+    """
+
+    def __init__(self, rpm: int = OPENAI_RPM, tpm: int = OPENAI_TPM,
+                 daily_tokens: int = DAILY_TOKENS, daily_usd: float = DAILY_USD,
+                 path: str | None = USAGE_FILE):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.daily_tokens = daily_tokens
+        self.daily_usd = daily_usd
+        self.path = path
+        self.day = time.strftime("%Y-%m-%d")
+        self.callers: dict[str, dict] = {}
+        self._cache: collections.OrderedDict[str, str] = collections.OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self._waiting: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+    def complete(self, caller: str, priority: int, create: Callable, fallback: Callable[[], str] | None = None,
+                 **request) -> str:
+        """
+        Makes a chat completion, ``create(**request)``, once there is room for it.
+
+        Parameters:
+            caller: Whose usage this is, e.g. "llm.answer".
+            priority: CRITICAL, NORMAL or CHAT.
+            create: The client's ``chat.completions.create``.
+            fallback: Local answer to give when over budget.
+
+        Returns:
+            The reply's text.
+        """
+        key = _request_key(request)
+        with self._cond:
+            self._roll_day()
+            if priority > CRITICAL and self.over_budget():
+                return self._degrade(caller, key, fallback)
+            pending = self._inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._inflight[key] = Future()
+            else:
+                self._usage(caller)["coalesced"] += 1
+        if not owner:
+            CALLS.labels(caller=caller, result="coalesced").inc()
+            return pending.result()
+
+        try:
+            prompt, completion = estimate_tokens(request)
+            estimated = prompt + completion
+            self._acquire(priority, estimated)
+            try:
+                response = create(**request)
+            except Exception as e:
+                if getattr(e, "status_code", None) == 429:
+                    self._throttled()
+                CALLS.labels(caller=caller, result="error").inc()
+                raise
+            text = response.choices[0].message.content.strip()
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                prompt, completion = usage.prompt_tokens, usage.completion_tokens
+            else:
+                completion = len(text) // CHARS_PER_TOKEN + 1
+            self._settle(caller, key, text, request.get("model", ""), prompt, completion, estimated)
+            CALLS.labels(caller=caller, result="live").inc()
+            pending.set_result(text)
+            return text
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                del self._inflight[key]
+
+    def _acquire(self, priority: int, tokens: int) -> None:
+        """
+        Waits until this call is the most urgent one queued and both buckets
+        have room for it above its priority's reserve.
+        """
+        started = time.monotonic()
+        reserve = RESERVE[priority]
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    delay = MAX_WAIT_STEP
+                    if self._waiting[0] == entry:
+                        delay = max(self.requests.shortfall(1, reserve),
+                                    self.tokens.shortfall(tokens, reserve))
+                        if delay <= 0:
+                            break
+                    self._cond.wait(min(delay, MAX_WAIT_STEP))
+                self.requests.take(1)
+                self.tokens.take(tokens)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+        WAIT_SECONDS.labels(priority=PRIORITY_NAMES[priority]).observe(time.monotonic() - started)
+
+    def _throttled(self) -> None:
+        print("[ERROR] OpenAI rate limit hit; holding every caller back")
+        with self._cond:
+            self.requests.level = min(self.requests.level, 0.0)
+            self.tokens.level = min(self.tokens.level, 0.0)
+
+    def _settle(self, caller: str, key: str, text: str, model: str,
+                prompt: int, completion: int, estimated: int) -> None:
+        """
+        Books a finished call's real usage against the bucket and the day.
+        """
+        cost = price(model, prompt, completion)
+        with self._cond:
+            self.tokens.take(prompt + completion - estimated)
+            usage = self._usage(caller)
+            usage["calls"] += 1
+            usage["tokens"] += prompt + completion
+            usage["cost"] += cost
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            if len(self._cache) > CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+            self._cond.notify_all()
+        TOKENS.labels(caller=caller).inc(prompt + completion)
+        COST.labels(caller=caller).inc(cost)
+        BUDGET_USED.set(self.budget_used())
+        self.save()
+
+    def _degrade(self, caller: str, key: str, fallback: Callable[[], str] | None) -> str:
+        """
+        Answers an over-budget call without the API. Called with the lock held.
+        """
+        self._usage(caller)["degraded"] += 1
+        text = self._cache.get(key)
+        if text is not None:
+            CALLS.labels(caller=caller, result="cached").inc()
+            return text
+        if fallback is not None:
+            CALLS.labels(caller=caller, result="fallback").inc()
+            return fallback()
+        CALLS.labels(caller=caller, result="refused").inc()
+        raise BudgetExceeded(f"daily OpenAI budget spent; {caller} has no local answer")
+
+    # ------------------------------------------------------------------
+    # Budget and usage
+    # ------------------------------------------------------------------
+    def _usage(self, caller: str) -> dict:
+        return self.callers.setdefault(
+            caller, {"calls": 0, "tokens": 0, "cost": 0.0, "coalesced": 0, "degraded": 0})
+
+    def _roll_day(self) -> None:
+        today = time.strftime("%Y-%m-%d")
+        if today != self.day:
+            self.day = today
+            self.callers = {}
+            BUDGET_USED.set(0.0)
+
+    def budget_used(self) -> float:
+        """
+        Share of the daily budget spent: the larger of tokens and dollars,
+        0 without a budget.
+        """
+        used = 0.0
+        if self.daily_tokens:
+            used = sum(u["tokens"] for u in self.callers.values()) / self.daily_tokens
+        if self.daily_usd:
+            used = max(used, sum(u["cost"] for u in self.callers.values()) / self.daily_usd)
+        return used
+
+    def over_budget(self) -> bool:
+        return self.budget_used() >= 1.0
+
+    def usage(self) -> dict[str, dict]:
+        """
+        Today's usage per caller.
+        """
+        with self._cond:
+            self._roll_day()
+            return {caller: dict(u) for caller, u in self.callers.items()}
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] could not read OpenAI usage from {self.path}: {e}")
+            return
+        if saved.get("day") == self.day:
+            for caller, usage in saved.get("callers", {}).items():
+                self._usage(caller).update(usage)
+            BUDGET_USED.set(self.budget_used())
+
+    def save(self) -> None:
+        """
+        Writes today's usage, replacing the file atomically.
+        """
+        if not self.path:
+            return
+        with self._cond:
+            data = json.dumps({"day": self.day, "callers": self.callers}, indent=1)
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"[ERROR] could not save OpenAI usage to {self.path}: {e}")
+
+
+def report(day: str, callers: dict[str, dict]) -> str:
+    if not callers:
+        return f"No OpenAI calls on {day}."
+    lines = [f"OpenAI usage on {day}:",
+             f"  {'caller':<16}{'calls':>7}{'tokens':>10}{'cost':>9}{'coalesced':>11}{'degraded':>10}"]
+    for caller, u in sorted(callers.items(), key=lambda item: -item[1]["cost"]):
+        lines.append(f"  {caller:<16}{u['calls']:>7}{u['tokens']:>10}{u['cost']:>8.3f}$"
+                     f"{u['coalesced']:>11}{u['degraded']:>10}")
+    return "\n".join(lines)
+
+
+limiter = OpenAILimiter()
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else USAGE_FILE
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Could not read {path}: {e}")
+    print(report(saved.get("day", "?"), saved.get("callers", {})))
@@ -0,0 +1,192 @@
+"""
+Supervisor for components hosted in one runtime process.
+
+Each component runs its target in a thread and receives a ``ComponentContext``
+for heartbeats and shutdown. When a target returns or raises, the component's
+thread reports the exit straight to the supervisor (no process polling), and the
+supervisor restarts it according to its policy with exponential backoff and a
+restart budget. Components whose heartbeat goes stale are reported unhealthy.
+"""
+
+import queue
+import threading
+import time
+import traceback
+from typing import Callable
+
+RESTART_ALWAYS = "always"          # restart after any exit (e.g. one tour per run)
+RESTART_ON_FAILURE = "on-failure"  # restart only after an exception
+RESTART_NEVER = "never"
+
+
+class ComponentContext:
+    """
+    Handed to a component's target function.
+    """
+
+    def __init__(self, component: "Component", stopping: threading.Event):
+        self.component = component
+        self.stopping = stopping
+
+    def heartbeat(self) -> None:
+        self.component.last_heartbeat = time.monotonic()
+
+
+class Component:
+    """
+    Parameters:
+        name: Unique component name.
+        target: Callable taking a ComponentContext; runs until done or stopping.
+        restart: One of RESTART_ALWAYS, RESTART_ON_FAILURE, RESTART_NEVER.
+        heartbeat_timeout: Seconds without a heartbeat before the component is
+            reported unhealthy, or None if it does not heartbeat.
+        max_restarts: Restarts allowed within restart_window seconds.
+        restart_window: Length of the restart budget window in seconds.
+    """
+
+    def __init__(self, name: str, target: Callable[[ComponentContext], None],
+                 restart: str = RESTART_ON_FAILURE, heartbeat_timeout: float | None = None,
+                 max_restarts: int = 5, restart_window: float = 60.0):
+        self.name = name
+        self.target = target
+        self.restart = restart
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+
+        self.thread: threading.Thread | None = None
+        self.state = "stopped"  # stopped | running | backoff | failed
+        self.started_at = 0.0
+        self.last_heartbeat = 0.0
+        self.restart_times: list[float] = []
+        self.last_error: str | None = None
+        self.healthy = True
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "healthy": self.healthy,
+            "restarts": len(self.restart_times),
+            "uptime": time.monotonic() - self.started_at if self.state == "running" else 0.0,
+            "last_error": self.last_error,
+        }
+
+
+class Supervisor:
+    """
+    Starts, watches and restarts components.
+
+    Parameters:
+        check_interval: How often heartbeats and pending restarts are checked.
+        on_health: Optional callback(name, status) whenever a component's health changes.
+    """
+
+    def __init__(self, check_interval: float = 1.0,
+                 on_health: Callable[[str, dict], None] | None = None):
+        self.check_interval = check_interval
+        self.on_health = on_health
+        self.components: dict[str, Component] = {}
+        self.stopping = threading.Event()
+        self._exits = queue.Queue()
+        self._restart_at: dict[str, float] = {}
+
+    def add(self, component: Component) -> None:
+        self.components[component.name] = component
+
+    def start(self) -> None:
+        for component in self.components.values():
+            self._launch(component)
+
+    def _launch(self, component: Component) -> None:
+        context = ComponentContext(component, self.stopping)
+
+        def runner():
+            error = None
+            try:
+                component.target(context)
+            except BaseException as e:
+                error = f"{type(e).__name__}: {e}"
+                traceback.print_exc()
+            self._exits.put((component.name, error))
+
+        now = time.monotonic()
+        component.state = "running"
+        component.started_at = now
+        component.last_heartbeat = now
+        component.thread = threading.Thread(target=runner, daemon=True, name=component.name)
+        component.thread.start()
+        print(f"[SUPERVISOR] Started {component.name}")
+
+    def run_forever(self) -> None:
+        """
+        Reacts to component exits as they happen and checks heartbeats.
+        """
+        while not self.stopping.is_set():
+            try:
+                name, error = self._exits.get(timeout=self.check_interval)
+                self._handle_exit(self.components[name], error)
+            except queue.Empty:
+                pass
+            self._launch_due()
+            self._check_heartbeats()
+
+    def _handle_exit(self, component: Component, error: str | None) -> None:
+        component.last_error = error
+        if self.stopping.is_set():
+            component.state = "stopped"
+            return
+        print(f"[SUPERVISOR] {component.name} exited" + (f" with {error}" if error else ""))
+
+        wants_restart = (component.restart == RESTART_ALWAYS
+                         or (component.restart == RESTART_ON_FAILURE and error))
+        if not wants_restart:
+            component.state = "stopped"
+            return
+
+        now = time.monotonic()
+        component.restart_times = [t for t in component.restart_times
+                                   if now - t < component.restart_window]
+        if error and len(component.restart_times) >= component.max_restarts:
+            print(f"[SUPERVISOR] {component.name} is crash-looping, giving up")
+            component.state = "failed"
+            self._set_health(component, False)
+            return
+
+        # Clean exits restart immediately; crashes back off 0.5 s, 1 s, 2 s ... up to 10 s.
+        recent_failures = len(component.restart_times) if error else 0
+        delay = 0.0 if not error else min(10.0, 0.5 * 2 ** recent_failures)
+        component.restart_times.append(now)
+        component.state = "backoff"
+        self._restart_at[component.name] = now + delay
+
+    def _launch_due(self) -> None:
+        now = time.monotonic()
+        for name, when in list(self._restart_at.items()):
+            if when <= now:
+                del self._restart_at[name]
+                self._launch(self.components[name])
+
+    def _check_heartbeats(self) -> None:
+        now = time.monotonic()
+        for component in self.components.values():
+            if component.state != "running" or component.heartbeat_timeout is None:
+                continue
+            healthy = now - component.last_heartbeat <= component.heartbeat_timeout
+            if healthy != component.healthy:
+                if not healthy:
+                    print(f"[SUPERVISOR] {component.name} missed its heartbeat")
+                self._set_health(component, healthy)
+
+    def _set_health(self, component: Component, healthy: bool) -> None:
+        component.healthy = healthy
+        if self.on_health:
+            self.on_health(component.name, component.status())
+
+    def status(self) -> dict:
+        return {name: c.status() for name, c in self.components.items()}
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self.stopping.set()
+        for component in self.components.values():
+            if component.thread and component.thread.is_alive():
+                component.thread.join(timeout)
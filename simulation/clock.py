@@ -0,0 +1,213 @@
+"""
+Event-driven virtual clock for running the museum faster than real time.
+
+Simulated code sleeps on the clock instead of the wall clock. The clock jumps
+straight to the earliest pending wake-up as soon as the system has settled:
+no thread has started or finished a sleep for ``settle`` real seconds and every
+quiet-check (for example "no bus messages in flight") passes. Computation
+therefore takes no simulated time and an idle minute costs a few milliseconds.
+
+``install(module, ...)`` swaps a module's ``time`` for the clock, so the real
+voice bot, tour and navigation code measure and sleep in simulated seconds
+without being edited. Waits on locks, events and queues stay in real time;
+they are released by some other thread that sleeps on the clock.
+"""
+
+import heapq
+import itertools
+import threading
+import time as real_time
+from contextlib import contextmanager
+from typing import Callable
+
+
+class VirtualTime:
+    """
+    Stand-in for the ``time`` module backed by a VirtualClock.
+    """
+
+    def __init__(self, clock: "VirtualClock"):
+        self._clock = clock
+
+    def sleep(self, seconds: float) -> None:
+        self._clock.sleep(seconds)
+
+    def time(self) -> float:
+        return self._clock.epoch + self._clock.now()
+
+    def monotonic(self) -> float:
+        return self._clock.now()
+
+    def perf_counter(self) -> float:
+        return self._clock.now()
+
+    def strftime(self, fmt: str, t=None) -> str:
+        return real_time.strftime(fmt, t if t is not None else real_time.localtime(self.time()))
+
+    def __getattr__(self, name):
+        return getattr(real_time, name)
+
+
+class VirtualClock:
+    """
+    Simulated seconds, advanced whenever every simulated thread is waiting.
+
+    Parameters:
+        settle: Real seconds without clock activity before time may jump.
+        speed: Optional cap in simulated seconds per real second (None runs as
+            fast as the system settles).
+        epoch: Wall-clock time that simulated second 0 corresponds to.
+    """
+
+    def __init__(self, settle: float = 0.001, speed: float | None = None,
+                 epoch: float | None = None):
+        self.settle = settle
+        self.speed = speed
+        self.epoch = real_time.time() if epoch is None else epoch
+        self.time = VirtualTime(self)
+        self._now = 0.0
+        self._sleepers: list[tuple[float, int, threading.Event]] = []
+        self._seq = itertools.count()
+        self._activity = 0
+        self._quiet_checks: list[Callable[[], bool]] = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._installed: list[tuple[object, object]] = []
+
+    def now(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        """
+        Blocks the calling thread for a number of simulated seconds.
+        """
+        self.sleep_until(self._now + max(0.0, seconds))
+
+    def sleep_until(self, deadline: float) -> None:
+        wake = threading.Event()
+        with self._cond:
+            if deadline <= self._now:
+                return
+            heapq.heappush(self._sleepers, (deadline, next(self._seq), wake))
+            self._activity += 1
+            self._cond.notify_all()
+        wake.wait()
+
+    def add_quiet_check(self, check: Callable[[], bool]) -> None:
+        """
+        Adds a condition that must hold before time jumps, e.g. an empty bus.
+        """
+        self._quiet_checks.append(check)
+
+    def sleeping(self) -> int:
+        with self._cond:
+            return len(self._sleepers)
+
+    # ------------------------------------------------------------------
+    # Driving time
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="virtual-clock")
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _settled(self) -> bool:
+        with self._cond:
+            while self._running and not self._sleepers:
+                self._cond.wait()
+            seen = self._activity
+        real_time.sleep(self.settle)
+        with self._cond:
+            return seen == self._activity and all(check() for check in self._quiet_checks)
+
+    def _run(self) -> None:
+        while self._running:
+            if not self._settled():
+                continue
+            with self._cond:
+                if not self._sleepers:
+                    continue
+                deadline = self._sleepers[0][0]
+            if self.speed:
+                real_time.sleep(max(0.0, deadline - self._now) / self.speed)
+            with self._cond:
+                self._now = max(self._now, deadline)
+                while self._sleepers and self._sleepers[0][0] <= self._now:
+                    heapq.heappop(self._sleepers)[2].set()
+                self._activity += 1
+
+    # ------------------------------------------------------------------
+    # Patching modules
+    # ------------------------------------------------------------------
+    def install(self, *modules) -> None:
+        """
+        Points each module's ``time`` global at this clock.
+        """
+        for module in modules:
+            self._installed.append((module, module.time))
+            module.time = self.time
+
+    def uninstall(self) -> None:
+        while self._installed:
+            module, original = self._installed.pop()
+            module.time = original
+
+
+class Timeline:
+    """
+    Records when the robot was busy (talking, listening to the visitor,
+    driving) in simulated time, so idle stretches can be measured afterwards.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.intervals: list[tuple[float, float, str]] = []
+        self._open: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, kind: str) -> None:
+        with self._lock:
+            self._open.setdefault(kind, self.clock.now())
+
+    def end(self, kind: str) -> None:
+        with self._lock:
+            started = self._open.pop(kind, None)
+            if started is not None:
+                self.intervals.append((started, self.clock.now(), kind))
+
+    @contextmanager
+    def busy(self, kind: str):
+        self.begin(kind)
+        try:
+            yield
+        finally:
+            self.end(kind)
+
+    def busy_time(self, start: float, end: float, kinds: set[str] | None = None) -> float:
+        """
+        Simulated seconds within [start, end] covered by any busy interval.
+        """
+        with self._lock:
+            spans = [(max(a, start), min(b, end)) for a, b, kind in self.intervals
+                     if (kinds is None or kind in kinds) and b > start and a < end]
+            spans += [(max(a, start), end) for kind, a in self._open.items()
+                      if (kinds is None or kind in kinds) and a < end]
+        covered, reach = 0.0, start
+        for a, b in sorted(spans):
+            if b > reach:
+                covered += b - max(a, reach)
+                reach = b
+        return covered
+
+    def forget_before(self, cutoff: float) -> None:
+        with self._lock:
+            self.intervals = [i for i in self.intervals if i[1] > cutoff]
@@ -0,0 +1,437 @@
+"""
+Simulated motors, ultrasonic sensor and camera check for the museum simulator.
+
+``install()`` registers modules under the names navigation.py imports
+(basic_embedded.twomotorbasic, basic_embedded.ultrasonic_sensor and
+capture_analyse), so the real navigation code drives simulated hardware. It
+must run before navigation.navigation (or main) is first imported.
+
+Motion takes the same time as on the robot: the motion engine's duty-cycle
+profiles run on the virtual clock and the simulated base moves at a speed
+set by the duty cycle. The wheels slip, so the base ends up a little short
+of or past where navigation thinks it is, unless landmarks on the walls
+(``museum_index``) put it right. Visitors occasionally stand in the robot's
+way, and the camera check sometimes fails to recognise the exhibit in front
+of it, and always when the robot stopped well off the cell centre.
+"""
+
+import math
+import random
+import sys
+import threading
+import types
+from typing import Callable
+
+from capture_analyse import ARTWORKS
+from navigation.landmarks import LandmarkIndex
+from navigation.motion import Calibration
+from navigation.museum_map import (
+    Location_matrix, DIRECTION_VECTORS, HOME_POSITION, TURN_90_TIME, TURN_180_TIME,
+)
+from simulation.clock import VirtualClock, Timeline
+
+CLEAR_DISTANCE = 200.0     # cm reported with nothing in front of the robot
+BLOCKED_DISTANCE = 20.0    # cm reported while a visitor stands in the way
+OPEN_DISTANCE = 400.0      # cm reported by the calibration rangefinder off the wall
+OBSTACLE_CHANCE = 0.03     # per obstacle check before a cell
+OBSTACLE_SECONDS = (2.0, 12.0)
+VISION_MISS_CHANCE = 0.08  # per capture at the right exhibit
+VISION_LATENCY = (2.0, 4.5)  # capture plus the vision model round trip
+VISION_OFF_CENTRE = 0.3    # cells off the exhibit's cell centre before the camera misses it
+LANDMARK_LATENCY = (0.04, 0.09)  # frame grab plus marker detection on the Pi
+LANDMARK_FOV = math.radians(60)
+LANDMARK_RANGE = 4.0       # cells; markers further away are too small to decode
+MARKER_RANGE_NOISE = 0.02  # relative error of a marker's distance
+MARKER_OFFSET_NOISE = 2.0  # cm
+EXHIBIT_LATENCY = (0.08, 0.2)  # frame grab, ORB matching and homography on the Pi
+EXHIBIT_NOISE = 1.5        # cm, on the offset and range to an exhibit
+EXHIBIT_DISTANCE = 50.0    # cm from the cell centre to the exhibit on the wall
+
+
+class SimMotors:
+    """
+    The twomotorbasic API on the virtual clock, moving a simulated base.
+
+    Speed is proportional to the PWM duty cycle above ``physics.min_duty``;
+    at cruise the base covers a cell in ``physics.cell_time`` seconds and a
+    quarter turn in ``physics.turn_90_time``. By default this is the
+    uncalibrated robot, so navigation's profiles take the same time here as on
+    the robot; give it other physics to exercise navigation/calibrate.py.
+
+    Each straight move also covers a random fraction more or less ground
+    (``slip``), and the base's true position on the floor is tracked in grid
+    units from HOME_POSITION, facing UP. Turns always end square to the grid.
+
+    Parameters:
+        physics: How the simulated base actually moves.
+        slip: Standard deviation of the per-move speed error (0: none).
+        rng: Draws the slip.
+    """
+
+    def __init__(self, clock: VirtualClock, timeline: Timeline | None = None,
+                 physics: Calibration | None = None, slip: float = 0.0,
+                 rng: random.Random | None = None):
+        self.clock = clock
+        self.timeline = timeline
+        self.physics = physics or Calibration()
+        self.slip = slip
+        self.rng = rng or random.Random()
+        self.direction = {1: 0, 2: 0}  # +1 forward, -1 backward, 0 stopped
+        self.duty = {1: 100.0, 2: 100.0}
+        self.travel = 0.0     # cells driven forward (net) since the start
+        self.distance = 0.0   # cells driven in either direction
+        self.heading = 0.0    # quarter turns to the right since the start
+        self.row, self.col = float(HOME_POSITION[0]), float(HOME_POSITION[1])
+        self.turns = 0
+        self._grip = 1.0      # speed factor of the current move
+        self._since = clock.now()
+        self._lock = threading.RLock()
+
+    @property
+    def distance_cells(self) -> int:
+        return round(self.distance)
+
+    def _speed(self) -> float:
+        p = self.physics
+        duty = (self.duty[1] + self.duty[2]) / 2
+        return max(0.0, min(1.0, (duty - p.min_duty) / (p.cruise_duty - p.min_duty)))
+
+    def _integrate(self) -> None:
+        now = self.clock.now()
+        elapsed, self._since = now - self._since, now
+        m1, m2 = self.direction[1], self.direction[2]
+        if elapsed <= 0 or (m1 == 0 and m2 == 0):
+            return
+        if m1 == m2:
+            cells = m1 * self._speed() * self._grip * elapsed / self.physics.cell_time
+            self.travel += cells
+            self.distance += abs(cells)
+            dr, dc = self.facing()
+            self.row += dr * cells
+            self.col += dc * cells
+        elif m1 == -m2:
+            self.heading += m1 * self._speed() * elapsed / self.physics.turn_90_time
+
+    def _set(self, motor: int, direction: int) -> None:
+        with self._lock:
+            self._integrate()
+            before = dict(self.direction)
+            self.direction[motor] = direction
+            m1, m2 = self.direction[1], self.direction[2]
+            if m1 and m1 == -m2 and not (before[1] and before[1] == -before[2]):
+                self.turns += 1
+            if m1 and m1 == m2 and not (before[1] and before[1] == before[2]):
+                self._grip = max(0.5, 1.0 + self.rng.gauss(0.0, self.slip)) if self.slip else 1.0
+            if not (m1 or m2):
+                self.heading = float(round(self.heading))  # turns end square to the grid
+        if self.timeline:
+            if m1 or m2:
+                self.timeline.begin("drive")
+            else:
+                self.timeline.end("drive")
+
+    def facing(self) -> tuple[int, int]:
+        """
+        (row, col) unit vector of the heading, to the nearest quarter turn.
+        """
+        return DIRECTION_VECTORS[("UP", "RIGHT", "DOWN", "LEFT")[round(self.heading) % 4]]
+
+    def pose(self) -> tuple[float, float]:
+        """
+        (cells travelled forward, quarter turns to the right) right now.
+        """
+        with self._lock:
+            self._integrate()
+            return self.travel, self.heading
+
+    def position(self) -> tuple[float, float]:
+        """
+        True (row, col) on the floor right now.
+        """
+        with self._lock:
+            self._integrate()
+            return self.row, self.col
+
+    def init(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        self.motor1_stop()
+        self.motor2_stop()
+
+    def set_speed(self, motor: int, speed: float) -> None:
+        with self._lock:
+            self._integrate()
+            self.duty[motor] = speed
+
+    def motor1_forward(self) -> None:
+        self._set(1, 1)
+
+    def motor1_backward(self) -> None:
+        self._set(1, -1)
+
+    def motor2_forward(self) -> None:
+        self._set(2, 1)
+
+    def motor2_backward(self) -> None:
+        self._set(2, -1)
+
+    def motor1_stop(self) -> None:
+        self._set(1, 0)
+
+    def motor2_stop(self) -> None:
+        self._set(2, 0)
+
+    def move_forward(self) -> None:
+        self.motor1_forward()
+        self.motor2_forward()
+
+    def move_backward(self) -> None:
+        self.motor1_backward()
+        self.motor2_backward()
+
+    def _turn(self, right: bool, seconds: float) -> None:
+        if right:
+            self.motor1_forward()
+            self.motor2_backward()
+        else:
+            self.motor1_backward()
+            self.motor2_forward()
+        self.clock.sleep(seconds)
+        self.motor1_stop()
+        self.motor2_stop()
+
+    def turn_90_left(self) -> None:
+        self._turn(False, TURN_90_TIME)
+
+    def turn_90_right(self) -> None:
+        self._turn(True, TURN_90_TIME)
+
+    def turn_behind_left(self) -> None:
+        self._turn(False, TURN_180_TIME)
+
+    def turn_behind_right(self) -> None:
+        self._turn(True, TURN_180_TIME)
+
+
+class SimRangefinder:
+    """
+    The ultrasonic_sensor API for calibration runs: a wall straight ahead of
+    the robot's starting heading and open floor in every other direction.
+
+    Parameters:
+        motors: The simulated base whose pose decides the reading.
+        wall_cm: Distance to the wall at the start.
+        beam_quarters: Half the beam width, in quarter turns.
+    """
+
+    def __init__(self, motors: SimMotors, wall_cm: float = 400.0, beam_quarters: float = 0.1):
+        self.motors = motors
+        self.wall_cm = wall_cm
+        self.beam_quarters = beam_quarters
+
+    def init_sensor(self) -> None:
+        pass
+
+    def stop_sensor(self) -> None:
+        pass
+
+    def get_distance(self) -> float:
+        travel, heading = self.motors.pose()
+        off = abs(heading - 4 * round(heading / 4))
+        if off > self.beam_quarters:
+            return OPEN_DISTANCE
+        return max(2.0, self.wall_cm - travel * self.motors.physics.cell_size_cm)
+
+    def cleanup(self) -> None:
+        pass
+
+
+class SimUltrasonic:
+    """
+    The ultrasonic_sensor API. Each clear check may find a visitor in the way,
+    who then stays there for a while.
+    """
+
+    def __init__(self, clock: VirtualClock, rng: random.Random):
+        self.clock = clock
+        self.rng = rng
+        self.blocked_until = None
+        self.obstacles = 0
+
+    def init_sensor(self) -> None:
+        pass
+
+    def stop_sensor(self) -> None:
+        pass
+
+    def get_distance(self) -> float:
+        now = self.clock.now()
+        if self.blocked_until is not None:
+            if now < self.blocked_until:
+                return BLOCKED_DISTANCE
+            self.blocked_until = None
+            return CLEAR_DISTANCE
+        if self.rng.random() < OBSTACLE_CHANCE:
+            self.obstacles += 1
+            self.blocked_until = now + self.rng.uniform(*OBSTACLE_SECONDS)
+            return BLOCKED_DISTANCE
+        return CLEAR_DISTANCE
+
+    def cleanup(self) -> None:
+        pass
+
+
+class SimVision:
+    """
+    Deterministic stand-in for capture_analyse.cap_anal: recognises the
+    exhibit at the robot's cell, except for an occasional miss, or when the
+    robot is more than VISION_OFF_CENTRE from the cell centre. Like the real
+    vision model, it only ever names an exhibit in ARTWORKS, never "initial".
+
+    Parameters:
+        pose: Returns the robot's true (row, col), e.g. SimMotors.position.
+    """
+
+    def __init__(self, clock: VirtualClock, rng: random.Random,
+                 pose: Callable[[], tuple[float, float]] | None = None, timeline: Timeline | None = None):
+        self.clock = clock
+        self.rng = rng
+        self.pose = pose
+        self.timeline = timeline
+        self.captures = 0
+        self.misses = 0
+
+    def cap_anal(self) -> str:
+        self.captures += 1
+        if self.timeline:
+            with self.timeline.busy("vision"):
+                self.clock.sleep(self.rng.uniform(*VISION_LATENCY))
+        else:
+            self.clock.sleep(self.rng.uniform(*VISION_LATENCY))
+        row, col = self.pose()
+        cell_row, cell_col = round(row), round(col)
+        seen = None
+        if (0 <= cell_row < len(Location_matrix) and 0 <= cell_col < len(Location_matrix[0])
+                and max(abs(row - cell_row), abs(col - cell_col)) <= VISION_OFF_CENTRE):
+            seen = Location_matrix[cell_row][cell_col]
+        if seen not in ARTWORKS or self.rng.random() < VISION_MISS_CHANCE:
+            self.misses += 1
+            return "nothing found"
+        return seen
+
+
+def museum_index(size_cm: float = 15.0) -> LandmarkIndex:
+    """
+    A marker on the wall at the end of every row and column of the floor,
+    facing into the room, and a view of every exhibit.
+    """
+    rows, cols = len(Location_matrix), len(Location_matrix[0])
+    landmarks = []
+    for col in range(cols):
+        landmarks.append({"position": [-0.5, col], "faces": "DOWN"})
+        landmarks.append({"position": [rows - 0.5, col], "faces": "UP"})
+    for row in range(rows):
+        landmarks.append({"position": [row, -0.5], "faces": "RIGHT"})
+        landmarks.append({"position": [row, cols - 0.5], "faces": "LEFT"})
+    for marker_id, landmark in enumerate(landmarks):
+        landmark.update(id=f"marker:{marker_id}", size_cm=size_cm)
+    for row in Location_matrix:
+        for name in row:
+            if isinstance(name, str) and name != "initial":
+                landmarks.append({"id": f"exhibit:{name}", "distance_cm": EXHIBIT_DISTANCE})
+    return LandmarkIndex(landmarks, root="")
+
+
+class SimLandmarks:
+    """
+    Stand-in for capture_analyse.locate_landmarks and locate_exhibit: the
+    index's markers and exhibits in front of the simulated base, with the
+    range and offset a camera would measure, plus noise. Keyframes are never
+    recognised. An exhibit hangs on the wall half a cell beyond its cell
+    centre, on the side the robot faces.
+    """
+
+    def __init__(self, clock: VirtualClock, motors: SimMotors, rng: random.Random):
+        self.clock = clock
+        self.motors = motors
+        self.rng = rng
+        self.frames = 0
+        self.sightings = 0
+
+    def locate_landmarks(self, index: LandmarkIndex) -> list[dict]:
+        self.clock.sleep(self.rng.uniform(*LANDMARK_LATENCY))
+        self.frames += 1
+        row, col = self.motors.position()
+        dr, dc = self.motors.facing()
+        cell_cm = self.motors.physics.cell_size_cm
+        found = []
+        for landmark in index.markers():
+            fr, fc = DIRECTION_VECTORS[landmark["faces"]]
+            if (fr + dr, fc + dc) != (0, 0):
+                continue  # seen edge-on or from behind
+            to_row, to_col = landmark["position"][0] - row, landmark["position"][1] - col
+            ahead = to_row * dr + to_col * dc
+            right = to_row * dc - to_col * dr
+            if not 0.2 < ahead <= LANDMARK_RANGE or abs(right) > ahead * math.tan(LANDMARK_FOV / 2):
+                continue
+            found.append({
+                "landmark": landmark["id"],
+                "distance_cm": ahead * cell_cm * (1 + self.rng.gauss(0.0, MARKER_RANGE_NOISE)),
+                "offset_cm": right * cell_cm + self.rng.gauss(0.0, MARKER_OFFSET_NOISE),
+            })
+        self.sightings += len(found)
+        return found
+
+    def locate_exhibit(self, index: LandmarkIndex, name: str) -> dict | None:
+        self.clock.sleep(self.rng.uniform(*EXHIBIT_LATENCY))
+        exhibit = index.exhibit(name)
+        cells = [(r, c) for r, row in enumerate(Location_matrix) for c, seen in enumerate(row) if seen == name]
+        if exhibit is None or not cells:
+            return None
+        row, col = self.motors.position()
+        dr, dc = self.motors.facing()
+        cell_cm = self.motors.physics.cell_size_cm
+        to_row = cells[0][0] + dr * EXHIBIT_DISTANCE / cell_cm - row
+        to_col = cells[0][1] + dc * EXHIBIT_DISTANCE / cell_cm - col
+        ahead = to_row * dr + to_col * dc
+        right = to_row * dc - to_col * dr
+        if ahead <= 0 or abs(right) > ahead * math.tan(LANDMARK_FOV / 2):
+            return None
+        return {"offset_cm": right * cell_cm + self.rng.gauss(0.0, EXHIBIT_NOISE),
+                "range_error_cm": ahead * cell_cm - exhibit["distance_cm"] + self.rng.gauss(0.0, EXHIBIT_NOISE)}
+
+
+def _module(name: str, **functions) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(functions)
+    return module
+
+
+def install(motors: SimMotors, sensor: SimUltrasonic, vision: SimVision,
+            landmarks: SimLandmarks | None = None) -> None:
+    """
+    Registers the simulated hardware under the module names navigation.py imports.
+    """
+    if "navigation.navigation" in sys.modules:
+        raise RuntimeError("install() must run before navigation.navigation is imported")
+    sys.modules["basic_embedded.twomotorbasic"] = _module(
+        "basic_embedded.twomotorbasic", init=motors.init, shutdown=motors.shutdown,
+        set_speed=motors.set_speed,
+        motor1_forward=motors.motor1_forward, motor1_backward=motors.motor1_backward,
+        motor2_forward=motors.motor2_forward, motor2_backward=motors.motor2_backward,
+        move_forward=motors.move_forward, move_backward=motors.move_backward,
+        turn_90_left=motors.turn_90_left, turn_90_right=motors.turn_90_right,
+        turn_behind_left=motors.turn_behind_left, turn_behind_right=motors.turn_behind_right,
+        motor1_stop=motors.motor1_stop, motor2_stop=motors.motor2_stop,
+    )
+    sys.modules["basic_embedded.ultrasonic_sensor"] = _module(
+        "basic_embedded.ultrasonic_sensor",
+        init_sensor=sensor.init_sensor, stop_sensor=sensor.stop_sensor,
+        get_distance=sensor.get_distance, cleanup=sensor.cleanup,
+    )
+    sys.modules["capture_analyse"] = _module(
+        "capture_analyse", ARTWORKS=ARTWORKS, cap_anal=vision.cap_anal,
+        locate_landmarks=landmarks.locate_landmarks if landmarks else lambda index: [],
+        locate_exhibit=landmarks.locate_exhibit if landmarks else lambda index, name: None,
+    )
@@ -0,0 +1,218 @@
+"""
+Deterministic stand-ins for the voice bot's audio devices and cloud services.
+
+Each one keeps the interface voicebot.py already uses (the OpenAI client's
+``chat.completions.create``, gTTS, SpeechPlayer, MicrophoneStream and an STT
+backend), so the real speak / listen / summarise code paths run unchanged.
+Latencies are drawn from seeded log-normal distributions around typical
+production figures and elapse on the virtual clock; replies come from fixed
+templates and the scripted visitor instead of the network and the microphone.
+"""
+
+import random
+import re
+from types import SimpleNamespace
+
+from nlp_voice_bot.stt_backends import STTBackend
+from simulation.clock import VirtualClock, Timeline
+
+# Median seconds and log-normal spread of each simulated service.
+LLM_LATENCY = {"summary": (1.8, 0.35), "answer": (1.4, 0.35), "choose": (0.8, 0.3), "memory": (1.2, 0.3)}
+TTS_LATENCY = (0.35, 0.25)        # gTTS round trip for a short sentence
+TTS_SECONDS_PER_CHAR = 0.003
+STT_LATENCY = (0.7, 0.3)          # Google Web Speech round trip
+STT_NO_WORDS_CHANCE = 0.02        # recogniser returns nothing for clear speech
+BOT_WORDS_PER_SECOND = 2.6        # gTTS speaking rate before ffplay's atempo
+VISITOR_WORDS_PER_SECOND = 2.5
+ENDPOINT_SILENCE = 0.5            # MicrophoneStream's end_silence_ms
+
+
+def lognormal(rng: random.Random, median: float, sigma: float) -> float:
+    return rng.lognormvariate(0.0, sigma) * median
+
+
+class SimAudio:
+    """
+    What is in the air: the last line the bot spoke and the visitor currently
+    standing in front of the robot.
+    """
+
+    def __init__(self, clock: VirtualClock, timeline: Timeline, rng: random.Random):
+        self.clock = clock
+        self.timeline = timeline
+        self.rng = rng
+        self.last_spoken: str | None = None
+        self.visitor = None
+
+    def gtts(self, text: str, lang: str = "en") -> "SimTTS":
+        return SimTTS(self, text)
+
+
+class SimTTS:
+    """
+    gTTS stand-in: synthesis latency grows with the text, and the "audio" is the text itself.
+    """
+
+    def __init__(self, audio: SimAudio, text: str):
+        self.audio = audio
+        self.text = text
+
+    def write_to_fp(self, fp) -> None:
+        median, sigma = TTS_LATENCY
+        self.audio.clock.sleep(lognormal(self.audio.rng, median, sigma)
+                               + len(self.text) * TTS_SECONDS_PER_CHAR)
+        fp.write(self.text.encode())
+
+
+class SimPlayer:
+    """
+    SpeechPlayer stand-in: playback lasts as long as the words take to say.
+    """
+
+    def __init__(self, audio: SimAudio):
+        self.audio = audio
+        self._playing = False
+
+    def play(self, path: str, filters: str | None = None) -> bool:
+        with open(path, "rb") as f:
+            text = f.read().decode()
+        tempo = 1.0
+        match = re.search(r"atempo=([\d.]+)", filters or "")
+        if match:
+            tempo = float(match.group(1))
+        self.audio.last_spoken = text
+        self._playing = True
+        try:
+            with self.audio.timeline.busy("speech"):
+                self.audio.clock.sleep(len(text.split()) / BOT_WORDS_PER_SECOND / tempo)
+        finally:
+            self._playing = False
+        return True
+
+    def is_playing(self) -> bool:
+        return self._playing
+
+    def stop(self) -> bool:
+        return False
+
+
+class SimUtterance:
+    """
+    What the simulated microphone hands to speech-to-text in place of audio.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class SimMicrophone:
+    """
+    MicrophoneStream stand-in that asks the scripted visitor for a reply to
+    whatever the bot said last.
+    """
+
+    def __init__(self, audio: SimAudio):
+        self.audio = audio
+
+    def listen(self, timeout: float | None = None,
+               phrase_time_limit: float | None = None) -> SimUtterance | None:
+        delay, text = self.audio.visitor.respond(self.audio.last_spoken)
+        if text is None or (timeout is not None and delay >= timeout):
+            self.audio.clock.sleep(timeout if timeout is not None else delay)
+            return None
+        self.audio.clock.sleep(delay)
+        speaking = len(text.split()) / VISITOR_WORDS_PER_SECOND
+        if phrase_time_limit:
+            speaking = min(speaking, phrase_time_limit)
+        with self.audio.timeline.busy("visitor"):
+            self.audio.clock.sleep(speaking)
+        self.audio.clock.sleep(ENDPOINT_SILENCE)
+        return SimUtterance(text)
+
+    def set_echo_gate(self, active: bool) -> None:
+        pass
+
+    def capture_barge_in(self) -> None:
+        pass
+
+    def add_listener(self, callback) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class SimulatedSTT(STTBackend):
+    """
+    Speech-to-text backend that reads the scripted visitor's words back.
+    """
+
+    name = "simulated"
+
+    def __init__(self, audio: SimAudio, rng: random.Random):
+        self.audio = audio
+        self.rng = rng
+
+    def transcribe(self, audio: SimUtterance) -> str | None:
+        median, sigma = STT_LATENCY
+        self.audio.clock.sleep(lognormal(self.rng, median, sigma))
+        if self.rng.random() < STT_NO_WORDS_CHANCE:
+            return None
+        return audio.text
+
+
+class SimOpenAI:
+    """
+    Stands in for ``OpenAI()``: recognises the voice bot's prompts and
+    answers from templates, after a seeded model latency.
+
+    Parameters:
+        exhibits: voicebot.EXHIBITS, for answering exhibit choices.
+    """
+
+    def __init__(self, clock: VirtualClock, rng: random.Random, exhibits: list[dict]):
+        self.clock = clock
+        self.rng = rng
+        self.exhibits = exhibits
+        self.calls = {kind: 0 for kind in LLM_LATENCY}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @staticmethod
+    def _kind(system: str) -> str:
+        if system.startswith("Choose"):
+            return "choose"
+        if system.startswith("Condense"):
+            return "memory"
+        if "Answer visitor questions" in system:
+            return "answer"
+        return "summary"
+
+    def create(self, model: str, messages: list[dict], **kwargs):
+        system = messages[0]["content"]
+        user = messages[-1]["content"] if len(messages) > 1 else ""
+        kind = self._kind(system)
+        self.calls[kind] += 1
+        median, sigma = LLM_LATENCY[kind]
+        self.clock.sleep(lognormal(self.rng, median, sigma))
+
+        exhibit = re.search(r"'(.+)'", system)
+        exhibit = exhibit.group(1) if exhibit else "exhibit"
+        if kind == "choose":
+            # Same request, same choice, whatever the seed.
+            picker = random.Random(user)
+            picks = picker.sample(self.exhibits, picker.randint(1, 2))
+            content = ", ".join(e["location"] for e in picks)
+        elif kind == "memory":
+            content = f"The visitor has asked about {len(re.findall('the visitor asked', user))} things so far."
+        elif kind == "answer":
+            content = (f"Good question. The {exhibit} has a long history, and curators still "
+                       f"discuss how it was made and why it became so famous.")
+        else:
+            content = (f"Welcome to the {exhibit}, one of the most loved pieces in our collection. "
+                       f"Take a moment to look at the detail and the colours up close. "
+                       f"Visitors often notice something new every time they come back to it.")
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
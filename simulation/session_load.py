@@ -0,0 +1,218 @@
+"""
+Load test for the multi-visitor session manager (nlp_voice_bot/sessions.py).
+
+Runs N tour sessions at once on one asyncio loop, in real time, against
+stand-ins with the simulator's service latencies: an OpenAI client and gTTS
+that block a worker thread for their latency, and scripted visitors
+(simulation/visitor.py) who answer after thinking and speaking. Trips take
+TRIP_SECONDS. ``--time-scale`` shrinks every latency and wait, so a run takes
+minutes instead of hours. The CPU each session costs does not shrink, so the
+figures are conservative.
+
+For each session count the report gives:
+- the turn response time: from the visitor falling silent to the bot starting
+  to answer, in unscaled seconds;
+- the event loop's p99 lag;
+- the LLM calls made;
+- the TTS cache hit rate;
+- CPU use.
+
+A session count is sustained when the response p95 stays under ``--slo``
+and the loop lag p99 under ``--max-lag``.
+
+Usage:
+    python simulation/session_load.py [--sessions 10,50,100,200] [--tours 2]
+                                      [--time-scale 0.1] [--llm-concurrency 8]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from content import pack as content_pack
+from nlp_voice_bot import sessions
+from nlp_voice_bot.prompts import EXHIBITS
+from runtime.openai_limiter import OpenAILimiter
+from simulation import services
+from simulation.visitor import ScriptedVisitor
+from telemetry import events
+from telemetry.latency import Histogram
+
+TRIP_SECONDS = (8.0, 25.0)
+LAG_INTERVAL = 0.05  # real seconds between event-loop lag probes
+AUDIO_BYTES_PER_CHAR = 200  # about what gTTS produces
+
+
+class ScaledClock:
+    """
+    Real time, with every sleep shortened by the time scale.
+    """
+
+    def __init__(self, scale: float):
+        self.scale = scale
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds * self.scale)
+
+
+def load_tts(clock: ScaledClock, rng: random.Random):
+    """
+    A gTTS stand-in class whose synthesis blocks for the simulator's TTS latency.
+    """
+    class LoadTTS:
+        def __init__(self, text: str, lang: str = "en"):
+            self.text = text
+
+        def write_to_fp(self, fp) -> None:
+            median, sigma = services.TTS_LATENCY
+            clock.sleep(services.lognormal(rng, median, sigma)
+                        + len(self.text) * services.TTS_SECONDS_PER_CHAR)
+            fp.write(bytes(len(self.text) * AUDIO_BYTES_PER_CHAR))
+
+    return LoadTTS
+
+
+class ScriptedChannel:
+    """
+    A visitor at a kiosk: listens to the bot for as long as the words take,
+    and answers after thinking, speaking and speech-to-text.
+    """
+
+    def __init__(self, visitor: ScriptedVisitor, rng: random.Random, scale: float,
+                 responses: Histogram):
+        self.visitor = visitor
+        self.rng = rng
+        self.scale = scale
+        self.responses = responses
+        self.last_spoken = None
+        self._heard_at = None
+
+    async def play(self, text: str, audio: bytes | None) -> bool:
+        if self._heard_at is not None:
+            self.responses.add((time.perf_counter() - self._heard_at) / self.scale)
+            self._heard_at = None
+        self.last_spoken = text
+        seconds = len(text.split()) / services.BOT_WORDS_PER_SECOND / 1.3  # ffplay's atempo
+        await asyncio.sleep(seconds * self.scale)
+        return True
+
+    async def listen(self) -> str | None:
+        delay, reply = self.visitor.respond(self.last_spoken)
+        speaking = len(reply.split()) / services.VISITOR_WORDS_PER_SECOND if reply else 6.0
+        median, sigma = services.STT_LATENCY
+        stt = services.lognormal(self.rng, median, sigma) if reply else 0.0
+        await asyncio.sleep((delay + speaking + services.ENDPOINT_SILENCE + stt) * self.scale)
+        self._heard_at = time.perf_counter()
+        return reply
+
+
+async def watch_lag(lags: Histogram, stopping: asyncio.Event) -> None:
+    while not stopping.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.add(max(0.0, time.perf_counter() - started - LAG_INTERVAL))
+
+
+async def run_load(session_count: int, tours: int, scale: float, llm_concurrency: int,
+                   seed: int = 1) -> dict:
+    """
+    Runs session_count sessions, each serving tours visitors back to back.
+
+    Returns:
+        Response, lag and queueing percentiles, cache and CPU figures.
+    """
+    clock = ScaledClock(scale)
+    # Scaled tours would only skew the museum's real event log.
+    events.log = events.EventLog(None)
+    # Every line and summary rendered, as on a host without a content pack.
+    content_pack.CONTENT_PACK = ""
+    llm = services.SimOpenAI(clock, random.Random(f"{seed}-llm"), EXHIBITS)
+    tts_class = load_tts(clock, random.Random(f"{seed}-tts"))
+    manager = sessions.SessionManager(
+        # The host's capacity, not the API key's rate limits.
+        sessions.LLMGateway(lambda: llm, llm_concurrency, limiter=OpenAILimiter(0, 0, path=None)),
+        sessions.TTSCache(lambda: tts_class),
+        max_sessions=session_count,
+    )
+    loop = asyncio.get_running_loop()
+    responses, lags = Histogram(), Histogram()
+    hits_before = sessions.TTS_HIT.value + sessions.TTS_SHARED.value
+    misses_before = sessions.TTS_MISS.value
+    stopping = asyncio.Event()
+    watcher = asyncio.ensure_future(watch_lag(lags, stopping))
+
+    async def kiosk(k: int) -> None:
+        for n in range(tours):
+            rng = random.Random(f"{seed}-{k}-{n}")
+            channel = ScriptedChannel(ScriptedVisitor(rng, EXHIBITS), rng, scale, responses)
+
+            def send_movement(location):
+                loop.call_later(rng.uniform(*TRIP_SECONDS) * scale, session.tour.notify_arrived, location)
+
+            session = manager.open(f"kiosk-{k}-{n}", channel, send_movement)
+            await session.task
+
+    cpu_started, started = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(kiosk(k) for k in range(session_count)))
+    wall, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    stopping.set()
+    await watcher
+    await manager.close()
+
+    hits = sessions.TTS_HIT.value + sessions.TTS_SHARED.value - hits_before
+    misses = sessions.TTS_MISS.value - misses_before
+    return {
+        "sessions": session_count,
+        "tours": session_count * tours,
+        "wall": wall,
+        "response": responses.snapshot(),
+        "lag_p99": lags.percentile(99),
+        "llm_calls": sum(llm.calls.values()),
+        "tts_hit_rate": hits / max(1, hits + misses),
+        "cpu_share": cpu / wall,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="How many tour sessions one host sustains")
+    parser.add_argument("--sessions", default="10,50,100,200",
+                        help="comma-separated session counts to try")
+    parser.add_argument("--tours", type=int, default=2, help="visitors per session, back to back")
+    parser.add_argument("--time-scale", type=float, default=0.1,
+                        help="factor applied to every service latency and visitor wait")
+    parser.add_argument("--llm-concurrency", type=int, default=sessions.LLM_CONCURRENCY)
+    parser.add_argument("--slo", type=float, default=4.0,
+                        help="turn response p95 (unscaled seconds) a sustained load must meet")
+    parser.add_argument("--max-lag", type=float, default=0.1,
+                        help="event loop lag p99 (real seconds) a sustained load must meet")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="show the sessions' own logging")
+    args = parser.parse_args()
+
+    print(f"{'sessions':>8}{'tours':>7}{'resp p50':>10}{'resp p95':>10}{'lag p99':>9}"
+          f"{'LLM calls':>11}{'TTS hits':>10}{'CPU':>7}{'RSS MB':>8}  sustained")
+    sustained = 0
+    for count in [int(n) for n in args.sessions.split(",")]:
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            r = asyncio.run(run_load(count, args.tours, args.time_scale, args.llm_concurrency, args.seed))
+        ok = r["response"]["p95"] <= args.slo and r["lag_p99"] <= args.max_lag
+        if ok:
+            sustained = count
+        print(f"{count:>8}{r['tours']:>7}{r['response']['p50']:>9.2f}s{r['response']['p95']:>9.2f}s"
+              f"{r['lag_p99'] * 1000:>7.1f}ms{r['llm_calls']:>11}{r['tts_hit_rate'] * 100:>9.0f}%"
+              f"{r['cpu_share'] * 100:>6.0f}%{r['rss_mb']:>8.0f}  {'yes' if ok else 'no'}",
+              flush=True)
+    print(f"Sustained up to {sustained} concurrent sessions "
+          f"(response p95 <= {args.slo:.1f}s, loop lag p99 <= {args.max_lag * 1000:.0f}ms)")
+
+
+if __name__ == "__main__":
+    main()
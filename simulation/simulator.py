@@ -0,0 +1,355 @@
+"""
+Faster-than-real-time museum simulator.
+
+Runs the real tour logic (``voicebot.main``) and the real navigation loop
+(``main.serve`` -> ``navigation.get_to_location``) against simulated motors,
+ultrasonic sensor and camera (simulation/hardware.py), deterministic stand-ins
+for OpenAI, gTTS, playback, the microphone and speech-to-text
+(simulation/services.py) and scripted visitors (simulation/visitor.py), all
+talking over the in-process bus. Every sleep and timestamp in those modules
+runs on a virtual clock (simulation/clock.py) that skips ahead whenever the
+system is waiting, so a tour of several minutes takes a fraction of a second.
+
+Reports tours per hour, tour duration, idle time (nobody talking and the robot
+standing still, within a tour, and between tours), silent travel (the robot
+driving or checking an exhibit with nobody talking) and the per-stage latency
+distributions recorded by telemetry/latency.py, all in simulated seconds. The
+stage histograms of every tour are also appended to ``--metrics``, and the
+trace of every tour leg to ``--traces`` (read it with telemetry/tracing.py).
+
+Visitors arrive at random (``--interarrival`` seconds apart on average, 0 for
+a queue that never empties); each tour starts once the robot is back at the
+entrance. Runs with the same --seed make the same decisions.
+
+The wheels slip by ``--slip`` per move, and navigation keeps track with the
+markers of ``hardware.museum_index`` unless ``--no-landmarks`` leaves it to
+dead reckoning.
+
+Usage:
+    python simulation/simulator.py [--tours 200] [--seed 1] [--interarrival 0]
+                                   [--speed X] [--metrics FILE] [--traces FILE]
+                                   [--slip 0.05] [--no-landmarks] [--verbose]
+"""
+
+import argparse
+import contextlib
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from navigation import protocol
+from runtime.channels import LocalBus
+from simulation import hardware
+from simulation.clock import VirtualClock, Timeline
+from telemetry import events, latency, tracing
+
+DEFAULT_METRICS_FILE = "simulation_latency.jsonl"
+DEFAULT_TRACE_FILE = "simulation_traces.jsonl"
+DEFAULT_EVENT_DB = "simulation_events.db"
+DEFAULT_SLIP = 0.05
+BUSY_KINDS = {"speech", "visitor", "drive", "vision"}
+TALK_KINDS = {"speech", "visitor"}
+
+
+class TripLog:
+    """
+    Follows trip results on the status topic and signals when the robot is home.
+    """
+
+    def __init__(self, bus: LocalBus):
+        self.done = 0
+        self.failed = 0
+        self.home = threading.Event()
+        self._seen: set[str] = set()
+        self._lock = threading.Lock()
+        self.client = bus.client("simulator")
+        topic = protocol.robot_topic(protocol.TOPIC_NAV_STATUS)
+        self.client.subscribe(topic, qos=protocol.QOS)
+        self.client.message_callback_add(topic, self._on_status)
+        self.client.connect()
+        self.client.loop_start()
+
+    def _on_status(self, client, userdata, msg) -> None:
+        message = protocol.decode(msg.payload)
+        if message["type"] not in protocol.FINAL_TYPES:
+            return
+        with self._lock:
+            if message["id"] in self._seen:
+                return
+            self._seen.add(message["id"])
+            if message.get("target") == "initial":
+                self.home.set()
+            elif message["type"] == "done":
+                self.done += 1
+            else:
+                self.failed += 1
+
+
+def load_system(clock: VirtualClock, timeline: Timeline, seed: int,
+                slip: float = DEFAULT_SLIP, landmarks: bool = True):
+    """
+    Installs the simulated hardware, imports the real navigation and voice bot
+    modules on top of it and swaps their services for the stand-ins.
+
+    Returns:
+        (navigation_main, voicebot, hardware parts, SimOpenAI, SimAudio)
+    """
+    def rng(name):
+        return random.Random(f"{seed}-{name}")
+
+    motors = hardware.SimMotors(clock, timeline, slip=slip, rng=rng("slip"))
+    sensor = hardware.SimUltrasonic(clock, rng("sensor"))
+    vision = hardware.SimVision(clock, rng("vision"), motors.position, timeline)
+    camera = hardware.SimLandmarks(clock, motors, rng("landmarks"))
+    hardware.install(motors, sensor, vision, camera)
+
+    # One robot on its own bus: no fleet namespace and no reservation service.
+    os.environ.pop("ROBOT_ID", None)
+    protocol.ROBOT_ID = None
+
+    import main as navigation_main
+    from navigation import navigation, motion, edge_costs, localisation
+    from nlp_voice_bot import voicebot, tour, narration, stt_backends, sessions
+    from simulation import services
+    from runtime import openai_limiter
+    from content import pack as content_pack
+
+    # Drive the simulated base with the profile it actually has, not a local calibration file.
+    navigation.engine.calibration = motors.physics
+    # Learn edge costs afresh in memory instead of from (and into) the robot's store.
+    navigation.edge_model = edge_costs.EdgeCostModel(path=None)
+    # The museum's wall markers, not the robot's own landmark index.
+    navigation.localiser.index = hardware.museum_index() if landmarks else hardware.LandmarkIndex()
+    clock.install(navigation_main, navigation, motion, edge_costs, localisation, voicebot, tour,
+                  narration, stt_backends, sessions, latency, tracing, protocol, openai_limiter, events)
+    # Rate limits on simulated time, without touching the day's real usage.
+    openai_limiter.limiter = openai_limiter.OpenAILimiter(path=None)
+    # Simulated synthesis and summaries, even where a content pack is built.
+    content_pack.CONTENT_PACK = ""
+
+    audio = services.SimAudio(clock, timeline, rng("tts"))
+    stt_rng = rng("stt")
+    stt_backends.BACKENDS["simulated"] = lambda: services.SimulatedSTT(audio, stt_rng)
+    llm = services.SimOpenAI(clock, rng("llm"), voicebot.EXHIBITS)
+    voicebot.client = llm
+    voicebot.gTTS = audio.gtts
+    voicebot.player = services.SimPlayer(audio)
+    voicebot.microphone = services.SimMicrophone(audio)
+    voicebot.speech_to_text = stt_backends.SpeechToText("simulated")
+    return navigation_main, voicebot, (motors, sensor, vision, camera), llm, audio
+
+
+def run_simulation(tours: int, seed: int = 1, interarrival: float = 0.0,
+                   speed: float | None = None, settle: float = 0.001,
+                   metrics_path: str = DEFAULT_METRICS_FILE,
+                   trace_path: str | None = DEFAULT_TRACE_FILE, progress=None,
+                   slip: float = DEFAULT_SLIP, landmarks: bool = True,
+                   event_path: str | None = DEFAULT_EVENT_DB) -> dict:
+    """
+    Runs a number of visitor tours back to back in simulated time.
+
+    Parameters:
+        tours: Visitors to serve.
+        seed: Seeds visitors, service latencies, obstacles and vision misses.
+        interarrival: Mean simulated seconds between visitor arrivals (0: always one waiting).
+        speed: Optional cap on simulated seconds per real second.
+        settle: Real seconds of quiet before the clock skips ahead.
+        metrics_path: Where the per-tour latency records are appended.
+        trace_path: Where the spans of every tour leg are appended (None: memory only).
+        progress: Optional callable(tours_done) after every tour.
+        slip: Standard deviation of the base's per-move speed error.
+        landmarks: Whether navigation sees the wall markers.
+        event_path: The tour event log (None: no log). It is kept across runs,
+            so guided tours favour what earlier simulated visitors chose.
+
+    Returns:
+        Totals, histogram snapshots of tour-level figures and per-stage latencies.
+    """
+    from simulation.visitor import ScriptedVisitor
+
+    clock = VirtualClock(settle=settle, speed=speed)
+    timeline = Timeline(clock)
+    navigation_main, voicebot, (motors, sensor, vision, camera), llm, audio = \
+        load_system(clock, timeline, seed, slip, landmarks)
+    import navigation.navigation as robot
+    latency.recorder = latency.LatencyRecorder(metrics_path)
+    tracing.tracer = tracing.Tracer(trace_path)
+    events.log = events.EventLog(event_path)
+    random.seed(seed)  # the tour's own suggestions
+    arrivals = random.Random(f"{seed}-arrivals")
+
+    bus = LocalBus()
+    clock.add_quiet_check(lambda: bus.pending() == 0)
+    # The tour is over once it sends the robot home. Hold the clock from then
+    # until voicebot.main returns, so the drive home cannot run ahead while the
+    # tour shuts its event loop down and stretch the recorded tour duration.
+    ending = threading.Event()
+    clock.add_quiet_check(lambda: not ending.is_set())
+    tour_end = [0.0]
+    send_movement = voicebot.send_movement_command
+
+    def send_movement_command(location):
+        if location == "initial":
+            tour_end[0] = clock.now()
+            ending.set()
+        send_movement(location)
+
+    voicebot.send_movement_command = send_movement_command
+    trips = TripLog(bus)
+    stopping = threading.Event()
+    navigation = threading.Thread(
+        target=navigation_main.serve, args=(bus.client("navigation"), None, stopping),
+        daemon=True, name="sim-navigation")
+    navigation.start()
+    clock.start()
+
+    durations, idle, waits = latency.Histogram(), latency.Histogram(), latency.Histogram()
+    silent = latency.Histogram()
+    personas: dict[str, int] = {}
+    robot_idle = 0.0
+    arrival = 0.0
+    started_real = time.perf_counter()
+    try:
+        for n in range(tours):
+            visitor = ScriptedVisitor(random.Random(f"{seed}-visitor-{n}"), voicebot.EXHIBITS)
+            personas[visitor.persona] = personas.get(visitor.persona, 0) + 1
+            audio.visitor = visitor
+            if interarrival > 0:
+                arrival += arrivals.expovariate(1.0 / interarrival)
+                if clock.now() < arrival:
+                    robot_idle += arrival - clock.now()
+                    clock.sleep_until(arrival)
+                waits.add(clock.now() - arrival)
+
+            trips.home.clear()
+            start = tour_end[0] = clock.now()
+            try:
+                voicebot.main(bus.client(f"voice-{n}"))
+            finally:
+                ending.clear()
+            end = tour_end[0]
+            durations.add(end - start)
+            idle.add(end - start - timeline.busy_time(start, end, BUSY_KINDS))
+            # The visitor waits on the robot with nobody talking.
+            silent.add(timeline.busy_time(start, end, BUSY_KINDS) - timeline.busy_time(start, end, TALK_KINDS))
+            # The tour ends with a request to drive back to the entrance.
+            trips.home.wait()
+            timeline.forget_before(clock.now())
+            if progress:
+                progress(n + 1)
+    finally:
+        stopping.set()
+        navigation.join()
+        events.log.flush()
+        exhibits = events.report(events.log, since=clock.epoch)
+        events.log.close()
+        clock.stop()
+        clock.uninstall()
+        tracing.tracer.close()
+        voicebot.send_movement_command = send_movement
+        trips.client.disconnect()
+
+    simulated = clock.now()
+    busy = timeline.busy_time(0.0, simulated, {"drive"})
+    return {
+        "tours": tours,
+        "simulated_seconds": simulated,
+        "real_seconds": time.perf_counter() - started_real,
+        "tours_per_hour": tours / simulated * 3600 if simulated else 0.0,
+        "tour_duration": durations.snapshot(),
+        "tour_idle": idle.snapshot(),
+        "silent_travel": silent.snapshot(),
+        "idle_share": idle.total / durations.total if durations.total else 0.0,
+        "robot_idle": robot_idle,
+        "visitor_wait": waits.snapshot(),
+        "trips_done": trips.done,
+        "trips_failed": trips.failed,
+        "cells_driven": motors.distance_cells,
+        "obstacles": sensor.obstacles,
+        "vision_misses": vision.misses,
+        "vision_captures": vision.captures,
+        "landmark_frames": camera.frames,
+        "landmark_fixes": robot.localiser.fixes,
+        "position_error": math.dist(motors.position(), robot.currentPosition),
+        "llm_calls": dict(llm.calls),
+        "personas": personas,
+        "stages": {stage: hist.snapshot() for stage, hist in sorted(latency.recorder.lifetime.items())},
+        "stage_table": latency.recorder.summary(latency.recorder.lifetime),
+        "exhibit_table": exhibits,
+    }
+
+
+def format_report(r: dict) -> str:
+    def row(name, s):
+        return (f"{name:<20}{s['count']:>6}{s['mean']:>9.1f}s{s['p50']:>8.1f}s"
+                f"{s['p95']:>8.1f}s{s['p99']:>8.1f}s{s['max']:>8.1f}s")
+
+    lines = [
+        f"Simulated {r['tours']} tours: {r['simulated_seconds'] / 3600:.1f} h of museum time "
+        f"in {r['real_seconds']:.1f} s "
+        f"({r['simulated_seconds'] / max(r['real_seconds'], 1e-9):.0f}x real time)",
+        f"Throughput: {r['tours_per_hour']:.1f} tours/h; robot idle between tours "
+        f"{r['robot_idle']:.0f} s; idle within tours {r['idle_share'] * 100:.0f}%",
+        f"Trips: {r['trips_done']} done, {r['trips_failed']} failed, {r['cells_driven']} cells, "
+        f"{r['obstacles']} obstacles, {r['vision_misses']}/{r['vision_captures']} vision misses",
+        f"Localisation: {r['landmark_fixes']} landmark fixes in {r['landmark_frames']} frames; "
+        f"robot {r['position_error']:.2f} cells from where it believes it is at the end",
+        "Visitors: " + ", ".join(f"{k} {v}" for k, v in sorted(r["personas"].items())),
+        "LLM calls: " + ", ".join(f"{k} {v}" for k, v in sorted(r["llm_calls"].items())),
+        "",
+        f"{'per tour':<20}{'n':>6}{'mean':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}",
+        row("duration", r["tour_duration"]),
+        row("idle", r["tour_idle"]),
+        row("silent travel", r["silent_travel"]),
+        row("visitor wait", r["visitor_wait"]),
+        "",
+        "Stage latencies (all tours):",
+        r["stage_table"],
+        "",
+        "Exhibits (this run, from the event log):",
+        r["exhibit_table"],
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate museum tours faster than real time")
+    parser.add_argument("--tours", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--interarrival", type=float, default=0.0,
+                        help="mean simulated seconds between visitors (0: a visitor is always waiting)")
+    parser.add_argument("--speed", type=float,
+                        help="cap on simulated seconds per real second (default: as fast as possible)")
+    parser.add_argument("--settle", type=float, default=0.001,
+                        help="real seconds of quiet before the clock skips ahead")
+    parser.add_argument("--metrics", default=DEFAULT_METRICS_FILE,
+                        help="per-tour latency records are appended here")
+    parser.add_argument("--traces", default=DEFAULT_TRACE_FILE,
+                        help="spans of every tour leg are appended here")
+    parser.add_argument("--events", default=DEFAULT_EVENT_DB,
+                        help="tour event log (SQLite); popularity carries over between runs")
+    parser.add_argument("--slip", type=float, default=DEFAULT_SLIP,
+                        help="standard deviation of the wheels' per-move speed error")
+    parser.add_argument("--no-landmarks", action="store_true",
+                        help="navigate by dead reckoning alone")
+    parser.add_argument("--verbose", action="store_true", help="show the system's own logging")
+    args = parser.parse_args()
+
+    def progress(done):
+        if done % max(1, args.tours // 10) == 0:
+            print(f"[INFO] Simulator: {done}/{args.tours} tours", file=sys.__stdout__, flush=True)
+
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        result = run_simulation(args.tours, args.seed, args.interarrival, args.speed,
+                                args.settle, args.metrics, args.traces, progress,
+                                args.slip, not args.no_landmarks, args.events)
+    print(format_report(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Scripted visitors for the museum simulator.
+
+A visitor answers whatever the bot said last, in text, the way the tour's
+intent helpers expect: naming exhibits or describing a taste, accepting or
+declining suggestions, asking a few questions at each stop and eventually
+saying they are done. Personas mix the three ways tours start (named
+exhibits, a vague request the LLM has to interpret, "I'm not sure").
+"""
+
+import random
+
+from nlp_voice_bot.tour import WELCOME_LINE, QA_PROMPT, ANOTHER_PROMPT
+
+# weight: share of visitors; stops: exhibits they want to see; questions: per
+# exhibit; accept: chance of taking a suggestion; silence: chance of not
+# answering before the microphone times out.
+PERSONAS = {
+    "focused": {"weight": 0.45, "request": "named", "stops": (1, 3), "questions": (0, 2),
+                "accept": 0.8, "silence": 0.02},
+    "browser": {"weight": 0.25, "request": "vague", "stops": (1, 3), "questions": (0, 1),
+                "accept": 0.7, "silence": 0.03},
+    "unsure":  {"weight": 0.30, "request": "unsure", "stops": (1, 4), "questions": (0, 1),
+                "accept": 0.6, "silence": 0.05},
+}
+
+VAGUE_REQUESTS = [
+    "Something colourful please",
+    "Show me your favourite painting",
+    "What's popular here?",
+    "I like old things",
+]
+QUESTIONS = [
+    "Who made this?",
+    "When was it created?",
+    "What is it made of?",
+    "Why is it famous?",
+]
+THINK_TIME = (1.0, 0.4)  # median seconds before answering, log-normal spread
+
+
+class ScriptedVisitor:
+    """
+    One visitor's side of the conversation.
+
+    Parameters:
+        rng: The visitor's own random source.
+        exhibits: voicebot.EXHIBITS (keyword and location of every exhibit).
+        persona: A key of PERSONAS; drawn by weight when omitted.
+    """
+
+    def __init__(self, rng: random.Random, exhibits: list[dict], persona: str | None = None):
+        self.rng = rng
+        self.exhibits = exhibits
+        self.persona = persona or rng.choices(
+            list(PERSONAS), weights=[p["weight"] for p in PERSONAS.values()])[0]
+        self.profile = PERSONAS[self.persona]
+        self.wanted = rng.randint(*self.profile["stops"])
+        self.accepted = 0
+        self.questions_left = None
+        self.replies = 0
+
+    def _named_request(self, count: int) -> str:
+        picks = self.rng.sample(self.exhibits, min(count, len(self.exhibits)))
+        return "I'd like to see the " + " and the ".join(e["keyword"] for e in picks)
+
+    def _request(self) -> str:
+        kind = self.profile["request"]
+        if kind == "named":
+            return self._named_request(self.wanted)
+        if kind == "vague":
+            return self.rng.choice(VAGUE_REQUESTS)
+        return "I'm not sure"
+
+    def _next_reply(self, prompt: str | None) -> str:
+        if prompt == WELCOME_LINE:
+            return self._request()
+        if prompt and prompt.startswith("How about we head to the"):
+            if self.accepted >= self.wanted:
+                return "No thanks, that's all for today"
+            if self.rng.random() < self.profile["accept"]:
+                self.accepted += 1
+                return "Yes, sounds good"
+            return "Maybe a different one"
+        if prompt == QA_PROMPT:
+            if self.questions_left is None:
+                self.questions_left = self.rng.randint(*self.profile["questions"])
+            if self.questions_left > 0:
+                self.questions_left -= 1
+                return self.rng.choice(QUESTIONS)
+            self.questions_left = None
+            self.accepted += self.profile["request"] != "unsure"
+            return "Let's move on"
+        if prompt == ANOTHER_PROMPT:
+            if self.accepted >= self.wanted:
+                return "No thanks, I'm done"
+            return self._named_request(1)
+        return "Let's move on"
+
+    def respond(self, prompt: str | None) -> tuple[float, str | None]:
+        """
+        Returns (seconds before the visitor starts talking, what they say or None).
+        """
+        self.replies += 1
+        median, sigma = THINK_TIME
+        delay = self.rng.lognormvariate(0.0, sigma) * median
+        if self.rng.random() < self.profile["silence"]:
+            return delay, None
+        return delay, self._next_reply(prompt)
@@ -1,56 +1,19 @@
 #!/bin/bash
 
-# Check if Mosquitto MQTT broker is installed
-if ! command -v mosquitto &> /dev/null; then
-    echo "Mosquitto MQTT broker not found. Installing..."
-    if [[ "$OSTYPE" == "darwin"* ]]; then
-        # macOS
-        brew install mosquitto
-    elif [[ "$OSTYPE" == "linux-gnu"* ]]; then
-        # Linux
-        sudo apt-get update
-        sudo apt-get install -y mosquitto mosquitto-clients
-    else
-        echo "Unsupported OS. Please install Mosquitto manually."
-        exit 1
-    fi
-fi
-
-# Start Mosquitto MQTT broker in the background
-echo "Starting Mosquitto MQTT broker..."
-mosquitto -d
-
-# Sleep for a moment to ensure broker is running
-sleep 2
-
-# Start the main system in the background
-echo "Starting main navigation system..."
-python3 navigation/navigation.py &
-MAIN_PID=$!
+# Starts the whole museum system as one supervised process.
+#
+# Navigation, vision and the voice bot run as components of run_museum.py and
+# talk over an in-process bus, so no MQTT broker is needed. The runtime restarts
+# any component that crashes, so this script no longer polls for dead processes.
+#
+# To use a real Mosquitto broker instead (e.g. to watch traffic with
+# mosquitto_sub), start one and run: ./start_museum_system.sh --broker localhost
 
-# Start the voicebot in the background
-echo "Starting voice bot system..."
-python3 nlp_voice_bot/voicebot.py &
-VOICE_PID=$!
-
-echo "Museum system started successfully!"
-echo "Press Ctrl+C to stop the script"
-
-# Keep script running to allow orderly shutdown
-trap "echo 'Shutting down...'; kill $MAIN_PID; kill $VOICE_PID; pkill -f mosquitto; exit 0" SIGINT
-while true; do
-    # Check if either process has died
-    if ! ps -p $MAIN_PID > /dev/null; then
-        echo "Main navigation system has stopped. Restarting..."
-        python3 main.py &
-        MAIN_PID=$!
-    fi
-    
-    if ! ps -p $VOICE_PID > /dev/null; then
-        echo "Voice bot system has stopped. Restarting..."
-        python3 nlp_voice_bot/voicebot.py &
-        VOICE_PID=$!
-    fi
-    
+if [[ " $* " == *" --broker "* ]] && ! pgrep -x mosquitto > /dev/null; then
+    echo "Starting Mosquitto MQTT broker..."
+    mosquitto -d
     sleep 2
-done 
+fi
+
+echo "Starting museum runtime..."
+exec python3 run_museum.py "$@"
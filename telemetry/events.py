@@ -0,0 +1,309 @@
+"""
+Append-only log of what happens on tours, with queries over it.
+
+The tour and navigation record events as they happen:
+- ``tour.start`` and ``tour.end``;
+- ``exhibit.chosen`` when a visitor picks an exhibit;
+- ``trip.arrived`` and ``trip.failed``, with the leg's duration or the reason;
+- ``exhibit.dwell``, the time spent at an exhibit, and the questions asked there;
+- ``vision.check``, whether the camera confirmed the exhibit on arrival.
+
+``record()`` only puts the event on a queue. A background thread writes the
+queue to an SQLite database (``EVENT_DB``) in WAL mode, one transaction per
+batch of up to BATCH_SIZE events or every FLUSH_SECONDS. The tour never
+waits on the disk, and the fsync cost is shared by a batch. Readers get
+their own connection and are not blocked by the writer.
+
+The queries (popularity, dwell times, failure rates) use indexes on
+(kind, exhibit, time). Guided tours suggest popular exhibits first, and the
+voice bot prepares the popular exhibits' summaries ahead of the first request.
+
+Usage:
+    events.record("trip.arrived", tour=tour_id, exhibit=location, duration=41.2)
+    events.log.popularity(since=time.time() - 7 * 86400)
+
+    python telemetry/events.py [tour_events.db] [--days 7]
+"""
+
+import argparse
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from telemetry import metrics
+
+# EVENT_DB= (empty) keeps no log.
+EVENT_DB = os.getenv("EVENT_DB", "tour_events.db")
+BATCH_SIZE = 256
+FLUSH_SECONDS = 1.0
+MAX_QUEUED = 10000  # events dropped beyond this rather than using memory without bound
+POPULARITY_DAYS = 30
+POPULARITY_REFRESH = 300.0  # seconds recent popularity is reused before asking the database again
+NOT_EXHIBITS = ("initial",)  # trip targets with nothing on the wall for the camera to confirm
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    tour TEXT,
+    exhibit TEXT,
+    duration REAL,
+    ok INTEGER,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_kind_exhibit ON events (kind, exhibit, ts);
+CREATE INDEX IF NOT EXISTS events_kind_ts ON events (kind, ts);
+CREATE INDEX IF NOT EXISTS events_tour ON events (tour);
+"""
+
+EVENTS_WRITTEN = metrics.counter("museum_events_written_total", "Tour events written to the log")
+EVENTS_DROPPED = metrics.counter("museum_events_dropped_total",
+                                 "Tour events dropped because the writer fell behind or failed")
+EVENT_BATCH_SECONDS = metrics.histogram("museum_event_batch_seconds",
+                                        "Time to write one batch of tour events",
+                                        buckets=metrics.FAST_BUCKETS)
+
+
+class EventLog:
+    """
+    The event store: a queue in front of one writer thread, and read queries.
+
+    Parameters:
+        path: SQLite database file; None keeps no log (queries return nothing).
+    """
+
+    def __init__(self, path: str | None = EVENT_DB or None):
+        self.path = path
+        self._queue: queue.Queue = queue.Queue(MAX_QUEUED)
+        self._writer: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._settled = threading.Condition()
+        self._queued = 0   # events accepted by record()
+        self._handled = 0  # of those, written or dropped by the writer
+        self._popular: tuple[float, dict[str, int]] | None = None
+
+    def record(self, kind: str, tour: str | None = None, exhibit: str | None = None,
+               duration: float | None = None, ok: bool | None = None, **data) -> None:
+        """
+        Queues an event; never blocks. Extra keyword arguments are kept as JSON.
+        """
+        if self.path is None:
+            return
+        self._start()
+        row = (time.time(), kind, tour, exhibit, duration, None if ok is None else int(ok),
+               json.dumps(data) if data else None)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            EVENTS_DROPPED.inc()
+            return
+        with self._settled:
+            self._queued += 1
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def _start(self) -> None:
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="event-log", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=5.0)
+        db.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL syncs at checkpoints rather than on every commit.
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        return db
+
+    def _write_loop(self) -> None:
+        try:
+            db = self._connect()
+        except sqlite3.Error as e:
+            print(f"[ERROR] Event log: could not open {self.path}: {e}")
+            with self._settled:
+                self.path = None
+                self._settled.notify_all()
+            return
+        closing = False
+        while not closing:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=FLUSH_SECONDS))
+                while len(batch) < BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:  # close() asks the writer to finish
+                closing = True
+                batch = [row for row in batch if row is not None]
+                while True:
+                    try:
+                        row = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if row is not None:
+                        batch.append(row)
+            if batch:
+                self._write(db, batch)
+                with self._settled:
+                    self._handled += len(batch)
+                    self._settled.notify_all()
+        db.close()
+
+    def _write(self, db: sqlite3.Connection, batch: list[tuple]) -> None:
+        started = time.perf_counter()
+        try:
+            with db:
+                db.executemany("INSERT INTO events (ts, kind, tour, exhibit, duration, ok, data) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            EVENTS_WRITTEN.inc(len(batch))
+        except sqlite3.Error as e:
+            print(f"[ERROR] Event log: could not write {len(batch)} events: {e}")
+            EVENTS_DROPPED.inc(len(batch))
+        EVENT_BATCH_SECONDS.observe(time.perf_counter() - started)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Waits until every event recorded so far is written.
+
+        Returns:
+            False if the writer had not caught up within timeout real seconds.
+        """
+        with self._settled:
+            target = self._queued
+            return self._settled.wait_for(
+                lambda: self._handled >= target or self._writer is None or self.path is None, timeout)
+
+    def close(self) -> None:
+        """
+        Writes whatever is queued and stops the writer.
+        """
+        writer = self._writer
+        if writer is None:
+            return
+        self._queue.put(None)
+        writer.join(timeout=10.0)
+        self._writer = None
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def _query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        if self.path is None or not os.path.exists(self.path):
+            return []
+        db = getattr(self._local, "db", None)
+        try:
+            if db is None:
+                db = self._local.db = sqlite3.connect(self.path, timeout=5.0)
+            return db.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"[ERROR] Event log: query failed: {e}")
+            return []
+
+    def popularity(self, since: float = 0.0) -> dict[str, int]:
+        """
+        How often each exhibit was chosen, most popular first.
+        """
+        rows = self._query("SELECT exhibit, COUNT(*) AS n FROM events "
+                           "WHERE kind = 'exhibit.chosen' AND ts >= ? GROUP BY exhibit ORDER BY n DESC",
+                           (since,))
+        return dict(rows)
+
+    def recent_popularity(self) -> dict[str, int]:
+        """
+        popularity() over the last POPULARITY_DAYS, queried at most every
+        POPULARITY_REFRESH seconds.
+        """
+        now = time.monotonic()
+        cached = self._popular
+        if cached is None or now - cached[0] > POPULARITY_REFRESH:
+            cached = self._popular = (now, self.popularity(time.time() - POPULARITY_DAYS * 86400))
+        return cached[1]
+
+    def dwell_times(self, since: float = 0.0) -> dict[str, dict]:
+        """
+        Per exhibit: stops, mean and longest seconds spent there, and questions asked.
+        """
+        rows = self._query("SELECT exhibit, COUNT(*), AVG(duration), MAX(duration), "
+                           "SUM(json_extract(data, '$.questions')) FROM events "
+                           "WHERE kind = 'exhibit.dwell' AND ts >= ? GROUP BY exhibit", (since,))
+        return {exhibit: {"stops": n, "mean": mean, "max": longest, "questions": questions or 0}
+                for exhibit, n, mean, longest, questions in rows}
+
+    def failure_rates(self, since: float = 0.0) -> dict[str, dict]:
+        """
+        Per exhibit: trips, failed trips and camera checks that did not
+        confirm the exhibit, with their rates. Checks logged for targets in
+        NOT_EXHIBITS (older logs have them for trips home) are left out: the
+        camera can never confirm those.
+        """
+        skipped = ", ".join("?" * len(NOT_EXHIBITS))
+        rows = self._query("SELECT exhibit, "
+                           "SUM(kind = 'trip.arrived'), SUM(kind = 'trip.failed'), "
+                           "SUM(kind = 'vision.check'), SUM(kind = 'vision.check' AND ok = 0) "
+                           "FROM events WHERE (kind IN ('trip.arrived', 'trip.failed') "
+                           f"OR (kind = 'vision.check' AND exhibit NOT IN ({skipped}))) "
+                           "AND ts >= ? GROUP BY exhibit", (*NOT_EXHIBITS, since))
+        rates = {}
+        for exhibit, arrived, failed, checks, unconfirmed in rows:
+            trips = arrived + failed
+            rates[exhibit] = {
+                "trips": trips, "failed": failed, "trip_failure_rate": failed / trips if trips else 0.0,
+                "checks": checks, "unconfirmed": unconfirmed,
+                "check_failure_rate": unconfirmed / checks if checks else 0.0,
+            }
+        return rates
+
+
+def report(log: EventLog, since: float = 0.0) -> str:
+    popularity = log.popularity(since)
+    dwell = log.dwell_times(since)
+    failures = log.failure_rates(since)
+    exhibits = list(popularity) + sorted((set(dwell) | set(failures)) - set(popularity), key=str)
+    if not exhibits:
+        return "No tour events recorded."
+    lines = [f"{'exhibit':<48}{'chosen':>7}{'stops':>6}{'dwell s':>8}{'Qs':>6}"
+             f"{'trips':>6}{'failed':>7}{'unconfirmed':>12}"]
+    for exhibit in exhibits:
+        d = dwell.get(exhibit, {})
+        f = failures.get(exhibit, {})
+        lines.append(f"{(exhibit or '?')[:47]:<48}{popularity.get(exhibit, 0):>7}{d.get('stops', 0):>6}"
+                     f"{d.get('mean') or 0:>8.0f}{d.get('questions', 0):>6}{f.get('trips', 0):>6}"
+                     f"{f.get('trip_failure_rate', 0) * 100:>6.0f}%{f.get('check_failure_rate', 0) * 100:>11.0f}%")
+    return "\n".join(lines)
+
+
+# Process-wide log used by the module-level helper.
+log = EventLog()
+
+def record(kind: str, **fields) -> None:
+    log.record(kind, **fields)
+
+def popularity() -> dict[str, int]:
+    return log.recent_popularity()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exhibit popularity, dwell times and failure rates")
+    parser.add_argument("db", nargs="?", default=EVENT_DB)
+    parser.add_argument("--days", type=float, help="only the last N days")
+    args = parser.parse_args()
+    since = time.time() - args.days * 86400 if args.days else 0.0
+    print(report(EventLog(args.db), since))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Lightweight latency spans and per-stage histograms.
+
+Stages are timed with the monotonic performance counter and aggregated into
+log-bucketed histograms, so memory stays fixed no matter how many tours run.
+Inside a trace (telemetry/tracing.py) each timed stage is also a trace span,
+and every stage feeds the ``museum_stage_seconds`` metric (telemetry/metrics.py).
+Each stage keeps a lifetime histogram and a histogram for the current tour;
+``end_tour()`` prints the tour summary (p50/p95/p99 per stage) and appends it
+as one JSON line to the metrics file (``LATENCY_FILE``).
+
+Usage:
+    with span("llm.summary"):
+        exhibit_summary(name)
+
+    @timed("tts")
+    def synthesise(text): ...
+"""
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from telemetry import metrics, tracing
+
+LATENCY_FILE = os.getenv("LATENCY_FILE", "latency_metrics.jsonl")
+
+# Buckets grow by 5 % from 0.1 ms, covering up to a few minutes in ~300 buckets.
+MIN_BUCKET = 0.0001
+GROWTH = 1.05
+
+STAGE_SECONDS = metrics.histogram(
+    "museum_stage_seconds", "Latency of each timed stage (LLM, TTS, STT, playback, tour states)",
+    ["stage"])
+
+
+class Histogram:
+    """
+    Fixed-memory latency histogram with logarithmic buckets (5 % relative error).
+    """
+
+    def __init__(self):
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def _index(seconds: float) -> int:
+        if seconds <= MIN_BUCKET:
+            return 0
+        return math.ceil(math.log(seconds / MIN_BUCKET, GROWTH))
+
+    def add(self, seconds: float) -> None:
+        idx = self._index(seconds)
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                upper = MIN_BUCKET * GROWTH ** idx
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class LatencyRecorder:
+    """
+    Collects stage latencies for the process and for the tour in progress.
+    """
+
+    def __init__(self, path: str = LATENCY_FILE):
+        self.path = path
+        self.lifetime: dict[str, Histogram] = {}
+        self.tour: dict[str, Histogram] = {}
+        self.tour_started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+        with self._lock:
+            for table in (self.lifetime, self.tour):
+                hist = table.get(stage)
+                if hist is None:
+                    hist = table[stage] = Histogram()
+                hist.add(seconds)
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            with tracing.span(stage):
+                yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def timed(self, stage: str):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def begin_tour(self) -> None:
+        with self._lock:
+            self.tour = {}
+            self.tour_started = time.monotonic()
+
+    def summary(self, table: dict[str, Histogram] | None = None) -> str:
+        table = self.tour if table is None else table
+        with self._lock:
+            rows = {stage: hist.snapshot() for stage, hist in sorted(table.items())}
+        lines = [f"{'stage':<20}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for stage, s in rows.items():
+            lines.append(f"{stage:<20}{s['count']:>5}{s['p50'] * 1000:>10.0f}"
+                         f"{s['p95'] * 1000:>10.0f}{s['p99'] * 1000:>10.0f}{s['max'] * 1000:>10.0f}")
+        return "\n".join(lines)
+
+    def end_tour(self, **extra) -> dict:
+        """
+        Prints the tour summary and appends it to the metrics file.
+        """
+        with self._lock:
+            stages = {stage: hist.snapshot() for stage, hist in self.tour.items()}
+        record = {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "tour_duration": time.monotonic() - self.tour_started,
+            "stages": stages,
+            **extra,
+        }
+        print("Latency summary for this tour:\n" + self.summary())
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"[ERROR] Could not write latency metrics: {e}")
+        return record
+
+
+# Process-wide recorder used by the module-level helpers.
+recorder = LatencyRecorder()
+
+def record(stage: str, seconds: float) -> None:
+    recorder.record(stage, seconds)
+
+def span(stage: str):
+    return recorder.span(stage)
+
+def timed(stage: str):
+    return recorder.timed(stage)
@@ -0,0 +1,302 @@
+"""
+Operational metrics (counters, gauges, histograms) with a local HTTP scrape
+endpoint.
+
+Modules declare their metrics once at import time and update them where the
+work happens. Updating one is a dict lookup for its labels (none if the
+labelled child is bound once up front) plus an add under a per-metric lock,
+so per-cell and per-call updates cost well under a microsecond. Nothing is
+recorded in the ultrasonic sensor thread or inside the motion sleeps.
+
+``start_server()`` serves every metric in the Prometheus text format on
+``http://127.0.0.1:METRICS_PORT/metrics`` and as JSON on ``/metrics.json``.
+
+Usage:
+    TRIPS = metrics.histogram("museum_nav_trip_seconds", "Trip duration", ["result"])
+    TRIPS.labels(result="done").observe(12.3)
+
+    curl -s localhost:9108/metrics
+"""
+
+import bisect
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Seconds, from a fast LLM reply to a long trip across the floor.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+
+class HistogramValue:
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self) -> list[int]:
+        with self._lock:
+            counts = list(self.counts)
+        total, out = 0, []
+        for c in counts:
+            total += c
+            out.append(total)
+        return out
+
+
+class Metric:
+    """
+    A named metric family; each distinct label set is one child value.
+
+    Parameters:
+        name: Metric name, e.g. "museum_nav_trip_seconds".
+        help: One-line description shown in the scrape output.
+        labelnames: Label keys; without any the metric itself is updated directly.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        self._default = None if self.labelnames else self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        """
+        The child for one label set, created on first use.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def children(self) -> list[tuple[dict, object]]:
+        if self._default is not None:
+            return [({}, self._default)]
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, key)), child) for key, child in items]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterValue()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return GaugeValue()
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.dec(amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+
+def _format_labels(labels: dict, extra: tuple[str, str] | None = None) -> str:
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    """
+    Every metric of the process, by name.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_add(self, cls, name: str, help: str, labelnames, **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, tuple(labelnames), **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered differently")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._get_or_add(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self._get_or_add(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames=(),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_add(Histogram, name, help, labelnames, buckets=buckets)
+
+    def metrics(self) -> list[Metric]:
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, child in metric.children():
+                if isinstance(child, HistogramValue):
+                    cumulative = child.cumulative()
+                    for bound, count in zip(child.bounds + (float("inf"),), cumulative):
+                        le = "+Inf" if bound == float("inf") else _format_value(bound)
+                        lines.append(f"{metric.name}_bucket{_format_labels(labels, ('le', le))} {count}")
+                    lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+                    lines.append(f"{metric.name}_count{_format_labels(labels)} {child.count}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(child.value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """
+        All metrics as plain data (histograms as count, sum and bucket counts).
+        """
+        out = {}
+        for metric in self.metrics():
+            values = []
+            for labels, child in metric.children():
+                if isinstance(child, HistogramValue):
+                    values.append({"labels": labels, "count": child.count, "sum": child.sum,
+                                   "buckets": dict(zip([str(b) for b in child.bounds] + ["+Inf"],
+                                                       child.cumulative()))})
+                else:
+                    values.append({"labels": labels, "value": child.value})
+            out[metric.name] = {"type": metric.kind, "help": metric.help, "values": values}
+        return out
+
+
+# Process-wide registry used by the module-level helpers.
+registry = Registry()
+
+def counter(name: str, help: str, labelnames=()) -> Counter:
+    return registry.counter(name, help, labelnames)
+
+def gauge(name: str, help: str, labelnames=()) -> Gauge:
+    return registry.gauge(name, help, labelnames)
+
+def histogram(name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return registry.histogram(name, help, labelnames, buckets)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path in ("/metrics", "/"):
+            body = registry.render().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = json.dumps(registry.snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the console
+
+
+def start_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> ThreadingHTTPServer | None:
+    """
+    Serves the registry on a background thread.
+
+    Returns:
+        The server, or None if the port could not be bound.
+    """
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print(f"[ERROR] Metrics: could not listen on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    print(f"[INFO] Metrics: serving on http://{host}:{port}/metrics")
+    return server
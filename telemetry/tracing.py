@@ -0,0 +1,347 @@
+"""
+Trace spans that follow one tour leg across the voice bot, MQTT, navigation
+and vision.
+
+A leg ("tour.leg") starts when the visitor asks for an exhibit and ends when
+its summary is handed to the speaker. Work done for it records child spans:
+the LLM calls, the navigation request and its MQTT hops, the trip with every
+turn, drive, obstacle wait and camera check. Spans within a thread or an
+asyncio task find their parent through a context variable. Across MQTT the
+parent travels in the message as ``"trace": {"trace_id", "span_id"}``
+(``inject()`` / ``extract()``).
+
+Spans are only recorded inside a trace, so code paths without one pay for a
+single context-variable lookup. Finished spans are kept in memory
+(``tracer.finished``) and appended as JSON lines to ``TRACE_FILE``. Times are
+wall-clock seconds so spans from several processes line up.
+
+Usage:
+    leg = start_trace("tour.leg", target="Mona Lisa by Leonardo da Vinci")
+    with use(leg), span("llm.summary"):
+        exhibit_summary(name)
+    leg.end()
+
+    python telemetry/tracing.py [FILE] [--last N]    # critical path per leg
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# TRACING=0 keeps spans in memory only.
+TRACE_TO_FILE = os.getenv("TRACING", "1") != "0"
+MAX_KEPT = 10000
+
+
+def new_id(nbytes: int = 8) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class SpanContext:
+    """
+    The identity of a span, as carried in a message from another component.
+    """
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def context(self) -> dict:
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+
+class Span(SpanContext):
+    """
+    One timed piece of work within a trace.
+
+    Parameters:
+        name: What the span times, e.g. "nav.drive".
+        trace_id: The trace (tour leg) it belongs to.
+        parent_id: The enclosing span, None for the root of a trace.
+        start: Wall-clock start, defaults to now.
+        attrs: Extra details, e.g. the target or the attempt number.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None = None,
+                 start: float | None = None, **attrs):
+        super().__init__(trace_id, new_id(4))
+        self.name = name
+        self.parent_id = parent_id
+        self.start = time.time() if start is None else start
+        self.end_time: float | None = None
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def end(self, end: float | None = None, **attrs) -> None:
+        """
+        Finishes the span and hands it to the tracer. Ending twice is a no-op.
+        """
+        if self.end_time is not None:
+            return
+        self.attrs.update(attrs)
+        self.end_time = time.time() if end is None else end
+        tracer.export(self)
+
+    def to_dict(self) -> dict:
+        return {"trace": self.trace_id, "span": self.span_id, "parent": self.parent_id,
+                "name": self.name, "start": self.start, "end": self.end_time,
+                "attrs": self.attrs}
+
+
+class Tracer:
+    """
+    Collects finished spans in memory and appends them to the trace file.
+    """
+
+    def __init__(self, path: str | None = TRACE_FILE if TRACE_TO_FILE else None,
+                 keep: int = MAX_KEPT):
+        self.path = path
+        self.finished: deque[dict] = deque(maxlen=keep)
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        record = span.to_dict()
+        with self._lock:
+            self.finished.append(record)
+            if self.path is None:
+                return
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", buffering=1)
+                self._file.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print(f"[ERROR] Could not write trace span: {e}")
+                self.path = None
+
+    def trace(self, trace_id: str) -> list[dict]:
+        with self._lock:
+            return [s for s in self.finished if s["trace"] == trace_id]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Process-wide tracer used by the module-level helpers.
+tracer = Tracer()
+_current: ContextVar[SpanContext | None] = ContextVar("trace_span", default=None)
+
+def current() -> SpanContext | None:
+    return _current.get()
+
+def start_trace(name: str, start: float | None = None, **attrs) -> Span:
+    """
+    Starts the root span of a new trace. It is not made current; see use().
+    """
+    return Span(name, new_id(), None, start, **attrs)
+
+def start_span(name: str, parent: SpanContext | None = None, start: float | None = None,
+               **attrs) -> Span | None:
+    """
+    Starts a child of parent (default: the current span).
+
+    Returns:
+        The span, or None outside any trace.
+    """
+    parent = parent or _current.get()
+    if parent is None:
+        return None
+    return Span(name, parent.trace_id, parent.span_id, start, **attrs)
+
+def record(name: str, start: float, end: float | None = None,
+           parent: SpanContext | None = None, **attrs) -> None:
+    """
+    Records a span that has already happened, e.g. an MQTT hop timed from the
+    message's send timestamp.
+    """
+    span = start_span(name, parent, start, **attrs)
+    if span is not None:
+        span.end(end)
+
+@contextmanager
+def use(context: SpanContext | None):
+    """
+    Makes a span (or a remote span context) the parent of spans started inside.
+    """
+    if context is None:
+        yield None
+        return
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def span(name: str, parent: SpanContext | None = None, **attrs):
+    """
+    Times the enclosed block as a child of the current span, if there is one.
+    """
+    s = start_span(name, parent, **attrs)
+    if s is None:
+        yield None
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    finally:
+        _current.reset(token)
+        s.end()
+
+def activate(context: SpanContext | None):
+    """
+    Makes a span current for the rest of the calling task; undo with deactivate().
+    """
+    return _current.set(context)
+
+def deactivate(token) -> None:
+    _current.reset(token)
+
+def inject(context: SpanContext | None = None) -> dict | None:
+    """
+    The ``"trace"`` field for an outgoing message (None outside any trace).
+    """
+    context = context or _current.get()
+    return context.context() if context is not None else None
+
+def extract(message: dict) -> SpanContext | None:
+    """
+    The span context carried by an incoming message, if any.
+    """
+    trace = message.get("trace")
+    if not isinstance(trace, dict):
+        return None
+    trace_id, span_id = trace.get("trace_id"), trace.get("span_id")
+    if not isinstance(trace_id, str) or not isinstance(span_id, str):
+        return None
+    return SpanContext(trace_id, span_id)
+
+
+# ----------------------------------------------------------------------
+# Report
+# ----------------------------------------------------------------------
+def load(path: str) -> dict[str, list[dict]]:
+    """
+    Spans from a trace file, grouped by trace id.
+    """
+    traces: dict[str, list[dict]] = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                s = json.loads(line)
+                traces.setdefault(s["trace"], []).append(s)
+    return traces
+
+def critical_path(spans: list[dict]) -> list[tuple[str, float, float]]:
+    """
+    The chain of spans that determined when a trace's root span ended.
+
+    Walks back from the root's end: the child that finished last (before the
+    current point) is on the path, then whatever finished last before that
+    child started, and so on, recursing into each child. Time not covered by
+    a child is the parent's own ("self") time.
+
+    Returns:
+        (name, start, end) segments in time order; a parent's own time is
+        named "<name> (self)".
+    """
+    roots = [s for s in spans if s["parent"] is None]
+    if not roots:
+        return []
+    children: dict[str, list[dict]] = {}
+    for s in spans:
+        if s["parent"] is not None and s["end"] is not None:
+            children.setdefault(s["parent"], []).append(s)
+
+    def walk(node: dict, until: float) -> list[tuple[str, float, float]]:
+        segments = []
+        own = f"{node['name']} (self)" if node["span"] in children else node["name"]
+        t = min(node["end"], until)
+        remaining = [c for c in children.get(node["span"], []) if c["start"] < t]
+        while remaining:
+            last = max(remaining, key=lambda c: min(c["end"], t))
+            end = min(last["end"], t)
+            if end < t:
+                segments.append((own, end, t))
+            segments.extend(reversed(walk(last, end)))
+            t = max(last["start"], node["start"])
+            remaining = [c for c in remaining if c is not last and c["start"] < t]
+        if t > node["start"]:
+            segments.append((own, node["start"], t))
+        return list(reversed(segments))
+
+    root = roots[0]
+    if root["end"] is None:
+        return []
+    return walk(root, root["end"])
+
+def _merge(segments: list[tuple[str, float, float]]) -> list[tuple[str, float, float]]:
+    merged: list[tuple[str, float, float]] = []
+    for name, start, end in segments:
+        if merged and merged[-1][0] == name:
+            merged[-1] = (name, merged[-1][1], end)
+        else:
+            merged.append((name, start, end))
+    return merged
+
+def report(traces: dict[str, list[dict]], last: int | None = None) -> str:
+    """
+    The critical path of each tour leg, then where the seconds went over all legs.
+    """
+    legs = []
+    for trace_id, spans in traces.items():
+        root = next((s for s in spans if s["parent"] is None), None)
+        if root is not None and root["name"] == "tour.leg" and root["end"] is not None:
+            legs.append((root, spans))
+    legs.sort(key=lambda leg: leg[0]["start"])
+    shown = legs[-last:] if last else legs
+
+    lines = []
+    totals: dict[str, float] = {}
+    for root, spans in legs:
+        for name, start, end in critical_path(spans):
+            totals[name] = totals.get(name, 0.0) + end - start
+    for root, spans in shown:
+        duration = root["end"] - root["start"]
+        status = root["attrs"].get("status", "")
+        lines.append(f"Leg to {root['attrs'].get('target', '?')} ({root['trace'][:8]}): "
+                     f"{duration:.1f} s {status}".rstrip())
+        for name, start, end in _merge(critical_path(spans)):
+            if end - start >= 0.005:
+                lines.append(f"  {start - root['start']:>7.2f} s {end - start:>7.2f} s  {name}")
+        lines.append("")
+
+    total = sum(totals.values())
+    if legs:
+        lines.append(f"Critical path over {len(legs)} legs:")
+        lines.append(f"{'span':<28}{'total s':>10}{'per leg s':>11}{'share':>8}")
+        for name, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+            lines.append(f"{name:<28}{seconds:>10.1f}{seconds / len(legs):>11.2f}"
+                         f"{seconds / total * 100 if total else 0:>7.0f}%")
+    else:
+        lines.append("No finished tour legs in the trace file.")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Critical path of each traced tour leg")
+    parser.add_argument("path", nargs="?", default=TRACE_FILE)
+    parser.add_argument("--last", type=int, help="only list the last N legs (totals cover all)")
+    args = parser.parse_args()
+    print(report(load(args.path), args.last))
+
+
+if __name__ == "__main__":
+    main()
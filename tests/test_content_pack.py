@@ -0,0 +1,37 @@
+import pytest
+
+from content import pack as content_pack
+
+CATALOG = [
+    {"location": "Mona Lisa by Leonardo da Vinci", "keyword": "mona lisa",
+     "tags": {"portrait", "woman", "smile", "Leonardo da Vinci", "folded hands"}},
+    {"location": "Starry Night by Vincent van Gogh", "keyword": "starry night",
+     "tags": {"swirling-sky", "moon", "cypress-tree", "van-gogh"}},
+    {"location": "Sunflowers by Vincent van Gogh", "keyword": "sunflower",
+     "tags": {"vase with flowers", "yellow petals", "van-gogh"}},
+]
+
+
+@pytest.fixture
+def pack(tmp_path):
+    path = str(tmp_path / "museum.pack")
+    content_pack.build(path, CATALOG, summarise=lambda location: f"About {location}.")
+    return content_pack.ContentPack(path)
+
+
+def test_multi_word_tag_chooses_its_exhibit(pack):
+    assert pack.match_tags("the one with the cypress tree please") == ["Starry Night by Vincent van Gogh"]
+    assert pack.match_tags("a vase with flowers") == ["Sunflowers by Vincent van Gogh"]
+
+
+def test_one_generic_word_is_left_to_the_llm(pack):
+    assert pack.match_tags("is there a woman somewhere") == []
+    assert pack.match_tags("I like the moon") == []
+
+
+def test_several_single_word_tags_count(pack):
+    assert pack.match_tags("a portrait of a woman with a smile") == ["Mona Lisa by Leonardo da Vinci"]
+
+
+def test_tag_shared_by_several_exhibits_is_ambiguous(pack):
+    assert pack.match_tags("something by van gogh") == []
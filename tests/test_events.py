@@ -0,0 +1,16 @@
+from telemetry.events import EventLog
+
+
+def test_failure_rates_ignore_checks_on_trips_home(tmp_path):
+    log = EventLog(str(tmp_path / "events.db"))
+    log.record("vision.check", exhibit="initial", ok=False)
+    log.record("vision.check", exhibit="mona_lisa", ok=False)
+    log.record("vision.check", exhibit="mona_lisa", ok=True)
+    assert log.flush()
+    rates = log.failure_rates()
+    log.close()
+
+    # the camera cannot confirm home, so those checks are not failures
+    assert "initial" not in rates
+    assert rates["mona_lisa"]["checks"] == 2
+    assert rates["mona_lisa"]["check_failure_rate"] == 0.5
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from navigation.job_queue import NavigationJobQueue, PRIORITY_HIGH
+
+
+def test_higher_priority_runs_first():
+    queue = NavigationJobQueue()
+    queue.submit("a", "Mona Lisa")
+    queue.submit("b", "initial", priority=PRIORITY_HIGH)
+    queue.submit("c", "The Scream")
+    assert [queue.next_job(0).id for _ in range(3)] == ["b", "a", "c"]
+
+
+def test_replace_cancels_queued_and_running_jobs():
+    queue = NavigationJobQueue()
+    running, _ = queue.submit("a", "Mona Lisa")
+    queued, _ = queue.submit("b", "The Scream")
+    assert queue.next_job(0) is running
+    job, cancelled = queue.submit("c", "initial", replace=True)
+    assert set(cancelled) == {running, queued}
+    assert running.cancelled.is_set() and running.cancelled_while_running
+    assert queue.next_job(0) is job
+    assert queue.next_job(0) is None
+    # The cancelled trip reports back once the robot has stopped, and is not retried.
+    assert queue.finish(running, ok=False, error="cancelled") is False
+    assert running.status == "cancelled"
+
+
+def test_failed_trip_is_retried_with_backoff_then_fails():
+    queue = NavigationJobQueue(max_attempts=3, backoff=0.05)
+    job, _ = queue.submit("a", "Mona Lisa")
+    delays = []
+    for attempt in range(1, 3):
+        assert queue.next_job(1) is job and job.attempts == attempt
+        failed_at = time.monotonic()
+        assert queue.finish(job, ok=False, error="blocked") is True
+        assert job.status == "retrying"
+        delays.append(job.not_before - failed_at)
+        assert queue.next_job(0) is None  # not before the backoff
+    assert delays[0] == pytest.approx(0.05, abs=0.02) and delays[1] == pytest.approx(0.1, abs=0.02)
+    assert queue.next_job(1) is job and job.attempts == 3
+    assert queue.finish(job, ok=False, error="blocked") is False
+    assert job.status == "failed" and job.error == "blocked"
+
+
+def test_preempted_trip_keeps_its_attempts():
+    queue = NavigationJobQueue(max_attempts=2)
+    job, _ = queue.submit("a", "Mona Lisa")
+    assert queue.next_job(0) is job and job.attempts == 1
+    urgent, _ = queue.submit("b", "initial", priority=PRIORITY_HIGH)
+    assert job.cancelled.is_set()
+    # The interrupted trip is requeued, not counted as a failed attempt.
+    assert queue.finish(job, ok=False, error="cancelled") is True
+    assert job.status == "queued" and job.attempts == 0
+    assert queue.next_job(0) is urgent
+    assert queue.finish(urgent, ok=True) is False
+    assert queue.next_job(0) is job and job.attempts == 1
+    assert not job.cancelled.is_set()
+    assert queue.finish(job, ok=True) is False
+    assert job.status == "done"
+
+
+def test_failure_a_retry_cannot_help_is_final_at_once():
+    queue = NavigationJobQueue(max_attempts=3)
+    job, _ = queue.submit("a", "Nowhere")
+    assert queue.next_job(0) is job
+    assert queue.finish(job, ok=False, error="unknown target", retry=False) is False
+    assert job.status == "failed" and job.attempts == 1
+    assert queue.next_job(0) is None
@@ -0,0 +1,46 @@
+import pytest
+
+from nlp_voice_bot.narration import (
+    NARRATION_GAP, NARRATION_MARGIN, TRANSIT_NARRATION, SpeechTimer, next_line,
+)
+
+SUMMARY = "A warm and engaging summary of the painting in exactly twelve words here."
+
+
+def test_summary_starts_so_that_it_ends_before_the_arrival():
+    timer = SpeechTimer(seconds_per_word=0.5)
+    due = NARRATION_MARGIN + timer.duration(SUMMARY)
+    assert next_line(due, SUMMARY, timer, set()) == (SUMMARY, 0.0)
+    assert next_line(due - 3, SUMMARY, timer, set()) == (SUMMARY, 0.0)
+
+
+def test_transit_line_only_when_it_leaves_time_for_the_summary():
+    timer = SpeechTimer(seconds_per_word=0.5)
+    first = TRANSIT_NARRATION[0]
+    room = NARRATION_MARGIN + timer.duration(SUMMARY) + timer.duration(first) + NARRATION_GAP
+    assert next_line(room, SUMMARY, timer, set()) == (first, 0.0)
+    # Half a second short of the summary being due: too little for any line.
+    text, wait = next_line(NARRATION_MARGIN + timer.duration(SUMMARY) + 0.5, SUMMARY, timer, set())
+    assert text is None and wait == pytest.approx(0.5)
+
+
+def test_each_transit_line_is_said_once():
+    timer = SpeechTimer(seconds_per_word=0.5)
+    said = set(TRANSIT_NARRATION[:2])
+    assert next_line(100.0, None, timer, said) == (TRANSIT_NARRATION[2], 0.0)
+    text, wait = next_line(100.0, None, timer, set(TRANSIT_NARRATION))
+    assert text is None and wait == pytest.approx(100.0 - NARRATION_MARGIN)
+
+
+def test_quiet_until_the_summary_is_ready_when_arrival_is_close():
+    timer = SpeechTimer(seconds_per_word=0.5)
+    assert next_line(NARRATION_MARGIN / 2, None, timer, set()) == (None, 0.0)
+
+
+def test_timer_learns_from_lines_said_to_the_end():
+    timer = SpeechTimer(seconds_per_word=0.5)
+    timer.observe("one two three four", 0.5)  # too short to be timed
+    assert timer.lines == 0
+    timer.observe("one two three four", 4.0)
+    assert timer.seconds_per_word == pytest.approx(1.0)
+    assert timer.duration("one two") == pytest.approx(2.0)
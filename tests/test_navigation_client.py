@@ -0,0 +1,56 @@
+import time
+
+from navigation import protocol
+from navigation.client import NavigationClient
+
+
+class FakeMQTT:
+    def __init__(self):
+        self.requests = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.requests.append(protocol.decode(payload))
+
+
+class Message:
+    def __init__(self, payload):
+        self.payload = payload.encode()
+
+
+def client_with_results():
+    mqtt = FakeMQTT()
+    results = []
+    client = NavigationClient(mqtt, on_done=lambda target: results.append(("done", target)),
+                              on_failed=lambda target, reason: results.append(("failed", reason)),
+                              ack_timeout=5, max_attempts=2, retry_backoff=0.01)
+    return client, mqtt, results
+
+
+def reply(client, msg_type, **fields):
+    client.on_status_message(None, None, Message(protocol.encode(msg_type, client.request_id, **fields)))
+
+
+def test_retryable_failure_is_retried_with_a_fresh_request():
+    client, mqtt, results = client_with_results()
+    client.request("Mona Lisa by Leonardo da Vinci")
+    first = mqtt.requests[-1]["id"]
+    reply(client, "ack", status="accepted")
+    reply(client, "failed", target="Mona Lisa by Leonardo da Vinci",
+          reason="arrival not verified after 3 attempts", retryable=True)
+    deadline = time.monotonic() + 2
+    while len(mqtt.requests) < 2 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert len(mqtt.requests) == 2 and mqtt.requests[-1]["id"] != first
+    assert mqtt.requests[-1]["target"] == "Mona Lisa by Leonardo da Vinci"
+    assert results == []
+    reply(client, "done", target="Mona Lisa by Leonardo da Vinci", verified=True)
+    assert results == [("done", "Mona Lisa by Leonardo da Vinci")]
+
+
+def test_final_failure_is_reported_without_retry():
+    client, mqtt, results = client_with_results()
+    client.request("Nowhere")
+    reply(client, "failed", target="Nowhere", reason="unknown target after 1 attempts", retryable=False)
+    assert results == [("failed", "unknown target after 1 attempts")]
+    time.sleep(0.05)
+    assert len(mqtt.requests) == 1
@@ -0,0 +1,97 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from runtime.openai_limiter import CHAT, CRITICAL, NORMAL, BudgetExceeded, OpenAILimiter
+
+
+class FakeCreate:
+    """
+    chat.completions.create that replies with the last message's content,
+    optionally held until released.
+    """
+
+    def __init__(self, prompt_tokens=10, completion_tokens=5, hold=False):
+        self.calls = 0
+        self.usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self, model, messages, **kwargs):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        reply = SimpleNamespace(content=f"re: {messages[-1]['content']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=reply)], usage=self.usage)
+
+
+def ask(limiter, create, text, priority=NORMAL, caller="llm.test", fallback=None):
+    return limiter.complete(caller, priority, create, fallback=fallback, model="gpt-3.5-turbo",
+                            messages=[{"role": "user", "content": text}])
+
+
+def wait_for(check, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_critical_call_uses_the_reserve_chat_waits_for():
+    limiter = OpenAILimiter(rpm=60, tpm=0, path=None)
+    create = FakeCreate()
+    # Below the 30% a chat call must leave, above what a camera check needs.
+    limiter.requests.level = 10.0
+    answers = []
+    chat = threading.Thread(target=lambda: answers.append(ask(limiter, create, "question", CHAT)))
+    chat.start()
+    wait_for(lambda: limiter._waiting)
+    assert ask(limiter, create, "camera", CRITICAL) == "re: camera"
+    assert not answers
+    with limiter._cond:
+        limiter.requests.level = limiter.requests.capacity
+        limiter._cond.notify_all()
+    chat.join(2)
+    assert answers == ["re: question"]
+    assert create.calls == 2
+
+
+def test_identical_requests_in_flight_are_sent_once():
+    limiter = OpenAILimiter(rpm=0, tpm=0, path=None)
+    create = FakeCreate(hold=True)
+    answers = []
+    callers = [threading.Thread(target=lambda: answers.append(ask(limiter, create, "summary")))
+               for _ in range(3)]
+    callers[0].start()
+    assert create.started.wait(2)
+    for thread in callers[1:]:
+        thread.start()
+    wait_for(lambda: limiter.usage().get("llm.test", {}).get("coalesced") == 2)
+    create.release.set()
+    for thread in callers:
+        thread.join(2)
+    assert answers == ["re: summary"] * 3
+    assert create.calls == 1
+    assert limiter.usage()["llm.test"]["calls"] == 1
+
+
+def test_over_budget_calls_degrade_but_critical_ones_are_made():
+    limiter = OpenAILimiter(rpm=0, tpm=0, daily_tokens=100, path=None)
+    create = FakeCreate(prompt_tokens=80, completion_tokens=30)
+    assert ask(limiter, create, "Mona Lisa") == "re: Mona Lisa"
+    assert limiter.over_budget()
+
+    # An earlier identical reply, then the local fallback, then a refusal.
+    assert ask(limiter, create, "Mona Lisa") == "re: Mona Lisa"
+    assert ask(limiter, create, "The Scream", CHAT, fallback=lambda: "local") == "local"
+    with pytest.raises(BudgetExceeded):
+        ask(limiter, create, "The Scream", CHAT)
+    assert create.calls == 1
+    assert limiter.usage()["llm.test"]["degraded"] == 3
+
+    assert ask(limiter, create, "camera", CRITICAL, caller="vision.match") == "re: camera"
+    assert create.calls == 2
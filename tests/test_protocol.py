@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from navigation import protocol
+
+
+def test_encode_decode_round_trip():
+    payload = protocol.encode("request", "r-1", target="Mona Lisa", priority="high")
+    message = protocol.decode(payload.encode())
+    assert message["v"] == protocol.PROTOCOL_VERSION
+    assert message["type"] == "request" and message["id"] == "r-1"
+    assert message["target"] == "Mona Lisa" and message["priority"] == "high"
+
+
+def test_bare_string_is_a_request_with_a_fresh_id():
+    first = protocol.decode(b"The Scream by Edvard Munch\n")
+    second = protocol.decode("The Scream by Edvard Munch")
+    assert first["type"] == "request" and first["target"] == "The Scream by Edvard Munch"
+    assert first["id"] != second["id"]
+
+
+@pytest.mark.parametrize("version", [None, 0, protocol.PROTOCOL_VERSION + 1, "1"])
+def test_unsupported_version_is_rejected(version):
+    message = json.loads(protocol.encode("request", "r-1", target="Mona Lisa"))
+    if version is None:
+        del message["v"]
+    else:
+        message["v"] = version
+    with pytest.raises(ValueError, match="version"):
+        protocol.decode(json.dumps(message))
+
+
+@pytest.mark.parametrize("payload", [
+    "",
+    "{not json",
+    json.dumps({"v": protocol.PROTOCOL_VERSION, "type": "teleport"}),
+    json.dumps({"v": protocol.PROTOCOL_VERSION, "type": "request", "id": "r-1"}),
+])
+def test_malformed_message_is_rejected(payload):
+    with pytest.raises(ValueError):
+        protocol.decode(payload)
+
+
+def test_encode_rejects_unknown_type():
+    with pytest.raises(ValueError):
+        protocol.encode("teleport")
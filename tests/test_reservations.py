@@ -0,0 +1,78 @@
+from fleet.reservations import ReservationService
+from navigation import protocol
+
+
+class FakeClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published.append((topic, protocol.decode(payload)))
+
+
+class Message:
+    def __init__(self, payload):
+        self.payload = payload.encode()
+
+
+class Floor:
+    """
+    Sends reservation messages to a service whose clock only moves when told.
+    """
+
+    def __init__(self):
+        self.client = FakeClient()
+        self.service = ReservationService(self.client)
+        self.slot = 1000
+        self.service.now = lambda: self.slot
+
+    def send(self, msg_type, robot, position, **fields):
+        self.client.published.clear()
+        self.service.on_message(None, None, Message(protocol.encode(
+            msg_type, protocol.new_request_id(), robot_id=robot, position=list(position),
+            facing="UP", **fields)))
+        return self.client.published[-1][1] if self.client.published else None
+
+
+def test_plan_avoids_robots_and_parks_at_goal():
+    floor = Floor()
+    floor.send("release", "r2", (2, 1))
+    reply = floor.send("plan", "r1", (2, 0), goal=[2, 2])
+    assert reply["route"][-1] == [2, 2]
+    assert [2, 1] not in reply["route"]
+    assert floor.service.table.parked_by((2, 2)) == "r1"
+
+
+def test_deadlock_through_a_parked_goal_is_broken():
+    # r1 wants the goal r2 has parked, r2 waits for r3, r3 waits for r1 and r4
+    # waits behind r2: nobody stands on r2's goal, so only the park closes the cycle.
+    floor = Floor()
+    floor.send("release", "r2", (0, 2))
+    route = floor.send("plan", "r2", (0, 2), goal=[2, 0])["route"]
+    assert route[-1] == [2, 0]
+    floor.send("release", "r3", (1, 2))
+    floor.send("release", "r1", (1, 1))
+    floor.send("release", "r4", (0, 1))
+
+    assert floor.send("step", "r2", (0, 2), cell=[1, 2])["granted"] is False
+    assert floor.send("step", "r4", (0, 1), cell=[0, 2])["granted"] is False
+    assert floor.send("step", "r3", (1, 2), cell=[1, 1])["granted"] is False
+    # r2 gives up the goal it has not reached, and r1 takes it at once.
+    route = floor.send("plan", "r1", (1, 1), goal=[2, 0])["route"]
+    assert route[-1] == [2, 0]
+    assert floor.service.deadlocks == 1
+    assert floor.service.table.parked_by((2, 0)) == "r1"
+    reply = floor.send("step", "r2", (0, 2), cell=[1, 2])
+    assert reply["granted"] is False and reply["route"] == []
+    assert floor.send("plan", "r2", (0, 2), goal=[2, 0])["route"] is None
+
+
+def test_robot_may_leave_a_cell_another_robot_has_parked_its_goal_on():
+    floor = Floor()
+    assert floor.send("plan", "r2", (0, 0), goal=[2, 2])["route"][-1] == [2, 2]
+    floor.slot += 60
+    # r1 has stopped on r2's goal, which stays r2's, and still finds its way out.
+    floor.send("release", "r1", (2, 2))
+    assert floor.service.table.parked_by((2, 2)) == "r2"
+    route = floor.send("plan", "r1", (2, 2), goal=[0, 2])["route"]
+    assert route and route[-1] == [0, 2]
@@ -0,0 +1,72 @@
+import asyncio
+
+from nlp_voice_bot.intents import ends_turn_early, wants_to_end
+from nlp_voice_bot.tour import TourState, TourStateMachine
+
+
+class Visitor:
+    """
+    Says an utterance word by word as partial results; stops at the word the
+    tour ends the utterance on, like the microphone's endpointing.
+    """
+
+    def __init__(self, utterance):
+        self.words = utterance.split()
+        self.tour = None
+        self.heard = ""
+        self.cut = False
+
+    async def listen(self):
+        for n in range(1, len(self.words) + 1):
+            self.heard = " ".join(self.words[:n])
+            self.tour.notify_partial(self.heard)
+            await asyncio.sleep(0.01)
+            if self.cut:
+                break
+        return self.heard
+
+    def end_utterance(self):
+        self.cut = True
+
+
+def tour_for(visitor):
+    async def speak(text):
+        return True
+
+    tour = TourStateMachine(speak=speak, listen=visitor.listen, summarise=None, answer=None,
+                            choose=None, send_movement=None, exhibits=["Mona Lisa by Leonardo da Vinci"],
+                            end_utterance=visitor.end_utterance)
+    visitor.tour = tour
+    return tour
+
+
+def run_state(tour, handler):
+    async def run():
+        tour._loop = asyncio.get_running_loop()
+        tour._events = asyncio.Queue()
+        return await handler()
+
+    return asyncio.run(run())
+
+
+def test_exhibit_request_at_greeting_is_not_cut_short():
+    visitor = Visitor("Let's go see the Mona Lisa")
+    tour = tour_for(visitor)
+    assert run_state(tour, tour._greet) is TourState.SELECT
+    assert tour.request == "Let's go see the Mona Lisa"
+    assert not visitor.cut
+
+
+def test_moving_on_in_qa_ends_the_utterance_early():
+    visitor = Visitor("no questions thanks let's see the next one please")
+    tour = tour_for(visitor)
+    tour.current_location = "Mona Lisa by Leonardo da Vinci"
+    assert run_state(tour, tour._qa) is TourState.NEXT
+    assert visitor.cut and visitor.heard == "no questions"
+
+
+def test_intents_match_whole_words():
+    assert not wants_to_end("Can you recommend another painting?")
+    assert not ends_turn_early("Can you recommend another painting?")
+    assert not ends_turn_early("okay so who painted it")
+    assert wants_to_end("I think we're done")